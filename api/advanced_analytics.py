@@ -13,7 +13,9 @@ import logging
 import pandas as pd
 import numpy as np
 from core.advanced_analytics import advanced_analytics_engine
-from core.db import SessionLocal, Miner, Metric as MinerMetrics, ProfitabilitySnapshot
+# Read-only engine: these routes never write
+from core.db import ReadSessionLocal, Miner, ProfitabilitySnapshot, metrics_source
+from core.archive import load_history
 
 logger = logging.getLogger(__name__)
 advanced_bp = Blueprint('advanced_analytics', __name__)
@@ -40,13 +42,9 @@ def get_miner_metrics_data(session, miner, days=90):
     """Get and process metrics data for a miner"""
     cutoff = datetime.utcnow() - timedelta(days=days)
 
-    # Get metrics and profit data
-    metrics = (session.query(MinerMetrics)
-               .filter(MinerMetrics.miner_ip == miner.miner_ip)
-               .filter(MinerMetrics.timestamp >= cutoff)
-               .order_by(MinerMetrics.timestamp).all())
-
-    if not metrics:
+    # Metrics from the cold archive (memory-mapped) and the DB for recent days
+    metrics = load_history(miner.miner_ip, cutoff, datetime.utcnow(), session=session)
+    if metrics.empty:
         return None
 
     profit_data = (session.query(ProfitabilitySnapshot)
@@ -54,27 +52,30 @@ def get_miner_metrics_data(session, miner, days=90):
                    .filter(ProfitabilitySnapshot.timestamp >= cutoff)
                    .order_by(ProfitabilitySnapshot.timestamp).all())
 
-    # Process metrics with profit data
-    metrics_data = []
-    for m in metrics:
-        profit_match = next((p for p in profit_data
-                             if p.timestamp.date() == m.timestamp.date()), None)
-
-        rejection_rate = 0.0
-        if (profit_match and hasattr(profit_match, 'shares_rejected') and
-                hasattr(profit_match, 'shares_accepted')):
-            total = profit_match.shares_accepted + profit_match.shares_rejected
-            rejection_rate = profit_match.shares_rejected / total if total > 0 else 0.0
-
-        metrics_data.append({
-            'timestamp': m.timestamp,
-            'hashrate': m.hashrate_ths,
-            'temperature': m.avg_temp_c,
-            'fan_speed': m.avg_fan_rpm,
-            'power_consumption': m.power_w,
-            'rejection_rate': rejection_rate,
-            'efficiency': m.hashrate_ths / (m.power_w + 1e-6) if m.power_w and m.power_w > 0 else 0.0,
-        })
+    # Rejection rate from the first snapshot of each day
+    rejection_by_day = {}
+    for p in profit_data:
+        day = p.timestamp.date()
+        if day in rejection_by_day:
+            continue
+        rate = 0.0
+        if hasattr(p, 'shares_rejected') and hasattr(p, 'shares_accepted'):
+            total = p.shares_accepted + p.shares_rejected
+            rate = p.shares_rejected / total if total > 0 else 0.0
+        rejection_by_day[day] = rate
+
+    power = metrics['power_w'].to_numpy(dtype=float)
+    hashrate = metrics['hashrate_ths'].to_numpy(dtype=float)
+    metrics_data = {
+        'timestamp': metrics['timestamp'],
+        'hashrate': hashrate,
+        'temperature': metrics['avg_temp_c'],
+        'fan_speed': metrics['avg_fan_rpm'],
+        'power_consumption': power,
+        'rejection_rate': (metrics['timestamp'].dt.date.map(rejection_by_day)
+                           .fillna(0.0).astype(float)),
+        'efficiency': np.where(power > 0, hashrate / (power + 1e-6), 0.0),
+    }
 
     df = pd.DataFrame(metrics_data)
     if len(df) < advanced_analytics_engine.sequence_length + 1:
@@ -112,7 +113,7 @@ def train_lstm_model():
                 'timestamp': datetime.utcnow().isoformat()
             }), 400
 
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             miners = session.query(Miner).all()
             all_features = []
             all_targets = []
@@ -180,7 +181,7 @@ def train_autoencoder():
                 'timestamp': datetime.utcnow().isoformat()
             }), 400
 
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             miners = session.query(Miner).all()
             all_normal_data = []
 
@@ -224,7 +225,7 @@ def train_autoencoder():
 def predict_failure_risk(miner_id: str):
     """Get failure risk prediction for a specific miner"""
     try:
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             # Try to get by IP first, then by ID
             miner = session.query(Miner).filter(Miner.miner_ip == miner_id).first()
             if not miner:
@@ -242,10 +243,11 @@ def predict_failure_risk(miner_id: str):
 
             # Get recent metrics
             cutoff = datetime.utcnow() - timedelta(days=7)
-            metrics = (session.query(MinerMetrics)
-                       .filter(MinerMetrics.miner_ip == miner.miner_ip)
-                       .filter(MinerMetrics.timestamp >= cutoff)
-                       .order_by(MinerMetrics.timestamp).all())
+            m = metrics_source(cutoff)
+            metrics = (session.query(m)
+                       .filter(m.miner_ip == miner.miner_ip)
+                       .filter(m.timestamp >= cutoff)
+                       .order_by(m.timestamp).all())
 
             if not metrics:
                 return jsonify({
@@ -299,7 +301,7 @@ def predict_failure_risk(miner_id: str):
 def detect_anomalies(miner_id: str):
     """Detect anomalies in miner metrics"""
     try:
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             # Try to get by IP first, then by ID
             miner = session.query(Miner).filter(Miner.miner_ip == miner_id).first()
             if not miner:
@@ -317,10 +319,11 @@ def detect_anomalies(miner_id: str):
 
             # Get recent metrics
             cutoff = datetime.utcnow() - timedelta(days=7)
-            metrics = (session.query(MinerMetrics)
-                       .filter(MinerMetrics.miner_ip == miner.miner_ip)
-                       .filter(MinerMetrics.timestamp >= cutoff)
-                       .order_by(MinerMetrics.timestamp).all())
+            m = metrics_source(cutoff)
+            metrics = (session.query(m)
+                       .filter(m.miner_ip == miner.miner_ip)
+                       .filter(m.timestamp >= cutoff)
+                       .order_by(m.timestamp).all())
 
             if not metrics:
                 return jsonify({
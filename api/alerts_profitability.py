@@ -1,10 +1,11 @@
 """API endpoints for alerts and profitability features."""
 from flask import Blueprint, jsonify, request, render_template
 from datetime import datetime, timedelta
-from sqlalchemy import and_, or_, desc, func
+from sqlalchemy import and_, desc
 import logging
 
-from core.db import SessionLocal, Alert, AlertRule, ProfitabilitySnapshot, Miner, Metric
+from core.db import SessionLocal, Alert, AlertRule, ProfitabilitySnapshot, Miner
+from core.fleet_state import FLEET_STATE
 from core.alert_engine import AlertEngine, create_default_rules
 from core.notification_service import NotificationService
 from core.profitability import ProfitabilityEngine
@@ -445,21 +446,7 @@ def get_current_profitability():
                         return jsonify({'error': 'No active miners found'}), 404
 
                     # Get metrics only for active miners
-                    latest_subq = (
-                        engine.session.query(
-                            Metric.miner_ip.label('ip'),
-                            func.max(Metric.timestamp).label('last_ts')
-                        ).filter(Metric.miner_ip.in_(active_miners)).group_by(Metric.miner_ip).subquery()
-                    )
-
-                    metrics = (
-                        engine.session.query(Metric)
-                        .join(latest_subq, and_(
-                            Metric.miner_ip == latest_subq.c.ip,
-                            Metric.timestamp == latest_subq.c.last_ts
-                        ))
-                        .all()
-                    )
+                    metrics = FLEET_STATE.snapshot().select(ips=active_miners)
 
                     if not metrics:
                         return jsonify({'error': 'No data for active miners'}), 404
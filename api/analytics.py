@@ -6,7 +6,7 @@ from flask import Blueprint, jsonify, request, render_template
 from datetime import datetime, timedelta
 import logging
 from core.predictive_analytics import analytics_engine
-from core.db import Miner, Metric, SessionLocal
+from core.db import Miner, ReadSessionLocal  # read-only engine
 from sqlalchemy import func, and_
 
 logger = logging.getLogger(__name__)
@@ -37,7 +37,7 @@ def get_miner_risk_assessment(miner_id):
     """Get failure risk assessment for a specific miner"""
     try:
         # Verify miner exists (miner_id can be IP or integer ID)
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             # Try to get by IP first, then by ID
             miner = session.query(Miner).filter(Miner.miner_ip == miner_id).first()
             if not miner:
@@ -119,7 +119,7 @@ def get_high_risk_miners():
         high_risk_miners = []
 
         # Get all miners using session
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             miners = session.query(Miner).all()
 
             for miner in miners:
@@ -164,7 +164,7 @@ def get_fleet_health_trend():
 
         # For now, we'll calculate current health and simulate trend
         # In a real implementation, you'd store historical health scores
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             # Note: Miner model doesn't have a 'status' field, getting all miners instead
             miners = session.query(Miner).all()
 
@@ -220,7 +220,7 @@ def get_fleet_health_trend():
 def get_maintenance_schedule():
     """Get recommended maintenance schedule based on risk assessments"""
     try:
-        with SessionLocal() as session:
+        with ReadSessionLocal() as session:
             # Note: Miner model doesn't have a 'status' field, getting all miners instead
             miners = session.query(Miner).all()
         maintenance_schedule = []
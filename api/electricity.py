@@ -4,7 +4,8 @@ API endpoints for electricity cost tracking and management.
 
 from flask import Blueprint, request, jsonify, render_template
 from sqlalchemy import and_, func
-from core.db import SessionLocal, ElectricityRate, ElectricityCost, Metric, Miner
+from core.db import SessionLocal, ElectricityRate, ElectricityCost, Miner, metrics_source
+from core.fleet_state import FLEET_STATE
 from core.electricity import ElectricityCostService, create_default_rates
 import datetime as dt
 
@@ -39,32 +40,11 @@ def estimate_costs_from_fleet(session, location=None):
     miners = miner_query.all()
     miner_ips = [m.miner_ip for m in miners] if miners else []
 
-    # Get latest metrics for these miners
-    if miner_ips:
-        metrics_query = session.query(Metric).filter(
-            and_(
-                Metric.miner_ip.in_(miner_ips),
-                Metric.timestamp >= cutoff
-            )
-        )
-    else:
-        # If no location filter, get all recent metrics
-        metrics_query = session.query(Metric).filter(Metric.timestamp >= cutoff)
-
-    # Get latest metric per miner
-    from sqlalchemy.sql import func as sql_func
-    subq = session.query(
-        Metric.miner_ip,
-        sql_func.max(Metric.timestamp).label('max_ts')
-    ).filter(Metric.timestamp >= cutoff).group_by(Metric.miner_ip).subquery()
-
-    latest_metrics = session.query(Metric).join(
-        subq,
-        and_(
-            Metric.miner_ip == subq.c.miner_ip,
-            Metric.timestamp == subq.c.max_ts
-        )
-    ).all()
+    # Latest metric per miner, if reported within the last hour
+    latest_metrics = FLEET_STATE.snapshot().fresh(cutoff)
+    if location:
+        located = set(miner_ips)
+        latest_metrics = [m for m in latest_metrics if m.miner_ip in located]
 
     # Calculate total fleet power
     total_power_w = sum(m.power_w for m in latest_metrics if m.power_w)
@@ -600,10 +580,11 @@ def record_costs_now():
             # Get average power consumption for each miner in the period
             for miner_ip in miner_ips:
                 # Query metrics for this miner in the period
-                metrics = session.query(Metric).filter(
-                    Metric.miner_ip == miner_ip,
-                    Metric.timestamp >= period_start,
-                    Metric.timestamp <= period_end
+                src = metrics_source(period_start, period_end)
+                metrics = session.query(src).filter(
+                    src.miner_ip == miner_ip,
+                    src.timestamp >= period_start,
+                    src.timestamp <= period_end
                 ).all()
 
                 if not metrics:
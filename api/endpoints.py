@@ -1,13 +1,29 @@
-import ipaddress
-import socket
+import csv
+import io
+import json
 import time
-from flask import Blueprint, jsonify, request, current_app
-from sqlalchemy import func, and_
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
+from sqlalchemy import func, or_
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from core.db import SessionLocal, Metric, Miner, Event, ErrorEvent, DB_PATH
-from core.miner import MinerClient, MinerError
-from miner_config import MINER_IP_RANGE, API_MAX_LIMIT, POLL_INTERVAL
-from core.get_network_ip import resolve_miner_ip_range, detect_local_ipv4_networks
+# Handlers only read: sessions come from the read-only engine (query_only, own pool)
+from core.db import (
+    ReadSessionLocal, Miner, Event, ErrorEvent, DB_PATH, BULK_WRITER, ROLLUP_MODELS,
+    ROLLUP_RESOLUTIONS, ROLLUP_FIELDS, IS_SQLITE, engine, metrics_source,
+)
+from core.miner import MinerClient, MinerError, MINER_HEALTH
+from core.fleet_state import FLEET_STATE
+from core.live_refresh import LIVE_REFRESH
+from core.rollups import (
+    choose_resolution, series_query, series_values, rollup_point, window_averages_query,
+)
+from core.downsample import AGGREGATIONS, downsample_rows, series_columns
+from miner_config import (
+    API_MAX_LIMIT, ROLLUP_SUMMARY_MAX_BUCKETS, SUMMARY_MAX_AGE, METRICS_DOWNSAMPLE_SOURCE_POINTS,
+    METRICS_DOWNSAMPLE_MAX_ROWS, METRICS_DOWNSAMPLE_WINDOW, METRICS_EXPORT_PAGE_ROWS,
+    METRICS_EXPORT_FETCH_ROWS,
+)
+from core.inventory import resolve_scan_networks, probe_hosts, browse_mdns, merge_discovered
+from core.write_queue import WRITE_QUEUE
 from datetime import datetime, timezone, timedelta
 import logging
 
@@ -38,35 +54,19 @@ def debug_peek():
     fresh_within = int(request.args.get("fresh_within", 30))
     cutoff = datetime.utcnow() - timedelta(minutes=fresh_within)
 
-    s = SessionLocal()
-    try:
-        latest = (
-            s.query(
-                Metric.miner_ip.label('ip'),
-                func.max(Metric.timestamp).label('last_ts')
-            ).group_by(Metric.miner_ip).subquery()
-        )
-        q = (s.query(Metric)
-             .join(latest, and_(Metric.miner_ip == latest.c.ip,
-                                Metric.timestamp == latest.c.last_ts))
-             .order_by(Metric.miner_ip.asc()))
-        rows = q.all()
-
-        out = []
-        for m in rows:
-            age_min = (datetime.utcnow() - m.timestamp).total_seconds() / 60.0
-            out.append({
-                "ip": m.miner_ip,
-                "last_seen": m.timestamp.isoformat() + "Z",
-                "age_min": round(age_min, 1),
-                "active@fresh_min": fresh_within,
-                "is_active": m.timestamp >= cutoff,
-                "hashrate_ths": float(m.hashrate_ths or 0.0),
-                "power_w": float(m.power_w or 0.0),
-            })
-        return jsonify(out)
-    finally:
-        s.close()
+    out = []
+    for m in FLEET_STATE.snapshot().all():
+        age_min = (datetime.utcnow() - m.timestamp).total_seconds() / 60.0
+        out.append({
+            "ip": m.miner_ip,
+            "last_seen": m.timestamp.isoformat() + "Z",
+            "age_min": round(age_min, 1),
+            "active@fresh_min": fresh_within,
+            "is_active": m.timestamp >= cutoff,
+            "hashrate_ths": float(m.hashrate_ths or 0.0),
+            "power_w": float(m.power_w or 0.0),
+        })
+    return jsonify(out)
 
 
 @api_bp.route("/debug/tail")
@@ -74,12 +74,13 @@ def debug_tail():
     """Return last N metrics (optionally for one miner)."""
     ip = request.args.get("ip")
     n = int(request.args.get("n", 50))
-    s = SessionLocal()
+    s = ReadSessionLocal()
     try:
-        q = s.query(Metric)
+        m = metrics_source()
+        q = s.query(m)
         if ip:
-            q = q.filter(Metric.miner_ip == ip)
-        rows = (q.order_by(Metric.timestamp.desc()).limit(n).all())
+            q = q.filter(m.miner_ip == ip)
+        rows = (q.order_by(m.timestamp.desc()).limit(n).all())
         rows.reverse()
         return jsonify([{
             "timestamp": r.timestamp.isoformat() + "Z",
@@ -94,10 +95,16 @@ def debug_tail():
 def debug_db_info():
     """Return info about the metrics database location and basic row counts."""
     import os
-    s = SessionLocal()
+    s = ReadSessionLocal()
     try:
-        metrics_count = s.query(func.count(Metric.id)).scalar() or 0
+        metrics_count = s.query(func.count(metrics_source().id)).scalar() or 0
         miners_count = s.query(func.count(Miner.id)).scalar() or 0
+        if not IS_SQLITE:
+            return jsonify({
+                "db_url": engine.url.render_as_string(hide_password=True),
+                "metrics_count": int(metrics_count),
+                "miners_count": int(miners_count),
+            })
         path_str = str(DB_PATH)
         exists = os.path.exists(path_str)
         size_bytes = os.path.getsize(path_str) if exists else 0
@@ -112,9 +119,54 @@ def debug_db_info():
         s.close()
 
 
+@api_bp.route("/debug/poll_cycle")
+def debug_poll_cycle():
+    """Return timing of the last scheduler poll cycle (duration vs. POLL_INTERVAL)."""
+    from scheduler import LAST_POLL_CYCLE  # local import: scheduler imports this module
+    return jsonify(dict(LAST_POLL_CYCLE))
+
+
+@api_bp.route("/debug/miner_health")
+def debug_miner_health():
+    """Per-miner circuit state, latency EWMA/p99 and consecutive failures."""
+    return jsonify(MINER_HEALTH.snapshot())
+
+
+@api_bp.route("/debug/live_refresh")
+def debug_live_refresh():
+    """Live refresh counters: fetches started, joined in flight, reused within the interval."""
+    return jsonify(LIVE_REFRESH.stats())
+
+
+@api_bp.route("/debug/ingest")
+def debug_ingest():
+    """Bulk writer counters per table: rows/s and batch latency."""
+    return jsonify({"batch_size": BULK_WRITER.batch_size, "tables": BULK_WRITER.stats()})
+
+
+@api_bp.route("/debug/write_queue")
+def debug_write_queue():
+    """Single-writer queue: depth, jobs per transaction, queue wait and commit latency."""
+    return jsonify(WRITE_QUEUE.stats())
+
+
+@api_bp.route("/debug/fleet_state")
+def debug_fleet_state():
+    """In-memory fleet state: miners held, snapshot version and source, update counters."""
+    return jsonify(FLEET_STATE.stats())
+
+
+@api_bp.route("/debug/retention")
+def debug_retention():
+    """Report of the last retention run: rows deleted per table and bytes reclaimed."""
+    from core.retention import LAST_RETENTION_REPORT
+    return jsonify(dict(LAST_RETENTION_REPORT))
+
+
 def discover_miners(timeout=1, workers=50, use_mdns=True, return_sources=False, cidrs=None):
     """
-    Scan the configured CIDR for TCP/4028 and optionally browse mDNS _cgminer._tcp.
+    Scan the configured CIDR for the CGMiner port (CGMINER_PORT, default 4028) and
+    optionally browse mDNS _cgminer._tcp.
 
     Args:
         timeout (int|float): socket timeout per probe in seconds
@@ -126,51 +178,13 @@ def discover_miners(timeout=1, workers=50, use_mdns=True, return_sources=False,
         list[str] if return_sources is False
         dict[str, str] if return_sources is True
     """
-    # Try to detect local networks if no specific CIDRs are provided
-    if not cidrs:
-        try:
-            networks = detect_local_ipv4_networks()
-            if networks:
-                cidrs = [str(net) for net in networks]
-                logger.info(f"Auto-detected networks: {cidrs}")
-        except Exception as e:
-            logger.warning(f"Failed to detect local networks: {e}")
-
-    # Determine networks to scan
-    networks = []
     try:
-        if cidrs:
-            items = cidrs if isinstance(cidrs, (list, tuple)) else [c.strip() for c in str(cidrs).split(',') if c.strip()]
-            for c in items:
-                try:
-                    networks.append(ipaddress.ip_network(c))
-                except Exception as e:
-                    logger.warning(f"Invalid CIDR {c}: {e}")
-                    continue
-        if not networks:
-            cidr = MINER_IP_RANGE or resolve_miner_ip_range()
-            if not cidr:
-                logger.warning("discover_miners_no_cidr_configured")
-                return {} if return_sources else []
-            try:
-                networks = [ipaddress.ip_network(cidr)]
-                logger.info(f"Using configured CIDR: {cidr}")
-            except Exception as e:
-                logger.warning(f"discover_miners_invalid_cidr cidr={cidr} err={e}")
-                return {} if return_sources else []
+        networks = resolve_scan_networks(cidrs)
     except Exception as e:
         logger.exception("discover_miners_networks_build_failed", exc_info=e)
         return {} if return_sources else []
-
-    # noinspection PyBroadException
-    def scan(ip):
-        with socket.socket() as s:
-            s.settimeout(timeout)
-            try:
-                s.connect((str(ip), 4028))
-                return str(ip)
-            except Exception:
-                return None
+    if not networks:
+        return {} if return_sources else []
 
     # TCP scan once using a single executor across all networks
     hosts = []
@@ -179,33 +193,9 @@ def discover_miners(timeout=1, workers=50, use_mdns=True, return_sources=False,
             hosts.extend(list(net.hosts()))
         except Exception:
             continue
-    with ThreadPoolExecutor(max_workers=workers) as ex:
-        tcp_hosts = {ip for ip in ex.map(scan, hosts) if ip}
+    tcp_hosts = probe_hosts(hosts, timeout=timeout, workers=workers)
 
-    mdns_hosts = set()
-    if use_mdns:
-        try:
-            from zeroconf import Zeroconf, ServiceBrowser
-            zeroconf = Zeroconf()
-            services = []
-
-            def on_service(zc, type_, name):
-                info = zc.get_service_info(type_, name)
-                if info:
-                    for addr in info.addresses:
-                        try:
-                            services.append(socket.inet_ntoa(addr))
-                        except OSError:
-                            # ignore non-IPv4 addresses
-                            pass
-
-            ServiceBrowser(zeroconf, "_cgminer._tcp.local.", handlers=[on_service])
-            time.sleep(2)
-            zeroconf.close()
-            mdns_hosts = set(services)
-        except Exception:
-            # zeroconf not installed or runtime error; ignore
-            mdns_hosts = set()
+    mdns_hosts = browse_mdns() if use_mdns else set()
 
     union = tcp_hosts | mdns_hosts
     if not return_sources:
@@ -220,11 +210,12 @@ def discover_miners(timeout=1, workers=50, use_mdns=True, return_sources=False,
 
 
 def _last_seen_for_ip(ip: str):
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
-        m = (session.query(Metric)
-             .filter(Metric.miner_ip == ip)
-             .order_by(Metric.timestamp.desc())
+        src = metrics_source()
+        m = (session.query(src)
+             .filter(src.miner_ip == ip)
+             .order_by(src.timestamp.desc())
              .first())
         if not m:
             return None, None
@@ -281,7 +272,22 @@ def _to_naive_utc(dt):
 
 @api_bp.route('/summary')
 def summary():
-    """Summarize current metrics and indicate a data source (live vs. DB fallback)."""
+    """
+    Fleet totals from the scheduler's last poll (the in-memory fleet state).
+
+    Query params:
+      - ip: one miner instead of the fleet
+      - active_only / fresh_within (minutes, default true / 30): only miners seen recently
+      - max_age (seconds, default SUMMARY_MAX_AGE): samples older than this are marked
+        'stale' (still counted) and reported in stale_workers
+      - live: 'true' to refresh the miners live first. Refreshes go through LIVE_REFRESH:
+        one fetch in flight per miner, reused for LIVE_REFRESH_MIN_INTERVAL seconds, and
+        miners that do not answer keep their poll sample.
+    Each log row's source is 'live', 'poll' or 'stale' (rows read from the database used
+    to be 'db_fallback'); the top-level source is that value when all rows agree, 'mixed'
+    otherwise, or 'none' without rows. Each row's discovery is 'manual' for ?ip= and
+    'poll' for miners listed from the fleet state.
+    """
     ipf = request.args.get('ip')
 
     # Parse fresh_within and active_only params (similar to miners_summary endpoint)
@@ -289,129 +295,71 @@ def summary():
         fresh_within = int(request.args.get('fresh_within', 30))
     except Exception:
         fresh_within = 30
+    try:
+        max_age = int(request.args.get('max_age', SUMMARY_MAX_AGE))
+    except Exception:
+        max_age = SUMMARY_MAX_AGE
     active_only = request.args.get('active_only', 'true').lower() == 'true'
-    prefer_live = request.args.get('live', 'true').lower() != 'false'
+    live = request.args.get('live', 'false').lower() == 'true'
 
+    now = _naive_utc_now()
+    fleet = FLEET_STATE.snapshot()
     if ipf:
         miners = [ipf]
         discovery_sources = {ipf: "manual"}
     else:
-        # Use DB to get list of miners instead of network discovery (much faster!)
-        s_quick = SessionLocal()
-        try:
-            cutoff = _naive_utc_now() - timedelta(minutes=fresh_within)
-            latest_subq = (
-                s_quick.query(
-                    Metric.miner_ip.label('ip'),
-                    func.max(Metric.timestamp).label('last_ts')
-                )
-                .group_by(Metric.miner_ip)
-                .subquery()
-            )
-            q = s_quick.query(latest_subq.c.ip)
-            if active_only:
-                q = q.filter(latest_subq.c.last_ts >= cutoff)
-            miners = [row.ip for row in q.all()]
-            discovery_sources = {ip: 'db' for ip in miners}
-        except Exception:
-            miners = []
-            discovery_sources = {}
-        finally:
-            s_quick.close()
+        miners = fleet.ips(fresh_within=fresh_within if active_only else None, now=now)
+        discovery_sources = {ip: 'poll' for ip in miners}
+    refreshed = LIVE_REFRESH.refresh(miners) if live and miners else {}
+
     totals = {'power': 0.0, 'hash': 0.0, 'uptime': 0, 'temps': [], 'fans': []}
     data = []
     overall_srcs = set()
-
-    # Prefetch latest DB metric per miner once to avoid per-thread queries
-    prefetch = {}
-    if miners:
-        s_pref = SessionLocal()
-        try:
-            latest_subq = (
-                s_pref.query(
-                    Metric.miner_ip.label('ip'),
-                    func.max(Metric.timestamp).label('last_ts')
-                )
-                .filter(Metric.miner_ip.in_(miners))
-                .group_by(Metric.miner_ip)
-                .subquery()
-            )
-            rows = (
-                s_pref.query(Metric)
-                .join(latest_subq, and_(Metric.miner_ip == latest_subq.c.ip,
-                                        Metric.timestamp == latest_subq.c.last_ts))
-                .all()
-            )
-            for m in rows:
-                prefetch[m.miner_ip] = m
-        except Exception:
-            prefetch = {}
-        finally:
-            s_pref.close()
-
-    # worker that returns (ip, payload, src) or (ip, None, None)
-    def _fetch_one(ip: str):
-        # 1) try live
-        if prefer_live:
-            try:
-                payload = MinerClient(ip).fetch_normalized()
-                return ip, payload, 'live'
-            except MinerError:
-                pass
-            except Exception:
-                pass
-        # 2) fallback: last prefetched DB metric
-        last = prefetch.get(ip)
-        if last:
-            return ip, {
+    stale = 0
+    for ip in miners:
+        payload = refreshed.get(ip)
+        if payload is not None:
+            src = 'live'
+        else:
+            last = fleet.get(ip)
+            if last is None or last.timestamp is None:
+                continue
+            payload = {
                 'hashrate_ths': last.hashrate_ths,
                 'elapsed_s': last.elapsed_s,
                 'avg_temp_c': last.avg_temp_c,
                 'avg_fan_rpm': last.avg_fan_rpm,
                 'power_w': last.power_w,
                 'when': last.timestamp.isoformat() + 'Z',
-            }, 'db_fallback'
-        else:
-            return ip, None, None
-
-    with ThreadPoolExecutor(max_workers=min(_MAX_WORKERS, max(len(miners), 1))) as ex:
-        futures = {ex.submit(_fetch_one, ip): ip for ip in miners}
-        for fut in as_completed(futures, timeout=None):
-            ip = futures[fut]
-            try:
-                ip, payload, src = fut.result()
-            except Exception:
-                continue
-
-            if not payload:
-                continue
-
-            overall_srcs.add(src)
-            totals['power'] += float(payload.get('power_w', 0) or 0)
-            totals['hash'] += float(payload.get('hashrate_ths', 0) or 0)
-            totals['uptime'] = max(totals['uptime'], int(payload.get('elapsed_s', 0) or 0))
-
-            avg_temp_c = payload.get('avg_temp_c')
-            avg_fan_rpm = payload.get('avg_fan_rpm')
-            if avg_temp_c:
-                totals['temps'].append(float(avg_temp_c))
-            if avg_fan_rpm:
-                totals['fans'].append(float(avg_fan_rpm))
-
-            ts = payload.get('when') or datetime.now(timezone.utc).isoformat()
-            data.append({
-                'timestamp': ts,
-                'ip': ip,
-                'hash': payload.get('hashrate_ths', 0),
-                'source': src,
-                'discovery': discovery_sources.get(ip, 'unknown')
-            })
+            }
+            src = 'poll' if (now - last.timestamp).total_seconds() <= max_age else 'stale'
+            stale += src == 'stale'
+
+        overall_srcs.add(src)
+        totals['power'] += float(payload.get('power_w', 0) or 0)
+        totals['hash'] += float(payload.get('hashrate_ths', 0) or 0)
+        totals['uptime'] = max(totals['uptime'], int(payload.get('elapsed_s', 0) or 0))
+
+        avg_temp_c = payload.get('avg_temp_c')
+        avg_fan_rpm = payload.get('avg_fan_rpm')
+        if avg_temp_c:
+            totals['temps'].append(float(avg_temp_c))
+        if avg_fan_rpm:
+            totals['fans'].append(float(avg_fan_rpm))
+
+        ts = payload.get('when') or datetime.now(timezone.utc).isoformat()
+        data.append({
+            'timestamp': ts,
+            'ip': ip,
+            'hash': payload.get('hashrate_ths', 0),
+            'source': src,
+            'discovery': discovery_sources.get(ip, 'unknown')
+        })
 
-    overall_source = (
-        'live' if overall_srcs == {'live'} else
-        ('db_fallback' if overall_srcs == {'db_fallback'}
-         else ('mixed' if overall_srcs else 'none'))
-    )
+    if len(overall_srcs) == 1:
+        overall_source = overall_srcs.pop()
+    else:
+        overall_source = 'mixed' if overall_srcs else 'none'
 
     return jsonify({
         'source': overall_source,
@@ -421,7 +369,10 @@ def summary():
         'avg_temp': round(sum(totals['temps']) / len(totals['temps']), 1) if totals['temps'] else 0,
         'avg_fan_speed': round(sum(totals['fans']) / len(totals['fans']), 0) if totals['fans'] else 0,
         'total_workers': len(miners),
+        'stale_workers': stale,
+        'max_age_s': max_age,
         'log': data,
+        'polled_at': fleet.updated_at.isoformat() + 'Z' if fleet.updated_at else None,
         'last_updated': datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
     })
 
@@ -436,6 +387,9 @@ def miners_summary():
       ips (csv, optional) — restrict to a list of IPs
       since (ISO, optional) — overrides window_min if set
     Response: [{ ip, last_seen, hashrate_ths, power_w, avg_temp_c, avg_fan_rpm }]
+
+    Windows longer than ROLLUP_SUMMARY_MAX_BUCKETS poll intervals are averaged from the
+    finest rollup with at most that many buckets; X-Metrics-Resolution names the source.
     """
     # Parse params safely
     try:
@@ -461,30 +415,38 @@ def miners_summary():
     cutoff = now - timedelta(minutes=fresh_within)
     ip_list = [i.strip() for i in ips_param.split(',') if i.strip()] if ips_param else None
 
-    s = SessionLocal()
+    s = ReadSessionLocal()
     try:
-        # Aggregate per miner over the window
-        q = (
-            s.query(
-                Metric.miner_ip.label('ip'),
-                func.max(Metric.timestamp).label('last_ts'),
-                func.avg(Metric.hashrate_ths).label('hashrate_ths'),
-                func.avg(Metric.power_w).label('power_w'),
-                func.avg(Metric.avg_temp_c).label('avg_temp_c'),
-                func.avg(Metric.avg_fan_rpm).label('avg_fan_rpm'),
+        # Short windows average raw rows; longer ones average rollup buckets
+        label = choose_resolution((now - since_dt).total_seconds(), ROLLUP_SUMMARY_MAX_BUCKETS)
+        if label:
+            q = window_averages_query(s, label, since_dt, ip_list)
+            if active_only:
+                fresh = FLEET_STATE.snapshot().ips(fresh_within=fresh_within, now=now)
+                q = q.filter(ROLLUP_MODELS[label].miner_ip.in_(fresh))
+        else:
+            # Aggregate per miner over the window
+            m = metrics_source(since_dt)
+            q = (
+                s.query(
+                    m.miner_ip.label('ip'),
+                    func.max(m.timestamp).label('last_ts'),
+                    func.avg(m.hashrate_ths).label('hashrate_ths'),
+                    func.avg(m.power_w).label('power_w'),
+                    func.avg(m.avg_temp_c).label('avg_temp_c'),
+                    func.avg(m.avg_fan_rpm).label('avg_fan_rpm'),
+                )
+                .filter(m.timestamp >= since_dt)
             )
-            .filter(Metric.timestamp >= since_dt)
-        )
-        if ip_list:
-            q = q.filter(Metric.miner_ip.in_(ip_list))
-
-        q = q.group_by(Metric.miner_ip)
-        if active_only:
-            q = q.having(func.max(Metric.timestamp) >= cutoff)
+            if ip_list:
+                q = q.filter(m.miner_ip.in_(ip_list))
 
-        q = q.order_by(func.max(Metric.timestamp).desc())
+            q = q.group_by(m.miner_ip)
+            if active_only:
+                q = q.having(func.max(m.timestamp) >= cutoff)
 
-        rows = q.all()
+        # Newest first; sorting the per-miner rows here keeps a temp B-tree out of the plan
+        rows = sorted(q.all(), key=lambda r: r.last_ts or datetime.min, reverse=True)
         out = []
         for r in rows:
             last_ts = r.last_ts
@@ -496,7 +458,9 @@ def miners_summary():
                 "avg_temp_c": float(r.avg_temp_c or 0.0),
                 "avg_fan_rpm": float(r.avg_fan_rpm or 0.0),
             })
-        return jsonify(out)
+        resp = jsonify(out)
+        resp.headers["X-Metrics-Resolution"] = label or "raw"
+        return resp
     finally:
         s.close()
 
@@ -524,31 +488,11 @@ def miners_current():
     ip_list = [i.strip() for i in ips_param.split(',') if i.strip()] if ips_param else None
     enrich_model = request.args.get('enrich_model', 'false').lower() == 'true'
 
-    cutoff = _naive_utc_now() - timedelta(minutes=fresh_within)
+    now = _naive_utc_now()
 
-    s = SessionLocal()
+    s = ReadSessionLocal()
     try:
-        latest = (
-            s.query(
-                Metric.miner_ip.label('ip'),
-                func.max(Metric.timestamp).label('last_ts')
-            )
-            .group_by(Metric.miner_ip)
-            .subquery()
-        )
-
-        q = (
-            s.query(Metric)
-            .join(latest, and_(Metric.miner_ip == latest.c.ip,
-                               Metric.timestamp == latest.c.last_ts))
-        )
-
-        if ip_list:
-            q = q.filter(Metric.miner_ip.in_(ip_list))
-        if active_only:
-            q = q.filter(Metric.timestamp >= cutoff)
-
-        rows = q.order_by(Metric.miner_ip.asc()).all()
+        rows = FLEET_STATE.snapshot().select(ip_list, fresh_within if active_only else None, now)
 
         # Prefer DB-sourced model if available to avoid live network calls.
         models: dict[str, str] = {}
@@ -602,6 +546,30 @@ def miners_current():
 
 @api_bp.route("/metrics")
 def metrics():
+    """
+    Metric rows, oldest first (at most `limit`).
+
+    Query params:
+      - ip / ips: one miner, or a CSV of miners
+      - since (ISO): start of the window
+      - limit (int, default 500, capped at API_MAX_LIMIT)
+      - active_only / fresh_within: only miners seen within fresh_within minutes
+      - resolution: auto (default), raw, 1m, 5m, 1h or 1d. With `since`, auto reads raw
+        rows when the window fits `points` per miner at the poll interval, otherwise the
+        finest rollup that fits; without `since` it reads raw rows. Rollup rows carry
+        bucket averages under the same keys, timestamped at the bucket start.
+      - points (int): points per miner for auto (default: limit / miners in scope)
+      - agg: lttb, avg, min, max or minmax to downsample each miner's series to `points`
+        rows on the server (see core.downsample). The whole window is read (default
+        `since`: METRICS_DOWNSAMPLE_WINDOW seconds ago), so `limit` no longer truncates it;
+        auto picks a rollup once the window exceeds METRICS_DOWNSAMPLE_SOURCE_POINTS samples
+        per miner or METRICS_DOWNSAMPLE_MAX_ROWS across the miners in scope, and beyond that
+        cap the newest rows are kept. points x miners is capped at API_MAX_LIMIT.
+      - field: the field LTTB keeps the shape of (default hashrate_ths)
+      - detail: 'true' adds samples and min/max/last to rollup rows
+      - enrich_model: 'true' to fetch the model live for single-miner queries
+    The resolution used is returned in the X-Metrics-Resolution header.
+    """
     ip_filter = request.args.get("ip")
     ips_param = request.args.get("ips")
     since = request.args.get("since")
@@ -609,63 +577,94 @@ def metrics():
     active_only = request.args.get("active_only", "false").lower() == "true"
     fresh_within = int(request.args.get("fresh_within", 30))
     enrich_model = request.args.get('enrich_model', 'false').lower() == 'true'
+    resolution = request.args.get("resolution", "auto").lower()
+    detail = request.args.get("detail", "false").lower() == "true"
+    agg = request.args.get("agg", "").lower()
+    field = request.args.get("field", "hashrate_ths")
+    if agg and agg not in AGGREGATIONS:
+        error = f"agg must be one of: {', '.join(AGGREGATIONS)}"
+        return jsonify({"ok": False, "error": error}), 400
+    if field not in ROLLUP_FIELDS:
+        error = f"field must be one of: {', '.join(ROLLUP_FIELDS)}"
+        return jsonify({"ok": False, "error": error}), 400
 
     # enforce a hard upper bound for safety
     limit = max(1, min(limit, API_MAX_LIMIT))
 
-    s = SessionLocal()
+    s = ReadSessionLocal()
     try:
-        q = s.query(Metric)
-
+        ip_list = None
         if ip_filter:
-            q = q.filter(Metric.miner_ip == ip_filter)
-
-        if ips_param and not ip_filter:
-            ip_list = [i.strip() for i in ips_param.split(",") if i.strip()]
-            if ip_list:
-                q = q.filter(Metric.miner_ip.in_(ip_list))
+            ip_list = [ip_filter]
+        elif ips_param:
+            ip_list = [i.strip() for i in ips_param.split(",") if i.strip()] or None
 
+        since_dt = None
         if since:
             try:
-                dt = _normalize_since(since)
+                since_dt = _normalize_since(since)
             except Exception:
-                dt = None
-            if dt:
-                q = q.filter(Metric.timestamp >= dt)
+                since_dt = None
 
         if active_only:
-            cutoff = _naive_utc_now() - timedelta(minutes=fresh_within)
-            latest_subq = (
-                s.query(
-                    Metric.miner_ip.label("ip"),
-                    func.max(Metric.timestamp).label("last_ts"),
-                )
-                .group_by(Metric.miner_ip)
-                .subquery()
-            )
-            active_ips = [
-                r.ip
-                for r in s.query(latest_subq)
-                .filter(latest_subq.c.last_ts >= cutoff)
-                .all()
-            ]
+            active_ips = FLEET_STATE.snapshot().ips(fresh_within=fresh_within, now=_naive_utc_now())
+            if ip_list:
+                active = set(active_ips)
+                active_ips = [ip for ip in ip_list if ip in active]
             if not active_ips:
                 return jsonify([])
-            q = q.filter(Metric.miner_ip.in_(active_ips))
-
-        rows = q.order_by(Metric.timestamp.asc()).limit(limit).all()
-
-        out = [
-            {
-                "timestamp": (m.timestamp.isoformat() + "Z"),  # return ISO+Z
-                "ip": m.miner_ip,
-                "power_w": m.power_w,
-                "hashrate_ths": m.hashrate_ths,
-                "avg_temp_c": m.avg_temp_c,
-                "avg_fan_rpm": m.avg_fan_rpm,
-            }
-            for m in rows
-        ]
+            ip_list = active_ips
+
+        series = len(ip_list) if ip_list else (len(FLEET_STATE.snapshot()) or 1)
+        try:
+            points = int(request.args.get("points") or 0)
+        except ValueError:
+            points = 0
+        points = points or max(1, limit // series)
+        if agg:
+            points = max(1, min(points, API_MAX_LIMIT // series))
+            # Always a bounded window, so the row cap never falls on the newest data
+            since_dt = since_dt or _naive_utc_now() - timedelta(seconds=METRICS_DOWNSAMPLE_WINDOW)
+
+        label = None
+        if resolution in ROLLUP_RESOLUTIONS:
+            label = resolution
+        elif resolution == "auto" and since_dt:
+            # Downsampling bounds the payload, so it may read far more rows than it returns,
+            # up to the per-request row cap shared by every miner in scope
+            budget = points
+            if agg:
+                budget = min(METRICS_DOWNSAMPLE_SOURCE_POINTS,
+                             METRICS_DOWNSAMPLE_MAX_ROWS // series)
+            label = choose_resolution((_naive_utc_now() - since_dt).total_seconds(), budget)
+
+        if agg:
+            rows = series_values(s, label, since_dt, ip_list, limit=METRICS_DOWNSAMPLE_MAX_ROWS)
+            columns = series_columns(rows, rollup=label is not None)
+            out = downsample_rows(columns, points, agg, field)
+        elif label:
+            rows = series_query(s, label, since_dt, ip_list).limit(limit).all()
+            out = [rollup_point(r, detail=detail) for r in rows]
+        else:
+            m = metrics_source(since_dt)
+            q = s.query(m)
+            if ip_list:
+                q = q.filter(m.miner_ip.in_(ip_list))
+            if since_dt:
+                q = q.filter(m.timestamp >= since_dt)
+            rows = q.order_by(m.timestamp.asc()).limit(limit).all()
+
+            out = [
+                {
+                    "timestamp": (m.timestamp.isoformat() + "Z"),  # return ISO+Z
+                    "ip": m.miner_ip,
+                    "power_w": m.power_w,
+                    "hashrate_ths": m.hashrate_ths,
+                    "avg_temp_c": m.avg_temp_c,
+                    "avg_fan_rpm": m.avg_fan_rpm,
+                }
+                for m in rows
+            ]
 
         # For single-miner queries, best-effort include model once
         if ip_filter:
@@ -688,6 +687,9 @@ def metrics():
                 for rec in out:
                     rec['model'] = model
         resp = jsonify(out)
+        resp.headers["X-Metrics-Resolution"] = label or "raw"
+        if agg:
+            resp.headers["X-Metrics-Downsample"] = f"{agg};points={points};rows={len(rows)}"
         try:
             resp = api_cache_control(resp)
         except Exception:
@@ -697,6 +699,118 @@ def metrics():
         s.close()
 
 
+EXPORT_COLUMNS = ("id", "timestamp", "ip", "power_w", "hashrate_ths", "elapsed_s", "avg_temp_c",
+                  "avg_fan_rpm")
+_EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _parse_cursor(value: str) -> tuple:
+    """'<timestamp>,<id>' (the last row received) -> (naive UTC datetime, id)."""
+    ts, _, row_id = value.rpartition(",")
+    if not ts:
+        raise ValueError("cursor must be '<timestamp>,<id>'")
+    return _normalize_since(ts), int(row_id)
+
+
+def _export_batches(ip_list, since_dt, until_dt, after, limit):
+    """Metrics rows ordered by (timestamp, id), in fetchmany() batches.
+
+    Keyset pagination: each page of METRICS_EXPORT_PAGE_ROWS resumes after the last
+    (timestamp, id) sent, in its own session, so no read transaction (or WAL snapshot)
+    stays open for a whole export and memory does not grow with its size.
+    """
+    sent = 0
+    while True:
+        page = METRICS_EXPORT_PAGE_ROWS
+        if limit:
+            page = min(page, limit - sent)
+        s = ReadSessionLocal()
+        try:
+            m = metrics_source(since_dt, until_dt)
+            q = s.query(m.id, m.timestamp, m.miner_ip, m.power_w, m.hashrate_ths, m.elapsed_s,
+                        m.avg_temp_c, m.avg_fan_rpm)
+            if ip_list:
+                q = q.filter(m.miner_ip.in_(ip_list))
+            if since_dt:
+                q = q.filter(m.timestamp >= since_dt)
+            if until_dt:
+                q = q.filter(m.timestamp < until_dt)
+            if after:
+                # (timestamp, id) > after, spelled so the timestamp index bounds the range
+                q = q.filter(m.timestamp >= after[0], or_(m.timestamp > after[0], m.id > after[1]))
+            result = s.execute(q.order_by(m.timestamp.asc(), m.id.asc()).limit(page).statement)
+            got = 0
+            while True:
+                batch = result.fetchmany(METRICS_EXPORT_FETCH_ROWS)
+                if not batch:
+                    break
+                got += len(batch)
+                after = (batch[-1].timestamp, batch[-1].id)
+                yield batch
+        finally:
+            s.close()
+        sent += got
+        if got < page or (limit and sent >= limit):
+            return
+
+
+def _export_values(row) -> list:
+    return [row.id, row.timestamp.isoformat() + "Z", row.miner_ip, row.power_w, row.hashrate_ths,
+            row.elapsed_s, row.avg_temp_c, row.avg_fan_rpm]
+
+
+@api_bp.route("/metrics/export")
+def metrics_export():
+    """
+    Stream raw metric rows as NDJSON (default) or CSV, ordered by (timestamp, id).
+
+    Query params:
+      - format: ndjson or csv
+      - ip / ips: one miner, or a CSV of miners
+      - since (ISO, inclusive) / until (ISO, exclusive): the time range
+      - cursor: '<timestamp>,<id>' of the last row received; the export resumes after it
+      - limit (int, default 0 = no limit): rows in this response
+    Each row carries id and timestamp, so an interrupted download can be resumed with
+    cursor=<timestamp>,<id> from its last complete row. Memory use is constant: rows are
+    read in keyset pages and written out as they are fetched.
+    """
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in _EXPORT_FORMATS:
+        error = f"format must be one of: {', '.join(_EXPORT_FORMATS)}"
+        return jsonify({"ok": False, "error": error}), 400
+    ip_filter = request.args.get("ip")
+    ips_param = request.args.get("ips")
+    ip_list = None
+    if ip_filter:
+        ip_list = [ip_filter]
+    elif ips_param:
+        ip_list = [i.strip() for i in ips_param.split(",") if i.strip()] or None
+    try:
+        since_dt = _normalize_since(request.args["since"]) if request.args.get("since") else None
+        until_dt = _normalize_since(request.args["until"]) if request.args.get("until") else None
+        after = _parse_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        limit = max(0, int(request.args.get("limit", 0)))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    def generate():
+        if fmt == "csv" and not after:
+            yield ",".join(EXPORT_COLUMNS) + "\n"
+        for batch in _export_batches(ip_list, since_dt, until_dt, after, limit):
+            if fmt == "csv":
+                buf = io.StringIO()
+                csv.writer(buf, lineterminator="\n").writerows(_export_values(r) for r in batch)
+                yield buf.getvalue()
+            else:
+                yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, _export_values(r), strict=True)))
+                              + "\n" for r in batch)
+
+    resp = Response(stream_with_context(generate()), mimetype=_EXPORT_FORMATS[fmt])
+    resp.headers["Content-Disposition"] = f"attachment; filename=metrics.{fmt}"
+    resp.headers["X-Accel-Buffering"] = "no"  # let reverse proxies pass chunks through
+    return resp
+
+
 @api_bp.route("/error-logs")
 def error_logs():
     level = request.args.get("level")
@@ -704,7 +818,7 @@ def error_logs():
     since = request.args.get("since")
     limit = int(request.args.get("limit", 200))
 
-    session = SessionLocal()
+    session = ReadSessionLocal()
     q = session.query(ErrorEvent)
 
     # Treat empty or 'ALL' (any case) as no level filter
@@ -738,7 +852,7 @@ def error_logs():
 
 @api_bp.route("/events")
 def events():
-    s = SessionLocal()
+    s = ReadSessionLocal()
     try:
         rows = (s.query(Event).order_by(Event.timestamp.desc()).limit(500).all())
         return jsonify([{
@@ -1351,6 +1465,11 @@ def api_discover():
         else:
             src_map = sources
             miners = sorted(list(src_map.keys()))
+        # Fold newly found miners into the inventory; absences are left to the background sweep
+        try:
+            WRITE_QUEUE.run(lambda ws: merge_discovered(src_map, session=ws))
+        except Exception:
+            logger.exception('discover inventory merge failed')
         return jsonify({"ok": True, "miners": miners, "sources": src_map})
     except Exception as e:
         logger.exception('discover failed')
@@ -1,6 +1,5 @@
 from flask import Blueprint, Response, current_app
-from sqlalchemy import func, and_
-from core.db import SessionLocal, Metric
+from core.fleet_state import FLEET_STATE
 from datetime import timedelta
 
 # Prometheus client (optional dependency). Provide a lightweight fallback.
@@ -68,48 +67,42 @@ POWER_EST = Gauge('miner_power_est_w', 'Estimated power in Watts', ['ip', 'model
 AVG_TEMP = Gauge('miner_avg_temp_c', 'Average temperature C', ['ip'])
 FAN_RPM = Gauge('miner_avg_fan_rpm', 'Average fan RPM', ['ip'])
 STATUS = Gauge('miner_status', '1=active,0=stale', ['ip'])
+# Single-writer queue: depth, commit/wait latency (ms) and grouping (see core/write_queue.py)
+WRITE_QUEUE_STATS = Gauge('db_write_queue', 'Database write queue statistics', ['stat'])
+_WRITE_QUEUE_STATS = ("depth", "max_depth", "jobs", "failed_jobs", "transactions",
+                      "avg_jobs_per_transaction", "avg_wait_ms", "max_wait_ms", "avg_commit_ms",
+                      "last_commit_ms", "max_commit_ms")
+
+
+def _populate_write_queue():
+    from core.write_queue import WRITE_QUEUE
+    stats = WRITE_QUEUE.stats()
+    for stat in _WRITE_QUEUE_STATS:
+        WRITE_QUEUE_STATS.labels(stat=stat).set(float(stats.get(stat) or 0.0))
 
 
 def _populate_from_latest(active_within_min: int = 30):
-    """Populate gauges from latest row per miner within freshness window."""
+    """Populate gauges from the latest sample per miner (in-memory fleet state)."""
     cutoff = _naive_utc_now() - timedelta(minutes=active_within_min)
-    s = SessionLocal()
-    try:
-        latest = (
-            s.query(
-                Metric.miner_ip.label('ip'),
-                func.max(Metric.timestamp).label('last_ts'),
-            )
-            .group_by(Metric.miner_ip)
-            .subquery()
-        )
-
-        q = (
-            s.query(Metric)
-            .join(latest, and_(Metric.miner_ip == latest.c.ip, Metric.timestamp == latest.c.last_ts))
-        )
-
-        rows = q.all()
-
-        # Clear previous values to avoid stale labelsets
-        HASHRATE.clear()
-        POWER_EST.clear()
-        STATUS.clear()
-        AVG_TEMP.clear()
-        FAN_RPM.clear()
-
-        # Best-effort to enrich with model via MinerClient is intentionally avoided here
-        # to keep the exporter fast and DB-only. Model can be attached elsewhere if stored.
-        for m in rows:
-            is_active = 1.0 if (m.timestamp and m.timestamp >= cutoff) else 0.0
-            model = ''  # unknown here without hitting the network
-            HASHRATE.labels(ip=m.miner_ip, model=model).set(float(m.hashrate_ths or 0.0))
-            POWER_EST.labels(ip=m.miner_ip, model=model).set(float(m.power_w or 0.0))
-            STATUS.labels(ip=m.miner_ip).set(is_active)
-            AVG_TEMP.labels(ip=m.miner_ip).set(float(m.avg_temp_c or 0.0))
-            FAN_RPM.labels(ip=m.miner_ip).set(float(m.avg_fan_rpm or 0.0))
-    finally:
-        s.close()
+    rows = FLEET_STATE.snapshot().all()
+
+    # Clear previous values to avoid stale labelsets
+    HASHRATE.clear()
+    POWER_EST.clear()
+    STATUS.clear()
+    AVG_TEMP.clear()
+    FAN_RPM.clear()
+
+    # Best-effort to enrich with model via MinerClient is intentionally avoided here
+    # to keep the exporter fast and network-free. Model can be attached elsewhere if stored.
+    for m in rows:
+        is_active = 1.0 if (m.timestamp and m.timestamp >= cutoff) else 0.0
+        model = ''  # unknown here without hitting the network
+        HASHRATE.labels(ip=m.miner_ip, model=model).set(float(m.hashrate_ths or 0.0))
+        POWER_EST.labels(ip=m.miner_ip, model=model).set(float(m.power_w or 0.0))
+        STATUS.labels(ip=m.miner_ip).set(is_active)
+        AVG_TEMP.labels(ip=m.miner_ip).set(float(m.avg_temp_c or 0.0))
+        FAN_RPM.labels(ip=m.miner_ip).set(float(m.avg_fan_rpm or 0.0))
 
 
 def _naive_utc_now():
@@ -131,4 +124,5 @@ def metrics():
     except Exception:
         # Leave gauges empty; still return a valid exposition format
         pass
+    _populate_write_queue()
     return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
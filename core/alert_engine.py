@@ -3,18 +3,35 @@ from __future__ import annotations
 import logging
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, List, Any
-from sqlalchemy import func, and_, or_
-from core.db import SessionLocal, Alert, AlertRule, Metric, Miner
+from core.db import SessionLocal, Alert, AlertRule, Metric, Miner, BULK_WRITER, metrics_source
+from core.write_queue import WRITE_QUEUE
+from core.fleet_state import FLEET_STATE
 from miner_config import TEMP_THRESHOLD, HASHRATE_DROP_THRESHOLD, ALERT_COOLDOWN_MINUTES
 
 logger = logging.getLogger(__name__)
 
 
+def _update_alerts(session, ids: List[int], from_statuses: List[str], **values) -> int:
+    """Set `values` on the alerts in `ids` still in one of `from_statuses`; returns rows changed."""
+    if not ids:
+        return 0
+    return (
+        session.query(Alert)
+        .filter(Alert.id.in_(ids), Alert.status.in_(from_statuses))
+        .update(values, synchronize_session=False)
+    )
+
+
 class AlertEngine:
     """Evaluates alert rules against current miner metrics."""
 
-    def __init__(self):
-        self.session = SessionLocal()
+    # Column order of the alert tuples handed to BULK_WRITER
+    ALERT_COLUMNS = ("created_at", "updated_at", "rule_id", "miner_ip", "alert_type", "severity",
+                     "message", "details", "status")
+
+    def __init__(self, session=None):
+        self.session = session if session is not None else SessionLocal()
+        self._pending_alerts: List[Alert] = []
 
     def __enter__(self):
         return self
@@ -22,6 +39,10 @@ class AlertEngine:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.session.close()
 
+    def latest_metrics(self) -> list:
+        """Latest metric per miner (in-memory fleet state)."""
+        return FLEET_STATE.snapshot().all()
+
     def check_all_miners(self) -> List[Alert]:
         """
         Check all active miners against all enabled alert rules.
@@ -37,22 +58,7 @@ class AlertEngine:
                 logger.debug("No enabled alert rules")
                 return new_alerts
 
-            # Get latest metric per miner
-            latest_subq = (
-                self.session.query(
-                    Metric.miner_ip.label('ip'),
-                    func.max(Metric.timestamp).label('last_ts')
-                ).group_by(Metric.miner_ip).subquery()
-            )
-
-            metrics = (
-                self.session.query(Metric)
-                .join(latest_subq, and_(
-                    Metric.miner_ip == latest_subq.c.ip,
-                    Metric.timestamp == latest_subq.c.last_ts
-                ))
-                .all()
-            )
+            metrics = self.latest_metrics()
 
             # Get miner metadata
             miner_ips = [m.miner_ip for m in metrics]
@@ -80,6 +86,9 @@ class AlertEngine:
                         new_alerts.append(alert)
                         logger.info(f"Alert triggered: {alert.message} for {alert.miner_ip}")
 
+            # Persist this check's alerts in one batch
+            self._flush_alerts()
+
             # Auto-resolve alerts for miners that recovered
             self._auto_resolve_alerts(metrics)
 
@@ -294,10 +303,11 @@ class AlertEngine:
 
     def _get_rolling_average_hashrate(self, ip: str, samples: int = 10) -> Optional[float]:
         """Calculate rolling average hashrate for baseline."""
+        m = metrics_source()
         recent = (
-            self.session.query(Metric.hashrate_ths)
-            .filter(Metric.miner_ip == ip, Metric.hashrate_ths.isnot(None))
-            .order_by(Metric.timestamp.desc())
+            self.session.query(m.hashrate_ths)
+            .filter(m.miner_ip == ip, m.hashrate_ths.isnot(None))
+            .order_by(m.timestamp.desc())
             .limit(samples)
             .all()
         )
@@ -313,8 +323,11 @@ class AlertEngine:
 
     def _create_alert(self, rule: AlertRule, miner_ip: str, alert_type: str,
                       message: str, details: Dict[str, Any]) -> Alert:
-        """Create and persist a new alert."""
+        """Create a new alert; it is persisted with the rest of the check by _flush_alerts()."""
+        now = datetime.utcnow()
         alert = Alert(
+            created_at=now,
+            updated_at=now,
             rule_id=rule.id,
             miner_ip=miner_ip,
             alert_type=alert_type,
@@ -324,11 +337,21 @@ class AlertEngine:
             status='active'
         )
 
-        self.session.add(alert)
-        self.session.commit()
+        self._pending_alerts.append(alert)
 
         return alert
 
+    def _flush_alerts(self) -> None:
+        """Insert pending alerts with one batched insert and assign their ids."""
+        if not self._pending_alerts:
+            return
+        pending, self._pending_alerts = self._pending_alerts, []
+        rows = [tuple(getattr(a, c) for c in self.ALERT_COLUMNS) for a in pending]
+        ids = WRITE_QUEUE.run(lambda ws: BULK_WRITER.write(Alert, self.ALERT_COLUMNS, rows,
+                                                           session=ws, returning="id"))
+        for alert, alert_id in zip(pending, ids, strict=True):
+            alert.id = alert_id
+
     def _auto_resolve_alerts(self, current_metrics: List[Metric]) -> None:
         """Auto-resolve alerts for miners that have recovered."""
         # Get all active alerts
@@ -343,6 +366,7 @@ class AlertEngine:
         for metric in current_metrics:
             current_state[metric.miner_ip] = metric
 
+        resolved = []
         for alert in active_alerts:
             metric = current_state.get(alert.miner_ip)
             if not metric:
@@ -369,34 +393,26 @@ class AlertEngine:
                         should_resolve = True
 
             if should_resolve:
-                alert.status = 'auto_resolved'
-                alert.resolved_at = datetime.utcnow()
-                alert.resolution_note = 'Condition automatically cleared'
+                resolved.append(alert.id)
                 logger.info(f"Auto-resolved alert {alert.id} for {alert.miner_ip}")
 
-        self.session.commit()
+        if resolved:
+            WRITE_QUEUE.run(_update_alerts, resolved, ['active'], status='auto_resolved',
+                            resolved_at=datetime.utcnow(),
+                            resolution_note='Condition automatically cleared')
 
     def acknowledge_alert(self, alert_id: int, user: str = 'system') -> bool:
         """Acknowledge an alert."""
-        alert = self.session.query(Alert).filter(Alert.id == alert_id).first()
-        if alert and alert.status == 'active':
-            alert.status = 'acknowledged'
-            alert.acknowledged_at = datetime.utcnow()
-            alert.acknowledged_by = user
-            self.session.commit()
-            return True
-        return False
+        changed = WRITE_QUEUE.run(_update_alerts, [alert_id], ['active'], status='acknowledged',
+                                  acknowledged_at=datetime.utcnow(), acknowledged_by=user)
+        return changed > 0
 
     def resolve_alert(self, alert_id: int, note: str = None, user: str = 'system') -> bool:
         """Manually resolve an alert."""
-        alert = self.session.query(Alert).filter(Alert.id == alert_id).first()
-        if alert and alert.status in ['active', 'acknowledged']:
-            alert.status = 'resolved'
-            alert.resolved_at = datetime.utcnow()
-            alert.resolution_note = note
-            self.session.commit()
-            return True
-        return False
+        changed = WRITE_QUEUE.run(_update_alerts, [alert_id], ['active', 'acknowledged'],
+                                  status='resolved', resolved_at=datetime.utcnow(),
+                                  resolution_note=note)
+        return changed > 0
 
 
 def create_default_rules(session=None):
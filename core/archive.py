@@ -0,0 +1,249 @@
+"""Columnar cold archive of raw metrics: one NumPy file per miner per closed day.
+
+Files are <archive dir>/<miner ip>/<YYYY-MM-DD>.npy, each a structured array of that
+miner's samples for the UTC day, oldest first:
+  dt            uint32   seconds since the previous sample (the first: since midnight)
+  hashrate_ths, power_w, avg_temp_c, avg_fan_rpm   float32 (NaN where missing)
+  elapsed_s     uint32
+Reads memory-map the files (np.load(mmap_mode="r")) and rebuild timestamps with a
+cumulative sum, so training jobs get arrays or DataFrames without the ORM.
+
+archive_pending() writes each closed day once, ARCHIVE_AFTER_DAYS after it ends, and
+records it in <archive dir>/_days/<YYYY-MM-DD>.json. Raw rows stay in the database
+until retention removes them; load_history() reads archived days from the files and
+the rest from the database.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from core.db import DB_DIR, SessionLocal, metrics_source
+from miner_config import ARCHIVE_AFTER_DAYS, ARCHIVE_MAX_DAYS, METRICS_ARCHIVE_DIR
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("hashrate_ths", "power_w", "avg_temp_c", "avg_fan_rpm", "elapsed_s")
+DTYPE = np.dtype([
+    ("dt", "<u4"),
+    ("hashrate_ths", "<f4"),
+    ("power_w", "<f4"),
+    ("avg_temp_c", "<f4"),
+    ("avg_fan_rpm", "<f4"),
+    ("elapsed_s", "<u4"),
+])
+_EPOCH = dt.datetime(1970, 1, 1)
+_DAY = dt.timedelta(days=1)
+
+
+def _epoch(ts: dt.datetime) -> int:
+    return int((ts - _EPOCH).total_seconds())
+
+
+def encode_day(day: dt.date, frame: pd.DataFrame) -> np.ndarray:
+    """One miner's samples for `day` (timestamp + FIELDS columns) as a DTYPE array."""
+    frame = frame.sort_values("timestamp")
+    ts = frame["timestamp"].to_numpy(dtype="datetime64[s]").astype(np.int64)
+    out = np.empty(len(frame), dtype=DTYPE)
+    out["dt"] = np.diff(ts, prepend=_epoch(dt.datetime.combine(day, dt.time())))
+    for field in FIELDS[:-1]:
+        values = pd.to_numeric(frame[field], errors="coerce")
+        out[field] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+    elapsed = pd.to_numeric(frame["elapsed_s"], errors="coerce")
+    out["elapsed_s"] = elapsed.fillna(0).clip(lower=0).to_numpy()
+    return out
+
+
+def decode_day(day: dt.date, arr: np.ndarray) -> np.ndarray:
+    """Timestamps (int64 epoch seconds) of a day file's samples."""
+    return _epoch(dt.datetime.combine(day, dt.time())) + np.cumsum(arr["dt"], dtype=np.int64)
+
+
+class MetricsArchive:
+    """Per-miner, per-day .npy files under `directory` (see module docstring)."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else DB_DIR / "archive"
+
+    # ---- layout ----
+    @staticmethod
+    def _dirname(ip: str) -> str:
+        return ip.replace(":", "_").replace("/", "_")
+
+    def path(self, ip: str, day: dt.date) -> Path:
+        return self.directory / self._dirname(ip) / f"{day.isoformat()}.npy"
+
+    def _marker(self, day: dt.date) -> Path:
+        return self.directory / "_days" / f"{day.isoformat()}.json"
+
+    def days(self) -> list:
+        """Archived days, oldest first."""
+        markers = (self.directory / "_days").glob("*.json")
+        return sorted(dt.date.fromisoformat(p.stem) for p in markers)
+
+    def archived_until(self) -> dt.datetime | None:
+        """End of the newest archived day (archived data covers everything before it)."""
+        days = self.days()
+        return dt.datetime.combine(days[-1], dt.time()) + _DAY if days else None
+
+    def miners(self) -> list:
+        if not self.directory.exists():
+            return []
+        return sorted(p.name for p in self.directory.iterdir()
+                      if p.is_dir() and p.name != "_days")
+
+    # ---- writes ----
+    def write(self, ip: str, day: dt.date, frame: pd.DataFrame) -> int:
+        """Write one miner's day atomically; returns bytes written."""
+        path = self.path(ip, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as fh:
+            np.save(fh, encode_day(day, frame))
+        os.replace(tmp, path)
+        return path.stat().st_size
+
+    def archive_day(self, day: dt.date, session) -> dict:
+        """Copy every miner's raw samples for `day` from the database into the archive."""
+        start = dt.datetime.combine(day, dt.time())
+        end = start + _DAY
+        m = metrics_source(start, end)
+        in_day = (m.timestamp >= start, m.timestamp < end)
+        ips = [ip for (ip,) in session.execute(select(m.miner_ip).where(*in_day).distinct())
+               if ip is not None]
+        columns = [m.timestamp] + [getattr(m, f) for f in FIELDS]
+        rows = nbytes = 0
+        for ip in ips:
+            # One miner at a time: an index seek per miner and bounded memory
+            result = session.execute(
+                select(*columns).where(m.miner_ip == ip, *in_day).order_by(m.timestamp))
+            frame = pd.DataFrame(result.all(), columns=["timestamp", *FIELDS])
+            if frame.empty:
+                continue
+            nbytes += self.write(ip, day, frame)
+            rows += len(frame)
+        info = {"day": day.isoformat(), "miners": len(ips), "rows": rows, "bytes": nbytes,
+                "archived_at": dt.datetime.utcnow().isoformat() + "Z"}
+        marker = self._marker(day)
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.write_text(json.dumps(info))
+        return info
+
+    def archive_pending(self, session=None, now: dt.datetime = None,
+                        after_days: int = ARCHIVE_AFTER_DAYS,
+                        max_days: int = ARCHIVE_MAX_DAYS) -> dict:
+        """Archive closed days after the newest archived one (at most `max_days`)."""
+        close_session = session is None
+        session = session or SessionLocal()
+        now = now or dt.datetime.utcnow()
+        try:
+            last_closed = (now - dt.timedelta(days=max(after_days, 0))).date() - _DAY
+            archived = self.days()
+            if archived:
+                day = archived[-1] + _DAY
+            else:
+                m = metrics_source()
+                oldest = session.execute(select(func.min(m.timestamp))).scalar()
+                if oldest is None:
+                    return {"archived": [], "rows": 0, "bytes": 0}
+                day = oldest.date()
+            done = []
+            while day <= last_closed and len(done) < max_days:
+                done.append(self.archive_day(day, session))
+                day += _DAY
+            return {"archived": [d["day"] for d in done], "rows": sum(d["rows"] for d in done),
+                    "bytes": sum(d["bytes"] for d in done)}
+        finally:
+            if close_session:
+                session.close()
+
+    # ---- reads ----
+    def read(self, ip: str, start: dt.datetime, end: dt.datetime, fields=FIELDS) -> dict:
+        """{"timestamp": datetime64[s] array, field: array, ...} for [start, end).
+
+        Field arrays are views of the memory-mapped files when one day is read, and
+        concatenated copies when the range spans several days.
+        """
+        lo, hi = _epoch(start), _epoch(end)
+        parts_ts, parts = [], {f: [] for f in fields}
+        day = start.date()
+        while day <= (end - dt.timedelta(microseconds=1)).date():
+            path = self.path(ip, day)
+            if path.exists():
+                arr = np.load(path, mmap_mode="r")
+                ts = decode_day(day, arr)
+                i, j = np.searchsorted(ts, lo, "left"), np.searchsorted(ts, hi, "left")
+                if j > i:
+                    parts_ts.append(ts[i:j])
+                    for f in fields:
+                        parts[f].append(arr[f][i:j])
+            day += _DAY
+        join = (lambda xs: xs[0]) if len(parts_ts) == 1 else np.concatenate
+        if not parts_ts:
+            out = {"timestamp": np.empty(0, dtype="datetime64[s]")}
+            out.update({f: np.empty(0, dtype=DTYPE[f]) for f in fields})
+            return out
+        out = {"timestamp": join(parts_ts).astype("datetime64[s]")}
+        out.update({f: join(parts[f]) for f in fields})
+        return out
+
+    def frame(self, ip: str, start: dt.datetime, end: dt.datetime, fields=FIELDS) -> pd.DataFrame:
+        """read() as a DataFrame (timestamp column first)."""
+        return pd.DataFrame(self.read(ip, start, end, fields))
+
+    def fleet(self, start: dt.datetime, end: dt.datetime, ips=None, fields=FIELDS) -> pd.DataFrame:
+        """All (or `ips`) miners' archived samples in [start, end) with a miner_ip column."""
+        frames = []
+        for ip in ips if ips is not None else self.miners():
+            df = self.frame(ip, start, end, fields)
+            if len(df):
+                df.insert(1, "miner_ip", ip)
+                frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=["timestamp", "miner_ip", *fields])
+        return pd.concat(frames, ignore_index=True)
+
+
+ARCHIVE = MetricsArchive(METRICS_ARCHIVE_DIR)
+
+
+def load_history(ip: str, start: dt.datetime, end: dt.datetime, session=None,
+                 archive: MetricsArchive = None) -> pd.DataFrame:
+    """One miner's samples in [start, end) as a DataFrame (timestamp + FIELDS).
+
+    Days the archive covers come from the memory-mapped files; the rest from the
+    database with a single Core query.
+    """
+    archive = archive or ARCHIVE
+    until = archive.archived_until()
+    frames = []
+    if until is not None and start < until:
+        frames.append(archive.frame(ip, start, min(end, until)))
+    db_start = max(start, until) if until is not None else start
+    if db_start < end:
+        close_session = session is None
+        session = session or SessionLocal()
+        try:
+            m = metrics_source(db_start, end)
+            result = session.execute(
+                select(m.timestamp, *(getattr(m, f) for f in FIELDS))
+                .where(m.miner_ip == ip, m.timestamp >= db_start, m.timestamp < end)
+                .order_by(m.timestamp))
+            db = pd.DataFrame(result.all(), columns=["timestamp", *FIELDS])
+        finally:
+            if close_session:
+                session.close()
+        if len(db):
+            db["timestamp"] = pd.to_datetime(db["timestamp"]).astype("datetime64[s]")
+            frames.append(db.astype({f: "float64" for f in FIELDS[:-1]}))
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=["timestamp", *FIELDS])
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
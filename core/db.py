@@ -1,15 +1,33 @@
 from __future__ import annotations
 import datetime as _dt
 from pathlib import Path
+from urllib.parse import quote
+import logging
 import sqlite3
+import threading
+import time
 from sqlalchemy import (
-    create_engine, event, Column, Integer, Float, String, DateTime, Text, Boolean, ForeignKey, Index
+    create_engine, event, func, insert, inspect, literal_column, select, type_coerce, union_all,
+    Column, Integer, Float, String, DateTime, Text, Boolean, ForeignKey, Index, MetaData, REAL,
+    TypeDecorator
 )
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.dialects.sqlite import JSON as SQLITE_JSON
+from sqlalchemy.orm import sessionmaker, declarative_base, aliased
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import JSON as SQLITE_JSON, insert as sqlite_insert
+from sqlalchemy.engine import make_url
 import os
+import csv
+import io
 import json
 import base64
+from miner_config import (
+    INGEST_BATCH_SIZE, METRICS_PARTITIONED, METRICS_PARTITION_DIR, METRICS_COMPACT, SQLITE_PROFILE,
+    SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_TEMP_STORE, SQLITE_WAL_AUTOCHECKPOINT,
+    SQLITE_PAGE_SIZE, SQLITE_READ_POOL_SIZE, SQLITE_ANALYSIS_LIMIT, DATABASE_URL, DB_POOL_SIZE,
+    DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+)
+
+logger = logging.getLogger(__name__)
 
 # -----------------------------------------------------------------------------
 # Database location (single source of truth)
@@ -19,35 +37,131 @@ DB_DIR = (BASE_DIR / "../db_files").resolve()
 DB_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DB_DIR / "metrics.db"
 
+# DATABASE_URL selects the backend: unset (or sqlite:///...) keeps the SQLite file,
+# postgresql://... uses a pooled server connection
+DB_URL = make_url(DATABASE_URL) if DATABASE_URL else None
+if DB_URL is not None and DB_URL.get_backend_name() == "sqlite" and DB_URL.database:
+    DB_PATH = Path(DB_URL.database).resolve()
+    DB_DIR = DB_PATH.parent
+IS_SQLITE = DB_URL is None or DB_URL.get_backend_name() == "sqlite"
+
 # -----------------------------------------------------------------------------
-# Engine (SQLite best practices for multithreaded app + scheduler)
+# Engines (SQLite best practices for multithreaded app + scheduler)
 # -----------------------------------------------------------------------------
-engine = create_engine(
-    f"sqlite:///{DB_PATH}",
-    echo=False,
-    future=True,
-    connect_args={"check_same_thread": False},  # scheduler + web threads
-)
+def sqlite_pragmas(profile: str = SQLITE_PROFILE, read_only: bool = False) -> list:
+    """PRAGMAs run on every new connection for `profile` ("tuned" or "baseline")."""
+    tuned = profile == "tuned"
+    if read_only:
+        pragmas = ["PRAGMA query_only=1", "PRAGMA busy_timeout=5000"]
+    else:
+        pragmas = [
+            # page_size and auto_vacuum only take effect on a new database; existing ones
+            # need a VACUUM (see core/retention.py)
+            *([f"PRAGMA page_size={SQLITE_PAGE_SIZE}"] if tuned else []),
+            "PRAGMA auto_vacuum=INCREMENTAL",
+            # WAL & reasonable sync level for durability and concurrency
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            "PRAGMA busy_timeout=5000",
+            *([f"PRAGMA wal_autocheckpoint={SQLITE_WAL_AUTOCHECKPOINT}"] if tuned else []),
+        ]
+    if tuned:
+        pragmas += [
+            f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+            f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+            f"PRAGMA temp_store={SQLITE_TEMP_STORE}",
+        ]
+    return pragmas
+
+
+def _pragma_listener(pragmas: list):
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cur = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cur.execute(pragma)
+        finally:
+            cur.close()
+    return _set_sqlite_pragmas
+
+
+def create_sqlite_writer(path, profile: str = SQLITE_PROFILE, **kwargs):
+    """A read-write engine for the database at `path` with the profile's pragmas."""
+    writer = create_engine(
+        f"sqlite:///{path}",
+        echo=False,
+        future=True,
+        connect_args={"check_same_thread": False},  # scheduler + web threads
+        **kwargs,
+    )
+    event.listen(writer, "connect", _pragma_listener(sqlite_pragmas(profile)))
+    return writer
 
 
-# Apply WAL & reasonable sync level for durability and concurrency
-@event.listens_for(engine, "connect")
-def _set_sqlite_pragmas(dbapi_connection, connection_record):
-    cur = dbapi_connection.cursor()
-    try:
-        cur.execute("PRAGMA journal_mode=WAL;")
-        cur.execute("PRAGMA synchronous=NORMAL;")
-        cur.execute("PRAGMA busy_timeout=5000;")
-        # Optional: reduce page cache misses a bit
-        # cur.execute("PRAGMA cache_size=-20000;")  # ~20MB cache
-    finally:
-        cur.close()
+def create_sqlite_engines(path, profile: str = SQLITE_PROFILE,
+                          read_pool_size: int = SQLITE_READ_POOL_SIZE) -> tuple:
+    """(writer, reader) engines for the database at `path`.
+
+    The writer is for ingestion, scheduler jobs and anything that commits. The reader
+    opens the file with mode=ro and query_only, for API handlers, so a stray write
+    from a request fails instead of queueing behind ingestion.
+    """
+    writer = create_sqlite_writer(path, profile)
+    reader = create_engine(
+        f"sqlite:///file:{quote(Path(path).as_posix())}?mode=ro&uri=true",
+        echo=False,
+        future=True,
+        connect_args={"check_same_thread": False},
+        pool_size=read_pool_size,
+        max_overflow=read_pool_size,
+    )
+    event.listen(reader, "connect", _pragma_listener(sqlite_pragmas(profile, read_only=True)))
+    return writer, reader
+
+
+def create_server_engines(url, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW,
+                          pool_timeout: float = DB_POOL_TIMEOUT,
+                          pool_recycle: int = DB_POOL_RECYCLE) -> tuple:
+    """(writer, reader) engines for a server database (PostgreSQL) at `url`.
+
+    Both share one QueuePool; connections are pinged on checkout and recycled after
+    `pool_recycle` seconds so restarts and idle timeouts on the server side are survived.
+    The reader runs its transactions READ ONLY.
+    """
+    writer = create_engine(
+        url,
+        echo=False,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+    )
+    reader = writer
+    if writer.dialect.name == "postgresql":
+        reader = writer.execution_options(postgresql_readonly=True)
+    return writer, reader
+
+
+if IS_SQLITE:
+    engine, read_engine = create_sqlite_engines(DB_PATH)
+    # The write queue's engine: a single connection, kept for the life of the process and
+    # used only by the queue's thread (core/write_queue.py)
+    queue_engine = create_sqlite_writer(DB_PATH, pool_size=1, max_overflow=0)
+else:
+    engine, read_engine = create_server_engines(DB_URL)
+    queue_engine = engine  # the server handles concurrent writers; the queue still groups commits
+IS_POSTGRES = engine.dialect.name == "postgresql"
 
 
 # -----------------------------------------------------------------------------
 # Session / Base
 # -----------------------------------------------------------------------------
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+# Read-only sessions for API handlers (see create_sqlite_engines / create_server_engines)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False,
+                                expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -71,6 +185,104 @@ class Metric(Base):
     avg_fan_rpm = Column(Float)
 
 
+class MinerLatest(Base):
+    """Newest metrics row per miner, upserted in the same transaction as each metrics batch.
+
+    Readers that only need the current state of the fleet query this instead of
+    grouping the whole metrics history by miner_ip. Columns mirror Metric.
+    """
+    __tablename__ = "miner_latest"
+
+    miner_ip = Column(String, primary_key=True)
+    timestamp = Column(DateTime, index=True)
+    power_w = Column(Float)
+    hashrate_ths = Column(Float)
+    elapsed_s = Column(Integer)
+    avg_temp_c = Column(Float)
+    avg_fan_rpm = Column(Float)
+
+
+# Rollup resolutions (label -> bucket seconds), finest first, and the metrics they summarize
+ROLLUP_RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+ROLLUP_FIELDS = ("hashrate_ths", "power_w", "avg_temp_c", "avg_fan_rpm")
+
+
+def _rollup_model(label: str):
+    """metrics_<label>: one row per (miner, bucket start) with samples, last_ts and
+    <field>_min/_max/_avg/_last for each ROLLUP_FIELDS entry (see core/rollups.py)."""
+    attrs = {
+        "__tablename__": f"metrics_{label}",
+        # (bucket, miner_ip) serves window reads ordered by bucket then miner without a sort
+        "__table_args__": (Index(f"idx_metrics_{label}_bucket_ip", "bucket", "miner_ip"),),
+        "__doc__": f"{label} rollup of metrics, maintained by core.rollups.update_rollups().",
+        "miner_ip": Column(String, primary_key=True),
+        "bucket": Column(DateTime, primary_key=True),
+        "samples": Column(Integer, nullable=False, default=0),
+        "last_ts": Column(DateTime),
+    }
+    for field in ROLLUP_FIELDS:
+        for stat in ("min", "max", "avg", "last"):
+            attrs[f"{field}_{stat}"] = Column(Float)
+    return type(f"MetricRollup{label}", (Base,), attrs)
+
+
+ROLLUP_MODELS = {label: _rollup_model(label) for label in ROLLUP_RESOLUTIONS}
+
+
+class RollupState(Base):
+    """High-water mark (last metrics.id folded in) per rollup pipeline."""
+    __tablename__ = "rollup_state"
+
+    name = Column(String(32), primary_key=True)
+    last_metric_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=_dt.datetime.utcnow)
+
+
+_EPOCH = _dt.datetime(1970, 1, 1)
+
+
+class EpochSeconds(TypeDecorator):
+    """Naive-UTC datetime stored as INTEGER seconds since the epoch."""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect=None):
+        if value is None or isinstance(value, int):
+            return value
+        if value.tzinfo is not None:
+            value = value.astimezone(_dt.timezone.utc).replace(tzinfo=None)
+        return int((value - _EPOCH).total_seconds())
+
+    def process_result_value(self, value, dialect=None):
+        return None if value is None else _EPOCH + _dt.timedelta(seconds=value)
+
+
+class MinerKey(Base):
+    """Small integer id per miner IP; the key of metrics_compact."""
+    __tablename__ = "miner_ids"
+
+    id = Column(Integer, primary_key=True)
+    ip = Column(String, nullable=False, unique=True)
+
+
+class CompactMetric(Base):
+    """Metrics clustered on (miner_id, ts) in a WITHOUT ROWID table: the primary key B-tree
+    holds the rows, and the ts index serves fleet-wide windows."""
+    __tablename__ = "metrics_compact"
+    __table_args__ = (
+        Index("idx_metrics_compact_ts", "ts"),
+        {"sqlite_with_rowid": False},
+    )
+
+    miner_id = Column(Integer, primary_key=True, autoincrement=False)
+    ts = Column(EpochSeconds, primary_key=True, autoincrement=False)
+    power_w = Column(REAL)
+    hashrate_ths = Column(REAL)
+    elapsed_s = Column(Integer)
+    avg_temp_c = Column(REAL)
+    avg_fan_rpm = Column(REAL)
+
+
 # noinspection PyDeprecation
 class Miner(Base):
     """Static/durable metadata about a miner device (one row per device/IP)."""
@@ -133,6 +345,12 @@ class Miner(Base):
     last_reboot_at = Column(DateTime, nullable=True)
     uptime_s = Column(Integer, nullable=True)
 
+    # Inventory (maintained by core.inventory discovery sweeps)
+    is_active = Column(Boolean, default=True, nullable=True, index=True)  # NULL treated as active
+    discovered_via = Column(String(16), nullable=True)  # 'tcp', 'mdns', 'both', 'manual'
+    last_discovered_at = Column(DateTime, nullable=True)
+    missed_sweeps = Column(Integer, default=0, nullable=True)
+
     # Tagging
     tags = Column(SQLITE_JSON, nullable=True)
 
@@ -297,13 +515,7 @@ def _quarantine_corrupt_files(db_path: Path) -> None:
                 pass
 
 
-def init_db():
-    """Create tables; auto-recover if the existing DB appears corrupt.
-
-    If PRAGMA quick_check fails or the file raises an error, the existing DB and
-    its WAL/SHM siblings are renamed with a .corrupt-<timestamp> suffix, and a
-    fresh database is created at the original path.
-    """
+def _recover_sqlite_file() -> None:
     # If the file exists but quick_check fails, quarantine and recreate
     try:
         if DB_PATH.exists() and not _quick_check(DB_PATH):
@@ -321,9 +533,709 @@ def init_db():
             pass
         _quarantine_corrupt_files(DB_PATH)
 
-    # Ensure directory exists and create tables
+    # Ensure directory exists
     DB_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def init_db():
+    """Create tables; auto-recover if the existing SQLite DB appears corrupt.
+
+    If PRAGMA quick_check fails or the file raises an error, the existing DB and
+    its WAL/SHM siblings are renamed with a .corrupt-<timestamp> suffix, and a
+    fresh database is created at the original path. With a server database
+    (DATABASE_URL) only the tables are created.
+    """
+    if IS_SQLITE:
+        _recover_sqlite_file()
     Base.metadata.create_all(bind=engine)
+    ensure_indexes()
+    if PARTITIONS is not None:
+        PARTITIONS.ensure_ahead()
+    ensure_miner_latest()
+    refresh_query_stats()
+
+
+def ensure_indexes(bind=None) -> list:
+    """Create any model index missing from an existing table; returns the names created.
+
+    create_all() skips tables that already exist, so an index added to a model (or one a
+    migration failed to create) would otherwise never reach an older database. The hot
+    read paths depend on these (see tests/test_query_plans.py).
+    """
+    bind = bind if bind is not None else engine
+    created = []
+    with bind.begin() as conn:
+        insp = inspect(conn)
+        tables = set(insp.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables or not table.indexes:
+                continue
+            existing = {ix["name"] for ix in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    created.append(index.name)
+    if created:
+        logger.info(f"db_indexes_created names={','.join(created)}")
+    return created
+
+
+def refresh_query_stats(bind=None, analysis_limit: int = SQLITE_ANALYSIS_LIMIT) -> float:
+    """Refresh SQLite's planner statistics with a sampled ANALYZE; returns seconds taken.
+
+    Without sqlite_stat1 the planner cannot tell that miner_ip has few distinct values, so
+    a windowed per-miner aggregate walks the whole (miner_ip, timestamp) index instead of
+    skip-scanning one range per miner. analysis_limit caps the rows read per index, which
+    keeps this in milliseconds at 10M rows. Pooled read-only connections are recycled so
+    they load the new statistics. PostgreSQL's autovacuum analyzes on its own.
+    """
+    bind = bind if bind is not None else engine
+    if bind.dialect.name != "sqlite":
+        return 0.0
+    started = time.perf_counter()
+    with bind.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA analysis_limit={int(analysis_limit)}")
+        conn.exec_driver_sql("ANALYZE")
+    if bind is engine:
+        read_engine.dispose()
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"db_query_stats_refreshed analysis_limit={analysis_limit} duration_s={elapsed:.3f}")
+    return elapsed
+
+
+# -----------------------------------------------------------------------------
+# Bulk ingestion
+# -----------------------------------------------------------------------------
+# Column order of the tuples poll_metrics hands to BULK_WRITER (also miner_latest's columns)
+METRIC_COLUMNS = ("timestamp", "miner_ip", "power_w", "hashrate_ths", "elapsed_s", "avg_temp_c",
+                  "avg_fan_rpm")
+
+
+def upsert_insert(table, dialect: str = None):
+    """INSERT with ON CONFLICT support for `dialect` ("sqlite" or "postgresql"; default:
+    the engine's)."""
+    if (dialect or engine.dialect.name) == "postgresql":
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
+def _upsert_miner_latest(conn, rows: list) -> None:
+    """Move each miner's miner_latest row forward to the newest of `rows` (metrics dicts)."""
+    table = MinerLatest.__table__
+    now = _dt.datetime.utcnow()
+    stmt = upsert_insert(table, conn.dialect.name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.miner_ip],
+        set_={c: stmt.excluded[c] for c in METRIC_COLUMNS if c != "miner_ip"},
+        where=stmt.excluded.timestamp >= table.c.timestamp,
+    )
+    conn.execute(stmt, [
+        {c: (row.get(c) if c != "timestamp" else row.get(c) or now) for c in METRIC_COLUMNS}
+        for row in rows
+    ])
+
+
+def latest_metrics_select(dialect: str = None, source=None):
+    """Each miner's newest metrics row (METRIC_COLUMNS) as a SELECT.
+
+    PostgreSQL uses DISTINCT ON (miner_ip) over the (miner_ip, timestamp) index; SQLite
+    joins against a MAX(timestamp) GROUP BY, which can return ties.
+    """
+    m = source if source is not None else Metric
+    cols = [getattr(m, c) for c in METRIC_COLUMNS]
+    if (dialect or engine.dialect.name) == "postgresql":
+        return (select(*cols).distinct(m.miner_ip).where(m.miner_ip.isnot(None))
+                .order_by(m.miner_ip, m.timestamp.desc(), m.id.desc()))
+    last = (select(m.miner_ip.label("miner_ip"), func.max(m.timestamp).label("last_ts"))
+            .group_by(m.miner_ip).subquery())
+    return (select(*cols)
+            .join(last, (m.miner_ip == last.c.miner_ip) & (m.timestamp == last.c.last_ts))
+            .where(m.miner_ip.isnot(None)))
+
+
+def rebuild_miner_latest(bind=None) -> int:
+    """Recompute miner_latest from the metrics history (one pass). Returns rows."""
+    bind = bind if bind is not None else engine
+    table = MinerLatest.__table__
+    dialect = bind.dialect.name
+    # The partition/compact layouts belong to the process engine
+    source = metrics_source() if bind is engine else None
+    stmt = (upsert_insert(table, dialect)
+            .from_select(list(METRIC_COLUMNS), latest_metrics_select(dialect, source))
+            .on_conflict_do_nothing(index_elements=[table.c.miner_ip]))
+    with bind.begin() as conn:
+        conn.execute(table.delete())
+        conn.execute(stmt)
+        return conn.execute(select(func.count()).select_from(table)).scalar() or 0
+
+
+def ensure_miner_latest(bind=None) -> None:
+    """Backfill miner_latest once for databases that have metrics from before the table existed."""
+    bind = bind if bind is not None else engine
+    m = metrics_source() if bind is engine else Metric
+    with bind.connect() as conn:
+        empty = conn.exec_driver_sql("SELECT 1 FROM miner_latest LIMIT 1").first() is None
+        has_metrics = conn.execute(select(m.id).limit(1)).first() is not None
+    if empty and has_metrics:
+        rebuild_miner_latest(bind)
+
+
+def _copy_value(value):
+    if value is None:
+        return None  # written as an unquoted empty field, which COPY csv reads as NULL
+    if isinstance(value, _dt.datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def copy_rows(conn, table, rows: list) -> int:
+    """Load `rows` (dicts with the same keys) into `table` with one COPY FROM STDIN (PostgreSQL).
+
+    Runs on the connection's current transaction, so it commits or rolls back with the
+    rest of the batch. Works with psycopg2 (copy_expert) and psycopg 3 (cursor.copy).
+    """
+    if not rows:
+        return 0
+    columns = list(rows[0])
+    buf = io.StringIO()
+    out = csv.writer(buf, lineterminator="\n")
+    for row in rows:
+        out.writerow([_copy_value(row[c]) for c in columns])
+    buf.seek(0)
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, buf)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buf.getvalue())
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+# Tables whose BulkWriter batches use COPY on PostgreSQL (no RETURNING needed)
+COPY_TABLES = {"metrics"}
+
+# Called with (connection, batch of row dicts) inside each batch's transaction, per table
+INGEST_HOOKS = {
+    "metrics": _upsert_miner_latest,
+}
+
+
+# -----------------------------------------------------------------------------
+# Monthly metric partitions
+# -----------------------------------------------------------------------------
+class MetricPartitions:
+    """Raw metrics rows kept in one SQLite file per month (metrics_YYYY_MM.db).
+
+    Every pooled connection ATTACHes the month files as schemas p_YYYY_MM and gets a
+    TEMP view VIEW_NAME (main.metrics UNION ALL each month) for ad-hoc SQL. It has its own
+    name so unqualified `metrics` still means main.metrics and ORM writes keep working.
+    Metric reads go through source() (metrics_source()), which unions main.metrics with
+    only the months the range overlaps. BulkWriter sends metrics batches here; rows
+    written before partitioning was enabled stay in main.metrics until retention purges
+    them. drop() removes a month by unlinking its file.
+
+    A month's file is attached when a connection is checked out, never inside a
+    transaction, so ensure_ahead() must create next month's file before the rollover
+    (scheduler.setup_db and the prepare_partitions job do).
+    """
+    VIEW_NAME = "metrics_all"
+
+
+    def __init__(self, bind=None, directory=None):
+        self.bind = bind if bind is not None else engine
+        self.directory = Path(directory) if directory else DB_DIR / "partitions"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._tables: dict = {}
+        self._engines: list = []
+
+    # ---- naming ----
+    @staticmethod
+    def month_key(ts: _dt.datetime) -> str:
+        return ts.strftime("%Y_%m")
+
+    @staticmethod
+    def schema(key: str) -> str:
+        return f"p_{key}"
+
+    @staticmethod
+    def month_bounds(key: str) -> tuple:
+        """[start, end) of month `key` as naive UTC datetimes."""
+        year, month = (int(x) for x in key.split("_"))
+        start = _dt.datetime(year, month, 1)
+        end = _dt.datetime(year + month // 12, month % 12 + 1, 1)
+        return start, end
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"metrics_{key}.db"
+
+    def months(self) -> list:
+        """Partition months on disk, oldest first."""
+        files = self.directory.glob("metrics_[0-9][0-9][0-9][0-9]_[0-9][0-9].db")
+        return sorted(p.stem[len("metrics_"):] for p in files)
+
+    def overlapping(self, since: _dt.datetime = None, until: _dt.datetime = None) -> list:
+        """Months with rows that could fall in [since, until]."""
+        out = []
+        for key in self.months():
+            start, end = self.month_bounds(key)
+            if (since is None or end > since) and (until is None or start <= until):
+                out.append(key)
+        return out
+
+    def table(self, key: str = None):
+        """The metrics Table in partition `key` (main.metrics for None)."""
+        schema = self.schema(key) if key else "main"
+        table = self._tables.get(schema)
+        if table is None:
+            table = self._tables[schema] = Metric.__table__.to_metadata(MetaData(), schema=schema)
+        return table
+
+    # ---- files ----
+    def ensure(self, keys) -> list:
+        """Create the files for months in `keys` that do not exist yet; returns those created."""
+        created = []
+        with self._lock:
+            for key in keys:
+                path = self.path(key)
+                if path.exists():
+                    continue
+                # Build it under a temporary name so a half-created file is never attached
+                tmp = path.with_name(path.name + ".tmp")
+                part = create_engine(f"sqlite:///{tmp}", future=True)
+                try:
+                    with part.connect() as conn:
+                        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                    Metric.__table__.create(bind=part, checkfirst=True)
+                finally:
+                    part.dispose()
+                os.replace(tmp, path)
+                created.append(key)
+            if created:
+                self._generation += 1
+        return created
+
+    def ensure_ahead(self, now: _dt.datetime = None) -> list:
+        """Create this month's and next month's files so the rollover never waits on DDL."""
+        now = now or _dt.datetime.utcnow()
+        _, end = self.month_bounds(self.month_key(now))
+        return self.ensure([self.month_key(now), self.month_key(end)])
+
+    def drop(self, key: str) -> bool:
+        """Detach month `key` from the pool and unlink its file.
+
+        Returns False when the file cannot be removed yet (still open on a platform that
+        forbids it); the next retention run retries.
+        """
+        with self._lock:
+            self._generation += 1
+            # Idle pooled connections close now; busy ones DETACH on their next checkout
+            for eng in self._engines or [self.bind]:
+                eng.dispose()
+            try:
+                for suffix in ("-wal", "-shm", ""):
+                    p = Path(f"{self.path(key)}{suffix}")
+                    if p.exists():
+                        p.unlink()
+            except OSError as e:
+                logger.warning(f"partition_drop_failed month={key} error={e}")
+                return False
+        logger.info(f"partition_dropped month={key}")
+        return True
+
+    # ---- connections ----
+    def install(self, bind=None) -> "MetricPartitions":
+        """Attach partitions to every connection of `bind` (default: the writer) as it is
+        checked out, and again after months are added or dropped."""
+        bind = bind if bind is not None else self.bind
+        self._engines.append(bind)
+        event.listen(bind, "checkout", self._on_checkout)
+        return self
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        generation = self._generation
+        if connection_record.info.get("metric_partitions") != generation:
+            if self._sync(dbapi_connection):
+                connection_record.info["metric_partitions"] = generation
+
+    def _sync(self, dbapi_connection) -> bool:
+        """ATTACH month files, DETACH removed ones and rebuild the TEMP VIEW_NAME view."""
+        if dbapi_connection.in_transaction:
+            return False
+        with self._lock:
+            keys = self.months()
+            limit = dbapi_connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+            if len(keys) > limit:
+                logger.warning(f"partition_attach_limit months={len(keys)} limit={limit}")
+                keys = keys[-limit:]
+            wanted = {self.schema(k): k for k in keys}
+            attached = {row[1] for row in dbapi_connection.execute("PRAGMA database_list")}
+            for name in attached:
+                if name.startswith("p_") and name not in wanted:
+                    dbapi_connection.execute(f"DETACH DATABASE {name}")
+            for name, key in wanted.items():
+                if name not in attached:
+                    dbapi_connection.execute(f"ATTACH DATABASE ? AS {name}", (str(self.path(key)),))
+                    dbapi_connection.execute(f"PRAGMA {name}.synchronous=NORMAL")
+        has_main = dbapi_connection.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'metrics'").fetchone()
+        # Read-only connections run with query_only, which also blocks TEMP DDL
+        query_only = dbapi_connection.execute("PRAGMA query_only").fetchone()[0]
+        if query_only:
+            dbapi_connection.execute("PRAGMA query_only=0")
+        try:
+            dbapi_connection.execute(f"DROP VIEW IF EXISTS temp.{self.VIEW_NAME}")
+            if not has_main:
+                return False  # before init_db; retried on the next checkout
+            cols = ", ".join(c.name for c in Metric.__table__.columns)
+            selects = [f"SELECT {cols} FROM {schema}.metrics" for schema in ["main", *wanted]]
+            dbapi_connection.execute(
+                f"CREATE TEMP VIEW {self.VIEW_NAME} AS " + " UNION ALL ".join(selects))
+            return True
+        finally:
+            if query_only:
+                dbapi_connection.execute("PRAGMA query_only=1")
+
+    @staticmethod
+    def _attached(conn) -> list:
+        return [row[1] for row in conn.exec_driver_sql("PRAGMA database_list")
+                if row[1] == "main" or row[1].startswith("p_")]
+
+    # ---- reads / writes ----
+    def source(self, since: _dt.datetime = None, until: _dt.datetime = None):
+        """Metric entity over main.metrics plus only the months overlapping [since, until]."""
+        tables = [self.table(None)] + [self.table(k) for k in self.overlapping(since, until)]
+        union = union_all(*(select(*t.c) for t in tables)).subquery("metrics")
+        return aliased(Metric, union, adapt_on_names=True)
+
+    def max_id(self, conn) -> int:
+        """Highest metrics id in main and every attached partition, or the rollup mark if higher."""
+        parts = " UNION ALL ".join(
+            f"SELECT MAX(id) AS id FROM {s}.metrics" for s in self._attached(conn))
+        return conn.exec_driver_sql(
+            f"SELECT MAX(COALESCE((SELECT MAX(id) FROM ({parts})), 0), "
+            "COALESCE((SELECT last_metric_id FROM rollup_state WHERE name = 'metrics'), 0))"
+        ).scalar() or 0
+
+    def prepare(self, conn, batch: list) -> None:
+        """Create and attach the months `batch` (metrics row dicts) falls in; before any write.
+
+        Attaching is impossible inside a transaction (e.g. a write-queue job's savepoint),
+        so a month that ensure_ahead() did not create in time raises RuntimeError there.
+        """
+        now = _dt.datetime.utcnow()
+        for row in batch:
+            row["timestamp"] = row.get("timestamp") or now
+        keys = {self.month_key(row["timestamp"]) for row in batch}
+        attached = set(self._attached(conn))
+        if any(self.schema(k) not in attached for k in keys):
+            self.ensure(keys)
+            if not self._sync(conn.connection.dbapi_connection):
+                raise RuntimeError(
+                    "metrics partitions must be attached before the batch's transaction starts")
+
+    def insert(self, conn, batch: list) -> list:
+        """Insert prepared rows into their month partitions with ids continuing the global sequence.
+
+        Runs after the miner_latest upsert in the same transaction, whose write lock on
+        the main database keeps concurrent batches from allocating the same ids.
+        """
+        next_id = self.max_id(conn) + 1
+        by_month: dict = {}
+        for row in batch:
+            row["id"] = next_id
+            next_id += 1
+            by_month.setdefault(self.month_key(row["timestamp"]), []).append(row)
+        for key, rows in by_month.items():
+            conn.execute(insert(self.table(key)), rows)
+        return [row["id"] for row in batch]
+
+
+# -----------------------------------------------------------------------------
+# Compact metrics
+# -----------------------------------------------------------------------------
+# Synthetic Metric.id of a compact row: ts * COMPACT_ID_SHIFT + miner_id (ordered by time)
+COMPACT_ID_SHIFT = 1 << 20
+
+
+class CompactMetrics:
+    """Metrics stored in metrics_compact behind Metric's interface.
+
+    Writes map miner IPs to small integer ids (miner_ids) and timestamps to epoch
+    seconds. Rows are keyed by (miner_id, second), so unlike the metrics table, which
+    keeps every row, a later sample for the same miner and second (even within one
+    batch) replaces the earlier one and both get the same id. Rows without a miner_ip
+    cannot be keyed: they are not stored, are counted in `skipped` and logged. New IPs
+    are registered on the batch's own connection, inside its transaction (a write-queue
+    job's savepoint), and the ids are only cached once that transaction commits; a
+    rollback forgets them, so the cache never holds an id that was rolled back.
+    source() is a Metric-shaped entity over metrics_compact joined to miner_ids, so
+    readers keep filtering on timestamp/miner_ip and the filters still use the keys.
+    Its id is synthetic and grows with time, so the rollup job's id high-water mark
+    works; samples arriving with a timestamp older than the mark are not rolled up.
+    """
+    STATE_NAME = "metrics_compact"
+    _PENDING = "compact_miner_ids"  # Connection.info key: ids registered in the open transaction
+
+    def __init__(self, bind=None):
+        self.bind = bind if bind is not None else engine
+        self._ids: dict = {}
+        self._lock = threading.Lock()
+        self._source = None
+        self._engines: set = set()  # engines whose commit/rollback events are listened to
+        self.skipped = 0  # rows dropped for lack of a miner_ip
+
+    def _listen(self, conn) -> None:
+        eng = conn.engine
+        with self._lock:
+            if eng in self._engines:
+                return
+            self._engines.add(eng)
+        event.listen(eng, "commit", self._on_commit)
+        for name in ("rollback", "rollback_savepoint"):
+            event.listen(eng, name, self._on_rollback)
+        event.listen(eng, "reset", self._on_reset)  # returned to the pool without commit
+
+    def _on_commit(self, conn) -> None:
+        pending = conn.info.pop(self._PENDING, None)
+        if pending:
+            with self._lock:
+                self._ids.update(pending)
+
+    def _on_rollback(self, conn, *args) -> None:
+        # Any rollback may have undone the registrations; they are looked up again next time
+        conn.info.pop(self._PENDING, None)
+
+    def _on_reset(self, dbapi_connection, connection_record, reset_state) -> None:
+        connection_record.info.pop(self._PENDING, None)
+
+    def miner_ids(self, conn, ips) -> dict:
+        """{ip: miner_id} for `ips`, registering unknown IPs on `conn` (in its transaction)."""
+        pending = conn.info.get(self._PENDING, {})
+        out = {ip: self._ids.get(ip, pending.get(ip)) for ip in ips}
+        missing = [ip for ip, mid in out.items() if mid is None]
+        if missing:
+            self._listen(conn)
+            table = MinerKey.__table__
+            register = upsert_insert(table, conn.dialect.name)
+            conn.execute(register.on_conflict_do_nothing(index_elements=[table.c.ip]),
+                         [{"ip": ip} for ip in missing])
+            ids = select(table.c.ip, table.c.id).where(table.c.ip.in_(missing))
+            rows = dict(conn.execute(ids).all())
+            conn.info.setdefault(self._PENDING, {}).update(rows)
+            out.update(rows)
+        return out
+
+    def prepare(self, conn, batch: list) -> None:
+        """Fill in timestamps and resolve miner ids on the batch's connection."""
+        now = _dt.datetime.utcnow()
+        for row in batch:
+            row["timestamp"] = row.get("timestamp") or now
+        ids = self.miner_ids(conn, {row["miner_ip"] for row in batch if row.get("miner_ip")})
+        for row in batch:
+            row["miner_id"] = ids.get(row.get("miner_ip"))
+
+    def insert(self, conn, batch: list) -> list:
+        """Insert prepared metrics row dicts; returns one synthetic id per row, in batch
+        order (None for a row that was skipped)."""
+        rows = [
+            {"miner_id": row["miner_id"], "ts": row["timestamp"],
+             **{c: row.get(c) for c in METRIC_COLUMNS[2:]}}
+            for row in batch if row.get("miner_id") is not None
+        ]
+        skipped = len(batch) - len(rows)
+        if skipped:
+            with self._lock:
+                self.skipped += skipped
+            logger.warning(f"metrics_compact_rows_skipped rows={skipped} reason=no_miner_ip")
+        if rows:
+            table = CompactMetric.__table__
+            stmt = upsert_insert(table, conn.dialect.name)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.miner_id, table.c.ts],
+                set_={c: stmt.excluded[c] for c in METRIC_COLUMNS[2:]},
+            )
+            conn.execute(stmt, rows)
+        to_epoch = EpochSeconds().process_bind_param
+        return [to_epoch(row["timestamp"]) * COMPACT_ID_SHIFT + row["miner_id"]
+                if row.get("miner_id") is not None else None
+                for row in batch]
+
+    def source(self, since: _dt.datetime = None, until: _dt.datetime = None):
+        """Metric-shaped entity (id, timestamp, miner_ip, ...) over metrics_compact."""
+        if self._source is None:
+            c, k = CompactMetric.__table__.c, MinerKey.__table__.c
+            sel = (
+                select(
+                    (c.ts * literal_column(str(COMPACT_ID_SHIFT)) + c.miner_id).label("id"),
+                    type_coerce(c.ts, EpochSeconds).label("timestamp"),
+                    k.ip.label("miner_ip"),
+                    c.power_w, c.hashrate_ths, c.elapsed_s, c.avg_temp_c, c.avg_fan_rpm,
+                )
+                .select_from(CompactMetric.__table__.join(MinerKey.__table__, k.id == c.miner_id))
+                .subquery("metrics")
+            )
+            self._source = aliased(Metric, sel, adapt_on_names=True)
+        return self._source
+
+    @staticmethod
+    def id_time(metric_id: int) -> _dt.datetime:
+        """Timestamp encoded in a synthetic id (lets id range scans use the ts index)."""
+        return _EPOCH + _dt.timedelta(seconds=metric_id // COMPACT_ID_SHIFT)
+
+    @staticmethod
+    def initial_mark(session) -> int:
+        """Rollup mark matching the legacy one: past every compact row at or before the
+        newest metrics row already folded in, so switching over never double-counts."""
+        legacy = session.get(RollupState, "metrics")
+        if legacy is None or not legacy.last_metric_id:
+            return 0
+        ts = session.execute(
+            select(Metric.timestamp).where(Metric.id == legacy.last_metric_id)).scalar()
+        if ts is None:
+            return 0
+        return (EpochSeconds().process_bind_param(ts) + 1) * COMPACT_ID_SHIFT - 1
+
+
+if METRICS_PARTITIONED and METRICS_COMPACT:
+    raise ValueError("METRICS_PARTITIONED and METRICS_COMPACT cannot both be enabled")
+if (METRICS_PARTITIONED or METRICS_COMPACT) and not IS_SQLITE:
+    raise ValueError(
+        "METRICS_PARTITIONED and METRICS_COMPACT are SQLite layouts; unset them with DATABASE_URL")
+
+PARTITIONS = None
+if METRICS_PARTITIONED:
+    PARTITIONS = MetricPartitions(directory=METRICS_PARTITION_DIR).install()
+    PARTITIONS.install(read_engine).install(queue_engine)
+COMPACT = CompactMetrics() if METRICS_COMPACT else None
+
+
+def metrics_source(since: _dt.datetime = None, until: _dt.datetime = None):
+    """Entity for a metrics read: Metric, or the partition router / compact layout when enabled."""
+    store = PARTITIONS or COMPACT
+    return store.source(since, until) if store is not None else Metric
+
+
+class BulkWriter:
+    """Insert batches of plain tuples with one Core executemany per batch.
+
+    Each batch is its own transaction: on the writer's engine, or on `session`'s
+    connection followed by session.commit(). Rows beyond `batch_size` are split into
+    further batches. INGEST_HOOKS for the table run in the same transaction (metrics
+    batches keep miner_latest current this way). With a `metrics_store` (MetricPartitions
+    or CompactMetrics), metrics batches go there instead of main.metrics. Per-table
+    counters (rows/s, batch latency) are kept so batch sizes can be tuned for large
+    fleets; see stats().
+    """
+
+    def __init__(self, bind=None, batch_size: int = INGEST_BATCH_SIZE,
+                 metrics_store=None):
+        self.bind = bind if bind is not None else engine
+        self.batch_size = max(1, int(batch_size))
+        self.metrics_store = metrics_store
+        self._lock = threading.Lock()
+        self._stats: dict = {}
+
+    def write(self, table, columns, rows, session=None, returning: str = None):
+        """Insert `rows` (tuples ordered like `columns`) into `table` (model or Table).
+
+        Returns the number of rows written, or with `returning` the list of that
+        column's values (e.g. new primary keys) in row order.
+        """
+        table = getattr(table, "__table__", table)
+        rows = list(rows)
+        returned = []
+        for start in range(0, len(rows), self.batch_size):
+            batch = [dict(zip(columns, row, strict=True))
+                     for row in rows[start:start + self.batch_size]]
+            stmt = insert(table)
+            if returning:
+                stmt = stmt.returning(table.c[returning], sort_by_parameter_order=True)
+            started = time.perf_counter()
+            try:
+                if session is not None:
+                    values = self._execute(session.connection(), table, stmt, batch, returning)
+                    session.commit()
+                else:
+                    with self.bind.begin() as conn:
+                        values = self._execute(conn, table, stmt, batch, returning)
+            except Exception:
+                if session is not None:
+                    session.rollback()
+                self._record(table.name, 0, 0.0, failed=True)
+                raise
+            self._record(table.name, len(batch), time.perf_counter() - started)
+            if returning:
+                returned.extend(values)
+        return returned if returning else len(rows)
+
+    def _execute(self, conn, table, stmt, batch: list, returning: str = None):
+        hook = INGEST_HOOKS.get(table.name)
+        if self.metrics_store is not None and table.name == "metrics":
+            self.metrics_store.prepare(conn, batch)
+            hook(conn, batch)
+            return self.metrics_store.insert(conn, batch)
+        if table.name in COPY_TABLES and not returning and conn.dialect.name == "postgresql":
+            copy_rows(conn, table, batch)
+            if hook is not None:
+                hook(conn, batch)
+            return None
+        result = conn.execute(stmt, batch)
+        values = result.scalars().all() if returning else None
+        if hook is not None:
+            hook(conn, batch)
+        return values
+
+    def _record(self, name: str, rows: int, elapsed: float, failed: bool = False) -> None:
+        with self._lock:
+            st = self._stats.setdefault(name, {
+                "rows": 0, "batches": 0, "failed_batches": 0, "seconds": 0.0,
+                "last_batch_rows": 0, "last_batch_ms": 0.0, "max_batch_ms": 0.0,
+            })
+            if failed:
+                st["failed_batches"] += 1
+                return
+            st["rows"] += rows
+            st["batches"] += 1
+            st["seconds"] += elapsed
+            st["last_batch_rows"] = rows
+            st["last_batch_ms"] = elapsed * 1000.0
+            st["max_batch_ms"] = max(st["max_batch_ms"], elapsed * 1000.0)
+
+    def stats(self) -> dict:
+        """{table: counters} with rows/s and average/last/max batch latency in ms."""
+        with self._lock:
+            out = {}
+            for name, st in self._stats.items():
+                secs, batches, last_ms = st["seconds"], st["batches"], st["last_batch_ms"]
+                out[name] = {
+                    "rows": st["rows"],
+                    "batches": st["batches"],
+                    "failed_batches": st["failed_batches"],
+                    "rows_per_s": round(st["rows"] / secs, 1) if secs else None,
+                    "avg_batch_rows": round(st["rows"] / batches, 1) if batches else None,
+                    "avg_batch_ms": round(secs * 1000.0 / batches, 3) if batches else None,
+                    "last_batch_rows": st["last_batch_rows"],
+                    "last_batch_ms": round(st["last_batch_ms"], 3),
+                    "max_batch_ms": round(st["max_batch_ms"], 3),
+                    "last_rows_per_s": (round(st["last_batch_rows"] / (last_ms / 1000.0), 1)
+                                        if last_ms else None),
+                }
+            return out
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+# Shared writer used by the scheduler jobs, alert engine and profitability snapshots
+BULK_WRITER = BulkWriter(metrics_store=PARTITIONS or COMPACT)
 
 
 # noinspection PyDeprecation
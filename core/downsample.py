@@ -0,0 +1,170 @@
+"""Server-side downsampling of metric series for charts (/api/metrics?agg=...).
+
+The rows of a window are read once into NumPy column arrays ("t" in epoch microseconds,
+"ip", "w" sample weights and, for each field in ROLLUP_FIELDS, its value plus "<field>_min"
+and "<field>_max"; raw rows have weight 1 and min = max = value, rollup rows carry their
+bucket's samples/avg/min/max). Each miner's series is then reduced to at most `points`
+rows, so the payload is bounded by points x miners whatever the time range:
+
+  - lttb:   Largest-Triangle-Three-Buckets picks the `points` rows that best keep the shape
+            of one field (hashrate_ths by default); rows keep all their values.
+  - avg / min / max / minmax: `points` equal-time buckets reduced with ufunc.reduceat
+            (sample-weighted average, smallest min, largest max); minmax returns averages
+            plus <field>_min/<field>_max. Buckets are timestamped at their start.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from core.db import ROLLUP_FIELDS
+
+AGGREGATIONS = ("lttb", "avg", "min", "max", "minmax")
+
+
+def series_columns(rows, rollup: bool = False) -> dict:
+    """Column arrays from query rows, oldest first.
+
+    Raw rows: (timestamp, miner_ip, *ROLLUP_FIELDS). Rollup rows: (bucket, miner_ip,
+    samples, then avg, min, max for each field in ROLLUP_FIELDS).
+    """
+    width = 3 + 3 * len(ROLLUP_FIELDS) if rollup else 2 + len(ROLLUP_FIELDS)
+    cols = list(zip(*rows, strict=True)) if rows else [()] * width
+    out = {
+        "t": np.array(cols[0], dtype="datetime64[us]").astype(np.int64),
+        "ip": np.array(cols[1], dtype=object),
+    }
+    if rollup:
+        out["w"] = np.array(cols[2], dtype=np.float64)
+        for i, field in enumerate(ROLLUP_FIELDS):
+            for j, suffix in enumerate(("", "_min", "_max")):
+                out[field + suffix] = np.array(cols[3 + 3 * i + j], dtype=np.float64)
+    else:
+        out["w"] = np.ones(len(out["t"]))
+        for i, field in enumerate(ROLLUP_FIELDS):
+            values = np.array(cols[2 + i], dtype=np.float64)
+            out[field] = out[field + "_min"] = out[field + "_max"] = values
+    return out
+
+
+def lttb_indices(t: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of `n` points of the series (t, y) chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between contributes the
+    point forming the largest triangle with the previous pick and the next bucket's mean.
+    """
+    size = len(t)
+    if n >= size or size <= 2:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1])[:max(n, 1)]
+    x = (t - t[0]).astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    missing = np.isnan(y)
+    if missing.any():
+        y = np.where(missing, np.nanmean(y) if not missing.all() else 0.0, y)
+
+    # n - 2 buckets over points 1 .. size - 2; bucket i is edges[i]:edges[i + 1]
+    edges = np.arange(n - 1) * (size - 2) // (n - 2) + 1
+    # Mean of each bucket's successor (the last point for the last bucket), all at once
+    next_lo = edges[1:]
+    next_hi = np.append(edges[2:], size)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x = (cx[next_hi] - cx[next_lo]) / (next_hi - next_lo)
+    mean_y = (cy[next_hi] - cy[next_lo]) / (next_hi - next_lo)
+
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (mean_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def bucket_grid(start: int, stop: int, n: int) -> tuple:
+    """(base, width) of `n` equal buckets covering epoch-microsecond times start..stop,
+    on whole seconds."""
+    second = 1_000_000
+    base = start - start % second
+    width = -(-int(stop - base + 1) // n)  # ceil(span / n), rounded up to whole seconds
+    return base, max(1, -(-width // second)) * second
+
+
+def bucket_reduce(cols: dict, n: int, agg: str, grid: tuple = None) -> dict:
+    """One series reduced to at most `n` equal-time buckets (agg: avg, min, max or minmax).
+    Pass a shared `grid` (bucket_grid) so several miners' buckets line up."""
+    t = cols["t"]
+    base, width = grid or bucket_grid(t[0], t[-1], n)
+    idx = (t - base) // width
+    starts = np.flatnonzero(np.diff(idx, prepend=-1))
+    out = {
+        "t": base + idx[starts] * width,
+        "ip": cols["ip"][starts],
+        "w": np.add.reduceat(cols["w"], starts),
+    }
+    for field in ROLLUP_FIELDS:
+        values = cols[field]
+        valid = ~np.isnan(values)
+        weights = np.where(valid, cols["w"], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            total = np.add.reduceat(np.where(valid, values, 0.0) * weights, starts)
+            avg = total / np.add.reduceat(weights, starts)
+            lo = np.fmin.reduceat(cols[field + "_min"], starts)
+            hi = np.fmax.reduceat(cols[field + "_max"], starts)
+        out[field] = {"min": lo, "max": hi}.get(agg, avg)
+        out[field + "_min"], out[field + "_max"] = lo, hi
+    return out
+
+
+def downsample(cols: dict, n: int, agg: str, field: str = "hashrate_ths",
+               grid: tuple = None) -> dict:
+    """One miner's series reduced to at most `n` rows (see module docstring)."""
+    if len(cols["t"]) <= n:
+        return cols
+    if agg == "lttb":
+        keep = lttb_indices(cols["t"], cols[field], n)
+        return {k: v[keep] for k, v in cols.items()}
+    return bucket_reduce(cols, n, agg, grid)
+
+
+def _nullable(values: np.ndarray) -> list:
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def downsample_rows(cols: dict, n: int, agg: str, field: str = "hashrate_ths") -> list:
+    """Every miner's series in `cols` downsampled to `n` rows, as /api/metrics rows ordered
+    by time then IP. Buckets share one grid across miners, so fleet totals can be summed
+    per timestamp. minmax rows also carry samples and <field>_min/<field>_max."""
+    if not len(cols["t"]):
+        return []
+    grid = bucket_grid(cols["t"].min(), cols["t"].max(), n)
+    ips, codes = np.unique(cols["ip"].astype(str), return_inverse=True)
+    order = np.argsort(codes, kind="stable")  # per miner, still oldest first
+    bounds = np.flatnonzero(np.diff(codes[order], prepend=-1))
+    parts = [downsample({k: v[sel] for k, v in cols.items()}, n, agg, field, grid)
+             for sel in np.split(order, bounds[1:])]
+    merged = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    order = np.lexsort((merged["ip"].astype(str), merged["t"]))
+    merged = {k: v[order] for k, v in merged.items()}
+
+    unit = "s" if not (merged["t"] % 1_000_000).any() else "us"  # as datetime.isoformat() would
+    iso = np.datetime_as_string(merged["t"].astype("datetime64[us]"), unit=unit)
+    stamps = [s + "Z" for s in iso.tolist()]
+    keys = ["power_w", "hashrate_ths", "avg_temp_c", "avg_fan_rpm"]
+    if agg == "minmax":
+        keys += [f + suffix for f in ROLLUP_FIELDS for suffix in ("_min", "_max")]
+    columns = [_nullable(merged[k]) for k in keys]
+    out = []
+    for i, (ts, ip) in enumerate(zip(stamps, merged["ip"].tolist(), strict=True)):
+        row = {"timestamp": ts, "ip": ip}
+        row.update({k: col[i] for k, col in zip(keys, columns, strict=True)})
+        if agg == "minmax":
+            row["samples"] = int(merged["w"][i])
+        out.append(row)
+    return out
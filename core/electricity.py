@@ -13,8 +13,8 @@ from __future__ import annotations
 import datetime as dt
 from typing import Dict, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from core.db import SessionLocal, ElectricityRate, ElectricityCost
+from sqlalchemy import and_, func
+from core.db import SessionLocal, ElectricityRate, ElectricityCost, metrics_source
 
 
 class ElectricityCostService:
@@ -147,6 +147,66 @@ class ElectricityCostService:
                 "tou_breakdown": None
             }
 
+    # Column order of the tuples produced by cost_row (for BULK_WRITER)
+    COST_COLUMNS = (
+        "timestamp", "miner_ip", "location", "period_start", "period_end", "duration_hours",
+        "total_kwh", "avg_power_kw", "rate_id", "rate_name", "avg_rate_usd_per_kwh",
+        "energy_cost_usd", "demand_charge_usd", "service_charge_usd", "total_cost_usd",
+        "tou_breakdown_usd",
+    )
+
+    @staticmethod
+    def average_power_by_miner(session: Session, period_start: dt.datetime,
+                               period_end: dt.datetime) -> Dict[str, float]:
+        """Average non-zero power_w per miner over the period, in one grouped query."""
+        m = metrics_source(period_start, period_end)
+        return dict(
+            session.query(m.miner_ip, func.avg(m.power_w))
+            .filter(
+                m.timestamp >= period_start,
+                m.timestamp <= period_end,
+                m.power_w != 0,
+            )
+            .group_by(m.miner_ip)
+            .all()
+        )
+
+    @staticmethod
+    def cost_row(
+            period_start: dt.datetime,
+            period_end: dt.datetime,
+            power_w: float,
+            miner_ip: str = None,
+            location: str = None,
+            rate: ElectricityRate = None
+    ) -> tuple:
+        """Electricity cost for a time period as a tuple ordered like COST_COLUMNS."""
+        cost_data = ElectricityCostService.calculate_cost_for_period(
+            power_w, period_start, period_end, rate
+        )
+
+        duration_hours = (period_end - period_start).total_seconds() / 3600
+        service_charge = rate.daily_service_charge_usd * (duration_hours / 24.0)
+
+        return (
+            dt.datetime.utcnow(),
+            miner_ip,
+            location,
+            period_start,
+            period_end,
+            duration_hours,
+            cost_data["total_kwh"],
+            power_w / 1000.0,
+            rate.id,
+            rate.name,
+            cost_data["avg_rate_usd_per_kwh"],
+            cost_data["energy_cost_usd"],
+            0.0,  # demand charge; TODO: implement demand charges
+            service_charge,
+            cost_data["energy_cost_usd"] + service_charge,
+            cost_data["tou_breakdown"],
+        )
+
     @staticmethod
     def record_cost(
             session: Session,
@@ -163,32 +223,11 @@ class ElectricityCostService:
             if not rate:
                 raise ValueError("No active electricity rate found")
 
-        # Calculate costs
-        cost_data = ElectricityCostService.calculate_cost_for_period(
-            power_w, period_start, period_end, rate
+        row = ElectricityCostService.cost_row(
+            period_start, period_end, power_w, miner_ip=miner_ip, location=location, rate=rate
         )
-
-        duration_hours = (period_end - period_start).total_seconds() / 3600
-
-        # Create cost record
         cost_record = ElectricityCost(
-            timestamp=dt.datetime.utcnow(),
-            miner_ip=miner_ip,
-            location=location,
-            period_start=period_start,
-            period_end=period_end,
-            duration_hours=duration_hours,
-            total_kwh=cost_data["total_kwh"],
-            avg_power_kw=power_w / 1000.0,
-            rate_id=rate.id,
-            rate_name=rate.name,
-            avg_rate_usd_per_kwh=cost_data["avg_rate_usd_per_kwh"],
-            energy_cost_usd=cost_data["energy_cost_usd"],
-            demand_charge_usd=0.0,  # TODO: implement demand charges
-            service_charge_usd=rate.daily_service_charge_usd * (duration_hours / 24.0),
-            total_cost_usd=cost_data["energy_cost_usd"] + (rate.daily_service_charge_usd * (duration_hours / 24.0)),
-            tou_breakdown_usd=cost_data["tou_breakdown"]
-        )
+            **dict(zip(ElectricityCostService.COST_COLUMNS, row, strict=True)))
 
         session.add(cost_record)
         session.commit()
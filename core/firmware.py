@@ -25,12 +25,18 @@ from miner_config import (
     FIRMWARE_VENDOR_ALIASES,
 )
 from core.db import FirmwareImage, FirmwareFlashJob, SessionLocal
+from core.write_queue import WRITE_QUEUE
 
 # Replace the circular import:
 # from scheduler import logger
 logger = logging.getLogger(__name__)
 
 
+def _log_write_failure(future) -> None:
+    if future.exception() is not None:
+        logger.error(f"Firmware job update failed: {future.exception()}")
+
+
 class FirmwareService:
     """CRUD helpers for `FirmwareImage` records."""
 
@@ -348,27 +354,27 @@ class FirmwareFlashService:
             if progress < 100 and (progress - last_state['progress'] < 5) and (now - last_state['ts'] < 1.0):
                 return
 
-            session_cb = SessionLocal()
-            try:
+            entry = {
+                "timestamp": dt.datetime.utcnow().isoformat(),
+                "message": message,
+                "progress": progress
+            }
+
+            def record(session_cb):
                 j = FirmwareFlashService.get_job_by_public_id(session_cb, job_id)
                 if not j:
                     return
-
                 FirmwareFlashService.mark_progress(session_cb, j, progress)
-
                 history = (j.extra_metadata or {}).get("history", [])
-                history.append({
-                    "timestamp": dt.datetime.utcnow().isoformat(),
-                    "message": message,
-                    "progress": progress
-                })
+                history.append(entry)
                 j.extra_metadata = {**(j.extra_metadata or {}), "history": history}
                 session_cb.commit()
 
-                last_state['progress'] = progress
-                last_state['ts'] = now
-            finally:
-                session_cb.close()
+            # Queued without waiting: the flash is not held up by database writes, and the
+            # write queue keeps progress updates in order
+            WRITE_QUEUE.submit(record, callback=_log_write_failure)
+            last_state['progress'] = progress
+            last_state['ts'] = now
 
         def flash_worker():
             from core.firmware_flasher import FlashError
@@ -384,7 +390,8 @@ class FirmwareFlashService:
                 success, message = flasher.flash(path, progress_callback)
 
                 if success:
-                    FirmwareFlashService.mark_completed(session_worker, j)
+                    WRITE_QUEUE.run(lambda ws: FirmwareFlashService.mark_completed(
+                        ws, FirmwareFlashService.get_job_by_public_id(ws, job_id)))
                     progress_callback(100, f"Success: {message or 'Firmware updated'}")
                     logger.info(f"Job {job_id}: Firmware update success for {j.miner_ip}")
                 else:
@@ -404,9 +411,7 @@ class FirmwareFlashService:
                 else:
                     logger.warning(f"Job {job_id}: Flash failed: {error_msg}")
 
-                # New session for error recording to ensure clean state
-                session_err = SessionLocal()
-                try:
+                def record_failure(session_err):
                     j_err = FirmwareFlashService.get_job_by_public_id(session_err, job_id)
                     if j_err:
                         FirmwareFlashService.mark_failed(session_err, j_err, error_msg)
@@ -419,8 +424,11 @@ class FirmwareFlashService:
                         })
                         j_err.extra_metadata = {**(j_err.extra_metadata or {}), "history": hist}
                         session_err.commit()
-                finally:
-                    session_err.close()
+
+                try:
+                    WRITE_QUEUE.run(record_failure)
+                except Exception as write_error:
+                    logger.error(f"Job {job_id}: could not record failure: {write_error}")
             finally:
                 session_worker.close()
 
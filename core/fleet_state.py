@@ -0,0 +1,204 @@
+"""In-memory fleet state: the newest poll result per miner, shared by the read endpoints.
+
+The poller hands every cycle's rows to FLEET_STATE.update(), and readers that only need
+current state (/api/summary, /api/miners, /api/miners/current, the active-miner filter of
+/api/metrics, the Prometheus exporter, the alert engine, fleet profitability and cost
+estimates) take FLEET_STATE.snapshot() instead of querying miner_latest. The database
+is read once, on a cold start (load() from miner_latest), so a restart still serves the
+last known state before the first poll.
+
+Each miner is a MinerState with __slots__ and the same attributes as a MinerLatest row,
+so code written against those rows reads it unchanged. A FleetSnapshot is never changed
+once published: update() builds the next one under a writer-side lock and swaps a single
+reference, so readers take no lock and always see one whole cycle. Records are also kept
+in timestamp order, so "fresh within N minutes" is a bisect and a slice, not a scan.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from core.db import METRIC_COLUMNS, MinerLatest, ReadSessionLocal
+
+logger = logging.getLogger(__name__)
+
+_OLDEST = dt.datetime.min
+
+
+class MinerState:
+    """One miner's newest sample (METRIC_COLUMNS). Treated as immutable once published."""
+    __slots__ = METRIC_COLUMNS
+
+    def __init__(self, miner_ip: str, timestamp: dt.datetime = None, power_w: float = None,
+                 hashrate_ths: float = None, elapsed_s: int = None, avg_temp_c: float = None,
+                 avg_fan_rpm: float = None):
+        self.miner_ip = miner_ip
+        self.timestamp = timestamp
+        self.power_w = power_w
+        self.hashrate_ths = hashrate_ths
+        self.elapsed_s = elapsed_s
+        self.avg_temp_c = avg_temp_c
+        self.avg_fan_rpm = avg_fan_rpm
+
+    @classmethod
+    def from_row(cls, row) -> "MinerState":
+        """From a MinerLatest/Metric row or anything with the same attributes."""
+        return cls(**{c: getattr(row, c) for c in METRIC_COLUMNS})
+
+    def as_dict(self) -> dict:
+        return {c: getattr(self, c) for c in METRIC_COLUMNS}
+
+    def __repr__(self) -> str:
+        return (f"MinerState({self.miner_ip!r}, {self.timestamp!r}, "
+                f"hashrate_ths={self.hashrate_ths!r})")
+
+
+class FleetSnapshot:
+    """An immutable view of the fleet at one version."""
+    __slots__ = ("miners", "version", "updated_at", "source", "_by_time", "_times")
+
+    def __init__(self, miners: dict, version: int = 0, updated_at: dt.datetime = None,
+                 source: str = "poll"):
+        self.miners = miners  # ip -> MinerState; never mutated after publication
+        self.version = version
+        self.updated_at = updated_at
+        self.source = source  # "db" (cold start), "poll" or "empty"
+        self._by_time = sorted(miners.values(), key=lambda r: r.timestamp or _OLDEST)
+        self._times = [r.timestamp or _OLDEST for r in self._by_time]
+
+    def __len__(self) -> int:
+        return len(self.miners)
+
+    def __contains__(self, ip) -> bool:
+        return ip in self.miners
+
+    def get(self, ip: str):
+        return self.miners.get(ip)
+
+    def all(self) -> list:
+        """Every miner, ordered by IP string (like ORDER BY miner_ip)."""
+        return [self.miners[ip] for ip in sorted(self.miners)]
+
+    def fresh(self, cutoff: dt.datetime) -> list:
+        """Miners whose newest sample is at or after naive-UTC `cutoff`, oldest first."""
+        return self._by_time[bisect_left(self._times, cutoff):]
+
+    def select(self, ips=None, fresh_within: float = None, now: dt.datetime = None) -> list:
+        """Miners ordered by IP, restricted to `ips` and/or to those seen within
+        `fresh_within` minutes of `now` (naive UTC, default utcnow)."""
+        if fresh_within is not None:
+            cutoff = (now or dt.datetime.utcnow()) - dt.timedelta(minutes=fresh_within)
+            rows = self.fresh(cutoff)
+            if ips is not None:
+                wanted = set(ips)
+                rows = [r for r in rows if r.miner_ip in wanted]
+            return sorted(rows, key=lambda r: r.miner_ip)
+        if ips is not None:
+            return [self.miners[ip] for ip in sorted(set(ips)) if ip in self.miners]
+        return self.all()
+
+    def ips(self, fresh_within: float = None, now: dt.datetime = None) -> list:
+        return [r.miner_ip for r in self.select(fresh_within=fresh_within, now=now)]
+
+
+_EMPTY = FleetSnapshot({}, source="empty")
+
+
+class FleetState:
+    """Process-wide holder of the current FleetSnapshot (see module docstring)."""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or ReadSessionLocal
+        self._snapshot: FleetSnapshot | None = None
+        self._lock = threading.Lock()  # serializes writers only
+        self._stats = {"loads": 0, "load_errors": 0, "updates": 0, "rows": 0, "last_update_ms": 0.0,
+                       "loaded_at": None}
+
+    def snapshot(self) -> FleetSnapshot:
+        """The current snapshot; the first call loads miner_latest (cold start)."""
+        snap = self._snapshot
+        if snap is not None:
+            return snap
+        with self._lock:
+            if self._snapshot is None:
+                return self._load_locked()
+            return self._snapshot
+
+    def load(self, session=None) -> FleetSnapshot:
+        """(Re)build the snapshot from miner_latest."""
+        with self._lock:
+            return self._load_locked(session)
+
+    def _load_locked(self, session=None) -> FleetSnapshot:
+        close_session = session is None
+        try:
+            session = session or self.session_factory()
+            miners = {r.miner_ip: MinerState.from_row(r) for r in session.query(MinerLatest).all()}
+        except Exception as e:
+            # Serve empty without caching it, so the next read retries the database
+            self._stats["load_errors"] += 1
+            logger.warning(f"fleet_state_load_failed error={e}")
+            return _EMPTY
+        finally:
+            if close_session and session is not None:
+                session.close()
+        version = self._snapshot.version + 1 if self._snapshot is not None else 1
+        self._snapshot = FleetSnapshot(miners, version, dt.datetime.utcnow(), source="db")
+        self._stats["loads"] += 1
+        self._stats["loaded_at"] = self._snapshot.updated_at.isoformat() + "Z"
+        logger.info(f"fleet_state_loaded miners={len(miners)}")
+        return self._snapshot
+
+    def update(self, columns, rows) -> int:
+        """Apply one poll cycle's rows (tuples ordered like `columns`); returns miners changed.
+
+        As with the miner_latest upsert, a sample older than the one held is ignored.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            base = self._snapshot if self._snapshot is not None else self._load_locked()
+            miners = dict(base.miners)
+            changed = 0
+            for values in rows:
+                record = MinerState(**dict(zip(columns, values, strict=True)))
+                held = miners.get(record.miner_ip)
+                if (held is not None and held.timestamp and record.timestamp
+                        and record.timestamp < held.timestamp):
+                    continue
+                miners[record.miner_ip] = record
+                changed += 1
+            if changed:
+                self._snapshot = FleetSnapshot(miners, base.version + 1, dt.datetime.utcnow())
+            self._stats["updates"] += 1
+            self._stats["rows"] += changed
+            self._stats["last_update_ms"] = (time.perf_counter() - started) * 1000.0
+        return changed
+
+    def reset(self) -> None:
+        """Forget the snapshot; the next read cold-starts from the database."""
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self) -> dict:
+        snap = self._snapshot
+        return {
+            "loaded": snap is not None,
+            "miners": len(snap) if snap is not None else 0,
+            "version": snap.version if snap is not None else 0,
+            "source": snap.source if snap is not None else None,
+            "updated_at": (snap.updated_at.isoformat() + "Z"
+                           if snap is not None and snap.updated_at else None),
+            "loads": self._stats["loads"],
+            "load_errors": self._stats["load_errors"],
+            "updates": self._stats["updates"],
+            "rows": self._stats["rows"],
+            "last_update_ms": round(self._stats["last_update_ms"], 3),
+            "loaded_at": self._stats["loaded_at"],
+        }
+
+
+# Process-wide store: updated by scheduler.poll_metrics, read by the API handlers
+FLEET_STATE = FleetState()
@@ -0,0 +1,365 @@
+"""Persistent miner inventory backed by the miners table.
+
+The poll loop reads its targets from here instead of scanning the network. Rediscovery
+runs separately (DiscoverySweeper) and walks the configured CIDRs a chunk at a time,
+merging new IPs and marking miners that stop answering as vanished. Model, vendor,
+firmware and nominal efficiency are filled in by MetadataEnricher from what the poller
+detected, so readers of the miners table never have to ask a miner.
+"""
+from __future__ import annotations
+
+import ipaddress
+import logging
+import re
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import or_
+
+from core.db import Miner, SessionLocal
+from core.fleet_state import FLEET_STATE
+from core.get_network_ip import detect_local_ipv4_networks, resolve_miner_ip_range
+from core.miner import get_cached_metadata
+from core.write_queue import WRITE_QUEUE
+from helpers.utils import csv_efficiency_for_model
+from miner_config import (
+    CGMINER_PORT,
+    INVENTORY_MISSED_SWEEPS,
+    INVENTORY_SWEEP_CHUNK,
+    METADATA_ENRICH_FULL_INTERVAL,
+    MINER_IP_RANGE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_scan_networks(cidrs=None) -> List[ipaddress.IPv4Network]:
+    """Networks to scan: explicit CIDRs, else local interfaces, else MINER_IP_RANGE."""
+    # Try to detect local networks if no specific CIDRs are provided
+    if not cidrs:
+        try:
+            networks = detect_local_ipv4_networks()
+            if networks:
+                cidrs = [str(net) for net in networks]
+                logger.info(f"Auto-detected networks: {cidrs}")
+        except Exception as e:
+            logger.warning(f"Failed to detect local networks: {e}")
+
+    networks = []
+    if cidrs:
+        items = cidrs if isinstance(cidrs, (list, tuple)) else [
+            c.strip() for c in str(cidrs).split(',') if c.strip()
+        ]
+        for c in items:
+            try:
+                networks.append(ipaddress.ip_network(c))
+            except Exception as e:
+                logger.warning(f"Invalid CIDR {c}: {e}")
+                continue
+    if not networks:
+        cidr = MINER_IP_RANGE or resolve_miner_ip_range()
+        if not cidr:
+            logger.warning("discover_miners_no_cidr_configured")
+            return []
+        try:
+            networks = [ipaddress.ip_network(cidr)]
+            logger.info(f"Using configured CIDR: {cidr}")
+        except Exception as e:
+            logger.warning(f"discover_miners_invalid_cidr cidr={cidr} err={e}")
+            return []
+    return networks
+
+
+def probe_hosts(hosts: Iterable, port: int = CGMINER_PORT, timeout: float = 1,
+                workers: int = 50) -> Set[str]:
+    """Return the subset of hosts accepting TCP connections on the CGMiner port."""
+
+    # noinspection PyBroadException
+    def scan(ip):
+        with socket.socket() as s:
+            s.settimeout(timeout)
+            try:
+                s.connect((str(ip), port))
+                return str(ip)
+            except Exception:
+                return None
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return {ip for ip in ex.map(scan, hosts) if ip}
+
+
+def browse_mdns(wait_s: float = 2.0) -> Set[str]:
+    """Browse _cgminer._tcp via Zeroconf; empty set when zeroconf is unavailable."""
+    try:
+        from zeroconf import ServiceBrowser, Zeroconf
+        zeroconf = Zeroconf()
+        services = []
+
+        def on_service(zc, type_, name):
+            info = zc.get_service_info(type_, name)
+            if info:
+                for addr in info.addresses:
+                    try:
+                        services.append(socket.inet_ntoa(addr))
+                    except OSError:
+                        # ignore non-IPv4 addresses
+                        pass
+
+        ServiceBrowser(zeroconf, "_cgminer._tcp.local.", handlers=[on_service])
+        time.sleep(wait_s)
+        zeroconf.close()
+        return set(services)
+    except Exception:
+        # zeroconf not installed or runtime error; ignore
+        return set()
+
+
+def _active_filter():
+    # Rows created before the inventory columns existed have is_active NULL
+    return or_(Miner.is_active.is_(None), Miner.is_active == True)  # noqa: E712
+
+
+def get_poll_targets(session=None) -> List[str]:
+    """IPs of all miners currently in the inventory (vanished miners excluded)."""
+    close_session = False
+    if session is None:
+        session = SessionLocal()
+        close_session = True
+    try:
+        rows = (session.query(Miner.miner_ip).filter(_active_filter())
+                .order_by(Miner.miner_ip.asc()).all())
+        return [r.miner_ip for r in rows]
+    finally:
+        if close_session:
+            session.close()
+
+
+def merge_discovered(found: Dict[str, str], swept: Optional[Iterable[str]] = None,
+                     session=None) -> Dict[str, int]:
+    """
+    Merge discovery results into the inventory.
+
+    Args:
+        found: ip -> source ('tcp', 'mdns', 'both', 'manual') for every miner that answered
+        swept: IPs covered by this probe; inventory miners in it that did not answer get a
+               missed sweep, and are marked vanished after INVENTORY_MISSED_SWEEPS misses
+
+    Returns:
+        {"added": n, "refreshed": n, "reactivated": n, "missed": n, "vanished": n}
+    """
+    close_session = False
+    if session is None:
+        session = SessionLocal()
+        close_session = True
+
+    summary = {"added": 0, "refreshed": 0, "reactivated": 0, "missed": 0, "vanished": 0}
+    now = datetime.utcnow()
+    try:
+        # The inventory is fleet-sized, so load it whole rather than IN() over a large chunk
+        existing = {m.miner_ip: m for m in session.query(Miner).all()}
+
+        for ip, source in found.items():
+            miner = existing.get(ip)
+            if miner is None:
+                session.add(Miner(miner_ip=ip, is_active=True, discovered_via=source,
+                                  last_discovered_at=now, missed_sweeps=0))
+                summary["added"] += 1
+                continue
+            if miner.is_active is False:
+                summary["reactivated"] += 1
+            else:
+                summary["refreshed"] += 1
+            miner.is_active = True
+            miner.discovered_via = source
+            miner.last_discovered_at = now
+            miner.missed_sweeps = 0
+
+        for ip in set(swept or ()) - set(found):
+            miner = existing.get(ip)
+            if miner is None or miner.is_active is False:
+                continue
+            miner.missed_sweeps = (miner.missed_sweeps or 0) + 1
+            summary["missed"] += 1
+            if miner.missed_sweeps >= INVENTORY_MISSED_SWEEPS:
+                miner.is_active = False
+                summary["vanished"] += 1
+                logger.info(f"inventory_miner_vanished ip={ip} missed_sweeps={miner.missed_sweeps}")
+
+        session.commit()
+        return summary
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if close_session:
+            session.close()
+
+
+class DiscoverySweeper:
+    """Walks the scan networks INVENTORY_SWEEP_CHUNK hosts per run, wrapping around."""
+
+    def __init__(self, cidrs=None, chunk_size: int = INVENTORY_SWEEP_CHUNK, timeout: float = 1,
+                 workers: int = 50, use_mdns: bool = True, port: int = CGMINER_PORT):
+        self.cidrs = cidrs
+        self.chunk_size = max(1, int(chunk_size))
+        self.timeout = timeout
+        self.workers = workers
+        self.use_mdns = use_mdns
+        self.port = port
+        self._hosts: List[str] = []
+        self._cursor = 0
+
+    def _next_chunk(self):
+        starting_pass = self._cursor == 0
+        if starting_pass:
+            # Re-resolve at the start of every pass so interface/CIDR changes are picked up
+            self._hosts = [str(ip) for net in resolve_scan_networks(self.cidrs)
+                           for ip in net.hosts()]
+        chunk = self._hosts[self._cursor:self._cursor + self.chunk_size]
+        self._cursor += len(chunk)
+        if self._cursor >= len(self._hosts):
+            self._cursor = 0
+        return chunk, starting_pass
+
+    def run_once(self, session=None) -> Dict[str, int]:
+        """Probe the next chunk and merge the results into the inventory."""
+        chunk, starting_pass = self._next_chunk()
+        found = {ip: "tcp" for ip in probe_hosts(chunk, port=self.port, timeout=self.timeout,
+                                                   workers=self.workers)}
+        # mDNS costs a fixed wait, so browse once per full pass rather than per chunk
+        if starting_pass and self.use_mdns:
+            for ip in browse_mdns():
+                found[ip] = "both" if ip in found else "mdns"
+
+        if session is not None:
+            summary = merge_discovered(found, swept=chunk, session=session)
+        else:
+            summary = WRITE_QUEUE.run(lambda ws: merge_discovered(found, swept=chunk, session=ws))
+        summary.update({"swept": len(chunk), "cursor": self._cursor,
+                        "total_hosts": len(self._hosts)})
+        return summary
+
+
+# Model substrings -> vendor, checked in order
+_VENDORS = (("antminer", "Bitmain"), ("bitmain", "Bitmain"), ("whatsminer", "MicroBT"),
+            ("microbt", "MicroBT"), ("avalon", "Canaan"), ("canaan", "Canaan"))
+# 'S19 Pro 110T' -> 110
+_NOMINAL_THS = re.compile(r"(\d+(?:\.\d+)?)\s*(?:t|th|ths)\b", re.IGNORECASE)
+
+
+def metadata_values(meta) -> Dict[str, object]:
+    """miners-table values for a MinerMetadata detected by the poller."""
+    model = (meta.model or "").strip()
+    firmware = meta.firmware or None
+    # Some firmwares append themselves to the model: 'Antminer S19 Pro (Vnish 1.2.6)'
+    match = re.search(r"\(([^)]+)\)", model)
+    if match:
+        firmware = firmware or match.group(1).strip()
+        model = re.sub(r"\s*\([^)]+\)", "", model).strip()
+    nominal_ths, efficiency = csv_efficiency_for_model(meta.model)
+    if not nominal_ths:
+        match = _NOMINAL_THS.search(model)
+        nominal_ths = float(match.group(1)) if match else None
+    low = model.lower()
+    return {
+        "vendor": next((vendor for key, vendor in _VENDORS if key in low), None),
+        "model": model or None,
+        "firmware_version": firmware,
+        "nominal_ths": nominal_ths or None,
+        "nominal_efficiency_j_per_th": efficiency or meta.j_per_th or None,
+    }
+
+
+def enrich_metadata(metadata: Dict[str, object], session=None) -> Dict[str, int]:
+    """
+    Write poller-detected metadata (ip -> MinerMetadata) into the miners table.
+
+    Vendor, model and firmware follow what was detected. Nominal TH/s and J/TH are only
+    set when missing or when the model changed, so hand-entered values survive.
+
+    Returns:
+        {"added": n, "updated": n, "unchanged": n}
+    """
+    close_session = False
+    if session is None:
+        session = SessionLocal()
+        close_session = True
+
+    summary = {"added": 0, "updated": 0, "unchanged": 0}
+    try:
+        known = session.query(Miner).filter(Miner.miner_ip.in_(list(metadata)))
+        existing = {m.miner_ip: m for m in known}
+        for ip, meta in metadata.items():
+            values = metadata_values(meta)
+            miner = existing.get(ip)
+            if miner is None:
+                session.add(Miner(miner_ip=ip, **values))
+                summary["added"] += 1
+                continue
+            changes = {c: values[c] for c in ("vendor", "model", "firmware_version")
+                       if values[c] is not None and getattr(miner, c) != values[c]}
+            for c in ("nominal_ths", "nominal_efficiency_j_per_th"):
+                current = getattr(miner, c)
+                if (values[c] is not None and values[c] != current
+                        and (current is None or "model" in changes)):
+                    changes[c] = values[c]
+            if not changes:
+                summary["unchanged"] += 1
+                continue
+            for c, v in changes.items():
+                setattr(miner, c, v)
+            summary["updated"] += 1
+            if "model" in changes or "firmware_version" in changes:
+                logger.info(f"inventory_metadata_changed ip={ip} model={miner.model!r} "
+                            f"firmware={miner.firmware_version!r}")
+
+        session.commit()
+        return summary
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if close_session:
+            session.close()
+
+
+class MetadataEnricher:
+    """Copies the poller's cached metadata (core.miner.get_cached_metadata) into the miners
+    table. Each run only writes miners whose metadata was detected since the last run
+    (first poll, reboot, MINER_METADATA_TTL); every full_interval seconds all polled
+    miners are compared again. No miner is contacted."""
+
+    def __init__(self, full_interval: float = METADATA_ENRICH_FULL_INTERVAL):
+        self.full_interval = full_interval
+        self._applied: Dict[str, float] = {}  # ip -> detected_at of the metadata last written
+        self._last_full: Optional[float] = None  # time.monotonic()
+
+    def pending(self, ips: Iterable[str], full: bool = False) -> Dict[str, object]:
+        """ip -> MinerMetadata for the miners that need writing."""
+        out = {}
+        for ip in ips:
+            meta = get_cached_metadata(ip)
+            if meta is not None and (full or self._applied.get(ip) != meta.detected_at):
+                out[ip] = meta
+        return out
+
+    def run_once(self, ips: Optional[Iterable[str]] = None, session=None) -> Dict[str, int]:
+        """Enrich `ips` (default: every miner in the fleet state)."""
+        now = time.monotonic()
+        full = self._last_full is None or now - self._last_full >= self.full_interval
+        ips = list(ips) if ips is not None else FLEET_STATE.snapshot().ips()
+        pending = self.pending(ips, full=full)
+        summary = {"checked": len(ips), "pending": len(pending), "full": int(full),
+                   "added": 0, "updated": 0, "unchanged": 0}
+        if pending:
+            if session is not None:
+                summary.update(enrich_metadata(pending, session=session))
+            else:
+                summary.update(WRITE_QUEUE.run(lambda ws: enrich_metadata(pending, session=ws)))
+            self._applied.update({ip: meta.detected_at for ip, meta in pending.items()})
+        if full:
+            self._last_full = now
+        return summary
@@ -0,0 +1,110 @@
+"""Explicit live refresh of miners for API callers (/api/summary?live=true).
+
+Read endpoints serve the poller's results (core.fleet_state); a live fetch only happens when
+a caller asks for one, and goes through LIVE_REFRESH:
+
+  - single-flight: while a miner's fetch is in flight, other callers wait on the same future
+    instead of opening another connection;
+  - rate limit: a finished fetch (success or failure) is reused for LIVE_REFRESH_MIN_INTERVAL
+    seconds, so refresh-happy tabs cost each miner at most one fetch per interval;
+  - bounded: fetches run on a shared pool of LIVE_REFRESH_WORKERS threads, and callers stop
+    waiting after LIVE_REFRESH_TIMEOUT (the fetch still completes for the next caller).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from core.miner import MinerClient
+from miner_config import LIVE_REFRESH_MIN_INTERVAL, LIVE_REFRESH_TIMEOUT, LIVE_REFRESH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+def _fetch_normalized(ip: str) -> dict:
+    return MinerClient(ip).fetch_normalized()
+
+
+class LiveRefresher:
+    """Single-flight, rate-limited live fetches (see module docstring)."""
+
+    def __init__(self, fetch=None, workers: int = LIVE_REFRESH_WORKERS,
+                 min_interval: float = LIVE_REFRESH_MIN_INTERVAL):
+        self.fetch_one = fetch or _fetch_normalized
+        self.workers = workers
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = {}  # ip -> Future
+        self._recent = {}  # ip -> (time.monotonic() finished, payload or None)
+        self._stats = {"requests": 0, "fetches": 0, "joined": 0, "reused": 0, "failures": 0,
+                       "timeouts": 0}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix="live-refresh")
+        return self._executor
+
+    def _run(self, ip: str):
+        try:
+            payload = self.fetch_one(ip)
+        except Exception as e:
+            payload = None
+            logger.debug(f"live_refresh_failed ip={ip} error={e}")
+        with self._lock:
+            self._in_flight.pop(ip, None)
+            self._recent[ip] = (time.monotonic(), payload)
+            if payload is None:
+                self._stats["failures"] += 1
+        return payload
+
+    def refresh(self, ips, timeout: float = LIVE_REFRESH_TIMEOUT) -> dict:
+        """{ip: normalized payload} for the miners that answered; failures and fetches
+        still running after `timeout` seconds are left out."""
+        results, pending = {}, {}
+        now = time.monotonic()
+        with self._lock:
+            self._stats["requests"] += 1
+            for ip in dict.fromkeys(ips):
+                recent = self._recent.get(ip)
+                if recent is not None and now - recent[0] < self.min_interval:
+                    self._stats["reused"] += 1
+                    if recent[1] is not None:
+                        results[ip] = recent[1]
+                    continue
+                fut = self._in_flight.get(ip)
+                if fut is not None:
+                    self._stats["joined"] += 1
+                else:
+                    fut = self._in_flight[ip] = self._pool().submit(self._run, ip)
+                    self._stats["fetches"] += 1
+                pending[ip] = fut
+        if pending:
+            done, not_done = wait(pending.values(), timeout=timeout)
+            if not_done:
+                with self._lock:
+                    self._stats["timeouts"] += len(not_done)
+            for ip, fut in pending.items():
+                if fut in done and fut.result() is not None:
+                    results[ip] = fut.result()
+        return results
+
+    def forget(self, ip: str = None) -> None:
+        """Drop remembered results (one miner, or all) so the next refresh fetches again."""
+        with self._lock:
+            if ip is None:
+                self._recent.clear()
+            else:
+                self._recent.pop(ip, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._in_flight), remembered=len(self._recent),
+                        min_interval_s=self.min_interval, workers=self.workers)
+
+
+# Shared by the API handlers
+LIVE_REFRESH = LiveRefresher()
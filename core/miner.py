@@ -1,6 +1,32 @@
+import asyncio
 import datetime as _dt
-from miner_config import CGMINER_TIMEOUT, EFFICIENCY_J_PER_TH
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from core.parsers import FieldMap, _avg, _to_float, detect_family, parser_for
 from helpers.utils import efficiency_for_model
+from miner_config import (
+    CGMINER_MAX_RESPONSE_BYTES,
+    CGMINER_PORT,
+    CGMINER_TIMEOUT,
+    EFFICIENCY_J_PER_TH,
+    MINER_CAPTURE_DIR,
+    MINER_CIRCUIT_BACKOFF,
+    MINER_CIRCUIT_FAILURES,
+    MINER_CIRCUIT_MAX_BACKOFF,
+    MINER_METADATA_TTL,
+    MINER_TIMEOUT_FLOOR,
+    MINER_TIMEOUT_P99_MULTIPLIER,
+    POLL_CONCURRENCY,
+)
+
+logger = logging.getLogger(__name__)
 
 HASHRATE_KEYS = [
     ("GHS 5s", "GHS"), ("GHS av", "GHS"),
@@ -13,62 +39,811 @@ class MinerError(Exception):
     pass
 
 
-def _to_float(x):
-    # noinspection PyBroadException
+class MinerUnavailableError(MinerError):
+    """Raised without touching the network while a miner's circuit is open."""
+
+
+# Latency samples kept per miner for p99, and how many are needed before timeouts adapt
+_LATENCY_SAMPLES = 64
+_LATENCY_MIN_SAMPLES = 5
+_EWMA_ALPHA = 0.2
+
+
+def _p99(samples) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def _ms(seconds) -> float | None:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class _MinerHealth:
+    def __init__(self):
+        self.connect_ewma = None
+        self.read_ewma = None
+        self.connect_samples = deque(maxlen=_LATENCY_SAMPLES)
+        self.read_samples = deque(maxlen=_LATENCY_SAMPLES)
+        self.failures = 0  # consecutive
+        self.opened = 0  # consecutive circuit openings; drives the backoff
+        self.open_until = 0.0  # time.monotonic(); 0 means the circuit is closed
+        self.probing = False  # half-open probe in flight
+
+
+class MinerHealthRegistry:
+    """
+    Per-miner latency and failure tracking shared by MinerClient and AsyncMinerClient.
+
+    Connect and read latencies feed an EWMA and a rolling p99, from which adaptive
+    timeouts are derived. After MINER_CIRCUIT_FAILURES consecutive connection failures
+    the circuit opens: polling reads fail fast with MinerUnavailableError until the backoff
+    has passed, then a single probe is let through (half-open). A failed probe reopens the
+    circuit with double the backoff; a success closes it. Control commands (restart, pool
+    changes) are always sent, so an operator can still recover a flapping miner.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._miners = {}
+
+    def _get(self, key) -> _MinerHealth:
+        h = self._miners.get(key)
+        if h is None:
+            h = self._miners[key] = _MinerHealth()
+        return h
+
+    def is_open(self, key) -> bool:
+        h = self._miners.get(key)
+        return h is not None and h.open_until > time.monotonic()
+
+    def allow(self, key) -> bool:
+        """Whether a command may be sent now; claims the half-open probe slot if due."""
+        with self._lock:
+            h = self._miners.get(key)
+            if h is None or not h.open_until:
+                return True
+            if h.probing or time.monotonic() < h.open_until:
+                return False
+            h.probing = True
+            return True
+
+    def timeouts(self, key, base: float) -> tuple:
+        """(connect_timeout, read_timeout): p99 x multiplier, clamped to [floor, base]."""
+        h = self._miners.get(key)
+        if h is None:
+            return base, base
+        return self._adaptive(h.connect_samples, base), self._adaptive(h.read_samples, base)
+
+    @staticmethod
+    def _adaptive(samples, base: float) -> float:
+        if len(samples) < _LATENCY_MIN_SAMPLES:
+            return base
+        return min(base, max(MINER_TIMEOUT_FLOOR, _p99(samples) * MINER_TIMEOUT_P99_MULTIPLIER))
+
+    def record_success(self, key, connect_s: float, read_s: float) -> None:
+        with self._lock:
+            h = self._get(key)
+            if h.open_until:
+                logger.info(f"miner_circuit_closed ip={key[0]} port={key[1]}")
+            h.failures = h.opened = 0
+            h.open_until = 0.0
+            h.probing = False
+            h.connect_samples.append(connect_s)
+            h.read_samples.append(read_s)
+            h.connect_ewma = connect_s if h.connect_ewma is None else (
+                _EWMA_ALPHA * connect_s + (1 - _EWMA_ALPHA) * h.connect_ewma)
+            h.read_ewma = read_s if h.read_ewma is None else (
+                _EWMA_ALPHA * read_s + (1 - _EWMA_ALPHA) * h.read_ewma)
+
+    def record_failure(self, key) -> None:
+        with self._lock:
+            h = self._get(key)
+            h.failures += 1
+            h.probing = False
+            if h.failures >= MINER_CIRCUIT_FAILURES:
+                h.opened += 1
+                backoff = min(MINER_CIRCUIT_MAX_BACKOFF,
+                              MINER_CIRCUIT_BACKOFF * 2 ** (h.opened - 1))
+                h.open_until = time.monotonic() + backoff
+                logger.warning(
+                    f"miner_circuit_open ip={key[0]} port={key[1]} failures={h.failures} "
+                    f"backoff_s={backoff}"
+                )
+
+    def release(self, key) -> None:
+        """Give up a half-open probe that ended without a verdict (e.g. cancelled)."""
+        with self._lock:
+            h = self._miners.get(key)
+            if h is not None:
+                h.probing = False
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        out = {}
+        with self._lock:
+            for (ip, port), h in self._miners.items():
+                if h.open_until > now:
+                    state = "open"
+                else:
+                    state = "half_open" if h.open_until else "closed"
+                out[ip if port == CGMINER_PORT else f"{ip}:{port}"] = {
+                    "state": state,
+                    "consecutive_failures": h.failures,
+                    "retry_in_s": round(max(0.0, h.open_until - now), 1) if h.open_until else None,
+                    "connect_ewma_ms": _ms(h.connect_ewma),
+                    "read_ewma_ms": _ms(h.read_ewma),
+                    "connect_p99_ms": _ms(_p99(h.connect_samples) if h.connect_samples else None),
+                    "read_p99_ms": _ms(_p99(h.read_samples) if h.read_samples else None),
+                }
+        return out
+
+
+# Shared by every client in the process (scheduler, API fan-outs, dashboard)
+MINER_HEALTH = MinerHealthRegistry()
+
+
+def _command_payload(cmd: str) -> str:
+    """Wrap a bare command name as CGMiner JSON; pass JSON payloads through unchanged."""
+    payload = cmd.strip()
+    if not payload.startswith("{"):
+        payload = json.dumps({"command": payload})
+    return payload
+
+
+def _parse_response(raw: bytes) -> dict:
+    """Parse a raw CGMiner/BMminer reply into a dict."""
+    text = raw.decode("utf-8", errors="ignore").strip()
+    # bmminer sometimes adds NULs; split by newlines/NULs and parse the first valid JSON
+    for line in [p for p in text.replace("\x00", "\n").splitlines() if p.strip()]:
+        try:
+            return json.loads(line)
+        except Exception:
+            continue
+    raise ValueError(f"Unable to parse miner response: {text[:200]}")
+
+
+# Initial receive buffer; grown (doubling) up to CGMINER_MAX_RESPONSE_BYTES
+_RECV_BUFFER_BYTES = 64 * 1024
+
+# Bytes that can change JSON nesting/string state; everything else is skipped by the scanner
+_JSON_STRUCTURAL = re.compile(rb'[\[\]{}"\\]')
+
+
+class _ResponseBuffer:
+    """
+    Receive buffer that notices when the first JSON document in the reply is complete.
+
+    Bytes land in a preallocated bytearray (recv_into) and only the newly received
+    region is scanned for brackets/quotes, so the reader can stop as soon as the
+    document closes instead of waiting for the miner to close the socket.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or CGMINER_MAX_RESPONSE_BYTES
+        self.buf = bytearray(min(_RECV_BUFFER_BYTES, self.max_bytes))
+        self.filled = 0
+        self.start = None  # index of the document's first byte
+        self.end = None  # index just past its last byte, once complete
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._skip = 0  # byte after a backslash inside a string
+
+    def writable(self) -> memoryview:
+        """Free tail of the buffer, growing it first when full."""
+        if self.filled == len(self.buf):
+            if self.filled >= self.max_bytes:
+                raise MinerError(f"response exceeds {self.max_bytes} bytes")
+            self.buf.extend(bytes(min(len(self.buf), self.max_bytes - len(self.buf))))
+        return memoryview(self.buf)[self.filled:]
+
+    def extend(self, data: bytes) -> bool:
+        """Append bytes read by a stream reader; returns True once the document is complete."""
+        view = memoryview(data)
+        while view:
+            target = self.writable()
+            n = min(len(target), len(view))
+            target[:n] = view[:n]
+            target.release()
+            view = view[n:]
+            if self.advance(n):
+                return True
+        return False
+
+    def advance(self, n: int) -> bool:
+        """Account for n bytes written into writable(); True once the document is complete."""
+        self.filled += n
+        if self.end is None:
+            self._scan()
+        return self.end is not None
+
+    def _scan(self) -> None:
+        buf, i = self.buf, self._pos
+        if self.start is None:
+            while i < self.filled and buf[i] in b" \t\r\n\x00":
+                i += 1
+            if i == self.filled:
+                self._pos = i
+                return
+            self.start = i
+        for m in _JSON_STRUCTURAL.finditer(buf, i, self.filled):
+            j = m.start()
+            if j < self._skip:
+                continue
+            c = buf[j]
+            if self._in_string:
+                if c == 0x5C:  # backslash: the next byte is escaped
+                    self._skip = j + 2
+                elif c == 0x22:
+                    self._in_string = False
+            elif c == 0x22:
+                self._in_string = True
+            elif c in (0x7B, 0x5B):
+                self._depth += 1
+            elif c in (0x7D, 0x5D):
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = j + 1
+                    return
+        self._pos = self.filled
+
+    def parse(self) -> dict:
+        if self.end is not None:
+            try:
+                return json.loads(self.buf[self.start:self.end])
+            except ValueError:
+                pass
+        # Truncated or not plain JSON: fall back to the line-based parser (raises ValueError)
+        return _parse_response(bytes(self.buf[:self.filled]))
+
+
+# Read commands behind fetch_normalized(), in the order they are piped
+_NORMALIZE_COMMANDS = ("summary", "stats", "version")
+
+# (ip, port) -> whether the firmware accepts piped commands ("summary+stats+version").
+# Missing means not probed yet; False means fall back to one connection per command.
+_PIPED_SUPPORT: dict = {}
+# (ip, port) -> time.monotonic() until which piping is skipped after an unclear probe
+_PIPED_RETRY_AT: dict = {}
+
+
+def _split_piped(resp: dict, commands) -> dict | None:
+    """Split a piped reply {"summary": [{...}], "stats": [{...}], ...} into per-command dicts.
+
+    Returns None when the reply is not a piped reply (e.g. STATUS "E" / "Invalid command").
+    """
+    if not isinstance(resp, dict):
+        return None
+    out = {}
+    for cmd in commands:
+        part = resp.get(cmd)
+        if isinstance(part, list) and part and isinstance(part[0], dict):
+            out[cmd] = part[0]
+    return out if commands[0] in out else None
+
+
+def _rejects_command(resp) -> bool:
+    """True for a well-formed error reply to an unknown command (STATUS "E", code 14)."""
+    status = resp.get("STATUS") if isinstance(resp, dict) else None
+    if not (isinstance(status, list) and status and isinstance(status[0], dict)):
+        return False
+    status = status[0]
+    return status.get("STATUS") == "E" and (
+        status.get("Code") == 14 or "invalid command" in str(status.get("Msg", "")).lower())
+
+
+def _piped_skipped(key) -> bool:
+    return (_PIPED_SUPPORT.get(key) is False
+            or _PIPED_RETRY_AT.get(key, 0.0) > time.monotonic())
+
+
+def _record_piped(key, resp, commands) -> dict | None:
+    """Split a piped reply and remember whether the miner accepts piped commands.
+
+    Only a clear rejection disables piping for good. A garbled or unexpected reply
+    (e.g. one cut short by a timeout) skips piping for MINER_METADATA_TTL and is then
+    probed again, so one bad reply cannot turn batching off until a restart.
+    """
+    replies = _split_piped(resp, commands)
+    if replies is not None:
+        _PIPED_SUPPORT[key] = True
+        _PIPED_RETRY_AT.pop(key, None)
+    elif _rejects_command(resp):
+        _PIPED_SUPPORT[key] = False
+    else:
+        _PIPED_RETRY_AT[key] = time.monotonic() + MINER_METADATA_TTL
+    return replies
+
+
+# Commands polled while the miner's static metadata is cached (VERSION is skipped)
+_POLL_COMMANDS = ("summary", "stats")
+
+
+@dataclass
+class MinerMetadata:
+    """Facts about a miner that only change across reboots or firmware updates."""
+    model: str
+    firmware: str
+    family: str  # firmware family, see core.parsers.detect_family()
+    j_per_th: float | None
+    elapsed_s: int  # Elapsed at the last poll; going backwards means the miner rebooted
+    detected_at: float  # time.monotonic()
+    field_map: FieldMap | None = None  # learned on the first poll by the family's parser
+
+
+# (ip, port) -> MinerMetadata, filled by the first poll and reused until reboot/TTL
+_METADATA_CACHE: dict = {}
+
+
+def get_cached_metadata(ip, port=CGMINER_PORT) -> MinerMetadata | None:
+    """Cached model/firmware/efficiency for a miner, or None if not polled yet."""
+    return _METADATA_CACHE.get((ip, port))
+
+
+def _cached_metadata(key) -> MinerMetadata | None:
+    meta = _METADATA_CACHE.get(key)
+    if meta is not None and time.monotonic() - meta.detected_at > MINER_METADATA_TTL:
+        _METADATA_CACHE.pop(key, None)
+        return None
+    return meta
+
+
+def _elapsed(summ: dict) -> int:
+    s0 = (summ.get("SUMMARY") or [{}])[0]
+    return int(_to_float(s0.get("Elapsed")) or 0)
+
+
+def _rebooted(meta: MinerMetadata, summ: dict) -> bool:
+    return _elapsed(summ) < meta.elapsed_s
+
+
+def _detect_firmware(ver: dict) -> str:
+    v0 = (ver.get("VERSION") or [{}])[0] if isinstance(ver, dict) else {}
+    for k in ("Firmware", "CompileTime"):
+        if v0.get(k):
+            return str(v0[k]).strip()
+    # Otherwise report the miner software and its version, e.g. "BMMiner 1.0.0"
+    for k in ("BMMiner", "BOSminer", "bosminer", "LUXminer", "CGMiner"):
+        if v0.get(k):
+            return f"{k} {v0[k]}".strip()
+    return ""
+
+
+def _detect_metadata(summ: dict, stats: dict, ver: dict) -> MinerMetadata:
+    """Detect model, firmware and J/TH from raw SUMMARY/STATS/VERSION replies."""
+    s0 = (summ.get("SUMMARY") or [{}])[0]
+
+    # determine model (robust across firmware variants)
+    def _norm_model(m):
+        if not m:
+            return ""
+        m = str(m).strip()
+        # common cleanup
+        m = " ".join(m.split())
+        return m
+
+    def _walk_for_model(obj):
+        # Look for common keys across SUMMARY/STATS/VERSION
+        MODEL_KEYS = {
+            "model", "type", "miner type", "minertype",
+            "modelname", "miner name", "product type", "product", "hw type"
+        }
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if isinstance(v, (dict, list)):
+                    res = _walk_for_model(v)
+                    if res:
+                        return res
+                key = str(k).strip().lower()
+                if key in MODEL_KEYS:
+                    if isinstance(v, str) and v.strip():
+                        return v
+            return None
+        if isinstance(obj, list):
+            for it in obj:
+                res = _walk_for_model(it)
+                if res:
+                    return res
+            return None
+        return None
+
+    # Try explicit places first, then recursive scan:
+    candidates = []
+
+    # some firmwares expose 'Model' at top-level or inside SUMMARY[0]
+    candidates.append(summ.get("Model"))
+    candidates.append(s0.get("Model"))
+    candidates.append(s0.get("Type"))  # SUMMARY sometimes has "Type": "Antminer S19 Pro"
+
+    # stats blocks sometimes have "Type"/"Model"/"ModelName"
+    for entry in (stats.get("STATS") or []):
+        candidates.append(entry.get("Model"))
+        candidates.append(entry.get("ModelName"))
+        candidates.append(entry.get("Type"))
+        # Some expose with spaces/case differences
+        candidates.append(entry.get("Miner Name"))
+        candidates.append(entry.get("MinerType"))
+        candidates.append(entry.get("Product Type"))
+
+    # version often has "Type" or similar in VERSION[0]
+    v0 = (ver.get("VERSION") or [{}])[0] if isinstance(ver, dict) else {}
+    candidates.append(ver.get("Model"))
+    candidates.append(v0.get("Model"))
+    candidates.append(v0.get("Type"))
+    candidates.append(v0.get("MinerType"))
+    candidates.append(v0.get("Miner Name"))
+
+    # fallback: recursively walk for common model keys
+    if not any(candidates):
+        candidates.append(_walk_for_model(summ))
+        candidates.append(_walk_for_model(stats))
+        candidates.append(_walk_for_model(ver))
+
+    model = next((m for m in candidates if isinstance(m, str) and m.strip()), "")
+    model = _norm_model(model)
+
+    return MinerMetadata(
+        model=model or "",
+        firmware=_detect_firmware(ver),
+        family=detect_family(ver),
+        j_per_th=efficiency_for_model(model),
+        elapsed_s=_elapsed(summ),
+        detected_at=time.monotonic(),
+    )
+
+
+def _normalize(summ: dict, stats: dict, meta: MinerMetadata) -> dict:
+    """Build the normalized metrics dict from raw SUMMARY/STATS replies and miner metadata.
+
+    Shared by MinerClient and AsyncMinerClient so both produce identical output.
+    """
+    # Field lookups come from the miner's learned map; re-learn if the reply layout changed
+    field_map = meta.field_map
+    if field_map is None or not field_map.fits(summ, stats):
+        field_map = meta.field_map = parser_for(meta.family).learn(summ, stats)
+    ths, temps, fans = field_map.extract(summ, stats)
+
+    elapsed = _elapsed(summ)
+    when_val = (summ.get("STATUS") or [{}])[0].get("When")
+    if isinstance(when_val, (int, float)):
+        when_iso = _dt.datetime.utcfromtimestamp(int(when_val)).isoformat() + "Z"
+    else:
+        when_iso = _dt.datetime.utcnow().isoformat() + "Z"
+
+    power_w = ths * (meta.j_per_th or EFFICIENCY_J_PER_TH)
+
+    return {
+        "hashrate_ths": ths,
+        "elapsed_s": elapsed,
+        "avg_temp_c": _avg(temps),
+        "avg_fan_rpm": _avg(fans),
+        # Always estimated from hashrate x J/TH; live power fields are not used
+        "power_w": power_w,
+        "when": when_iso,
+        "model": meta.model,
+    }
+
+
+def _normalize_replies(key, replies: dict, meta: MinerMetadata | None) -> dict:
+    """Normalize one poll, detecting and caching metadata when `meta` is None."""
+    summ, stats = replies["summary"], replies.get("stats") or {}
+    if meta is None:
+        meta = _detect_metadata(summ, stats, replies.get("version") or {})
+        _METADATA_CACHE[key] = meta
+    else:
+        meta.elapsed_s = _elapsed(summ)
+    return _normalize(summ, stats, meta)
+
+
+def _write_capture(capture_dir: str, ip, port, raw: dict, meta: MinerMetadata) -> str | None:
+    """
+    Store the raw replies of one fetch_normalized() as a replay fixture.
+
+    Layout: <capture_dir>/<family>/<ip>_<port>_<timestamp>.json holding the raw bytes of
+    each command (latin-1 text, so the bytes and any NULs round-trip exactly). Replay
+    them with helpers/replay_captures.py. Failures are logged, never raised.
+    """
     try:
-        return float(x)
-    except Exception:
+        now = _dt.datetime.utcnow()
+        folder = os.path.join(capture_dir, meta.family or "unknown")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{ip}_{port}_{now.strftime('%Y%m%dT%H%M%S%f')}.json")
+        doc = {
+            "ip": ip,
+            "port": port,
+            "captured_at": now.isoformat() + "Z",
+            "family": meta.family,
+            "model": meta.model,
+            "firmware": meta.firmware,
+            "responses": {cmd: data.decode("latin-1") for cmd, data in raw.items()},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(doc, f)
+        return path
+    except Exception as e:
+        logger.warning(f"miner_capture_failed ip={ip} error={e}")
         return None
 
 
-def _avg(seq):
-    vals = [v for v in (_to_float(s) for s in seq) if v is not None]
-    return sum(vals) / len(vals) if vals else 0.0
+class AsyncMinerClient:
+    """asyncio-streams CGMiner/BMminer client used for fleet-wide polling.
+
+    Mirrors the read side of MinerClient; fetch_normalized() returns the same dict.
+    """
+
+    def __init__(self, ip, port=CGMINER_PORT, timeout: float = None, capture_dir: str = None):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout if timeout is not None else CGMINER_TIMEOUT
+        # Capture mode: raw replies of each fetch_normalized() are written as fixtures
+        self.capture_dir = capture_dir if capture_dir is not None else MINER_CAPTURE_DIR
+        self._raw = {}
+
+    async def _send_command(self, cmd: str) -> dict:
+        key = (self.ip, self.port)
+        if not MINER_HEALTH.allow(key):
+            raise MinerUnavailableError(f"circuit open for {self.ip}:{self.port}")
+        connect_timeout, read_timeout = MINER_HEALTH.timeouts(key, self.timeout)
+        payload = _command_payload(cmd)
+        resp = _ResponseBuffer()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ip, self.port), timeout=connect_timeout
+            )
+            connected = time.monotonic()
+            try:
+                writer.write((payload + "\n").encode("utf-8"))
+                await writer.drain()
+                # Stop at the end of the JSON document, or EOF for firmware that sends junk
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(f"no complete reply within {self.timeout}s")
+                    data = await asyncio.wait_for(reader.read(_RECV_BUFFER_BYTES),
+                                                  timeout=min(read_timeout, remaining))
+                    if not data or resp.extend(data):
+                        break
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+        except (OSError, asyncio.TimeoutError):
+            MINER_HEALTH.record_failure(key)
+            raise
+        except BaseException:
+            MINER_HEALTH.release(key)
+            raise
+        MINER_HEALTH.record_success(key, connected - started, time.monotonic() - connected)
+        if self.capture_dir:
+            self._raw[cmd] = bytes(resp.buf[:resp.filled])
+        return resp.parse()
+
+    async def get_summary(self) -> dict:
+        return await self._send_command("summary")
+
+    async def get_stats(self) -> dict:
+        return await self._send_command("stats")
+
+    async def get_version(self) -> dict:
+        return await self._send_command("version")
+
+    async def _fetch_piped(self, commands) -> dict | None:
+        """Async equivalent of MinerClient._fetch_piped()."""
+        key = (self.ip, self.port)
+        if _piped_skipped(key):
+            return None
+        try:
+            resp = await self._send_command("+".join(commands))
+        except ValueError:
+            if _PIPED_SUPPORT.get(key):
+                raise
+            resp = None
+        return _record_piped(key, resp, commands)
+
+    async def _fetch_replies(self, commands) -> dict:
+        """Async equivalent of MinerClient._fetch_replies()."""
+        try:
+            replies = await self._fetch_piped(commands)
+        except MinerError:
+            raise
+        except Exception as e:
+            raise MinerError(str(e) or type(e).__name__) from e
+        if replies is not None:
+            return replies
+
+        replies = {}
+        for i, cmd in enumerate(commands):
+            try:
+                replies[cmd] = await self._send_command(cmd)
+            except Exception as e:
+                if i == 0 and isinstance(e, MinerError):
+                    raise
+                if i == 0:
+                    raise MinerError(str(e) or type(e).__name__) from e
+                replies[cmd] = {}
+        return replies
+
+    async def fetch_normalized(self) -> dict:
+        """Async equivalent of MinerClient.fetch_normalized()."""
+        key = (self.ip, self.port)
+        # Captures always record all three commands, so they bypass the metadata cache
+        meta = None if self.capture_dir else _cached_metadata(key)
+        self._raw = {}
+        replies = await self._fetch_replies(_POLL_COMMANDS if meta else _NORMALIZE_COMMANDS)
+        if meta is not None and _rebooted(meta, replies["summary"]):
+            meta = None
+        if meta is None and "version" not in replies:
+            try:
+                replies["version"] = await self.get_version()
+            except Exception:
+                replies["version"] = {}
+        result = _normalize_replies(key, replies, meta)
+        if self.capture_dir:
+            _write_capture(self.capture_dir, self.ip, self.port, self._raw, _METADATA_CACHE[key])
+        return result
+
+
+async def poll_fleet(ips, concurrency: int = POLL_CONCURRENCY, deadline: float = None,
+                     timeout: float = None, port: int = CGMINER_PORT) -> dict:
+    """
+    Fetch normalized metrics from every miner concurrently.
+
+    At most `concurrency` miners are in flight at once; anything still running when
+    `deadline` seconds have elapsed is cancelled and reported in `timed_out`.
+
+    Returns:
+      {"results": {ip: payload}, "errors": {ip: str}, "timed_out": [ip, ...], "duration_s": float}
+    """
+    started = time.monotonic()
+    sem = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def _one(ip):
+        async with sem:
+            return await AsyncMinerClient(ip, port=port, timeout=timeout).fetch_normalized()
+
+    tasks = {asyncio.ensure_future(_one(ip)): ip for ip in dict.fromkeys(ips)}
+    results, errors, timed_out = {}, {}, []
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+            timed_out.append(tasks[task])
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            ip = tasks[task]
+            exc = task.exception()
+            if exc is not None:
+                errors[ip] = str(exc) or type(exc).__name__
+            else:
+                results[ip] = task.result()
+
+    return {
+        "results": results,
+        "errors": errors,
+        "timed_out": sorted(timed_out),
+        "duration_s": time.monotonic() - started,
+    }
 
 
 class MinerClient:
     """CGMiner/BMminer API client for Antminer devices."""
 
-    def __init__(self, ip, port=4028, timeout: float = None):
+    def __init__(self, ip, port=CGMINER_PORT, timeout: float = None, capture_dir: str = None):
         self.ip = ip
         self.port = port
         self.timeout = timeout if timeout is not None else CGMINER_TIMEOUT
+        # Capture mode: raw replies of each fetch_normalized() are written as fixtures
+        self.capture_dir = capture_dir if capture_dir is not None else MINER_CAPTURE_DIR
+        self._raw = {}
 
-    def _send_command(self, cmd: str) -> dict:
+    def _send_command(self, cmd: str, poll: bool = False) -> dict:
         """
         Send a JSON command (with a newline terminator) and parse a robust response.
+
+        Uses MINER_HEALTH's adaptive connect/read timeouts and records the outcome. Polling
+        reads (poll=True) also fail fast with MinerUnavailableError while the miner's
+        circuit is open; other commands are always sent. The whole exchange is bounded by
+        self.timeout and CGMINER_MAX_RESPONSE_BYTES; reading stops as soon as a complete
+        JSON document has arrived.
         """
-        import json, socket
-        payload = cmd.strip()
-        if not payload.startswith("{"):
-            payload = json.dumps({"command": payload})
+        import socket
+        key = (self.ip, self.port)
+        if poll and not MINER_HEALTH.allow(key):
+            raise MinerUnavailableError(f"circuit open for {self.ip}:{self.port}")
+        connect_timeout, read_timeout = MINER_HEALTH.timeouts(key, self.timeout)
+        payload = _command_payload(cmd)
+        resp = _ResponseBuffer()
 
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(self.timeout)
+        s.settimeout(connect_timeout)
+        started = time.monotonic()
+        deadline = started + self.timeout  # wall clock for the whole exchange
         try:
             s.connect((self.ip, self.port))
+            connected = time.monotonic()
+            s.settimeout(read_timeout)
             s.sendall((payload + "\n").encode("utf-8"))  # <-- newline is critical
 
-            chunks = []
+            # Stop at the end of the JSON document, or EOF for firmware that sends junk
             while True:
-                buf = s.recv(4096)
-                if not buf:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout(f"no complete reply within {self.timeout}s")
+                s.settimeout(min(read_timeout, remaining))
+                n = s.recv_into(resp.writable())
+                if not n or resp.advance(n):
                     break
-                chunks.append(buf)
-
-            text = b"".join(chunks).decode("utf-8", errors="ignore").strip()
-            # bmminer sometimes adds NULs; split by newlines/NULs and parse the first valid JSON
-            for line in [p for p in text.replace("\x00", "\n").splitlines() if p.strip()]:
-                try:
-                    return json.loads(line)
-                except Exception:
-                    continue
-            raise ValueError(f"Unable to parse miner response: {text[:200]}")
+        except OSError:
+            MINER_HEALTH.record_failure(key)
+            raise
+        except BaseException:
+            if poll:
+                MINER_HEALTH.release(key)
+            raise
         finally:
             try:
                 s.close()
             except Exception:
                 pass
+        MINER_HEALTH.record_success(key, connected - started, time.monotonic() - connected)
+        if self.capture_dir:
+            self._raw[cmd] = bytes(resp.buf[:resp.filled])
+        return resp.parse()
+
+    def _fetch_piped(self, commands) -> dict | None:
+        """
+        Fetch several read commands over one connection using CGMiner's piped syntax
+        ({"command": "summary+stats+version"}).
+
+        Returns {command: reply}, or None when this miner's firmware rejects piped
+        commands. The outcome is cached per miner (see _record_piped()), so rejecting
+        firmware is only probed once.
+        """
+        key = (self.ip, self.port)
+        if _piped_skipped(key):
+            return None
+        try:
+            resp = self._send_command("+".join(commands), poll=True)
+        except ValueError:
+            # Some firmwares answer an unknown command with non-JSON, and a first reply
+            # may be cut short; while the capability is unknown, fall back and retry later.
+            if _PIPED_SUPPORT.get(key):
+                raise
+            resp = None
+        return _record_piped(key, resp, commands)
+
+    def _fetch_replies(self, commands) -> dict:
+        """
+        Fetch read commands as {command: reply}: piped when supported, else one
+        connection per command. Only the first command is required; a failure on
+        any other one yields {} for it.
+        """
+        try:
+            replies = self._fetch_piped(commands)
+        except MinerError:
+            raise
+        except Exception as e:
+            raise MinerError(str(e)) from e
+        if replies is not None:
+            return replies
+
+        replies = {}
+        for i, cmd in enumerate(commands):
+            try:
+                replies[cmd] = self._send_command(cmd, poll=True)
+            except Exception as e:
+                if i == 0 and isinstance(e, MinerError):
+                    raise
+                if i == 0:
+                    # Normalize any parsing/IO error to MinerError for callers that expect it
+                    raise MinerError(str(e)) from e
+                replies[cmd] = {}
+        return replies
 
     # ---- Normalized view across SUMMARY/STATS ----
     def fetch_normalized(self) -> dict:
@@ -77,140 +852,37 @@ class MinerClient:
         Keys:
           hashrate_ths (float), elapsed_s (int), avg_temp_c (float),
           avg_fan_rpm (float), power_w (float), when (ISO8601 string)
-        """
-        try:
-            summ = self.get_summary()  # {"SUMMARY":[{...}], "STATUS":[{...}]}
-        except Exception as e:
-            # Normalize any parsing/IO error to MinerError for callers that expect it
-            raise MinerError(str(e))
-        try:
-            stats = self.get_stats()  # {"STATS":[{...}, ...]}
-        except Exception:
-            stats = {}
-        try:
-            ver = self.get_version()  # {"VERSION":[{...}], "STATUS":[{...}]}, varies by FW
-        except Exception:
-            ver = {}
-
-        s0 = (summ.get("SUMMARY") or [{}])[0]
-
-        # determine model (robust across firmware variants)
-        def _norm_model(m):
-            if not m:
-                return ""
-            m = str(m).strip()
-            # common cleanup
-            m = " ".join(m.split())
-            return m
-
-        def _walk_for_model(obj):
-            # Look for common keys across SUMMARY/STATS/VERSION
-            MODEL_KEYS = {
-                "model", "type", "miner type", "minertype",
-                "modelname", "miner name", "product type", "product", "hw type"
-            }
-            if isinstance(obj, dict):
-                for k, v in obj.items():
-                    if isinstance(v, (dict, list)):
-                        res = _walk_for_model(v)
-                        if res:
-                            return res
-                    key = str(k).strip().lower()
-                    if key in MODEL_KEYS:
-                        if isinstance(v, str) and v.strip():
-                            return v
-                return None
-            if isinstance(obj, list):
-                for it in obj:
-                    res = _walk_for_model(it)
-                    if res:
-                        return res
-                return None
-            return None
 
-        # Try explicit places first, then recursive scan:
-        candidates = []
-
-        # some firmwares expose 'Model' at top-level or inside SUMMARY[0]
-        candidates.append(summ.get("Model"))
-        candidates.append(s0.get("Model"))
-        candidates.append(s0.get("Type"))  # SUMMARY sometimes has "Type": "Antminer S19 Pro"
-
-        # stats blocks sometimes have "Type"/"Model"/"ModelName"
-        for entry in (stats.get("STATS") or []):
-            candidates.append(entry.get("Model"))
-            candidates.append(entry.get("ModelName"))
-            candidates.append(entry.get("Type"))
-            # Some expose with spaces/case differences
-            candidates.append(entry.get("Miner Name"))
-            candidates.append(entry.get("MinerType"))
-            candidates.append(entry.get("Product Type"))
-
-        # version often has "Type" or similar in VERSION[0]
-        v0 = (ver.get("VERSION") or [{}])[0] if isinstance(ver, dict) else {}
-        candidates.append(ver.get("Model"))
-        candidates.append(v0.get("Model"))
-        candidates.append(v0.get("Type"))
-        candidates.append(v0.get("MinerType"))
-        candidates.append(v0.get("Miner Name"))
-
-        # fallback: recursively walk for common model keys
-        if not any(candidates):
-            candidates.append(_walk_for_model(summ))
-            candidates.append(_walk_for_model(stats))
-            candidates.append(_walk_for_model(ver))
-
-        model = next((m for m in candidates if isinstance(m, str) and m.strip()), "")
-        model = _norm_model(model)
-
-        # Hashrate: prefer GHS, fallback to MHS
-        ths = 0.0
-        for k in ("GHS 5s", "GHS av", "GHS 1s", "MHS 5s", "MHS av", "MHS 1s"):
-            if k in s0:
-                val = _to_float(s0.get(k)) or 0.0
-                ths = (val / 1000.0) if k.startswith("GHS") else (val / 1_000_000.0)
-                break
-
-        elapsed = int(_to_float(s0.get("Elapsed")) or 0)
-        when_val = (summ.get("STATUS") or [{}])[0].get("When")
-        if isinstance(when_val, (int, float)):
-            when_iso = _dt.datetime.utcfromtimestamp(int(when_val)).isoformat() + "Z"
-        else:
-            when_iso = _dt.datetime.utcnow().isoformat() + "Z"
-
-        temps, fans, powers = [], [], []
-        for entry in (stats.get("STATS") or []):
-            for key, val in entry.items():
-                fv = _to_float(val)
-                if fv is None:
-                    continue
-                lk = str(key).lower()
-                if lk.startswith("temp"):
-                    temps.append(fv)
-                elif lk.startswith("fan"):
-                    fans.append(fv)
-                elif lk in ("power", "device power", "power_draw", "chain_power"):
-                    powers.append(fv)
-
-        j_per_th = efficiency_for_model(model)
-        power_w = ths * (j_per_th or EFFICIENCY_J_PER_TH)
-
-        return {
-            "hashrate_ths": ths,
-            "elapsed_s": elapsed,
-            "avg_temp_c": _avg(temps),
-            "avg_fan_rpm": _avg(fans),
-            # Ignore live powers[], always estimate:
-            "power_w": power_w,
-            "when": when_iso,
-            "model": model or "",
-        }
+        Model, firmware and J/TH are detected on the first poll and cached per miner;
+        later polls skip VERSION until the miner reboots (Elapsed goes backwards) or
+        MINER_METADATA_TTL expires.
+
+        In capture mode (capture_dir / MINER_CAPTURE_DIR) the raw replies are also
+        written to a fixture file for helpers/replay_captures.py.
+        """
+        key = (self.ip, self.port)
+        # Captures always record all three commands, so they bypass the metadata cache
+        meta = None if self.capture_dir else _cached_metadata(key)
+        self._raw = {}
+        replies = self._fetch_replies(_POLL_COMMANDS if meta else _NORMALIZE_COMMANDS)
+        if meta is not None and _rebooted(meta, replies["summary"]):
+            meta = None
+        if meta is None and "version" not in replies:
+            try:
+                # {"VERSION":[{...}], "STATUS":[{...}]}, varies by FW
+                replies["version"] = self.get_version()
+            except Exception:
+                replies["version"] = {}
+        result = _normalize_replies(key, replies, meta)
+        if self.capture_dir:
+            _write_capture(self.capture_dir, self.ip, self.port, self._raw, _METADATA_CACHE[key])
+        return result
 
     def get_summary(self) -> dict:
-        return self._send_command("summary")
+        return self._send_command("summary", poll=True)
 
     def get_stats(self) -> dict:
-        return self._send_command("stats")
+        return self._send_command("stats", poll=True)
 
     def get_pools(self) -> dict:
         return self._send_command("pools")
@@ -223,7 +895,7 @@ class MinerClient:
         return self._send_command("log")
 
     def get_version(self) -> dict:
-        return self._send_command("version")
+        return self._send_command("version", poll=True)
 
     # ---- Pool management ----
     def add_pool(self, url: str, username: str, password: str = "") -> dict:
@@ -297,7 +969,8 @@ class MinerClient:
         """
         import requests
         from requests.auth import HTTPDigestAuth
-        from miner_config import MINER_USERNAME, MINER_PASSWORD
+
+        from miner_config import MINER_PASSWORD, MINER_USERNAME
 
         # Try configured credentials first, then common defaults
         credentials = [
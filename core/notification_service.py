@@ -9,10 +9,25 @@ from typing import Optional, List
 import requests
 from miner_config import SMTP_SERVER, SMTP_PORT, ALERT_EMAIL
 from core.db import Alert, AlertRule, SessionLocal
+from core.write_queue import WRITE_QUEUE
 
 logger = logging.getLogger(__name__)
 
 
+def _set_notification_status(session, alert_id: int, status: str, notified_at: datetime) -> int:
+    return (
+        session.query(Alert)
+        .filter(Alert.id == alert_id)
+        .update({"notified_at": notified_at, "notification_status": status},
+                synchronize_session=False)
+    )
+
+
+def _log_status_failure(future) -> None:
+    if future.exception() is not None:
+        logger.error(f"Failed to update alert notification status: {future.exception()}")
+
+
 class NotificationService:
     """Handles sending notifications for alerts."""
 
@@ -55,18 +70,9 @@ class NotificationService:
             if self._send_webhook(alert, rule):
                 success = True
 
-        # Update alert notification status
-        session = SessionLocal()
-        try:
-            db_alert = session.query(Alert).filter(Alert.id == alert.id).first()
-            if db_alert:
-                db_alert.notified_at = datetime.utcnow()
-                db_alert.notification_status = 'sent' if success else 'failed'
-                session.commit()
-        except Exception as e:
-            logger.exception("Failed to update alert notification status", exc_info=e)
-        finally:
-            session.close()
+        # Update alert notification status (queued; the result is only logged)
+        WRITE_QUEUE.submit(_set_notification_status, alert.id, 'sent' if success else 'failed',
+                           datetime.utcnow(), callback=_log_status_failure)
 
         return success
 
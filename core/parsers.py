@@ -0,0 +1,177 @@
+"""Firmware-family parsers for the per-poll numbers in SUMMARY/STATS replies.
+
+Rather than lowercasing every STATS key on every poll to find temp*/fan* fields, the
+first poll of a miner learns a FieldMap (which keys hold its hashrate, temperatures
+and fan speeds) with its firmware family's rules. Later polls of that miner are plain
+dict lookups. Unknown firmware uses the generic key scan, learned and cached the same
+way. The map lives on the miner's cached MinerMetadata (core/miner.py).
+
+Every parser yields the same avg_temp_c/avg_fan_rpm the generic scan does for its
+firmware's replies; the family rules only say where the fields live and which field
+identifies the layout. Firmware without rules of its own (e.g. Braiins) uses the
+generic parser.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+# SUMMARY hashrate keys in preference order, with the divisor to TH/s
+HASHRATE_FIELDS = (
+    ("GHS 5s", 1_000.0), ("GHS av", 1_000.0), ("GHS 1s", 1_000.0),
+    ("MHS 5s", 1_000_000.0), ("MHS av", 1_000_000.0), ("MHS 1s", 1_000_000.0),
+)
+
+
+def _to_float(x):
+    # noinspection PyBroadException
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+
+def _avg(seq):
+    vals = [v for v in (_to_float(s) for s in seq) if v is not None]
+    return sum(vals) / len(vals) if vals else 0.0
+
+
+def detect_family(ver: dict) -> str:
+    """Coarse firmware family from VERSION: antminer (stock), vnish, braiins, whatsminer."""
+    v0 = (ver.get("VERSION") or [{}])[0] if isinstance(ver, dict) else {}
+    keys = {str(k).lower() for k in v0}
+    text = " ".join(str(v) for v in v0.values()).lower()
+    if "vnish" in text:
+        return "vnish"
+    if "bosminer" in keys or "braiins" in text:
+        return "braiins"
+    if "btminer" in keys or "whatsminer" in text:
+        return "whatsminer"
+    if "bmminer" in keys or "cgminer" in keys:
+        return "antminer"
+    return "unknown"
+
+
+@dataclass(frozen=True)
+class FieldMap:
+    """Where one miner's per-poll numbers live. Fields are (section, index, key)."""
+    family: str
+    hashrate: tuple | None  # (SUMMARY key, divisor to TH/s)
+    temps: tuple
+    fans: tuple
+    stats_entries: int  # len(STATS) when learned; a different layout means re-learn
+    marker: tuple | None = None  # a field of the family's own layout (its first temp/fan field)
+
+    def fits(self, summ: dict, stats: dict) -> bool:
+        """Whether a reply still has the learned layout: same hashrate key, STATS length
+        and family-specific marker field."""
+        sections = {"SUMMARY": summ.get("SUMMARY") or [{}], "STATS": stats.get("STATS") or []}
+        if self.hashrate is not None and self.hashrate[0] not in sections["SUMMARY"][0]:
+            return False
+        if len(sections["STATS"]) != self.stats_entries:
+            return False
+        if self.marker is not None:
+            section, index, key = self.marker
+            return index < len(sections[section]) and key in sections[section][index]
+        return True
+
+    def extract(self, summ: dict, stats: dict) -> tuple:
+        """(hashrate_ths, temps, fans) by direct lookup."""
+        sections = {"SUMMARY": summ.get("SUMMARY") or [{}], "STATS": stats.get("STATS") or []}
+        ths = 0.0
+        if self.hashrate is not None:
+            key, divisor = self.hashrate
+            ths = (_to_float(sections["SUMMARY"][0].get(key)) or 0.0) / divisor
+        return ths, self._values(sections, self.temps), self._values(sections, self.fans)
+
+    @staticmethod
+    def _values(sections: dict, fields: tuple) -> list:
+        out = []
+        for section, index, key in fields:
+            fv = _to_float(sections[section][index].get(key))
+            if fv is not None:
+                out.append(fv)
+        return out
+
+
+class FirmwareParser:
+    """Generic rules: any numeric STATS key starting with temp/fan (case-insensitive)."""
+    family = "unknown"
+
+    def learn(self, summ: dict, stats: dict) -> FieldMap:
+        s0 = (summ.get("SUMMARY") or [{}])[0]
+        entries = stats.get("STATS") or []
+        temps = tuple(self._temp_fields(s0, entries))
+        fans = tuple(self._fan_fields(s0, entries))
+        return FieldMap(
+            family=self.family,
+            hashrate=next(((k, d) for k, d in HASHRATE_FIELDS if k in s0), None),
+            temps=temps,
+            fans=fans,
+            stats_entries=len(entries),
+            marker=self._marker(entries, temps + fans),
+        )
+
+    def _marker(self, entries: list, fields: tuple):
+        return fields[0] if fields else None
+
+    def _temp_fields(self, s0: dict, entries: list):
+        return self._scan(entries, "temp")
+
+    def _fan_fields(self, s0: dict, entries: list):
+        return self._scan(entries, "fan")
+
+    @staticmethod
+    def _scan(entries: list, prefix: str):
+        for i, entry in enumerate(entries):
+            for key, val in entry.items():
+                if str(key).lower().startswith(prefix) and _to_float(val) is not None:
+                    yield "STATS", i, key
+
+
+class AntminerParser(FirmwareParser):
+    """Stock bmminer: per-chain temp1..N (PCB), temp2_1..N (chip), temp_max and fan1..N
+    in the STATS entry after the version header, found with the generic prefix scan
+    (the temp_num/fan_num sensor counts included, as the generic scan has always
+    averaged them).
+
+    The layout is identified by that entry's temp_num/fan_num keys, which other
+    firmware does not report.
+    """
+    family = "antminer"
+    LAYOUT_KEYS = ("temp_num", "fan_num")
+
+    def _marker(self, entries, fields):
+        for i, entry in enumerate(entries):
+            for key in self.LAYOUT_KEYS:
+                if key in entry:
+                    return "STATS", i, key
+        return super()._marker(entries, fields)
+
+
+class VnishParser(AntminerParser):
+    """VNish keeps the stock bmminer STATS layout."""
+    family = "vnish"
+
+
+class WhatsminerParser(FirmwareParser):
+    """btminer: board temperature and both fan speeds are reported in SUMMARY."""
+    family = "whatsminer"
+    TEMP_KEYS = ("Temperature",)
+    FAN_KEYS = ("Fan Speed In", "Fan Speed Out")
+
+    def _temp_fields(self, s0, entries):
+        return [("SUMMARY", 0, k) for k in self.TEMP_KEYS if k in s0]
+
+    def _fan_fields(self, s0, entries):
+        return [("SUMMARY", 0, k) for k in self.FAN_KEYS if k in s0]
+
+
+GENERIC_PARSER = FirmwareParser()
+
+# Detected firmware family -> parser
+PARSERS = {p.family: p
+           for p in (AntminerParser(), VnishParser(), WhatsminerParser())}
+
+
+def parser_for(family: str) -> FirmwareParser:
+    return PARSERS.get(family, GENERIC_PARSER)
@@ -23,6 +23,7 @@ import joblib
 import os
 from sqlalchemy import text
 from core.db import SessionLocal, Miner
+from core.archive import load_history
 
 logger = logging.getLogger(__name__)
 
@@ -126,46 +127,27 @@ class PredictiveAnalyticsEngine:
             end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=days)
 
-            # Use SessionLocal for database queries
+            # Archived days come from the memory-mapped cold archive, recent ones from the DB
             session = SessionLocal()
             try:
-                query = text("""
-                             SELECT m.timestamp,
-                                    m.hashrate_ths as hashrate,
-                                    m.avg_temp_c as temperature,
-                                    m.avg_fan_rpm as fan_speed,
-                                    m.power_w as power_consumption,
-                                    0 as rejected_shares,
-                                    0 as accepted_shares,
-                                    COALESCE(mn.uptime_s, 0) as uptime,
-                                    mn.model,
-                                    mn.firmware_version
-                             FROM metrics m
-                                      JOIN miners mn ON m.miner_ip = mn.miner_ip
-                             WHERE m.miner_ip = :miner_id
-                               AND m.timestamp >= :start_date
-                               AND m.timestamp <= :end_date
-                             ORDER BY m.timestamp
-                             """)
-
-                result = session.execute(query, {
-                    'miner_id': miner_id,
-                    'start_date': start_date,
-                    'end_date': end_date
-                })
-
-                data = result.fetchall()
-                if not data:
+                miner = session.query(Miner).filter(Miner.miner_ip == miner_id).first()
+                if miner is None:
+                    return pd.DataFrame()
+                history = load_history(miner_id, start_date, end_date, session=session)
+                if history.empty:
                     return pd.DataFrame()
             finally:
                 session.close()
 
-            # Convert to DataFrame
-            df = pd.DataFrame(data, columns=[
-                'timestamp', 'hashrate', 'temperature', 'fan_speed',
-                'power_consumption', 'rejected_shares', 'accepted_shares',
-                'uptime', 'model', 'firmware_version'
-            ])
+            df = history.rename(columns={
+                'hashrate_ths': 'hashrate', 'avg_temp_c': 'temperature',
+                'avg_fan_rpm': 'fan_speed', 'power_w': 'power_consumption',
+            }).drop(columns=['elapsed_s'])
+            df['rejected_shares'] = 0
+            df['accepted_shares'] = 0
+            df['uptime'] = miner.uptime_s or 0
+            df['model'] = miner.model
+            df['firmware_version'] = miner.firmware_version
 
             # Calculate derived features
             df['rejection_rate'] = df['rejected_shares'] / (df['accepted_shares'] + df['rejected_shares'] + 1e-6)
@@ -3,8 +3,9 @@ from __future__ import annotations
 import logging
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, List, Any
-from sqlalchemy import func, and_
-from core.db import SessionLocal, ProfitabilitySnapshot, Metric, Miner
+from core.db import SessionLocal, ProfitabilitySnapshot, Miner, BULK_WRITER, metrics_source
+from core.fleet_state import FLEET_STATE
+from core.write_queue import WRITE_QUEUE
 from helpers.utils import csv_efficiency_for_model
 from miner_config import DEFAULT_POWER_COST
 
@@ -26,6 +27,13 @@ BLOCKS_PER_DAY = 144  # ~10 min per block
 BLOCK_REWARD = 3.125  # Current reward after 2024 halving
 SATS_PER_BTC = 100_000_000
 
+# Profitability dict keys stored on each snapshot row (column names match)
+SNAPSHOT_FIELDS = (
+    'btc_price_usd', 'network_difficulty', 'hashrate_ths', 'power_w', 'power_cost_usd_per_kwh',
+    'daily_power_cost_usd', 'estimated_btc_per_day', 'estimated_revenue_usd_per_day',
+    'daily_profit_usd', 'profit_margin_pct', 'break_even_btc_price',
+)
+
 
 class ProfitabilityEngine:
     """Calculate mining profitability metrics."""
@@ -58,10 +66,11 @@ class ProfitabilityEngine:
         Returns dict with profitability metrics or None if insufficient data.
         """
         # Get latest metric
+        m = metrics_source()
         metric = (
-            self.session.query(Metric)
-            .filter(Metric.miner_ip == miner_ip)
-            .order_by(Metric.timestamp.desc())
+            self.session.query(m)
+            .filter(m.miner_ip == miner_ip)
+            .order_by(m.timestamp.desc())
             .first()
         )
 
@@ -110,22 +119,8 @@ class ProfitabilityEngine:
         
         Returns dict with fleet-wide profitability metrics.
         """
-        # Get latest metrics for all miners
-        latest_subq = (
-            self.session.query(
-                Metric.miner_ip.label('ip'),
-                func.max(Metric.timestamp).label('last_ts')
-            ).group_by(Metric.miner_ip).subquery()
-        )
-
-        metrics = (
-            self.session.query(Metric)
-            .join(latest_subq, and_(
-                Metric.miner_ip == latest_subq.c.ip,
-                Metric.timestamp == latest_subq.c.last_ts
-            ))
-            .all()
-        )
+        # Latest metrics for all miners (in-memory fleet state)
+        metrics = FLEET_STATE.snapshot().all()
 
         if not metrics:
             logger.warning("No metrics found for fleet profitability calculation")
@@ -416,30 +411,27 @@ class ProfitabilityEngine:
         Returns:
             True if saved successfully
         """
-        try:
-            snapshot = ProfitabilitySnapshot(
-                miner_ip=miner_ip,
-                btc_price_usd=profitability_data.get('btc_price_usd'),
-                network_difficulty=profitability_data.get('network_difficulty'),
-                hashrate_ths=profitability_data.get('hashrate_ths'),
-                power_w=profitability_data.get('power_w'),
-                power_cost_usd_per_kwh=profitability_data.get('power_cost_usd_per_kwh'),
-                daily_power_cost_usd=profitability_data.get('daily_power_cost_usd'),
-                estimated_btc_per_day=profitability_data.get('estimated_btc_per_day'),
-                estimated_revenue_usd_per_day=profitability_data.get('estimated_revenue_usd_per_day'),
-                daily_profit_usd=profitability_data.get('daily_profit_usd'),
-                profit_margin_pct=profitability_data.get('profit_margin_pct'),
-                break_even_btc_price=profitability_data.get('break_even_btc_price')
-            )
+        return self.save_snapshots([(profitability_data, miner_ip)]) == 1
 
-            self.session.add(snapshot)
-            self.session.commit()
-            return True
+    def save_snapshots(self, snapshots: List[tuple]) -> int:
+        """
+        Save many (profitability_data, miner_ip) snapshots with one batched insert.
 
+        Returns:
+            Number of snapshots saved (0 on failure)
+        """
+        now = datetime.utcnow()
+        rows = [
+            (now, miner_ip) + tuple(data.get(f) for f in SNAPSHOT_FIELDS)
+            for data, miner_ip in snapshots
+        ]
+        try:
+            columns = ('timestamp', 'miner_ip') + SNAPSHOT_FIELDS
+            return WRITE_QUEUE.run(
+                lambda ws: BULK_WRITER.write(ProfitabilitySnapshot, columns, rows, session=ws))
         except Exception as e:
             logger.exception("Failed to save profitability snapshot", exc_info=e)
-            self.session.rollback()
-            return False
+            return 0
 
     def get_profitability_history(self, miner_ip: Optional[str] = None,
                                   days: int = 7) -> List[ProfitabilitySnapshot]:
@@ -476,14 +468,4 @@ class ProfitabilityEngine:
         Returns:
             List of miner IP addresses that are currently active
         """
-        cutoff = datetime.utcnow() - timedelta(hours=hours_threshold)
-
-        # Get miners with recent metrics
-        recent_metrics = (
-            self.session.query(Metric.miner_ip)
-            .filter(Metric.timestamp >= cutoff)
-            .distinct()
-            .all()
-        )
-
-        return [m.miner_ip for m in recent_metrics if m.miner_ip]
+        return FLEET_STATE.snapshot().ips(fresh_within=hours_threshold * 60)
@@ -0,0 +1,350 @@
+"""Retention policies: purge old rows in bounded chunks and hand free pages back to the OS.
+
+Each policy deletes rows older than its cutoff RETENTION_CHUNK_ROWS at a time, one short
+transaction per chunk with a pause in between, so web threads and the poller never wait
+behind one long write lock. Raw metrics are only deleted up to the rollup high-water
+mark, so nothing is purged before it has been folded into the rollup tables, and, while
+the cold archive is enabled (ARCHIVE_INTERVAL > 0), only before ARCHIVE.archived_until(),
+so a day the archiver has not copied yet (disabled run, failures, first-deploy backlog)
+is kept rather than lost.
+
+With METRICS_PARTITIONED, raw metrics live in monthly files: rows left in main.metrics
+are purged as above, and a month whose every row is past the cutoff (and rolled up) is
+dropped by unlinking its file. With METRICS_COMPACT the same metrics policy also purges
+metrics_compact (epoch-second cutoff, deleted by primary key).
+
+For the process database, each chunk and each vacuum step is a write-queue job
+(core/write_queue.py), so retention never holds the write lock from a second connection.
+Other binds (tests, the CLI against another file) use short transactions of their own.
+
+Afterwards `PRAGMA incremental_vacuum` returns freed pages in steps. That needs
+auto_vacuum=INCREMENTAL: new databases get it from the engine's connect pragmas, and
+existing ones need a one-off VACUUM (python -m core.retention --enable-incremental-vacuum).
+On PostgreSQL (DATABASE_URL) chunks are deleted by ctid, no PRAGMA is issued (the vacuum
+and WAL checkpoint steps are skipped) and autovacuum reclaims space.
+
+Usage:
+  python -m core.retention [--dry-run] [--enable-incremental-vacuum]
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, replace
+
+from sqlalchemy import DateTime, bindparam, text
+
+from core.archive import ARCHIVE
+from core.db import COMPACT, COMPACT_ID_SHIFT, PARTITIONS, EpochSeconds, engine
+from core.write_queue import WRITE_QUEUE
+from miner_config import (
+    ARCHIVE_INTERVAL,
+    RETENTION_CHUNK_PAUSE,
+    RETENTION_CHUNK_ROWS,
+    RETENTION_DAYS,
+    RETENTION_VACUUM_PAGES,
+)
+
+logger = logging.getLogger(__name__)
+
+# table -> column holding the row's time
+TIME_COLUMNS = {
+    "metrics": "timestamp",
+    "metrics_1m": "bucket",
+    "metrics_5m": "bucket",
+    "metrics_1h": "bucket",
+    "metrics_1d": "bucket",
+    "events": "timestamp",
+    "error_events": "created_at",
+    "command_history": "timestamp",
+    "profitability_snapshots": "timestamp",
+}
+
+# Extra delete conditions per table
+GUARDS = {
+    # Keep raw rows the rollup job has not folded in yet
+    "metrics": (
+        "id <= COALESCE((SELECT last_metric_id FROM rollup_state WHERE name = 'metrics'), 0)"
+    ),
+    "metrics_compact": (
+        f"ts * {COMPACT_ID_SHIFT} + miner_id <= "
+        "COALESCE((SELECT last_metric_id FROM rollup_state WHERE name = 'metrics_compact'), 0)"
+    ),
+}
+
+_AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+# Report of the most recent run_retention() (see /api/debug/retention)
+LAST_RETENTION_REPORT: dict = {}
+
+
+@dataclass
+class RetentionPolicy:
+    table: str
+    column: str
+    days: int
+    guard: str | None = None
+    key: str = "rowid"  # row identity for chunked deletes (WITHOUT ROWID tables use their PK)
+    epoch: bool = False  # time column holds epoch seconds
+    until: dt.datetime | None = None  # rows at or after this are kept too (archive progress)
+
+    def cutoff(self, now: dt.datetime) -> dt.datetime:
+        cutoff = now - dt.timedelta(days=self.days)
+        return min(cutoff, self.until) if self.until is not None else cutoff
+
+    def _where(self) -> str:
+        where = f"{self.column} < :cutoff"
+        return f"{where} AND {self.guard}" if self.guard else where
+
+    def _cutoff_param(self):
+        return bindparam("cutoff", type_=EpochSeconds if self.epoch else DateTime)
+
+    def count_sql(self):
+        return text(f"SELECT COUNT(*) FROM {self.table} WHERE {self._where()}").bindparams(
+            self._cutoff_param())
+
+    def delete_sql(self):
+        return text(
+            f"DELETE FROM {self.table} WHERE ({self.key}) IN "
+            f"(SELECT {self.key} FROM {self.table} WHERE {self._where()} LIMIT :limit)"
+        ).bindparams(self._cutoff_param())
+
+
+def policies(days: dict = None) -> list:
+    """Active policies from `days` (default RETENTION_DAYS); 0 or unknown tables are skipped."""
+    days = RETENTION_DAYS if days is None else days
+    out = []
+    for table, keep in days.items():
+        if table not in TIME_COLUMNS:
+            logger.warning(f"retention_unknown_table table={table}")
+            continue
+        if keep and keep > 0:
+            out.append(RetentionPolicy(table, TIME_COLUMNS[table], int(keep), GUARDS.get(table)))
+    return out
+
+
+def _in_transaction(fn, bind, queue=None):
+    """fn(connection) as a `queue` job, or in its own transaction on `bind`."""
+    if queue is not None:
+        return queue.run(lambda ws: fn(ws.connection()))
+    with bind.begin() as conn:
+        return fn(conn)
+
+
+def purge(policy: RetentionPolicy, bind=None, now: dt.datetime = None,
+          chunk_rows: int = RETENTION_CHUNK_ROWS, pause_s: float = RETENTION_CHUNK_PAUSE,
+          queue=None) -> dict:
+    """Delete rows past the policy cutoff, `chunk_rows` per transaction (or `queue` job).
+    Returns counts."""
+    bind = bind if bind is not None else engine
+    cutoff = policy.cutoff(now or dt.datetime.utcnow())
+    stmt = policy.delete_sql()
+    params = {"cutoff": cutoff, "limit": chunk_rows}
+    deleted = chunks = 0
+    while True:
+        n = _in_transaction(lambda conn: conn.execute(stmt, params).rowcount or 0, bind, queue)
+        if n <= 0:
+            break
+        deleted += n
+        chunks += 1
+        if n < chunk_rows:
+            break
+        if pause_s:
+            time.sleep(pause_s)  # let other writers in between chunks
+    return {"deleted": deleted, "chunks": chunks, "cutoff": cutoff.isoformat() + "Z"}
+
+
+def drop_partitions(policy: RetentionPolicy, partitions, now: dt.datetime = None) -> dict:
+    """Unlink monthly metrics files that end before the cutoff and are fully rolled up."""
+    cutoff = policy.cutoff(now or dt.datetime.utcnow())
+    dropped, pending = [], []
+    for key in partitions.months():
+        if partitions.month_bounds(key)[1] > cutoff:
+            break
+        with partitions.bind.connect() as conn:
+            rolled = conn.exec_driver_sql(
+                f"SELECT COUNT(*) FROM {partitions.schema(key)}.metrics "
+                f"WHERE NOT ({policy.guard})").scalar()
+        if rolled == 0 and partitions.drop(key):
+            dropped.append(key)
+        else:
+            pending.append(key)
+    return {"dropped": dropped, "pending": pending, "cutoff": cutoff.isoformat() + "Z"}
+
+
+def _for_dialect(policy: RetentionPolicy, dialect: str) -> RetentionPolicy:
+    """PostgreSQL has no rowid; chunked deletes address rows by ctid there."""
+    if dialect == "postgresql" and policy.key == "rowid":
+        return replace(policy, key="ctid")
+    return policy
+
+
+def _pragma(bind, name: str):
+    with bind.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def _vacuum_step(conn, pages: int) -> int:
+    """Free up to `pages` pages in the current transaction; returns how many were freed.
+
+    The sqlite3 module stops `PRAGMA incremental_vacuum(N)` after its first page, so the
+    pragma is repeated until `pages` are freed or the freelist stops shrinking.
+    """
+    before = free = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+    while free > 0 and before - free < pages:
+        conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(pages - (before - free))})")
+        remaining = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        if remaining >= free:
+            break
+        free = remaining
+    return before - free
+
+
+def incremental_vacuum(bind=None, pages_per_step: int = RETENTION_VACUUM_PAGES,
+                       pause_s: float = RETENTION_CHUNK_PAUSE, queue=None) -> dict:
+    """Return free pages to the filesystem in steps of `pages_per_step` (each a `queue`
+    job when given); a no-op unless auto_vacuum=INCREMENTAL."""
+    bind = bind if bind is not None else engine
+    if bind.dialect.name != "sqlite":
+        return {"auto_vacuum": "server", "vacuum_steps": 0, "pages_reclaimed": 0,
+                "bytes_reclaimed": 0}
+    mode = _AUTO_VACUUM_MODES.get(_pragma(bind, "auto_vacuum"), "unknown")
+    page_size = _pragma(bind, "page_size") or 0
+    free_before = _pragma(bind, "freelist_count") or 0
+    free = free_before
+    steps = 0
+    if mode == "incremental":
+        while free > 0:
+            freed = _in_transaction(lambda conn: _vacuum_step(conn, pages_per_step), bind, queue)
+            steps += 1
+            if freed <= 0:
+                break
+            free = _pragma(bind, "freelist_count") or 0
+            if free and pause_s:
+                time.sleep(pause_s)
+        # Checkpointing cannot run inside a transaction, so it stays off the write queue
+        with bind.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    elif free_before:
+        logger.info(f"retention_vacuum_skipped auto_vacuum={mode} free_pages={free_before}")
+    reclaimed = free_before - free
+    return {
+        "auto_vacuum": mode,
+        "vacuum_steps": steps,
+        "free_pages_before": free_before,
+        "free_pages_after": free,
+        "pages_reclaimed": reclaimed,
+        "bytes_reclaimed": reclaimed * page_size,
+    }
+
+
+def _file_bytes(bind) -> int | None:
+    path = bind.url.database
+    if bind.dialect.name != "sqlite" or not path or path == ":memory:":
+        return None
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def run_retention(bind=None, now: dt.datetime = None, days: dict = None, dry_run: bool = False,
+                  chunk_rows: int = RETENTION_CHUNK_ROWS, pause_s: float = RETENTION_CHUNK_PAUSE,
+                  vacuum: bool = True, archive=None, queue=None) -> dict:
+    """
+    Apply every retention policy, then incrementally vacuum.
+
+    Returns (and keeps in LAST_RETENTION_REPORT) per-table deleted rows and cutoffs,
+    total rows deleted, pages/bytes reclaimed and the database file size before/after.
+    With dry_run, only counts what would be deleted. Raw metrics are also kept from
+    `archive`'s archived_until() on (default: ARCHIVE for the process database while
+    ARCHIVE_INTERVAL > 0; everything, when nothing is archived yet). Deletes and vacuum
+    steps run as `queue` jobs (default: WRITE_QUEUE for the process database).
+    """
+    bind = bind if bind is not None else engine
+    if queue is None and bind is engine:
+        queue = WRITE_QUEUE
+    if archive is None and bind is engine and ARCHIVE_INTERVAL > 0:
+        archive = ARCHIVE
+    archived_until = archive.archived_until() if archive is not None else None
+    now = now or dt.datetime.utcnow()
+    started = time.perf_counter()
+    file_before = _file_bytes(bind)
+    tables = {}
+    partitions = PARTITIONS if PARTITIONS is not None and PARTITIONS.bind is bind else None
+    work = []
+    for policy in policies(days):
+        if archive is not None and policy.table == "metrics":
+            policy = replace(policy, until=archived_until or dt.datetime.min)
+        if partitions is not None and policy.table == "metrics":
+            # Month files are dropped whole; main.metrics keeps rows from before partitioning
+            if not dry_run:
+                try:
+                    tables["metrics_partitions"] = drop_partitions(policy, partitions, now)
+                except Exception as e:
+                    logger.warning(f"retention_partition_drop_failed error={e}")
+                    tables["metrics_partitions"] = {"error": str(e)}
+            policy = replace(policy, table="main.metrics")
+        work.append(_for_dialect(policy, bind.dialect.name))
+        if COMPACT is not None and COMPACT.bind is bind and policy.table == "metrics":
+            work.append(RetentionPolicy("metrics_compact", "ts", policy.days,
+                                        GUARDS["metrics_compact"], key="miner_id, ts",
+                                        epoch=True, until=policy.until))
+    for policy in work:
+        try:
+            if dry_run:
+                cutoff = policy.cutoff(now)
+                with bind.connect() as conn:
+                    n = conn.execute(policy.count_sql(), {"cutoff": cutoff}).scalar() or 0
+                tables[policy.table] = {"would_delete": n, "cutoff": cutoff.isoformat() + "Z"}
+            else:
+                tables[policy.table] = purge(policy, bind, now, chunk_rows=chunk_rows,
+                                             pause_s=pause_s, queue=queue)
+        except Exception as e:
+            logger.warning(f"retention_purge_failed table={policy.table} error={e}")
+            tables[policy.table] = {"error": str(e)}
+
+    report = {
+        "finished_at": dt.datetime.utcnow().isoformat() + "Z",
+        "dry_run": dry_run,
+        "tables": tables,
+        "rows_deleted": sum(t.get("deleted", 0) for t in tables.values()),
+        "archived_until": archived_until.isoformat() + "Z" if archived_until else None,
+    }
+    if vacuum and not dry_run:
+        report.update(incremental_vacuum(bind, pause_s=pause_s, queue=queue))
+    report["file_bytes_before"] = file_before
+    report["file_bytes_after"] = _file_bytes(bind)
+    report["duration_s"] = round(time.perf_counter() - started, 3)
+    if not dry_run:
+        LAST_RETENTION_REPORT.clear()
+        LAST_RETENTION_REPORT.update(report)
+    return report
+
+
+def enable_incremental_vacuum(bind=None) -> str:
+    """Switch an existing database to auto_vacuum=INCREMENTAL (rewrites the file with VACUUM)."""
+    bind = bind if bind is not None else engine
+    if bind.dialect.name != "sqlite":
+        raise ValueError("incremental vacuum is a SQLite setting; PostgreSQL relies on autovacuum")
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+    return _AUTO_VACUUM_MODES.get(_pragma(bind, "auto_vacuum"), "unknown")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Apply retention policies to the metrics database.")
+    p.add_argument("--dry-run", action="store_true", help="Only count rows past each cutoff")
+    p.add_argument("--enable-incremental-vacuum", action="store_true",
+                   help="Convert the database to auto_vacuum=INCREMENTAL first (full VACUUM)")
+    args = p.parse_args(argv)
+    if args.enable_incremental_vacuum:
+        print(f"auto_vacuum={enable_incremental_vacuum()}")
+    print(json.dumps(run_retention(dry_run=args.dry_run), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,298 @@
+"""Multi-resolution rollups of the metrics table (1m, 5m, 1h, 1d).
+
+Each metrics_<label> table holds one row per (miner_ip, bucket start) with the sample
+count, the newest sample time, and min/max/avg/last of hashrate, power, temperature and
+fan speed. update_rollups() folds new metrics rows in by id, starting after the
+high-water mark kept in rollup_state; each chunk (all four resolutions plus the new
+mark) commits in one transaction, so a crash never double-counts. Late rows with old
+timestamps still land in the right bucket because progress is tracked by id.
+
+With METRICS_COMPACT the source is the compact layout (its synthetic ids grow with
+time) and progress is kept under its own rollup_state name.
+
+The scheduler runs run_rollups(), which submits one chunk per write-queue job
+(core/write_queue.py), so a long catch-up interleaves with the other writers instead of
+taking the write lock from a second connection.
+
+Readers call choose_resolution() with the requested window and point budget and read
+raw metrics only when that is cheap enough.
+"""
+from __future__ import annotations
+
+import datetime as dt
+
+from sqlalchemy import case, func, select
+
+from core.db import (
+    COMPACT,
+    ROLLUP_FIELDS,
+    ROLLUP_MODELS,
+    ROLLUP_RESOLUTIONS,
+    RollupState,
+    SessionLocal,
+    metrics_source,
+    upsert_insert,
+)
+from core.write_queue import WRITE_QUEUE
+from miner_config import POLL_INTERVAL, ROLLUP_BATCH_ROWS, ROLLUP_MAX_BATCHES
+
+STATE_NAME = "metrics"
+_EPOCH = dt.datetime(1970, 1, 1)
+
+
+def bucket_start(ts: dt.datetime, seconds: int) -> dt.datetime:
+    """Start of the `seconds`-wide bucket containing naive-UTC `ts`."""
+    offset = int((ts - _EPOCH).total_seconds())
+    return _EPOCH + dt.timedelta(seconds=offset - offset % seconds)
+
+
+def choose_resolution(window_s: float, max_points: int) -> str | None:
+    """
+    Resolution for reading a window of `window_s` seconds in at most `max_points`
+    points per miner: None (raw rows) if poll-interval samples fit, else the finest
+    rollup label whose bucket count fits, else the coarsest rollup.
+    """
+    max_points = max(1, int(max_points))
+    if window_s / max(POLL_INTERVAL, 1) <= max_points:
+        return None
+    for label, seconds in ROLLUP_RESOLUTIONS.items():
+        if window_s / seconds <= max_points:
+            return label
+    return list(ROLLUP_RESOLUTIONS)[-1]
+
+
+# ---- aggregation ----
+def _aggregate(rows, seconds: int) -> list:
+    """Rollup rows for one resolution from (id, timestamp, miner_ip, *ROLLUP_FIELDS) tuples."""
+    groups = {}
+    n = len(ROLLUP_FIELDS)
+    for row in rows:
+        ts, ip, values = row[1], row[2], row[3:]
+        if ts is None or ip is None:
+            continue
+        key = (ip, bucket_start(ts, seconds))
+        g = groups.get(key)
+        if g is None:
+            # samples, last_ts, then per field: min, max, sum, count, last
+            g = groups[key] = [0, ts] + [None, None, 0.0, 0, None] * n
+        g[0] += 1
+        newer = ts >= g[1]
+        if newer:
+            g[1] = ts
+        for i, v in enumerate(values):
+            if v is None:
+                continue
+            base = 2 + i * 5
+            if g[base] is None or v < g[base]:
+                g[base] = v
+            if g[base + 1] is None or v > g[base + 1]:
+                g[base + 1] = v
+            g[base + 2] += v
+            g[base + 3] += 1
+            if newer or g[base + 4] is None:
+                g[base + 4] = v
+
+    out = []
+    for (ip, bucket), g in groups.items():
+        rec = {"miner_ip": ip, "bucket": bucket, "samples": g[0], "last_ts": g[1]}
+        for i, field in enumerate(ROLLUP_FIELDS):
+            base = 2 + i * 5
+            rec[f"{field}_min"] = g[base]
+            rec[f"{field}_max"] = g[base + 1]
+            rec[f"{field}_avg"] = g[base + 2] / g[base + 3] if g[base + 3] else None
+            rec[f"{field}_last"] = g[base + 4]
+        out.append(rec)
+    return out
+
+
+def _least(a, b):
+    return case((b.is_(None), a), (a.is_(None), b), (a <= b, a), else_=b)
+
+
+def _greatest(a, b):
+    return case((b.is_(None), a), (a.is_(None), b), (a >= b, a), else_=b)
+
+
+def _upsert_statement(model, dialect: str):
+    """INSERT ... ON CONFLICT that merges a chunk's bucket into an existing row."""
+    table = model.__table__
+    stmt = upsert_insert(table, dialect)
+    old, new = table.c, stmt.excluded
+    total = old.samples + new.samples
+    newer = new.last_ts >= old.last_ts
+    set_ = {"samples": total, "last_ts": _greatest(old.last_ts, new.last_ts)}
+    for field in ROLLUP_FIELDS:
+        avg = f"{field}_avg"
+        set_[f"{field}_min"] = _least(old[f"{field}_min"], new[f"{field}_min"])
+        set_[f"{field}_max"] = _greatest(old[f"{field}_max"], new[f"{field}_max"])
+        set_[avg] = case(
+            (new[avg].is_(None), old[avg]),
+            (old[avg].is_(None), new[avg]),
+            else_=(old[avg] * old.samples + new[avg] * new.samples) / total,
+        )
+        set_[f"{field}_last"] = case(
+            (new[f"{field}_last"].is_(None), old[f"{field}_last"]),
+            (newer, new[f"{field}_last"]),
+            else_=old[f"{field}_last"],
+        )
+    return stmt.on_conflict_do_update(index_elements=[old.miner_ip, old.bucket], set_=set_)
+
+
+_UPSERTS: dict = {}  # dialect name -> {label: statement}
+
+
+def _upserts(dialect: str) -> dict:
+    if dialect not in _UPSERTS:
+        _UPSERTS[dialect] = {label: _upsert_statement(model, dialect)
+                             for label, model in ROLLUP_MODELS.items()}
+    return _UPSERTS[dialect]
+
+
+def _source_query(hwm: int, limit: int):
+    """The next `limit` metrics rows after id `hwm` as (id, timestamp, miner_ip, *fields)."""
+    m = metrics_source()
+    q = (select(m.id, m.timestamp, m.miner_ip, *(getattr(m, f) for f in ROLLUP_FIELDS))
+         .where(m.id > hwm))
+    if COMPACT is not None:
+        q = q.where(m.timestamp >= COMPACT.id_time(hwm))  # range on the ts index
+    return q.order_by(m.id).limit(limit)
+
+
+def update_rollups(session=None, batch_rows: int = ROLLUP_BATCH_ROWS,
+                   max_batches: int = ROLLUP_MAX_BATCHES) -> dict:
+    """
+    Fold metrics rows past the high-water mark into every rollup table.
+
+    Processes up to `max_batches` chunks of `batch_rows` rows, one transaction each.
+    Returns {"rows", "batches", "high_water_mark", "caught_up"}.
+    """
+    close_session = session is None
+    session = session or SessionLocal()
+    try:
+        name = COMPACT.STATE_NAME if COMPACT is not None else STATE_NAME
+        state = session.get(RollupState, name)
+        if state is not None:
+            hwm = state.last_metric_id
+        else:
+            hwm = COMPACT.initial_mark(session) if COMPACT is not None else 0
+        rows_done = batches = 0
+        caught_up = False
+        while batches < max_batches:
+            rows = session.execute(_source_query(hwm, batch_rows)).all()
+            if not rows:
+                caught_up = True
+                break
+            conn = session.connection()
+            upserts = _upserts(conn.dialect.name)
+            for label, seconds in ROLLUP_RESOLUTIONS.items():
+                conn.execute(upserts[label], _aggregate(rows, seconds))
+            hwm = rows[-1][0]
+            session.merge(RollupState(name=name, last_metric_id=hwm,
+                                      updated_at=dt.datetime.utcnow()))
+            session.commit()
+            rows_done += len(rows)
+            batches += 1
+            if len(rows) < batch_rows:
+                caught_up = True
+                break
+        return {"rows": rows_done, "batches": batches, "high_water_mark": hwm,
+                "caught_up": caught_up}
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if close_session:
+            session.close()
+
+
+def run_rollups(queue=None, batch_rows: int = ROLLUP_BATCH_ROWS,
+                max_batches: int = ROLLUP_MAX_BATCHES) -> dict:
+    """update_rollups() through the write queue (default WRITE_QUEUE), one chunk per job.
+    Returns the same summary."""
+    queue = queue or WRITE_QUEUE
+    rows = batches = 0
+    step = {"high_water_mark": None, "caught_up": False}
+    while batches < max_batches:
+        step = queue.run(update_rollups, batch_rows=batch_rows, max_batches=1)
+        rows += step["rows"]
+        batches += step["batches"]
+        if step["caught_up"]:
+            break
+    return {"rows": rows, "batches": batches, "high_water_mark": step["high_water_mark"],
+            "caught_up": step["caught_up"]}
+
+
+# ---- reads ----
+def series_query(session, label: str, since: dt.datetime, ips=None):
+    """Rollup rows for `label` from the bucket containing `since` (all if None), oldest first."""
+    model = ROLLUP_MODELS[label]
+    q = session.query(model)
+    if since is not None:
+        q = q.filter(model.bucket >= bucket_start(since, ROLLUP_RESOLUTIONS[label]))
+    if ips:
+        q = q.filter(model.miner_ip.in_(list(ips)))
+    return q.order_by(model.bucket.asc(), model.miner_ip.asc())
+
+
+def series_values(session, label: str | None, since: dt.datetime, ips=None,
+                  limit: int = None) -> list:
+    """Rows for core.downsample.series_columns, oldest first: raw metrics when `label` is
+    None, else rollup buckets with their samples and avg/min/max per field. With `limit`,
+    the newest `limit` rows are returned, so a cap drops the start of the window."""
+    if label is None:
+        m = metrics_source(since)
+        q = session.query(m.timestamp, m.miner_ip, *[getattr(m, f) for f in ROLLUP_FIELDS])
+        ts, ip = m.timestamp, m.miner_ip
+    else:
+        model = ROLLUP_MODELS[label]
+        stats = [getattr(model, f"{f}_{stat}")
+                 for f in ROLLUP_FIELDS for stat in ("avg", "min", "max")]
+        q = session.query(model.bucket, model.miner_ip, model.samples, *stats)
+        ts, ip = model.bucket, model.miner_ip
+        if since is not None:
+            since = bucket_start(since, ROLLUP_RESOLUTIONS[label])
+    if since is not None:
+        q = q.filter(ts >= since)
+    if ips:
+        q = q.filter(ip.in_(list(ips)))
+    if not limit:
+        return (q.order_by(ts.asc()) if label is None else q.order_by(ts.asc(), ip.asc())).all()
+    q = q.order_by(ts.desc()) if label is None else q.order_by(ts.desc(), ip.desc())
+    return q.limit(limit).all()[::-1]
+
+
+def rollup_point(row, detail: bool = False) -> dict:
+    """A rollup row in the /api/metrics row shape (averages), optionally with min/max/last."""
+    out = {
+        "timestamp": row.bucket.isoformat() + "Z",
+        "ip": row.miner_ip,
+        "power_w": row.power_w_avg,
+        "hashrate_ths": row.hashrate_ths_avg,
+        "avg_temp_c": row.avg_temp_c_avg,
+        "avg_fan_rpm": row.avg_fan_rpm_avg,
+    }
+    if detail:
+        out["samples"] = row.samples
+        for field in ROLLUP_FIELDS:
+            for stat in ("min", "max", "last"):
+                out[f"{field}_{stat}"] = getattr(row, f"{field}_{stat}")
+    return out
+
+
+def window_averages_query(session, label: str, since: dt.datetime, ips=None):
+    """Per-miner sample-weighted averages over rollup buckets from `since`.
+
+    Rows: ip, last_ts, hashrate_ths, power_w, avg_temp_c, avg_fan_rpm.
+    """
+    model = ROLLUP_MODELS[label]
+    cols = [
+        (func.sum(getattr(model, f"{f}_avg") * model.samples) / func.sum(model.samples)).label(f)
+        for f in ROLLUP_FIELDS
+    ]
+    q = (
+        session.query(model.miner_ip.label("ip"), func.max(model.last_ts).label("last_ts"), *cols)
+        .filter(model.bucket >= bucket_start(since, ROLLUP_RESOLUTIONS[label]))
+    )
+    if ips:
+        q = q.filter(model.miner_ip.in_(list(ips)))
+    return q.group_by(model.miner_ip)
@@ -0,0 +1,248 @@
+"""Single-writer queue: every mutation runs on one database connection, in order.
+
+Writers submit a function that takes a Session. One thread ("db-writer") owns the
+connection, runs queued jobs back to back and groups up to WRITE_QUEUE_MAX_BATCH of
+them into one transaction, so concurrent writers never contend for SQLite's write lock
+and a burst of small writes costs one commit. Each job runs in its own SAVEPOINT: a
+job that raises is rolled back alone and the rest of the group still commits. A job
+may call session.commit() or session.rollback(); that only releases or rolls back its
+savepoint, so existing helpers that commit (e.g. FirmwareFlashService.mark_progress)
+can be queued unchanged.
+
+submit() returns a concurrent.futures.Future that resolves with the function's return
+value once the group's transaction has committed (or with its exception); run() waits
+for it. Queue depth, jobs per transaction, queue wait and commit latency are in
+stats(), /api/debug/write_queue and the Prometheus exporter.
+
+Writes that deliberately bypass the queue: schema DDL and the miner_latest rebuild in
+setup_db (before the writer thread starts); VACUUM in enable_incremental_vacuum and
+PRAGMA wal_checkpoint, which SQLite refuses inside a transaction; creating, attaching
+and unlinking partition files; and the admin CRUD routes, which commit on their own
+request session.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.orm import Session
+
+from core.db import queue_engine
+from miner_config import WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_MAX_WAIT_MS, WRITE_QUEUE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "queued_at")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class WriteQueue:
+    """Serializes writes through one thread and connection (see module docstring)."""
+
+    def __init__(self, bind=None, max_batch: int = WRITE_QUEUE_MAX_BATCH,
+                 max_wait_ms: float = WRITE_QUEUE_MAX_WAIT_MS,
+                 timeout: float = WRITE_QUEUE_TIMEOUT):
+        self.bind = bind if bind is not None else queue_engine
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = timeout
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._session: Session | None = None  # the running job's session (writer thread only)
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0, "jobs": 0, "failed_jobs": 0, "transactions": 0,
+            "failed_transactions": 0, "max_depth": 0, "wait_s": 0.0, "max_wait_ms": 0.0,
+            "commit_s": 0.0, "last_commit_ms": 0.0, "max_commit_ms": 0.0, "last_batch_jobs": 0,
+        }
+
+    # ---- submitting ----
+    def submit(self, fn, *args, callback=None, **kwargs) -> Future:
+        """Queue fn(session, *args, **kwargs); returns a Future for its result.
+
+        `callback`, if given, is called with the Future once it is done (on the writer
+        thread, so it must not block).
+        """
+        job = _Job(fn, args, kwargs)
+        if callback is not None:
+            job.future.add_done_callback(callback)
+        self._ensure_started()
+        self._queue.put(job)
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], depth)
+        return job.future
+
+    def run(self, fn, *args, timeout: float = None, **kwargs):
+        """submit() and wait for the committed result (re-raises the job's exception).
+
+        Called from inside a queued job, fn runs directly in that job's savepoint, since
+        waiting on the queue from its own thread would deadlock.
+        """
+        if self._session is not None and threading.current_thread() is self._thread:
+            return fn(self._session, *args, **kwargs)
+        timeout = timeout if timeout is not None else self.timeout
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    # ---- writer thread ----
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """Block for one job, then take whatever else is queued (waiting up to max_wait_s)."""
+        job = self._queue.get()
+        if job is _STOP:
+            return None
+        jobs = [job]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(jobs) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    nxt = self._queue.get(timeout=remaining)
+                else:
+                    nxt = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _STOP:
+                self._queue.put(_STOP)  # finish this group, then stop
+                break
+            jobs.append(nxt)
+        return jobs
+
+    def _loop(self) -> None:
+        while True:
+            jobs = self._next_batch()
+            if jobs is None:
+                return
+            try:
+                self._run_group(jobs)
+            except Exception as e:  # never let the writer thread die
+                logger.exception("write_queue_group_failed", exc_info=e)
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+    def _run_group(self, jobs: list) -> None:
+        jobs = [j for j in jobs if j.future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        started = time.perf_counter()
+        wait_s = [started - j.queued_at for j in jobs]
+        outcomes = []
+        try:
+            with self.bind.connect() as conn:
+                trans = conn.begin()
+                try:
+                    for job in jobs:
+                        outcomes.append(self._run_job(conn, job))
+                    commit_started = time.perf_counter()
+                    trans.commit()
+                except BaseException:
+                    trans.rollback()
+                    raise
+            commit_s = time.perf_counter() - commit_started
+        except Exception as e:
+            logger.warning(f"write_queue_commit_failed jobs={len(jobs)} error={e}")
+            self._record(jobs, wait_s, None, failed_jobs=len(jobs))
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+        failed = sum(1 for _, error in outcomes if error is not None)
+        self._record(jobs, wait_s, commit_s, failed_jobs=failed)
+        for job, (value, error) in zip(jobs, outcomes, strict=True):
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(value)
+
+    def _run_job(self, conn, job: _Job) -> tuple:
+        """Run one job in its own savepoint; returns (value, exception)."""
+        session = Session(bind=conn, join_transaction_mode="create_savepoint",
+                          autoflush=False, expire_on_commit=False)
+        self._session = session
+        try:
+            value = job.fn(session, *job.args, **job.kwargs)
+            session.commit()
+            return value, None
+        except Exception as e:
+            session.rollback()
+            return None, e
+        finally:
+            self._session = None
+            session.close()
+
+    def close(self, timeout: float = None) -> None:
+        """Finish the queued jobs and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    # ---- stats ----
+    def _record(self, jobs: list, wait_s: list, commit_s: float | None, failed_jobs: int) -> None:
+        with self._lock:
+            st = self._stats
+            st["jobs"] += len(jobs)
+            st["failed_jobs"] += failed_jobs
+            st["wait_s"] += sum(wait_s)
+            st["max_wait_ms"] = max(st["max_wait_ms"], max(wait_s) * 1000.0)
+            st["last_batch_jobs"] = len(jobs)
+            if commit_s is None:
+                st["failed_transactions"] += 1
+                return
+            st["transactions"] += 1
+            st["commit_s"] += commit_s
+            st["last_commit_ms"] = commit_s * 1000.0
+            st["max_commit_ms"] = max(st["max_commit_ms"], commit_s * 1000.0)
+
+    def stats(self) -> dict:
+        """Queue depth, job/transaction counters, queue wait and commit latency in ms."""
+        with self._lock:
+            st = dict(self._stats)
+        txns = st["transactions"]
+        return {
+            "depth": self.depth(),
+            "max_depth": st["max_depth"],
+            "submitted": st["submitted"],
+            "jobs": st["jobs"],
+            "failed_jobs": st["failed_jobs"],
+            "transactions": txns,
+            "failed_transactions": st["failed_transactions"],
+            "avg_jobs_per_transaction": round(st["jobs"] / txns, 2) if txns else None,
+            "last_batch_jobs": st["last_batch_jobs"],
+            "avg_wait_ms": round(st["wait_s"] * 1000.0 / st["jobs"], 3) if st["jobs"] else None,
+            "max_wait_ms": round(st["max_wait_ms"], 3),
+            "avg_commit_ms": round(st["commit_s"] * 1000.0 / txns, 3) if txns else None,
+            "last_commit_ms": round(st["last_commit_ms"], 3),
+            "max_commit_ms": round(st["max_commit_ms"], 3),
+            "running": bool(self._thread and self._thread.is_alive()),
+        }
+
+
+# Process-wide writer used by the scheduler jobs, alert engine, firmware jobs and request handlers
+WRITE_QUEUE = WriteQueue()
@@ -1,7 +1,5 @@
-import re
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from auth import login_required
-from miner_config import EFFICIENCY_J_PER_TH
 
 dash_bp = Blueprint('dashboard', __name__)
 
@@ -22,10 +20,9 @@ def get_miners():
       - est_power_w (float)  # estimated using CSV J/TH and hashrate
     """
     from datetime import datetime, timezone
-    from sqlalchemy import func, and_
-    from core.db import SessionLocal, Metric, Miner
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    from core.miner import MinerClient
+    from core.db import ReadSessionLocal, Miner
+    from core.fleet_state import FLEET_STATE
+    from core.miner import get_cached_metadata
     from helpers.utils import csv_efficiency_for_model, efficiency_for_model
 
     # Freshness thresholds (seconds). Keep in sync with static/js/miners.js
@@ -38,128 +35,26 @@ def get_miners():
 
     now = datetime.now(timezone.utc)
 
-    s = SessionLocal()
+    # A pure read: no miner is contacted and nothing is written. Model, vendor, firmware and
+    # nominal efficiency are kept current by the scheduler's enrich_miner_metadata job.
+    s = ReadSessionLocal()
     try:
-        latest = (
-            s.query(
-                Metric.miner_ip.label('ip'),
-                func.max(Metric.timestamp).label('last_ts')
-            ).group_by(Metric.miner_ip).subquery()
-        )
-
-        rows = (
-            s.query(Metric)
-            .join(latest, and_(Metric.miner_ip == latest.c.ip,
-                               Metric.timestamp == latest.c.last_ts))
-            .order_by(Metric.miner_ip.asc())
-            .all()
-        )
-
-        # Best-effort model lookup in parallel
-        models = {}
+        rows = FLEET_STATE.snapshot().all()
         ips = [m.miner_ip for m in rows]
-        if ips:
-            def _fetch(ip):
-                try:
-                    return ip, MinerClient(ip).fetch_normalized().get('model', '')
-                except Exception:
-                    return ip, ''
-
-            with ThreadPoolExecutor(max_workers=min(8, len(ips))) as ex:
-                for fut in as_completed([ex.submit(_fetch, ip) for ip in ips]):
-                    ip, model = fut.result()
-                    models[ip] = model
-
-        # Load existing Miner metadata and create rows for new IPs
         miners_by_ip = {}
         if ips:
             for miner in s.query(Miner).filter(Miner.miner_ip.in_(ips)).all():
                 miners_by_ip[miner.miner_ip] = miner
-            created_any = False
-            for ip in ips:
-                if ip not in miners_by_ip:
-                    # Extract model and firmware version using the new _normalize_model function
-                    from helpers.utils import _normalize_model
-                    raw_model_name = models.get(ip, '')
-                    model_name, firmware_version = _normalize_model(raw_model_name, extract_firmware=True)
-
-                    # Guess vendor from model prefix
-                    vendor = None
-                    if model_name:
-                        low = model_name.lower()
-                        if 'antminer' in low or 'bitmain' in low:
-                            vendor = 'Bitmain'
-                        elif 'whatsminer' in low or 'microbt' in low:
-                            vendor = 'MicroBT'
-                        elif 'avalon' in low or 'canaan' in low:
-                            vendor = 'Canaan'
-
-                    try:
-                        # Add debug logging
-                        import logging
-                        logging.basicConfig(level=logging.DEBUG)
-                        logger = logging.getLogger(__name__)
-                        logger.debug(f"Processing miner: IP={ip}, Model='{model_name}', Firmware='{firmware_version}'")
-
-                        # Get efficiency data with multiple fallback strategies
-                        # Use the raw model name for lookups as it includes firmware info if present
-                        nominal_ths, csv_eff = 0.0, 0.0
-
-                        # Try to get from CSV first (uses raw model name internally)
-                        nominal_ths, csv_eff = csv_efficiency_for_model(raw_model_name)
-                        logger.debug(f"CSV lookup - Model: '{model_name}', Result: TH/s={nominal_ths}, J/TH={csv_eff}")
-
-                        # If CSV lookup failed or returned zeros, try the full efficiency lookup
-                        if not (nominal_ths and csv_eff) and model_name:
-                            eff = efficiency_for_model(raw_model_name)
-                            logger.debug(f"Efficiency lookup - Model: '{model_name}', Result: {eff} J/TH")
-                            if eff > 0:
-                                csv_eff = eff
-                                # If we still don't have nominal THs, try to estimate
-                                if not nominal_ths:
-                                    # Try to extract TH/s from model name (e.g., 'S19 Pro 110T' -> 110)
-                                    if model_name:
-                                        ths_match = re.search(r'(\d+)\s*(?:t|th|ths|terahash)', model_name,
-                                                              re.IGNORECASE)
-                                        if ths_match:
-                                            nominal_ths = float(ths_match.group(1))
-                                            logger.debug(f"Extracted TH/s from model name: {nominal_ths}")
-
-                                    # Default fallback if we couldn't determine from model name
-                                    if not nominal_ths:
-                                        nominal_ths = 100.0  # Reasonable default
-                                        logger.debug(f"Using default TH/s: {nominal_ths}")
-
-                        logger.debug(f"Final values - TH/s: {nominal_ths}, J/TH: {csv_eff}")
-
-                        # Create the miner with the best data we have
-                        miner = Miner(
-                            miner_ip=ip,
-                            vendor=vendor,
-                            model=model_name or None,
-                            firmware_version=firmware_version,
-                            nominal_ths=float(nominal_ths) if nominal_ths else None,
-                            nominal_efficiency_j_per_th=float(csv_eff) if csv_eff else None
-                        )
-                    except Exception as e:
-                        # Log the error but continue with defaults
-                        import logging
-                        logging.error(f"Error creating miner {ip}: {str(e)}")
-                        miner = Miner(
-                            miner_ip=ip,
-                            vendor=vendor,
-                            model=model_name or None,
-                            nominal_ths=100.0,  # Default values
-                            nominal_efficiency_j_per_th=EFFICIENCY_J_PER_TH
-                        )
-                    s.add(miner)
-                    miners_by_ip[ip] = miner
-                    created_any = True
-            if created_any:
-                try:
-                    s.commit()
-                except Exception:
-                    s.rollback()
+
+        # Until the job has written a new miner's row, use what the poller detected
+        models = {}
+        for ip in ips:
+            miner_meta = miners_by_ip.get(ip)
+            if miner_meta is not None and miner_meta.model:
+                models[ip] = miner_meta.model
+            else:
+                cached = get_cached_metadata(ip)
+                models[ip] = cached.model if cached is not None else ''
 
         out = []
         for m in rows:
@@ -202,7 +97,7 @@ def get_miners():
                 'is_stale': age > LAGGING,
                 'age_sec': age,
                 'status': status,
-                'model': (miner_meta.model if (miner_meta and miner_meta.model) else model_name),
+                'model': model_name,
                 'ip': m.miner_ip,
                 'last_seen': ts.isoformat().replace('+00:00', 'Z'),
                 'est_power_w': est_power,
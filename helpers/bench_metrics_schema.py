@@ -0,0 +1,177 @@
+"""Compare the legacy metrics table with the compact layout (metrics_compact).
+
+Builds a throwaway database per layout in a temporary directory and writes the same
+synthetic fleet history through BulkWriter (one batch per poll cycle, like
+poll_metrics). For each layout this reports:
+  - bytes_per_row: database file size after a checkpoint, divided by rows
+  - insert_rows_per_s: BulkWriter throughput
+  - miner_range_ms: one miner's newest quarter of history (the per-miner chart read)
+  - fleet_window_ms: per-miner averages over the last 10 cycles (the summary read)
+and the compact/legacy speedups.
+
+Usage:
+  python -m helpers.bench_metrics_schema [--miners 500] [--cycles 200] [--json]
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+
+from core.db import (
+    METRIC_COLUMNS,
+    BulkWriter,
+    CompactMetric,
+    CompactMetrics,
+    Metric,
+    MinerKey,
+    MinerLatest,
+    RollupState,
+)
+from miner_config import POLL_INTERVAL
+
+LAYOUTS = ("legacy", "compact")
+
+
+def _engine(path: Path):
+    eng = create_engine(f"sqlite:///{path}", future=True)
+
+    @event.listens_for(eng, "connect")
+    def _pragmas(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+    return eng
+
+
+_START = dt.datetime(2026, 1, 1)
+
+
+def _cycle_ts(c: int) -> dt.datetime:
+    return _START + dt.timedelta(seconds=c * POLL_INTERVAL)
+
+
+def _cycles(miners: int, cycles: int, seed: int = 1):
+    rnd = random.Random(seed)
+    for c in range(cycles):
+        ts = _cycle_ts(c)
+        yield ts, [
+            (ts, f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", rnd.uniform(3000, 3500),
+             rnd.uniform(95, 110), c * POLL_INTERVAL, rnd.uniform(55, 75), rnd.uniform(4000, 6000))
+            for i in range(miners)
+        ]
+
+
+def _file_bytes(eng, path: Path) -> int:
+    with eng.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return sum(os.path.getsize(p) for p in (path, Path(f"{path}-wal")) if p.exists())
+
+
+def _timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def _speedup(legacy_ms: float, compact_ms: float) -> float:
+    return round(legacy_ms / max(compact_ms, 1e-6), 2)
+
+
+def bench_layout(layout: str, directory: Path, miners: int, cycles: int, repeat: int = 5) -> dict:
+    path = directory / f"{layout}.db"
+    eng = _engine(path)
+    tables = [MinerLatest.__table__, RollupState.__table__]
+    if layout == "legacy":
+        tables.append(Metric.__table__)
+    else:
+        tables += [MinerKey.__table__, CompactMetric.__table__]
+    for table in tables:
+        table.create(bind=eng)
+
+    store = CompactMetrics(bind=eng) if layout == "compact" else None
+    writer = BulkWriter(bind=eng, batch_size=max(miners, 1), metrics_store=store)
+    rows = 0
+    started = time.perf_counter()
+    for _, batch in _cycles(miners, cycles):
+        rows += writer.write(Metric, METRIC_COLUMNS, batch)
+    insert_s = time.perf_counter() - started
+    last_ts = _cycle_ts(cycles - 1)
+
+    source = store.source() if store else Metric
+    session = sessionmaker(bind=eng)()
+    ip = "10.0.0.7"
+    since_range = last_ts - dt.timedelta(seconds=cycles * POLL_INTERVAL // 4)
+    since_window = last_ts - dt.timedelta(seconds=10 * POLL_INTERVAL)
+
+    def miner_range():
+        session.query(source).filter(source.miner_ip == ip, source.timestamp >= since_range) \
+            .order_by(source.timestamp).all()
+
+    def fleet_window():
+        session.query(source.miner_ip, func.avg(source.hashrate_ths), func.max(source.timestamp)) \
+            .filter(source.timestamp >= since_window).group_by(source.miner_ip).all()
+
+    try:
+        report = {
+            "rows": rows,
+            "bytes_per_row": round(_file_bytes(eng, path) / max(rows, 1), 1),
+            "insert_rows_per_s": round(rows / insert_s) if insert_s else None,
+            "miner_range_ms": round(_timed(miner_range, repeat), 3),
+            "fleet_window_ms": round(_timed(fleet_window, repeat), 3),
+        }
+    finally:
+        session.close()
+        eng.dispose()
+    return report
+
+
+def run(miners: int = 500, cycles: int = 200, directory=None) -> dict:
+    """{"legacy": {...}, "compact": {...}, "compact_vs_legacy": {...}}."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        report = {layout: bench_layout(layout, Path(tmp), miners, cycles) for layout in LAYOUTS}
+    legacy, compact = report["legacy"], report["compact"]
+    report["compact_vs_legacy"] = {
+        "size_ratio": round(compact["bytes_per_row"] / legacy["bytes_per_row"], 3),
+        "insert_speedup": round(compact["insert_rows_per_s"] / legacy["insert_rows_per_s"], 2),
+        "miner_range_speedup": _speedup(legacy["miner_range_ms"], compact["miner_range_ms"]),
+        "fleet_window_speedup": _speedup(legacy["fleet_window_ms"], compact["fleet_window_ms"]),
+    }
+    return report
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the legacy and compact metrics layouts.")
+    p.add_argument("--miners", type=int, default=500, help="Miners per poll cycle (default: 500)")
+    p.add_argument("--cycles", type=int, default=200, help="Poll cycles written (default: 200)")
+    p.add_argument("--dir", type=Path, default=None, help="Where to put the temporary databases")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(miners=max(1, args.miners), cycles=max(1, args.cycles), directory=args.dir)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    cols = ["rows", "bytes_per_row", "insert_rows_per_s", "miner_range_ms", "fleet_window_ms"]
+    print(f"{'layout':<10}" + "".join(f"{c:>{len(c) + 2}}" for c in cols))
+    for layout in LAYOUTS:
+        print(f"{layout:<10}" + "".join(f"{report[layout][c]:>{len(c) + 2}}" for c in cols))
+    ratios = report["compact_vs_legacy"].items()
+    print("compact vs legacy: " + ", ".join(f"{k}={v}" for k, v in ratios))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
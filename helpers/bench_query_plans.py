@@ -0,0 +1,318 @@
+"""Query plans and wall time of the hot read paths on a large synthetic metrics database.
+
+Builds a throwaway SQLite database with `miners` x `cycles` raw metrics rows (one poll
+cycle every POLL_INTERVAL seconds, ending now), rollups for every resolution and
+miner_latest, refreshes the planner statistics the way init_db() does, then runs each
+hot read path through its real code (API handlers via a test client, the alert engine,
+the electricity cost query). Every SELECT they issue is re-run under EXPLAIN QUERY PLAN:
+  - metrics_miner:         /api/metrics for one miner over the last hour (raw)
+  - metrics_fleet:         /api/metrics for active miners over 15 minutes (raw)
+  - metrics_tail:          /api/metrics?limit=500 without a window
+  - metrics_rollup:        /api/metrics over 24 hours at 1h resolution
+  - miners_summary:        /api/miners/summary over 15 minutes (raw)
+  - miners_summary_rollup: /api/miners/summary over 24 hours (rollup)
+  - miners_current:        /api/miners/current (fleet state, plus the model lookup)
+  - alert_latest:          AlertEngine latest rows and one miner's rolling hashrate
+  - fleet_state_load:      the in-memory fleet state's cold start from miner_latest
+  - electricity_window:    average power per miner over the last hour
+  - metrics_export:        one keyset page of /api/metrics/export for the fleet
+  - metrics_export_miner:  one keyset page of /api/metrics/export for one miner
+
+A plan regresses when it scans a metrics table (SCAN metrics..., apart from the
+allowances listed per case) or needs a temp B-tree for GROUP BY, ORDER BY or DISTINCT.
+Reported per case: plan lines, problems and median wall time in ms. Exits 1 if any plan
+regressed. tests/test_query_plans.py runs the same cases on a smaller database.
+
+Usage:
+  python -m helpers.bench_query_plans [--miners 1000] [--cycles 10000] [--repeats 5]
+                                      [--dir /tmp] [--json]
+"""
+import argparse
+import datetime as dt
+import json
+import re
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from core.db import (
+    ROLLUP_FIELDS,
+    ROLLUP_RESOLUTIONS,
+    Base,
+    create_sqlite_engines,
+    rebuild_miner_latest,
+    refresh_query_stats,
+)
+from miner_config import POLL_INTERVAL
+
+# Plan lines that mean a hot query got slow as the history grows
+_SCAN = re.compile(r"^SCAN (metrics\w*)\b")
+_TEMP_BTREE = "USE TEMP B-TREE"
+
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # SQLAlchemy's SQLite DateTime storage format
+
+CASES = ("metrics_miner", "metrics_fleet", "metrics_tail", "metrics_rollup", "miners_summary",
+         "miners_summary_rollup", "miners_current", "alert_latest", "electricity_window",
+         "fleet_state_load", "metrics_export", "metrics_export_miner")
+
+
+def _ip(i: int) -> str:
+    return f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+
+
+def build_database(path, miners: int, cycles: int, end: dt.datetime = None, chunk: int = 200_000):
+    """Create and fill a metrics database at `path`; returns (writer, reader) engines.
+
+    Rows go in through the sqlite3 module in large transactions (the point is the
+    resulting file, not ingest speed); rollups are filled with one INSERT ... SELECT
+    per resolution.
+    """
+    end = end or dt.datetime.utcnow()
+    start = end - dt.timedelta(seconds=(cycles - 1) * POLL_INTERVAL)
+    writer, reader = create_sqlite_engines(path, profile="tuned", read_pool_size=2)
+    Base.metadata.create_all(bind=writer)
+
+    con = sqlite3.connect(str(path))
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=OFF")
+
+        def rows():
+            for c in range(cycles):
+                ts = (start + dt.timedelta(seconds=c * POLL_INTERVAL)).strftime(_TS_FORMAT)
+                for i in range(miners):
+                    k = c * miners + i
+                    yield (ts, _ip(i), 3000.0 + k % 500, 95.0 + k % 15, c * POLL_INTERVAL,
+                           55.0 + k % 20, 4000.0 + k % 2000)
+
+        sql = ("INSERT INTO metrics (timestamp, miner_ip, power_w, hashrate_ths, elapsed_s, "
+               "avg_temp_c, avg_fan_rpm) VALUES (?, ?, ?, ?, ?, ?, ?)")
+        batch = []
+        for row in rows():
+            batch.append(row)
+            if len(batch) >= chunk:
+                con.executemany(sql, batch)
+                con.commit()
+                batch.clear()
+        con.executemany(sql, batch)
+        con.commit()
+
+        for label, seconds in ROLLUP_RESOLUTIONS.items():
+            epoch = f"(CAST(strftime('%s', timestamp) AS INTEGER) / {seconds}) * {seconds}"
+            bucket = f"strftime('%Y-%m-%d %H:%M:%S.000000', {epoch}, 'unixepoch')"
+            stats = ", ".join(f"avg({f}), min({f}), max({f}), avg({f})" for f in ROLLUP_FIELDS)
+            cols = ", ".join(f"{f}_avg, {f}_min, {f}_max, {f}_last" for f in ROLLUP_FIELDS)
+            con.execute(f"INSERT INTO metrics_{label} (miner_ip, bucket, samples, last_ts, {cols}) "
+                        f"SELECT miner_ip, {bucket}, count(*), max(timestamp), {stats} "
+                        f"FROM metrics GROUP BY miner_ip, {bucket}")
+            con.commit()
+    finally:
+        con.close()
+    rebuild_miner_latest(writer)
+    refresh_query_stats(writer)
+    return writer, reader
+
+
+@contextmanager
+def captured_selects(bind):
+    """Collect (statement, parameters) of every SELECT run on `bind` inside the block."""
+    seen = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            seen.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", capture)
+    try:
+        yield seen
+    finally:
+        event.remove(bind, "before_cursor_execute", capture)
+
+
+def explain(bind, statement: str, parameters=()) -> list:
+    """EXPLAIN QUERY PLAN detail lines for one statement."""
+    with bind.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[3] for row in rows]
+
+
+def plan_problems(lines: list, allow=()) -> list:
+    """Plan lines that scan a metrics table or build a temp B-tree, minus `allow`ed ones."""
+    return [
+        line for line in lines
+        if (_SCAN.match(line) or _TEMP_BTREE in line) and not any(line.startswith(a) for a in allow)
+    ]
+
+
+class HotQueries:
+    """The hot read paths, run through their real code against `reader`.
+
+    Each case is (name, run(), allow): run() issues the case's queries; `allow` lists
+    plan-line prefixes accepted for that case, with the reason next to it.
+    """
+
+    def __init__(self, reader, miners: int, now: dt.datetime = None):
+        from api import endpoints
+        from core import alert_engine
+        from core.alert_engine import AlertEngine
+        from core.electricity import ElectricityCostService
+        from core.fleet_state import FleetState
+
+        self.reader = reader
+        self.now = now or dt.datetime.utcnow()
+        self.ip = _ip(min(7, miners - 1))
+        self.Session = sessionmaker(bind=reader)
+        self._endpoints = endpoints
+        self._patched = (endpoints, alert_engine)
+        self._fleet_state = FleetState
+        self.fleet = FleetState(session_factory=self.Session)
+        self._alerts = AlertEngine
+        self._electricity = ElectricityCostService
+        app = Flask(__name__)
+        app.register_blueprint(endpoints.api_bp, url_prefix="/api")
+        self.client = app.test_client()
+
+    def _since(self, minutes: int) -> str:
+        return (self.now - dt.timedelta(minutes=minutes)).isoformat() + "Z"
+
+    def _get(self, url: str):
+        resp = self.client.get(url)
+        assert resp.status_code == 200, f"{url} -> {resp.status_code}"
+        resp.get_data()  # streamed responses run their queries as the body is read
+
+    def _alert_latest(self):
+        session = self.Session()
+        try:
+            engine = self._alerts(session=session)
+            engine.latest_metrics()
+            engine._get_rolling_average_hashrate(self.ip)
+        finally:
+            session.close()
+
+    def _electricity_window(self):
+        session = self.Session()
+        try:
+            self._electricity.average_power_by_miner(session, self.now - dt.timedelta(hours=1),
+                                                     self.now)
+        finally:
+            session.close()
+
+    def cases(self) -> list:
+        g = self._get
+        return [
+            ("metrics_miner", lambda: g(f"/api/metrics?ip={self.ip}&since={self._since(60)}"
+                                        f"&resolution=raw"), ()),
+            ("metrics_fleet", lambda: g(f"/api/metrics?active_only=true&since={self._since(15)}"
+                                        f"&resolution=raw&limit=3000"), ()),
+            # Read in timestamp order; LIMIT stops the walk after 500 index entries
+            ("metrics_tail", lambda: g("/api/metrics?limit=500"),
+             ("SCAN metrics USING INDEX ix_metrics_timestamp",)),
+            ("metrics_rollup", lambda: g(f"/api/metrics?since={self._since(1440)}"
+                                         f"&resolution=1h&limit=10000"), ()),
+            ("miners_summary", lambda: g("/api/miners/summary?window_min=15"), ()),
+            ("miners_summary_rollup", lambda: g("/api/miners/summary?window_min=1440"), ()),
+            ("miners_current", lambda: g("/api/miners/current"), ()),
+            ("alert_latest", self._alert_latest, ()),
+            ("electricity_window", self._electricity_window, ()),
+            # One row per miner, read once per process
+            ("fleet_state_load", lambda: self._fleet_state(session_factory=self.Session).load(),
+             ("SCAN miner_latest",)),
+            # Keyset pages resume mid-history: index range from the cursor, no sort
+            ("metrics_export",
+             lambda: g(f"/api/metrics/export?cursor={self._since(120)},0&limit=1000"), ()),
+            ("metrics_export_miner",
+             lambda: g(f"/api/metrics/export?ip={self.ip}&cursor={self._since(600)},0"
+                       "&limit=1000"), ()),
+        ]
+
+    @contextmanager
+    def serving(self):
+        """Point the API handlers and fleet state at `reader` for the duration of the block."""
+        originals = [self._endpoints.ReadSessionLocal] + [m.FLEET_STATE for m in self._patched]
+        self._endpoints.ReadSessionLocal = self.Session
+        for module in self._patched:
+            module.FLEET_STATE = self.fleet
+        try:
+            yield self
+        finally:
+            self._endpoints.ReadSessionLocal = originals[0]
+            for module, fleet in zip(self._patched, originals[1:], strict=True):
+                module.FLEET_STATE = fleet
+
+    def check(self, run, allow=(), repeats: int = 3) -> dict:
+        """Run one case: its plans, problems and median wall time."""
+        with captured_selects(self.reader) as seen:
+            run()
+        plans = [{"sql": " ".join(sql.split()), "plan": explain(self.reader, sql, params)}
+                 for sql, params in seen]
+        timings = []
+        for _ in range(max(1, repeats)):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return {
+            "statements": len(plans),
+            "plans": plans,
+            "problems": [p for entry in plans for p in plan_problems(entry["plan"], allow)],
+            "wall_ms": round(statistics.median(timings) * 1000, 3),
+        }
+
+
+def run(miners: int = 1000, cycles: int = 10000, repeats: int = 5, directory=None) -> dict:
+    """{"rows", "build_s", "cases": {name: {...}}, "regressed": [names]}."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        started = time.perf_counter()
+        writer, reader = build_database(Path(tmp) / "metrics.db", miners, cycles)
+        build_s = time.perf_counter() - started
+        try:
+            hot = HotQueries(reader, miners)
+            with hot.serving():
+                cases = {name: hot.check(fn, allow, repeats) for name, fn, allow in hot.cases()}
+        finally:
+            writer.dispose()
+            reader.dispose()
+    return {
+        "rows": miners * cycles,
+        "build_s": round(build_s, 1),
+        "cases": cases,
+        "regressed": [name for name, case in cases.items() if case["problems"]],
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Check query plans and time the hot read paths.")
+    p.add_argument("--miners", type=int, default=1000, help="Miners per poll cycle (default: 1000)")
+    p.add_argument("--cycles", type=int, default=10000,
+                   help="Poll cycles of history (default: 10000)")
+    p.add_argument("--repeats", type=int, default=5, help="Timed runs per case (default: 5)")
+    p.add_argument("--dir", type=Path, default=None, help="Where to put the temporary database")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(miners=max(1, args.miners), cycles=max(1, args.cycles), repeats=args.repeats,
+                 directory=args.dir)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 1 if report["regressed"] else 0
+    print(f"rows={report['rows']} build_s={report['build_s']}")
+    print(f"{'case':<24}{'stmts':>6}{'wall_ms':>12}  plan")
+    for name, case in report["cases"].items():
+        lines = [line for entry in case["plans"] for line in entry["plan"]]
+        print(f"{name:<24}{case['statements']:>6}{case['wall_ms']:>12}  " + " | ".join(lines))
+        for problem in case["problems"]:
+            print(f"{'':<42}REGRESSED: {problem}")
+    return 1 if report["regressed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
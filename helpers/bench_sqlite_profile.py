@@ -0,0 +1,199 @@
+"""Hot-endpoint read latency under concurrent ingest, with and without the SQLite profile.
+
+For each profile a throwaway database is seeded with fleet history ending now. An ingest
+thread then writes one poll cycle at a time through BulkWriter on the writer engine
+while reader threads run the queries behind the hot endpoints:
+  - summary:        every miner_latest row (/api/summary)
+  - metrics:        one miner's raw samples over the last hour (/api/metrics)
+  - miners_summary: per-miner averages over 15 minutes (/api/miners/summary)
+  - tail:           the newest 50 samples of one miner (/api/debug/tail)
+
+"baseline" is the old setup: WAL/synchronous/busy_timeout pragmas only, and readers
+share the writer engine. "tuned" applies SQLITE_PROFILE=tuned (mmap, cache, temp_store,
+wal_autocheckpoint, page_size) and readers use the read-only engine. Reported per
+profile and query: p50/p95/p99 latency in ms, plus ingest batch latency.
+
+Usage:
+  python -m helpers.bench_sqlite_profile [--miners 300] [--history-cycles 240]
+                                         [--seconds 10] [--readers 4] [--json]
+"""
+import argparse
+import datetime as dt
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from core.db import METRIC_COLUMNS, Base, BulkWriter, Metric, MinerLatest, create_sqlite_engines
+from miner_config import POLL_INTERVAL
+
+PROFILES = ("baseline", "tuned")
+QUERIES = ("summary", "metrics", "miners_summary", "tail")
+
+
+def _ip(i: int) -> str:
+    return f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+
+
+def _cycle(rnd: random.Random, ts: dt.datetime, miners: int) -> list:
+    return [
+        (ts, _ip(i), rnd.uniform(3000, 3500), rnd.uniform(95, 110), 60,
+         rnd.uniform(55, 75), rnd.uniform(4000, 6000))
+        for i in range(miners)
+    ]
+
+
+def _percentiles(samples: list) -> dict:
+    if not samples:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    ms = sorted(s * 1000 for s in samples)
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {"n": len(ms), "p50_ms": round(q[49], 3), "p95_ms": round(q[94], 3),
+            "p99_ms": round(q[98], 3)}
+
+
+def _queries(miners: int):
+    ip = _ip(min(7, miners - 1))
+
+    def summary(s, now):
+        s.query(MinerLatest).all()
+
+    def metrics(s, now):
+        (s.query(Metric)
+         .filter(Metric.miner_ip == ip, Metric.timestamp >= now - dt.timedelta(hours=1))
+         .order_by(Metric.timestamp.asc()).limit(500).all())
+
+    def miners_summary(s, now):
+        (s.query(Metric.miner_ip, func.avg(Metric.hashrate_ths), func.avg(Metric.power_w),
+                 func.max(Metric.timestamp))
+         .filter(Metric.timestamp >= now - dt.timedelta(minutes=15))
+         .group_by(Metric.miner_ip).all())
+
+    def tail(s, now):
+        s.query(Metric).filter(Metric.miner_ip == ip).order_by(Metric.id.desc()).limit(50).all()
+
+    return {"summary": summary, "metrics": metrics, "miners_summary": miners_summary, "tail": tail}
+
+
+def bench_profile(profile: str, directory: Path, miners: int, history_cycles: int,
+                  seconds: float, readers: int, ingest_interval: float) -> dict:
+    writer_engine, read_engine = create_sqlite_engines(directory / f"{profile}.db", profile=profile)
+    Base.metadata.create_all(bind=writer_engine)
+    writer = BulkWriter(bind=writer_engine, batch_size=max(miners, 1))
+    rnd = random.Random(1)
+    start = dt.datetime.utcnow() - dt.timedelta(seconds=history_cycles * POLL_INTERVAL)
+    for c in range(history_cycles):
+        ts = start + dt.timedelta(seconds=c * POLL_INTERVAL)
+        writer.write(Metric, METRIC_COLUMNS, _cycle(rnd, ts, miners))
+
+    # Baseline readers share the writer's engine and pool, as before the profile
+    session_factory = sessionmaker(bind=read_engine if profile == "tuned" else writer_engine)
+    queries = _queries(miners)
+    latencies = {name: [] for name in QUERIES}
+    ingest = []
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def ingest_loop():
+        r = random.Random(2)
+        while not stop.is_set():
+            started = time.perf_counter()
+            writer.write(Metric, METRIC_COLUMNS, _cycle(r, dt.datetime.utcnow(), miners))
+            ingest.append(time.perf_counter() - started)
+            stop.wait(ingest_interval)
+
+    def read_loop(offset: int):
+        local = {name: [] for name in QUERIES}
+        i = offset
+        while not stop.is_set():
+            name = QUERIES[i % len(QUERIES)]
+            i += 1
+            session = session_factory()
+            try:
+                started = time.perf_counter()
+                queries[name](session, dt.datetime.utcnow())
+                local[name].append(time.perf_counter() - started)
+            finally:
+                session.close()
+        with lock:
+            for name, samples in local.items():
+                latencies[name].extend(samples)
+
+    threads = [threading.Thread(target=ingest_loop, daemon=True)]
+    threads += [threading.Thread(target=read_loop, args=(n,), daemon=True) for n in range(readers)]
+    try:
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        writer_engine.dispose()
+        read_engine.dispose()
+    report = {name: _percentiles(latencies[name]) for name in QUERIES}
+    report["ingest_batch"] = _percentiles(ingest)
+    return report
+
+
+def run(miners: int = 300, history_cycles: int = 240, seconds: float = 10.0, readers: int = 4,
+        ingest_interval: float = 0.05, directory=None) -> dict:
+    """{"baseline": {query: {...}}, "tuned": {...}, "p95_speedup": {query: x}}."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        report = {
+            profile: bench_profile(profile, Path(tmp), miners, history_cycles, seconds, readers,
+                                   ingest_interval)
+            for profile in PROFILES
+        }
+    baseline, tuned = report["baseline"], report["tuned"]
+    report["p95_speedup"] = {
+        name: round(baseline[name]["p95_ms"] / max(tuned[name]["p95_ms"], 1e-6), 2)
+        for name in (*QUERIES, "ingest_batch")
+        if baseline[name]["p95_ms"] is not None and tuned[name]["p95_ms"] is not None
+    }
+    return report
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Benchmark hot-endpoint reads under ingest per SQLite profile.")
+    p.add_argument("--miners", type=int, default=300, help="Miners per poll cycle (default: 300)")
+    p.add_argument("--history-cycles", type=int, default=240,
+                   help="Cycles seeded before timing (default: 240)")
+    p.add_argument("--seconds", type=float, default=10.0,
+                   help="Timed run per profile (default: 10)")
+    p.add_argument("--readers", type=int, default=4, help="Concurrent reader threads (default: 4)")
+    p.add_argument("--ingest-interval", type=float, default=0.05,
+                   help="Pause between ingest batches in seconds (default: 0.05)")
+    p.add_argument("--dir", type=Path, default=None, help="Where to put the temporary databases")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(miners=max(1, args.miners), history_cycles=max(1, args.history_cycles),
+                 seconds=max(0.1, args.seconds), readers=max(1, args.readers),
+                 ingest_interval=max(0.0, args.ingest_interval), directory=args.dir)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    cols = ["n", "p50_ms", "p95_ms", "p99_ms"]
+    print(f"{'profile':<10}{'query':<16}" + "".join(f"{c:>10}" for c in cols))
+    for profile in PROFILES:
+        for name in (*QUERIES, "ingest_batch"):
+            row = report[profile][name]
+            print(f"{profile:<10}{name:<16}" + "".join(f"{str(row[c]):>10}" for c in cols))
+    speedups = report["p95_speedup"].items()
+    print("p95 speedup (baseline/tuned): " + ", ".join(f"{k}={v}" for k, v in speedups))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
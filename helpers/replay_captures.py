@@ -0,0 +1,168 @@
+"""Replay captured miner replies through the normalization code and report parse cost.
+
+Captures come from MinerClient/AsyncMinerClient in capture mode (MINER_CAPTURE_DIR=...
+or MinerClient(ip, capture_dir=...)): one JSON file per fetch_normalized() under
+<dir>/<family>/. For each firmware family this reports:
+  - cold: raw bytes -> JSON -> model/firmware/J/TH detection -> normalized dict
+    (first poll of a miner, or every poll in capture mode)
+  - warm: the same with cached metadata (what most polls do)
+  - parses/s and microseconds per parse for both paths
+  - allocations for one cold parse (tracemalloc): peak bytes, and the blocks/bytes
+    still alive afterwards (the result plus anything cached)
+
+Usage:
+  python -m helpers.replay_captures captures/ [--iterations 1000] [--json]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+from core.miner import _detect_metadata, _normalize, _ResponseBuffer, _split_piped
+
+
+def load_captures(path) -> list:
+    """All capture documents under `path` (a directory tree or a single file)."""
+    path = Path(path)
+    files = [path] if path.is_file() else sorted(path.rglob("*.json"))
+    captures = []
+    for f in files:
+        with open(f, encoding="utf-8") as fh:
+            doc = json.load(fh)
+        if isinstance(doc, dict) and "responses" in doc:
+            captures.append(doc)
+    return captures
+
+
+def raw_responses(doc: dict) -> dict:
+    """{command: raw bytes} exactly as received (captures store latin-1 text)."""
+    return {cmd: text.encode("latin-1") for cmd, text in doc["responses"].items()}
+
+
+def _parse_raw(raw: bytes) -> dict:
+    buf = _ResponseBuffer()
+    buf.extend(raw)
+    return buf.parse()
+
+
+def parse_replies(raws: dict) -> dict:
+    """Raw bytes -> {"summary": {...}, "stats": {...}, ...}, splitting piped replies."""
+    replies = {}
+    for cmd, raw in raws.items():
+        resp = _parse_raw(raw)
+        if "+" in cmd:
+            replies.update(_split_piped(resp, cmd.split("+")) or {})
+        else:
+            replies[cmd] = resp
+    return replies
+
+
+def normalize_capture(doc: dict, meta=None) -> dict:
+    """Run one capture through parsing and normalization; detects metadata unless given."""
+    replies = parse_replies(raw_responses(doc))
+    summ, stats = replies.get("summary") or {}, replies.get("stats") or {}
+    if meta is None:
+        meta = _detect_metadata(summ, stats, replies.get("version") or {})
+    return _normalize(summ, stats, meta)
+
+
+def _rate(fn, items, iterations: int) -> tuple:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for item in items:
+            fn(*item)
+    elapsed = time.perf_counter() - started
+    n = iterations * len(items)
+    return n / elapsed if elapsed else float("inf"), elapsed / n * 1e6
+
+
+def _allocations(doc: dict) -> dict:
+    normalize_capture(doc)  # warm up imports/caches so they are not counted
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        result = normalize_capture(doc)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = [d for d in after.compare_to(before, "filename") if d.size_diff > 0]
+    del result
+    return {
+        "peak_bytes": peak - base,
+        "retained_blocks": sum(d.count_diff for d in diff),
+        "retained_bytes": sum(d.size_diff for d in diff),
+    }
+
+
+def replay(captures: list, iterations: int = 1000) -> dict:
+    """Per-family throughput and allocation report: {family: {...}}."""
+    by_family = defaultdict(list)
+    for doc in captures:
+        by_family[doc.get("family") or "unknown"].append(doc)
+
+    report = {}
+    for family, docs in sorted(by_family.items()):
+        cold = [(doc,) for doc in docs]
+        warm = []
+        for doc in docs:
+            replies = parse_replies(raw_responses(doc))
+            meta = _detect_metadata(replies.get("summary") or {}, replies.get("stats") or {},
+                                    replies.get("version") or {})
+            warm.append((doc, meta))
+
+        cold_rate, cold_us = _rate(normalize_capture, cold, iterations)
+        warm_rate, warm_us = _rate(normalize_capture, warm, iterations)
+        allocs = [_allocations(doc) for doc in docs]
+        report[family] = {
+            "captures": len(docs),
+            "bytes_per_capture": round(
+                sum(len(r) for d in docs for r in raw_responses(d).values()) / len(docs)),
+            "cold_parses_per_s": round(cold_rate),
+            "cold_us_per_parse": round(cold_us, 1),
+            "warm_parses_per_s": round(warm_rate),
+            "warm_us_per_parse": round(warm_us, 1),
+            "peak_bytes_per_parse": round(sum(a["peak_bytes"] for a in allocs) / len(allocs)),
+            "retained_blocks_per_parse": round(
+                sum(a["retained_blocks"] for a in allocs) / len(allocs), 1),
+            "retained_bytes_per_parse": round(
+                sum(a["retained_bytes"] for a in allocs) / len(allocs)),
+        }
+    return report
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Replay miner captures and report parse throughput.")
+    p.add_argument("path", type=Path,
+                   help="Capture directory (MINER_CAPTURE_DIR) or a single capture file")
+    p.add_argument("--iterations", type=int, default=1000,
+                   help="Passes over each capture (default: 1000)")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    captures = load_captures(args.path)
+    if not captures:
+        print(f"No captures found under {args.path}", file=sys.stderr)
+        return 1
+    report = replay(captures, iterations=max(1, args.iterations))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    cols = ["captures", "cold_parses_per_s", "cold_us_per_parse", "warm_parses_per_s",
+            "warm_us_per_parse", "peak_bytes_per_parse", "retained_blocks_per_parse"]
+    print(f"{'family':<12}" + "".join(f"{c:>{len(c) + 2}}" for c in cols))
+    for family, row in report.items():
+        print(f"{family:<12}" + "".join(f"{row[c]:>{len(c) + 2}}" for c in cols))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
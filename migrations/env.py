@@ -8,6 +8,10 @@ from alembic import context
 # access to the values within the .ini file in use.
 config = context.config
 
+# DATABASE_URL (as used by core/db.py) overrides the sqlite URL in alembic.ini
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -0,0 +1,36 @@
+"""add inventory columns to miners
+
+Revision ID: 20261017_01
+Revises: 20251116_01
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_01'
+down_revision = '20251116_01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('miners', sa.Column('is_active', sa.Boolean(), nullable=True))
+    op.add_column('miners', sa.Column('discovered_via', sa.String(16), nullable=True))
+    op.add_column('miners', sa.Column('last_discovered_at', sa.DateTime(), nullable=True))
+    op.add_column('miners', sa.Column('missed_sweeps', sa.Integer(), nullable=True))
+    op.create_index('ix_miners_is_active', 'miners', ['is_active'], unique=False)
+    # Existing rows were created from live polls, so seed them as active inventory
+    op.execute("UPDATE miners SET is_active = 1, missed_sweeps = 0")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_miners_is_active', table_name='miners')
+    with op.batch_alter_table('miners') as batch:
+        batch.drop_column('missed_sweeps')
+        batch.drop_column('last_discovered_at')
+        batch.drop_column('discovered_via')
+        batch.drop_column('is_active')
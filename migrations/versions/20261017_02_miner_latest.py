@@ -0,0 +1,47 @@
+"""add miner_latest (newest metrics row per miner)
+
+Revision ID: 20261017_02
+Revises: 20261017_01
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_02'
+down_revision = '20261017_01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'miner_latest',
+        sa.Column('miner_ip', sa.String(), primary_key=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('power_w', sa.Float(), nullable=True),
+        sa.Column('hashrate_ths', sa.Float(), nullable=True),
+        sa.Column('elapsed_s', sa.Integer(), nullable=True),
+        sa.Column('avg_temp_c', sa.Float(), nullable=True),
+        sa.Column('avg_fan_rpm', sa.Float(), nullable=True),
+    )
+    op.create_index('ix_miner_latest_timestamp', 'miner_latest', ['timestamp'], unique=False)
+    # Seed from history; afterwards every metrics batch upserts it
+    op.execute(
+        "INSERT INTO miner_latest (miner_ip, timestamp, power_w, hashrate_ths, elapsed_s, "
+        "avg_temp_c, avg_fan_rpm) "
+        "SELECT m.miner_ip, m.timestamp, m.power_w, m.hashrate_ths, m.elapsed_s, m.avg_temp_c, "
+        "m.avg_fan_rpm FROM metrics m "
+        "JOIN (SELECT miner_ip, MAX(timestamp) AS last_ts FROM metrics GROUP BY miner_ip) l "
+        "ON m.miner_ip = l.miner_ip AND m.timestamp = l.last_ts "
+        "WHERE m.miner_ip IS NOT NULL "
+        "ON CONFLICT(miner_ip) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_miner_latest_timestamp', table_name='miner_latest')
+    op.drop_table('miner_latest')
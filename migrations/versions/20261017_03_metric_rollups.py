@@ -0,0 +1,51 @@
+"""add 1m/5m/1h/1d metric rollup tables and rollup_state
+
+Revision ID: 20261017_03
+Revises: 20261017_02
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_03'
+down_revision = '20261017_02'
+branch_labels = None
+depends_on = None
+
+LABELS = ('1m', '5m', '1h', '1d')
+FIELDS = ('hashrate_ths', 'power_w', 'avg_temp_c', 'avg_fan_rpm')
+
+
+def upgrade() -> None:
+    for label in LABELS:
+        stat_columns = [
+            sa.Column(f'{field}_{stat}', sa.Float(), nullable=True)
+            for field in FIELDS for stat in ('min', 'max', 'avg', 'last')
+        ]
+        op.create_table(
+            f'metrics_{label}',
+            sa.Column('miner_ip', sa.String(), primary_key=True),
+            sa.Column('bucket', sa.DateTime(), primary_key=True),
+            sa.Column('samples', sa.Integer(), nullable=False),
+            sa.Column('last_ts', sa.DateTime(), nullable=True),
+            *stat_columns,
+        )
+        op.create_index(f'idx_metrics_{label}_bucket', f'metrics_{label}', ['bucket'], unique=False)
+    # Empty high-water mark: the rollup job backfills from the start of metrics
+    op.create_table(
+        'rollup_state',
+        sa.Column('name', sa.String(32), primary_key=True),
+        sa.Column('last_metric_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_state')
+    for label in LABELS:
+        op.drop_index(f'idx_metrics_{label}_bucket', table_name=f'metrics_{label}')
+        op.drop_table(f'metrics_{label}')
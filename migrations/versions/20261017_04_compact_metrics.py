@@ -0,0 +1,60 @@
+"""add compact metrics layout (miner_ids + metrics_compact WITHOUT ROWID)
+
+Copies the existing metrics history into metrics_compact. Set METRICS_COMPACT=true to
+write and read the compact table; the legacy metrics table is left in place.
+
+Revision ID: 20261017_04
+Revises: 20261017_03
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_04'
+down_revision = '20261017_03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'miner_ids',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('ip', sa.String(), nullable=False, unique=True),
+    )
+    op.create_table(
+        'metrics_compact',
+        sa.Column('miner_id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('ts', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('power_w', sa.REAL(), nullable=True),
+        sa.Column('hashrate_ths', sa.REAL(), nullable=True),
+        sa.Column('elapsed_s', sa.Integer(), nullable=True),
+        sa.Column('avg_temp_c', sa.REAL(), nullable=True),
+        sa.Column('avg_fan_rpm', sa.REAL(), nullable=True),
+        sqlite_with_rowid=False,
+    )
+    op.execute(
+        "INSERT OR IGNORE INTO miner_ids (ip) "
+        "SELECT DISTINCT miner_ip FROM metrics WHERE miner_ip IS NOT NULL ORDER BY miner_ip"
+    )
+    # Epoch seconds; a second sample for the same miner and second keeps the later row
+    op.execute(
+        "INSERT OR REPLACE INTO metrics_compact "
+        "(miner_id, ts, power_w, hashrate_ths, elapsed_s, avg_temp_c, avg_fan_rpm) "
+        "SELECT k.id, CAST(strftime('%s', m.timestamp) AS INTEGER), m.power_w, m.hashrate_ths, "
+        "m.elapsed_s, m.avg_temp_c, m.avg_fan_rpm "
+        "FROM metrics m JOIN miner_ids k ON k.ip = m.miner_ip "
+        "WHERE m.timestamp IS NOT NULL ORDER BY m.id"
+    )
+    # Built after the copy: one sorted index build instead of per-row maintenance
+    op.create_index('idx_metrics_compact_ts', 'metrics_compact', ['ts'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_metrics_compact_ts', table_name='metrics_compact')
+    op.drop_table('metrics_compact')
+    op.drop_table('miner_ids')
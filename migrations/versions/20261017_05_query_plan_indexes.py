@@ -0,0 +1,34 @@
+"""index rollups on (bucket, miner_ip); make sure metrics(miner_ip, timestamp) exists
+
+Revision ID: 20261017_05
+Revises: 20261017_04
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_05'
+down_revision = '20261017_04'
+branch_labels = None
+depends_on = None
+
+LABELS = ('1m', '5m', '1h', '1d')
+
+
+def upgrade() -> None:
+    # 20251116_01 ignored failures; the hot per-miner reads need this index
+    op.execute("CREATE INDEX IF NOT EXISTS idx_metrics_miner_ip_timestamp ON metrics (miner_ip, timestamp)")
+    for label in LABELS:
+        op.create_index(f'idx_metrics_{label}_bucket_ip', f'metrics_{label}', ['bucket', 'miner_ip'],
+                        unique=False)
+        op.drop_index(f'idx_metrics_{label}_bucket', table_name=f'metrics_{label}')
+
+
+def downgrade() -> None:
+    for label in LABELS:
+        op.create_index(f'idx_metrics_{label}_bucket', f'metrics_{label}', ['bucket'], unique=False)
+        op.drop_index(f'idx_metrics_{label}_bucket_ip', table_name=f'metrics_{label}')
@@ -1,25 +1,48 @@
 from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+import asyncio
 import logging
 import datetime as dt
 from apscheduler.schedulers.background import BackgroundScheduler
-from api.endpoints import discover_miners
-from miner_config import POLL_INTERVAL
-from core.db import Base, engine, SessionLocal, Metric, Miner
-from core.miner import MinerClient, MinerError
+from miner_config import (
+    POLL_INTERVAL, POLL_CONCURRENCY, POLL_CYCLE_DEADLINE, INVENTORY_SWEEP_INTERVAL, ROLLUP_INTERVAL,
+    RETENTION_INTERVAL, ARCHIVE_INTERVAL, METADATA_ENRICH_INTERVAL,
+)
+from core.db import (
+    Base, engine, SessionLocal, Metric, Miner, ElectricityCost, BULK_WRITER, METRIC_COLUMNS,
+    ensure_miner_latest, PARTITIONS, refresh_query_stats,
+)
+from core.miner import poll_fleet
+from core.inventory import DiscoverySweeper, MetadataEnricher, get_poll_targets
+from core.rollups import run_rollups
+from core.retention import run_retention
+from core.archive import ARCHIVE
 from core.alert_engine import AlertEngine, create_default_rules
 from core.notification_service import NotificationService
 from core.profitability import ProfitabilityEngine
 from core.electricity import ElectricityCostService
 from core.firmware import FirmwareFlashService
+from core.write_queue import WRITE_QUEUE
+from core.fleet_state import FLEET_STATE
 
 
 # create tables
 def setup_db():
     Base.metadata.create_all(bind=engine)
+    ensure_miner_latest()
+    if PARTITIONS is not None:
+        PARTITIONS.ensure_ahead()
 
 
 logger = logging.getLogger(__name__)
 
+# Timing of the most recent poll_metrics cycle (see _record_poll_cycle)
+LAST_POLL_CYCLE: dict = {}
+
+# Rediscovery keeps its CIDR cursor between runs so each run probes only one chunk
+_sweeper = DiscoverySweeper()
+# Remembers which detected metadata it has written, so runs between full passes stay small
+_enricher = MetadataEnricher()
+
 
 def _job_listener(event):
     if event.exception:
@@ -28,48 +51,150 @@ def _job_listener(event):
         logger.debug("scheduler_job_ok", extra={"component": "scheduler", "job_id": event.job_id})
 
 
+def _record_poll_cycle(cycle: dict, miners: int) -> None:
+    """Keep the last cycle's timing so interval utilization can be inspected."""
+    duration = float(cycle.get("duration_s", 0.0))
+    LAST_POLL_CYCLE.clear()
+    LAST_POLL_CYCLE.update({
+        "finished_at": dt.datetime.utcnow().isoformat() + "Z",
+        "duration_s": round(duration, 3),
+        "interval_s": POLL_INTERVAL,
+        "deadline_s": POLL_CYCLE_DEADLINE,
+        "utilization": round(duration / POLL_INTERVAL, 3) if POLL_INTERVAL else None,
+        "miners": miners,
+        "ok": len(cycle.get("results") or {}),
+        "failed": len(cycle.get("errors") or {}),
+        "timed_out": len(cycle.get("timed_out") or []),
+    })
+    logger.info(
+        f"poll_metrics_cycle duration_s={LAST_POLL_CYCLE['duration_s']} "
+        f"utilization={LAST_POLL_CYCLE['utilization']} ok={LAST_POLL_CYCLE['ok']} "
+        f"failed={LAST_POLL_CYCLE['failed']} timed_out={LAST_POLL_CYCLE['timed_out']}"
+    )
+
+
 def poll_metrics():
     """Poll metrics from all miners."""
     session = SessionLocal()
     try:
-        inserted = 0
         ips = []
         try:
-            ips = discover_miners()
+            ips = get_poll_targets(session)
         except Exception as e:
-            logger.exception("discover_miners_failed", exc_info=e)
+            logger.exception("inventory_read_failed", exc_info=e)
             ips = []
 
         if not ips:
             logger.warning("poll_metrics_no_miners_found")
             return
 
-        logger.info(f"poll_metrics_discovered_miners count={len(ips)}")
-
-        for ip in ips:
-            try:
-                # If you're using fetch_normalized():
-                payload = MinerClient(ip).fetch_normalized()
-            except MinerError as me:
-                logger.warning(f"miner_fetch_failed ip={ip} error={me}")
-                continue
-
-            session.add(Metric(
-                miner_ip=ip,
-                power_w=float(payload.get("power_w", 0.0)),
-                hashrate_ths=float(payload.get("hashrate_ths", 0.0)),
-                elapsed_s=int(payload.get("elapsed_s", 0)),
-                avg_temp_c=float(payload.get("avg_temp_c", 0.0) or 0.0),
-                avg_fan_rpm=float(payload.get("avg_fan_rpm", 0.0) or 0.0),
-            ))
-            inserted += 1
-
-        session.commit()
+        logger.info(f"poll_metrics_inventory_miners count={len(ips)}")
+
+        cycle = asyncio.run(
+            poll_fleet(ips, concurrency=POLL_CONCURRENCY, deadline=POLL_CYCLE_DEADLINE))
+        _record_poll_cycle(cycle, len(ips))
+
+        for ip, error in cycle["errors"].items():
+            logger.warning(f"miner_fetch_failed ip={ip} error={error}")
+        if cycle["timed_out"]:
+            logger.warning(f"poll_metrics_deadline_exceeded count={len(cycle['timed_out'])}")
+
+        now = dt.datetime.utcnow()
+        rows = [
+            (
+                now,
+                ip,
+                float(payload.get("power_w", 0.0)),
+                float(payload.get("hashrate_ths", 0.0)),
+                int(payload.get("elapsed_s", 0)),
+                float(payload.get("avg_temp_c", 0.0) or 0.0),
+                float(payload.get("avg_fan_rpm", 0.0) or 0.0),
+            )
+            for ip, payload in cycle["results"].items()
+        ]
+        # Readers see the cycle right away, even while its rows wait in the write queue
+        FLEET_STATE.update(METRIC_COLUMNS, rows)
+        inserted = WRITE_QUEUE.run(
+            lambda ws: BULK_WRITER.write(Metric, METRIC_COLUMNS, rows, session=ws))
         logger.info(f"poll_metrics_inserted_rows count={inserted}")
     finally:
         session.close()
 
 
+def sweep_inventory():
+    """Probe the next chunk of the scan CIDRs and merge new/vanished miners into the inventory."""
+    try:
+        summary = _sweeper.run_once()
+        logger.info(
+            "inventory_sweep_complete",
+            extra={"component": "scheduler", **summary},
+        )
+    except Exception as e:
+        logger.exception("Inventory sweep failed", exc_info=e)
+
+
+def enrich_miner_metadata():
+    """Copy model/vendor/firmware/nominal efficiency detected by the poller into the inventory."""
+    try:
+        summary = _enricher.run_once()
+        if summary["pending"]:
+            logger.info(
+                f"metadata_enriched added={summary['added']} updated={summary['updated']} "
+                f"unchanged={summary['unchanged']} full={summary['full']}"
+            )
+    except Exception as e:
+        logger.exception("Metadata enrichment failed", exc_info=e)
+
+
+def refresh_rollups():
+    """Fold new metrics rows into the 1m/5m/1h/1d rollup tables (one write-queue job per chunk)."""
+    try:
+        summary = run_rollups()
+        logger.debug("rollups_updated", extra={"component": "scheduler", **summary})
+        if not summary["caught_up"]:
+            logger.warning(f"rollups_lagging high_water_mark={summary['high_water_mark']}")
+    except Exception as e:
+        logger.exception("Rollup update failed", exc_info=e)
+
+
+def apply_retention():
+    """Purge rows past their retention in small chunks, return free pages to the OS, then
+    refresh the planner statistics for the reshaped tables."""
+    try:
+        report = run_retention()
+        logger.info(
+            f"retention_complete rows_deleted={report['rows_deleted']} "
+            f"bytes_reclaimed={report.get('bytes_reclaimed', 0)} duration_s={report['duration_s']}"
+        )
+        refresh_query_stats()
+    except Exception as e:
+        logger.exception("Retention run failed", exc_info=e)
+
+
+def prepare_partitions():
+    """Create this and next month's metrics files, so the month rollover never needs an
+    ATTACH inside a write-queue transaction."""
+    try:
+        created = PARTITIONS.ensure_ahead()
+        if created:
+            logger.info(f"partitions_created months={','.join(created)}")
+    except Exception as e:
+        logger.exception("Partition preparation failed", exc_info=e)
+
+
+def archive_metrics():
+    """Copy closed days of raw metrics into the per-miner columnar cold archive."""
+    try:
+        report = ARCHIVE.archive_pending()
+        if report["archived"]:
+            logger.info(
+                f"archive_complete days={','.join(report['archived'])} rows={report['rows']} "
+                f"bytes={report['bytes']}"
+            )
+    except Exception as e:
+        logger.exception("Metrics archive run failed", exc_info=e)
+
+
 def check_alerts():
     """Check for alert conditions and send notifications."""
     try:
@@ -126,7 +251,9 @@ def record_electricity_costs():
                 location_groups[location] = []
             location_groups[location].append(miner.miner_ip)
 
-        total_recorded = 0
+        avg_power = ElectricityCostService.average_power_by_miner(session, period_start, period_end)
+
+        rows = []
 
         # Process each location group
         for location, miner_ips in location_groups.items():
@@ -141,42 +268,26 @@ def record_electricity_costs():
                 # Use first active rate as fallback
                 rate = active_rates[0]
 
-            # Get average power consumption for each miner in the period
             for miner_ip in miner_ips:
-                # Query metrics for this miner in the period
-                metrics = session.query(Metric).filter(
-                    Metric.miner_ip == miner_ip,
-                    Metric.timestamp >= period_start,
-                    Metric.timestamp <= period_end
-                ).all()
-
-                if not metrics:
-                    continue
-
-                # Calculate average power
-                power_values = [m.power_w for m in metrics if m.power_w]
-                if not power_values:
-                    continue
-                avg_power_w = sum(power_values) / len(power_values)
-
-                if avg_power_w == 0:
+                avg_power_w = avg_power.get(miner_ip)
+                if not avg_power_w:
                     continue
 
                 try:
-                    # Record the cost for this miner
-                    ElectricityCostService.record_cost(
-                        session=session,
+                    rows.append(ElectricityCostService.cost_row(
                         period_start=period_start,
                         period_end=period_end,
                         power_w=avg_power_w,
                         miner_ip=miner_ip,
                         location=location if location != "default" else None,
                         rate=rate
-                    )
-                    total_recorded += 1
+                    ))
                 except Exception as e:
-                    logger.warning(f"Failed to record cost for {miner_ip}: {e}")
+                    logger.warning(f"Failed to compute cost for {miner_ip}: {e}")
 
+        columns = ElectricityCostService.COST_COLUMNS
+        total_recorded = WRITE_QUEUE.run(
+            lambda ws: BULK_WRITER.write(ElectricityCost, columns, rows, session=ws))
         logger.info(f"Recorded electricity costs for {total_recorded} miners")
 
     except Exception as e:
@@ -216,6 +327,31 @@ def start_scheduler():
     # Metrics polling job
     scheduler.add_job(poll_metrics, 'interval', seconds=POLL_INTERVAL, id='poll_metrics')
 
+    # Inventory rediscovery (incremental CIDR sweep; first run immediately to seed an
+    # empty inventory)
+    scheduler.add_job(sweep_inventory, 'interval', seconds=INVENTORY_SWEEP_INTERVAL,
+                      id='sweep_inventory', next_run_time=dt.datetime.now())
+
+    # Miner metadata enrichment (no network: reads what the poller detected)
+    scheduler.add_job(enrich_miner_metadata, 'interval', seconds=METADATA_ENRICH_INTERVAL,
+                      id='enrich_miner_metadata')
+
+    # Metric rollups (incremental from the last folded metrics id)
+    scheduler.add_job(refresh_rollups, 'interval', seconds=ROLLUP_INTERVAL, id='refresh_rollups',
+                      next_run_time=dt.datetime.now())
+
+    # Retention purge + incremental vacuum
+    scheduler.add_job(apply_retention, 'interval', seconds=RETENTION_INTERVAL, id='apply_retention')
+
+    # Monthly metrics files, created a month ahead (setup_db creates the first ones)
+    if PARTITIONS is not None:
+        scheduler.add_job(prepare_partitions, 'interval', hours=6, id='prepare_partitions')
+
+    # Cold archive of closed days (before retention purges raw rows)
+    if ARCHIVE_INTERVAL > 0:
+        scheduler.add_job(archive_metrics, 'interval', seconds=ARCHIVE_INTERVAL,
+                          id='archive_metrics')
+
     # Alert checking job (run every 2 minutes)
     scheduler.add_job(check_alerts, 'interval', minutes=2, id='check_alerts')
 
@@ -233,6 +369,12 @@ def start_scheduler():
 
     print(f"Scheduler started:")
     print(f"  - Polling metrics every {POLL_INTERVAL}s")
+    print(f"  - Sweeping inventory every {INVENTORY_SWEEP_INTERVAL}s")
+    print(f"  - Enriching miner metadata every {METADATA_ENRICH_INTERVAL}s")
+    print(f"  - Updating metric rollups every {ROLLUP_INTERVAL}s")
+    print(f"  - Applying retention every {RETENTION_INTERVAL}s")
+    if ARCHIVE_INTERVAL > 0:
+        print(f"  - Archiving closed metric days every {ARCHIVE_INTERVAL}s")
     print(f"  - Checking alerts every 2 minutes")
     print(f"  - Calculating profitability every 15 minutes")
     print(f"  - Recording electricity costs every hour")
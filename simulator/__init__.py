@@ -0,0 +1,5 @@
+"""Local CGMiner/BMminer fleet simulator for load tests and benchmarks (python -m simulator)."""
+from .fleet import FleetSimulator, alias_hosts
+from .miner import MODELS, FaultProfile, SimulatedMiner
+
+__all__ = ["FleetSimulator", "alias_hosts", "MODELS", "FaultProfile", "SimulatedMiner"]
@@ -0,0 +1,143 @@
+"""
+CLI: serve a simulated CGMiner fleet until interrupted.
+
+Examples:
+  # 2000 miners on 127.0.1.1.. port 4028; point the monitor at them with the
+  # MINER_IP_RANGE printed at startup (discovery/inventory) and run as usual
+  python -m simulator --count 2000
+
+  # one host, consecutive ports, with faults
+  python -m simulator --count 500 --layout ports --host 127.0.0.1 --port 14028 \
+      --dropout 0.01 --malformed 0.005 --reboot-rate 0.0005
+"""
+import argparse
+import asyncio
+import ipaddress
+import logging
+
+from simulator.fleet import FleetSimulator
+from simulator.miner import MODELS, FaultProfile
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        description="Serve thousands of fake CGMiner/BMminer API endpoints.")
+    p.add_argument("--count", type=int, default=100, help="Number of miners (default: 100)")
+    p.add_argument("--layout", choices=("aliases", "ports"), default="aliases",
+                   help="One loopback address per miner (default) or one port per miner")
+    p.add_argument("--host", default=None,
+                   help="First loopback alias (default 127.0.1.1) or the host for --layout ports "
+                        "(default 127.0.0.1)")
+    p.add_argument("--port", type=int, default=4028,
+                   help="API port shared by aliases, or the first port for --layout ports "
+                        "(default: 4028)")
+    p.add_argument("--models", default=",".join(MODELS),
+                   help="Comma-separated models to draw from "
+                        f"(default: all of {', '.join(MODELS)})")
+    p.add_argument("--hashrate", type=float, default=None,
+                   help="Override nominal TH/s for every miner (default: per-model)")
+    p.add_argument("--latency-ms", type=float, default=20.0,
+                   help="Base reply latency (default: 20)")
+    p.add_argument("--jitter-ms", type=float, default=10.0,
+                   help="Extra uniform latency (default: 10)")
+    p.add_argument("--dropout", type=float, default=0.0,
+                   help="Probability a request is never answered")
+    p.add_argument("--malformed", type=float, default=0.0,
+                   help="Probability a reply is truncated (still NUL-terminated)")
+    p.add_argument("--reboot-rate", type=float, default=0.0,
+                   help="Probability a request triggers a reboot")
+    p.add_argument("--reboot-downtime", type=float, default=30.0,
+                   help="Seconds a rebooting miner resets connections (default: 30)")
+    p.add_argument("--temp-drift", type=float, default=0.5,
+                   help="Max temperature random-walk step per request in C (default: 0.5)")
+    p.add_argument("--no-piped", action="store_true",
+                   help="Reject piped commands like old firmware")
+    p.add_argument("--seed", type=int, default=None, help="Seed for reproducible runs")
+    p.add_argument("--stats-interval", type=float, default=30.0,
+                   help="Seconds between request/reboot counters on stdout (0 disables)")
+    return p.parse_args(argv)
+
+
+def _raise_fd_limit(needed: int) -> None:
+    """Each miner holds a listening socket; lift the soft fd limit towards the hard one."""
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        if target < needed:
+            print(f"[warn] fd limit {target} is below the ~{needed} needed; raise `ulimit -n`")
+
+
+def _covering_network(first: str, last: str) -> ipaddress.IPv4Network:
+    """Smallest CIDR containing both addresses (so discovery can sweep the whole fleet)."""
+    for prefix in range(32, -1, -1):
+        net = ipaddress.ip_network(f"{first}/{prefix}", strict=False)
+        if ipaddress.ip_address(last) in net:
+            return net
+    return ipaddress.ip_network("0.0.0.0/0")
+
+
+def _describe(fleet: FleetSimulator) -> None:
+    print(f"Simulating {len(fleet.miners)} miners ({fleet.layout})")
+    if fleet.layout == "aliases":
+        first, last = fleet.ips[0], fleet.ips[-1]
+        cidr = _covering_network(first, last)
+        print(f"  - {first} .. {last} port {fleet.port}")
+        print(f"  - Point the monitor at it: MINER_IP_RANGE={cidr} CGMINER_PORT={fleet.port}")
+    else:
+        print(f"  - {fleet.host} ports {fleet.miners[0].port} .. {fleet.miners[-1].port}")
+        print("  - Use MinerClient(host, port=...) or poll_fleet() per port")
+
+
+async def _report(fleet: FleetSimulator, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        print(f"[stats] {fleet.stats()}", flush=True)
+
+
+async def _main(args) -> None:
+    layout_host = "127.0.1.1" if args.layout == "aliases" else "127.0.0.1"
+    faults = FaultProfile(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        dropout_rate=args.dropout,
+        malformed_rate=args.malformed,
+        reboot_rate=args.reboot_rate,
+        reboot_downtime_s=args.reboot_downtime,
+        temp_drift_c=args.temp_drift,
+        piped=not args.no_piped,
+    )
+    fleet = FleetSimulator(
+        args.count, layout=args.layout, host=args.host or layout_host, port=args.port,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        hashrate_ths=args.hashrate, faults=faults, seed=args.seed,
+    )
+    await fleet.start()
+    _describe(fleet)
+    reporter = None
+    if args.stats_interval:
+        reporter = asyncio.ensure_future(_report(fleet, args.stats_interval))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if reporter:
+            reporter.cancel()
+        await fleet.stop()
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    _raise_fd_limit(args.count + 256)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        print("Simulator stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Serve a fleet of SimulatedMiner endpoints from one asyncio event loop."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import ipaddress
+import logging
+import random
+import socket
+import struct
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from miner_config import CGMINER_PORT
+from simulator.miner import MODELS, FaultProfile, SimulatedMiner
+
+logger = logging.getLogger(__name__)
+
+# How long a client may take to send its command line before the connection is dropped
+_REQUEST_TIMEOUT_S = 5.0
+# How long a dropped-out request is held open waiting for the client to give up
+_DROPOUT_HOLD_S = 60.0
+
+
+def alias_hosts(first: str, count: int) -> List[str]:
+    """`count` consecutive loopback addresses from `first`, skipping .0 and .255."""
+    addr = ipaddress.ip_address(first)
+    if not addr.is_loopback:
+        raise ValueError(f"{first} is not a loopback address")
+    hosts = []
+    while len(hosts) < count:
+        if not addr.is_loopback:
+            raise ValueError(f"Not enough loopback addresses after {first} for {count} miners")
+        if str(addr).rsplit(".", 1)[1] not in ("0", "255"):
+            hosts.append(str(addr))
+        addr += 1
+    return hosts
+
+
+class FleetSimulator:
+    """
+    A fleet of fake CGMiner/BMminer endpoints.
+
+    Layouts:
+      - "aliases": one miner per loopback address (127.0.1.1, 127.0.1.2, ...) on a shared
+        port. Linux routes all of 127.0.0.0/8 to lo without configuration, so the
+        inventory, discover_miners() and poll_metrics() work against it unchanged.
+      - "ports": one miner per port on a single host (port, port+1, ...); useful on
+        platforms without loopback aliases, with MinerClient(host, port=...) directly.
+
+    Port 0 picks a free port: one shared by every alias, or an ephemeral port per
+    miner in the "ports" layout.
+    """
+
+    def __init__(self, count: int, layout: str = "aliases", host: str = "127.0.1.1",
+                 port: int = CGMINER_PORT, models: Optional[Sequence[str]] = None,
+                 hashrate_ths: Optional[float] = None, faults: Optional[FaultProfile] = None,
+                 seed: Optional[int] = None):
+        if layout not in ("aliases", "ports"):
+            raise ValueError("layout must be 'aliases' or 'ports'")
+        self.count = int(count)
+        self.layout = layout
+        self.host = host
+        self.port = port
+        self.models = list(models or MODELS)
+        self.hashrate_ths = hashrate_ths
+        self.faults = faults or FaultProfile()
+        self.rng = random.Random(seed)
+        self.miners: List[SimulatedMiner] = []
+        self._servers: List[asyncio.AbstractServer] = []
+
+    @property
+    def endpoints(self) -> List[Tuple[str, int]]:
+        return [(m.host, m.port) for m in self.miners]
+
+    @property
+    def ips(self) -> List[str]:
+        return [m.host for m in self.miners]
+
+    def _new_miner(self, host: str, port: int) -> SimulatedMiner:
+        return SimulatedMiner(host, port, self.rng.choice(self.models), self.faults,
+                              hashrate_ths=self.hashrate_ths, rng=random.Random(self.rng.random()))
+
+    async def _bind(self, host: str, port: int) -> SimulatedMiner:
+        miner = self._new_miner(host, port)
+        server = await asyncio.start_server(lambda r, w: self._serve(miner, r, w), host, port,
+                                            backlog=128)
+        miner.port = server.sockets[0].getsockname()[1]
+        self._servers.append(server)
+        self.miners.append(miner)
+        return miner
+
+    async def start(self) -> None:
+        if self.layout == "aliases":
+            hosts = alias_hosts(self.host, self.count)
+            port = self.port
+            for host in hosts:
+                # With port 0 the first bind picks a free port and the other aliases share it
+                port = (await self._bind(host, port)).port
+            self.port = port
+        else:
+            for i in range(self.count):
+                await self._bind(self.host, self.port + i if self.port else 0)
+        logger.info(f"simulator_started miners={len(self.miners)} layout={self.layout}")
+
+    async def stop(self) -> None:
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            with contextlib.suppress(Exception):
+                await server.wait_closed()
+        self._servers.clear()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    async def _serve(self, miner: SimulatedMiner, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        try:
+            # Clients send one JSON command terminated by a newline (or just close the write side)
+            request = await asyncio.wait_for(reader.readline(), timeout=_REQUEST_TIMEOUT_S)
+            if not request:
+                return  # TCP probe (discovery) or client gave up
+            await asyncio.sleep(miner.latency_s())
+            reply = miner.handle(request)
+            if reply is None:
+                # Rebooting: reset the connection like a host with nothing listening
+                sock = writer.get_extra_info("socket")
+                if sock is not None:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            elif not reply:
+                # Dropout: never answer; wait for the client to time out and close
+                await asyncio.wait_for(reader.read(), timeout=_DROPOUT_HOLD_S)
+            else:
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "miners": len(self.miners),
+            "requests": sum(m.requests for m in self.miners),
+            "reboots": sum(m.reboots for m in self.miners),
+            "down": sum(1 for m in self.miners if m.is_down()),
+        }
+
+    @contextlib.contextmanager
+    def running(self):
+        """Run the fleet on a background thread for the duration of a with-block."""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        failure = []
+
+        def _run():
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start())
+            except BaseException as e:
+                failure.append(e)
+                loop.run_until_complete(self.stop())
+                started.set()
+                return
+            started.set()
+            loop.run_forever()
+
+        thread = threading.Thread(target=_run, name="miner-simulator", daemon=True)
+        thread.start()
+        started.wait()
+        if failure:
+            thread.join()
+            loop.close()
+            raise failure[0]
+        try:
+            yield self
+        finally:
+            asyncio.run_coroutine_threadsafe(self.stop(), loop).result(timeout=30)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=30)
+            loop.close()
@@ -0,0 +1,213 @@
+"""A single simulated CGMiner/BMminer API endpoint.
+
+SimulatedMiner holds the miner's state (model, hashrate, temperatures, uptime) and turns
+an API request into the bytes a real Antminer would send back, including its quirks:
+a trailing NUL after the JSON, piped commands ("summary+stats+version"), and
+STATUS "E" for unknown commands. Faults (dropouts, malformed replies, reboots) are
+drawn per request from a seeded random.Random so runs are reproducible.
+"""
+from __future__ import annotations
+
+import json
+import random
+import time
+from dataclasses import dataclass
+
+# model -> (nominal TH/s, fan count, hashboard count)
+MODELS = {
+    "Antminer S19": (95.0, 4, 3),
+    "Antminer S19 Pro": (110.0, 4, 3),
+    "Antminer S19j Pro": (100.0, 4, 3),
+    "Antminer S19 XP": (140.0, 4, 3),
+    "Antminer S21": (200.0, 4, 3),
+}
+
+BMMINER_VERSION = "1.0.0"
+
+
+@dataclass
+class FaultProfile:
+    """Per-request fault probabilities and timing, shared by every miner in a fleet."""
+    latency_ms: float = 20.0  # base reply latency
+    jitter_ms: float = 10.0  # uniform extra latency on top of the base
+    dropout_rate: float = 0.0  # request swallowed: no reply until the client gives up
+    malformed_rate: float = 0.0  # truncated JSON followed by a NUL
+    reboot_rate: float = 0.0  # chance per request that the miner reboots
+    reboot_downtime_s: float = 30.0  # connections are reset while rebooting
+    temp_drift_c: float = 0.5  # max temperature random-walk step per request
+    piped: bool = True  # whether "summary+stats+version" is accepted
+
+
+class SimulatedMiner:
+    """State and reply generation for one fake miner."""
+
+    def __init__(self, host: str, port: int, model: str, faults: FaultProfile,
+                 hashrate_ths: float = None, rng: random.Random = None):
+        if model not in MODELS:
+            raise ValueError(f"Unknown model {model!r}; choose from {sorted(MODELS)}")
+        self.host = host
+        self.port = port
+        self.model = model
+        self.faults = faults
+        self.rng = rng or random.Random()
+        nominal, self.fan_count, self.chains = MODELS[model]
+        self.nominal_ths = hashrate_ths if hashrate_ths is not None else nominal
+        self.booted_at = time.time() - self.rng.uniform(3600, 30 * 86400)
+        self.down_until = 0.0
+        self.reboots = 0
+        self.requests = 0
+        self.temp_c = self.rng.uniform(60.0, 72.0)
+
+    # ---- lifecycle ----
+    def reboot(self, now: float = None) -> None:
+        now = now or time.time()
+        self.reboots += 1
+        self.down_until = now + self.faults.reboot_downtime_s
+        self.booted_at = self.down_until
+
+    def is_down(self, now: float = None) -> bool:
+        return (now or time.time()) < self.down_until
+
+    def latency_s(self) -> float:
+        return (self.faults.latency_ms + self.rng.uniform(0, self.faults.jitter_ms)) / 1000.0
+
+    # ---- request handling ----
+    def handle(self, request: bytes) -> bytes | None:
+        """
+        Return the raw reply for one API request: None while the miner is down (the
+        connection is reset), b"" for a dropout (no reply is ever sent).
+
+        The request is the JSON sent by the client ({"command": "..."}), with or
+        without the trailing newline; plain-text commands are accepted too.
+        """
+        now = time.time()
+        self.requests += 1
+        if self.is_down(now):
+            return None
+        if self.faults.reboot_rate and self.rng.random() < self.faults.reboot_rate:
+            self.reboot(now)
+            return None
+        if self.faults.dropout_rate and self.rng.random() < self.faults.dropout_rate:
+            return b""
+
+        self._drift()
+        command = self._command(request)
+        reply = self.reply(command, now)
+        raw = json.dumps(reply).encode("utf-8")
+        if self.faults.malformed_rate and self.rng.random() < self.faults.malformed_rate:
+            raw = raw[: max(1, len(raw) // 2)]
+        # bmminer terminates every reply with a NUL
+        return raw + b"\x00"
+
+    @staticmethod
+    def _command(request: bytes) -> str:
+        text = request.decode("utf-8", errors="ignore").strip().strip("\x00")
+        try:
+            return str(json.loads(text).get("command", "")).strip()
+        except (ValueError, AttributeError):
+            return text.split("|", 1)[0]
+
+    def _drift(self) -> None:
+        step = self.faults.temp_drift_c
+        self.temp_c = min(95.0, max(40.0, self.temp_c + self.rng.uniform(-step, step)))
+
+    def reply(self, command: str, now: float = None) -> dict:
+        now = now or time.time()
+        if "+" in command:
+            parts = command.split("+")
+            if not self.faults.piped or any(p not in self._handlers() for p in parts):
+                return self._error(now)
+            return {p: [self._handlers()[p](now)] for p in parts}
+        handler = self._handlers().get(command)
+        if handler is None:
+            return self._error(now)
+        if command == "restart":
+            reply = handler(now)
+            self.reboot(now)
+            return reply
+        return handler(now)
+
+    def _handlers(self) -> dict:
+        return {
+            "summary": self._summary,
+            "stats": self._stats,
+            "version": self._version,
+            "pools": self._pools,
+            "restart": self._restart,
+        }
+
+    # ---- reply builders ----
+    def _status(self, now: float, code: int, msg: str) -> list:
+        return [{"STATUS": "S", "When": int(now), "Code": code, "Msg": msg,
+                 "Description": f"bmminer {BMMINER_VERSION}"}]
+
+    def _error(self, now: float) -> dict:
+        return {"STATUS": [{"STATUS": "E", "When": int(now), "Code": 14, "Msg": "Invalid command",
+                            "Description": f"bmminer {BMMINER_VERSION}"}], "id": 1}
+
+    def _elapsed(self, now: float) -> int:
+        return max(0, int(now - self.booted_at))
+
+    def _ghs(self) -> float:
+        # +/- 3% noise around nominal, dropping off as the board runs hot
+        derate = 1.0 if self.temp_c < 85 else 0.8
+        return self.nominal_ths * 1000.0 * derate * self.rng.uniform(0.97, 1.03)
+
+    def _summary(self, now: float) -> dict:
+        ghs = self._ghs()
+        return {
+            "STATUS": self._status(now, 11, "Summary"),
+            "SUMMARY": [{
+                "Elapsed": self._elapsed(now),
+                "GHS 5s": round(ghs, 2),
+                "GHS av": round(self.nominal_ths * 1000.0, 2),
+                "Found Blocks": 0,
+                "Accepted": self.requests * 3,
+                "Rejected": self.requests // 50,
+                "Hardware Errors": self.requests // 20,
+                "Best Share": 1_234_567,
+            }],
+            "id": 1,
+        }
+
+    def _stats(self, now: float) -> dict:
+        board = {
+            "Elapsed": self._elapsed(now),
+            "GHS 5s": round(self._ghs(), 2),
+            "miner_count": self.chains,
+        }
+        for i in range(1, self.fan_count + 1):
+            board[f"fan{i}"] = int(4800 + (self.temp_c - 60) * 60 + self.rng.uniform(-120, 120))
+        for i in range(1, self.chains + 1):
+            board[f"temp{i}"] = round(self.temp_c - 8 + self.rng.uniform(-1, 1), 1)
+            board[f"temp2_{i}"] = round(self.temp_c + self.rng.uniform(-1, 1), 1)
+        return {
+            "STATUS": self._status(now, 70, "BMMiner stats"),
+            "STATS": [
+                {"BMMiner": BMMINER_VERSION, "Miner": "uart_trans.1.3",
+                 "CompileTime": "Thu Jan 1 00:00:00 CST 2023", "Type": self.model},
+                board,
+            ],
+            "id": 1,
+        }
+
+    def _version(self, now: float) -> dict:
+        return {
+            "STATUS": self._status(now, 22, "BMMiner versions"),
+            "VERSION": [{"BMMiner": BMMINER_VERSION, "API": "3.1", "Miner": "uart_trans.1.3",
+                         "CompileTime": "Thu Jan 1 00:00:00 CST 2023", "Type": self.model}],
+            "id": 1,
+        }
+
+    def _pools(self, now: float) -> dict:
+        return {
+            "STATUS": self._status(now, 7, "1 Pool(s)"),
+            "POOLS": [{"POOL": 0, "URL": "stratum+tcp://pool.example:3333", "Status": "Alive",
+                       "Priority": 0, "User": f"sim.{self.host.replace('.', '_')}_{self.port}",
+                       "Stratum Active": True}],
+            "id": 1,
+        }
+
+    def _restart(self, now: float) -> dict:
+        status = {"STATUS": "RESTART", "When": int(now), "Code": 0, "Msg": "Restart"}
+        return {"STATUS": [status], "id": 1}
@@ -256,7 +256,9 @@ async function fillCharts() {
     ensureCharts();
 
     const since = new Date(Date.now() - uiChartHours() * 60 * 60 * 1000).toISOString();
-    const params = new URLSearchParams({since, limit: '3000'});
+    // Downsampled on the server: LTTB keeps a single miner's shape, aligned average buckets
+    // let the farm view sum miners per timestamp
+    const params = new URLSearchParams({since, limit: '3000', agg: QS_IP ? 'lttb' : 'avg'});
     if (QS_IP) {
         params.set('ip', QS_IP);
     } else {
@@ -0,0 +1,69 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.archive import MetricsArchive, load_history
+from core.db import Base, Metric
+
+DAY1 = dt.datetime(2026, 5, 1)
+
+
+@pytest.fixture
+def session():
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    s = sessionmaker(bind=eng)()
+    for day in range(3):
+        for i in range(4):
+            ts = DAY1 + dt.timedelta(days=day, hours=6 * i, seconds=17)
+            for ip in ("10.0.0.1", "10.0.0.2"):
+                s.add(Metric(timestamp=ts, miner_ip=ip, hashrate_ths=100.0 + day * 10 + i,
+                             power_w=3000.0, avg_temp_c=None, avg_fan_rpm=5000.0, elapsed_s=60 * i))
+    s.commit()
+    yield s
+    s.close()
+
+
+def test_archive_pending_writes_closed_days_once(session, tmp_path):
+    archive = MetricsArchive(tmp_path)
+    now = DAY1 + dt.timedelta(days=3, hours=1)  # day 3 ended an hour ago: not yet
+    report = archive.archive_pending(session, now=now, after_days=1)
+    assert report["archived"] == ["2026-05-01", "2026-05-02"]
+    assert report["rows"] == 16
+    assert archive.miners() == ["10.0.0.1", "10.0.0.2"]
+    assert archive.archive_pending(session, now=now, after_days=1)["archived"] == []
+
+    arr = np.load(archive.path("10.0.0.1", DAY1.date()), mmap_mode="r")
+    assert isinstance(arr, np.memmap)
+    assert list(arr["dt"]) == [17, 6 * 3600, 6 * 3600, 6 * 3600]  # delta-encoded
+
+
+def test_read_returns_mmapped_columns_for_range(session, tmp_path):
+    archive = MetricsArchive(tmp_path)
+    archive.archive_pending(session, now=DAY1 + dt.timedelta(days=4), after_days=0)
+
+    out = archive.read("10.0.0.2", DAY1 + dt.timedelta(hours=12),
+                       DAY1 + dt.timedelta(days=1, hours=7))
+    assert [str(t) for t in out["timestamp"]] == [
+        "2026-05-01T12:00:17", "2026-05-01T18:00:17", "2026-05-02T00:00:17", "2026-05-02T06:00:17"]
+    assert list(out["hashrate_ths"]) == [102.0, 103.0, 110.0, 111.0]
+    assert np.isnan(out["avg_temp_c"]).all()
+
+    fleet = archive.fleet(DAY1, DAY1 + dt.timedelta(days=3))
+    assert len(fleet) == 24 and set(fleet["miner_ip"]) == {"10.0.0.1", "10.0.0.2"}
+
+
+def test_load_history_joins_archive_and_database(session, tmp_path):
+    archive = MetricsArchive(tmp_path)
+    archive.archive_pending(session, now=DAY1 + dt.timedelta(days=2), after_days=0)  # day 1 only
+
+    df = load_history("10.0.0.1", DAY1, DAY1 + dt.timedelta(days=3), session=session,
+                      archive=archive)
+    assert len(df) == 12
+    assert df["timestamp"].is_monotonic_increasing
+    assert list(df["hashrate_ths"][3:6]) == [103.0, 110.0, 111.0]
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import socketserver
+import threading
+import time
+
+import pytest
+
+from core.miner import AsyncMinerClient, MinerClient, poll_fleet
+
+RESPONSES = {
+    "summary": {"STATUS": [{"STATUS": "S", "When": 1722427200}],
+                "SUMMARY": [{"GHS 5s": "95000.5", "Elapsed": 3600}]},
+    "stats": {"STATS": [{"Type": "Antminer S19 Pro", "temp1": 65, "temp2": 71,
+                         "fan1": 5400, "fan2": 5600}]},
+    "version": {"VERSION": [{"CGMiner": "4.9.0", "Type": "Antminer S19 Pro"}]},
+}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        cmd = json.loads(self.rfile.readline().decode("utf-8"))["command"]
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if "+" in cmd:
+            reply = {c: [RESPONSES.get(c, {})] for c in cmd.split("+")}
+        else:
+            reply = RESPONSES.get(cmd, {})
+        # bmminer-style trailing NUL
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\x00")
+
+
+def _serve(delay=0.0):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def fake_miner():
+    server = _serve()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_fetch_normalized_matches_sync(fake_miner):
+    host, port = fake_miner
+    expected = MinerClient(host, port=port, timeout=2).fetch_normalized()
+    result = asyncio.run(AsyncMinerClient(host, port=port, timeout=2).fetch_normalized())
+    assert result == expected
+    assert result["model"] == "Antminer S19 Pro"
+    assert result["avg_temp_c"] == 68.0
+
+
+def test_poll_fleet_reports_deadline_timeouts():
+    slow = _serve(delay=2.0)
+    try:
+        port = slow.server_address[1]
+        cycle = asyncio.run(poll_fleet(["127.0.0.1"], concurrency=4, deadline=0.3, timeout=5,
+                                       port=port))
+    finally:
+        slow.shutdown()
+        slow.server_close()
+    assert cycle["results"] == {}
+    assert cycle["timed_out"] == ["127.0.0.1"]
+    assert cycle["duration_s"] < 2.0
+
+
+def test_poll_fleet_collects_connection_errors():
+    # Port 1 on loopback is closed; connection is refused immediately
+    cycle = asyncio.run(poll_fleet(["127.0.0.1"], concurrency=1, deadline=5, timeout=1, port=1))
+    assert "127.0.0.1" in cycle["errors"]
+    assert cycle["results"] == {}
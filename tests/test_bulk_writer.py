@@ -0,0 +1,127 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import scheduler
+from core.db import (
+    METRIC_COLUMNS,
+    Alert,
+    Base,
+    BulkWriter,
+    Metric,
+    MinerLatest,
+    ensure_miner_latest,
+)
+from core.fleet_state import FleetState
+from core.write_queue import WriteQueue
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    return eng
+
+
+def _rows(n, ts=None):
+    ts = ts or dt.datetime(2026, 1, 1)
+    return [(ts, f"10.0.0.{i}", 3000.0, 100.0, 60, 65.0, 5000.0) for i in range(n)]
+
+
+def test_batches_and_counters(engine):
+    writer = BulkWriter(bind=engine, batch_size=4)
+    assert writer.write(Metric, METRIC_COLUMNS, _rows(10)) == 10
+
+    s = sessionmaker(bind=engine)()
+    assert s.query(Metric).count() == 10
+    s.close()
+
+    st = writer.stats()["metrics"]
+    assert st["rows"] == 10
+    assert st["batches"] == 3  # 4 + 4 + 2
+    assert st["last_batch_rows"] == 2
+    assert st["rows_per_s"] > 0 and st["avg_batch_ms"] >= 0
+
+
+def test_returning_ids_in_row_order_on_session(engine):
+    session = sessionmaker(bind=engine)()
+    writer = BulkWriter(bind=engine)
+    cols = ("rule_id", "miner_ip", "alert_type", "severity", "message", "status")
+    rows = [(None, ip, "temp", "warning", f"hot {ip}", "active") for ip in ("a", "b", "c")]
+    ids = writer.write(Alert, cols, rows, session=session, returning="id")
+    assert [session.get(Alert, i).miner_ip for i in ids] == ["a", "b", "c"]
+    session.close()
+
+
+def test_failed_batch_rolls_back_and_is_counted(engine):
+    session = sessionmaker(bind=engine)()
+    writer = BulkWriter(bind=engine)
+    with pytest.raises(IntegrityError):
+        # message is NOT NULL
+        writer.write(Alert, ("miner_ip", "alert_type", "severity", "message"),
+                     [("a", "temp", "warning", None)], session=session)
+    assert writer.stats()["alerts"]["failed_batches"] == 1
+    assert session.query(Alert).count() == 0
+    session.close()
+
+
+def test_poll_metrics_writes_one_batch(engine, monkeypatch):
+    writer = BulkWriter(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    results = {f"10.0.0.{i}": {"power_w": 3000, "hashrate_ths": 100, "elapsed_s": 60,
+                               "avg_temp_c": 65, "avg_fan_rpm": 5000} for i in range(5)}
+
+    async def fake_poll_fleet(ips, **kwargs):
+        return {"results": results, "errors": {}, "timed_out": [], "duration_s": 0.1}
+
+    monkeypatch.setattr(scheduler, "SessionLocal", session_factory)
+    monkeypatch.setattr(scheduler, "BULK_WRITER", writer)
+    monkeypatch.setattr(scheduler, "WRITE_QUEUE", WriteQueue(bind=engine))
+    monkeypatch.setattr(scheduler, "get_poll_targets", lambda session: list(results))
+    monkeypatch.setattr(scheduler, "poll_fleet", fake_poll_fleet)
+    monkeypatch.setattr(scheduler, "FLEET_STATE", FleetState(session_factory=session_factory))
+
+    scheduler.poll_metrics()
+
+    s = session_factory()
+    assert sorted(m.miner_ip for m in s.query(Metric)) == sorted(results)
+    assert len({m.timestamp for m in s.query(Metric)}) == 1
+    s.close()
+    assert writer.stats()["metrics"]["batches"] == 1
+    assert scheduler.FLEET_STATE.snapshot().ips() == sorted(results)
+
+
+def test_metrics_batches_upsert_miner_latest(engine):
+    writer = BulkWriter(bind=engine)
+    t0 = dt.datetime(2026, 1, 1, 12, 0)
+    writer.write(Metric, METRIC_COLUMNS, _rows(3, ts=t0))
+    newer = [(t0 + dt.timedelta(minutes=1), "10.0.0.1", 3100.0, 110.0, 120, 66.0, 5100.0)]
+    writer.write(Metric, METRIC_COLUMNS, newer)
+    # A late, older sample must not move miner_latest backwards
+    late = (t0 - dt.timedelta(minutes=5), "10.0.0.1", 1.0, 1.0, 1, 1.0, 1.0)
+    writer.write(Metric, METRIC_COLUMNS, [late])
+
+    s = sessionmaker(bind=engine)()
+    latest = {r.miner_ip: r for r in s.query(MinerLatest)}
+    assert sorted(latest) == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+    assert latest["10.0.0.1"].timestamp == t0 + dt.timedelta(minutes=1)
+    assert latest["10.0.0.1"].hashrate_ths == 110.0
+    s.close()
+
+
+def test_rebuild_miner_latest_from_history(engine):
+    s = sessionmaker(bind=engine)()
+    t0 = dt.datetime(2026, 1, 1)
+    for i in range(3):
+        s.add(Metric(timestamp=t0 + dt.timedelta(minutes=i), miner_ip="10.0.0.9",
+                     hashrate_ths=float(i)))
+    s.commit()
+
+    ensure_miner_latest(engine)
+    assert s.query(MinerLatest).one().hashrate_ths == 2.0
+    s.close()
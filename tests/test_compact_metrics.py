@@ -0,0 +1,149 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import core.db as db
+import core.retention as retention
+import core.rollups as rollups
+from core.db import (
+    METRIC_COLUMNS,
+    Base,
+    BulkWriter,
+    CompactMetric,
+    CompactMetrics,
+    Metric,
+    MinerKey,
+    RollupState,
+)
+from core.write_queue import WriteQueue
+
+T0 = dt.datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    return eng
+
+
+@pytest.fixture
+def compact(engine, monkeypatch):
+    store = CompactMetrics(bind=engine)
+    monkeypatch.setattr(db, "COMPACT", store)
+    monkeypatch.setattr(rollups, "COMPACT", store)
+    monkeypatch.setattr(retention, "COMPACT", store)
+    return store
+
+
+def _rows(ts, n=3, hashrate=100.0):
+    return [(ts, f"10.0.0.{i}", 3000.0, hashrate, 60, 65.0, 5000.0) for i in range(n)]
+
+
+def test_writes_compact_rows_and_reads_them_as_metrics(engine, compact):
+    writer = BulkWriter(bind=engine, metrics_store=compact)
+    writer.write(Metric, METRIC_COLUMNS, _rows(T0) + _rows(T0 + dt.timedelta(seconds=30)))
+    # Same miner and second again: replaces the earlier sample
+    writer.write(Metric, METRIC_COLUMNS, [(T0, "10.0.0.1", 1.0, 1.0, 1, 1.0, 1.0)])
+
+    s = sessionmaker(bind=engine)()
+    assert s.query(Metric).count() == 0
+    assert s.query(CompactMetric).count() == 6
+    assert sorted(k.ip for k in s.query(MinerKey)) == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+
+    m = db.metrics_source()
+    rows = (s.query(m).filter(m.miner_ip == "10.0.0.1", m.timestamp >= T0)
+            .order_by(m.timestamp).all())
+    assert [(r.timestamp, r.hashrate_ths) for r in rows] == [
+        (T0, 1.0), (T0 + dt.timedelta(seconds=30), 100.0)]
+    assert rows[0].id < rows[1].id
+    s.close()
+
+
+def test_ids_line_up_with_the_batch(engine, compact, caplog):
+    late = T0 + dt.timedelta(milliseconds=400)
+    rows = [(T0, "10.0.0.1", 3000.0, 100.0, 60, 65.0, 5000.0),
+            (T0, None, 3000.0, 100.0, 60, 65.0, 5000.0),
+            (late, "10.0.0.1", 3000.0, 120.0, 60, 65.0, 5000.0)]
+    batch = [dict(zip(METRIC_COLUMNS, row, strict=True)) for row in rows]
+    with engine.begin() as conn:
+        compact.prepare(conn, batch)
+        ids = compact.insert(conn, batch)
+
+    # One id per input row: none for the row without an IP, and the same one for two
+    # samples of a miner within one second, of which the later is kept
+    assert len(ids) == 3 and ids[1] is None and ids[0] == ids[2]
+    assert compact.skipped == 1 and "metrics_compact_rows_skipped rows=1" in caplog.text
+    s = sessionmaker(bind=engine)()
+    assert [r.hashrate_ths for r in s.query(CompactMetric)] == [120.0]
+    s.close()
+
+
+def test_rollups_follow_compact_ids_without_double_counting(engine, compact):
+    s = sessionmaker(bind=engine)()
+    # History that the legacy table already folded in, copied over by the migration
+    s.add(Metric(timestamp=T0, miner_ip="10.0.0.0", hashrate_ths=50.0))
+    s.commit()
+    s.merge(RollupState(name="metrics", last_metric_id=1))
+    s.commit()
+    writer = BulkWriter(bind=engine, metrics_store=compact)
+    writer.write(Metric, METRIC_COLUMNS, _rows(T0, n=1, hashrate=50.0))
+
+    writer.write(Metric, METRIC_COLUMNS, _rows(T0 + dt.timedelta(seconds=30), n=1))
+    result = rollups.update_rollups(session=s)
+    assert result["rows"] == 1
+
+    bucket = s.query(db.ROLLUP_MODELS["1m"]).one()
+    assert bucket.samples == 1 and bucket.hashrate_ths_avg == 100.0
+    assert s.get(RollupState, "metrics_compact").last_metric_id == result["high_water_mark"]
+    s.close()
+
+
+def test_retention_purges_compact_rows_by_key(engine, compact):
+    writer = BulkWriter(bind=engine, metrics_store=compact)
+    writer.write(Metric, METRIC_COLUMNS, _rows(T0 - dt.timedelta(days=30)) + _rows(T0))
+    s = sessionmaker(bind=engine)()
+    rollups.update_rollups(session=s)
+
+    report = retention.run_retention(bind=engine, now=T0, days={"metrics": 14}, chunk_rows=2,
+                                     pause_s=0, vacuum=False)
+    assert report["tables"]["metrics_compact"]["deleted"] == 3
+    assert s.query(CompactMetric).count() == 3
+    s.close()
+
+
+def test_new_miners_register_inside_the_queue_transaction(tmp_path, monkeypatch):
+    eng = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", future=True,
+                        connect_args={"check_same_thread": False, "timeout": 1})
+    Base.metadata.create_all(bind=eng)
+    store = CompactMetrics(bind=eng)
+    writer = BulkWriter(bind=eng, metrics_store=store)
+    queue = WriteQueue(bind=eng, max_batch=10, max_wait_ms=200)
+    try:
+        # An earlier job in the same group already holds the write lock
+        def write(rows):
+            return lambda ws: writer.write(Metric, METRIC_COLUMNS, rows, session=ws)
+
+        first = queue.submit(write(_rows(T0, n=1)))
+        second = queue.submit(write(_rows(T0, n=3)))
+        assert first.result(5) == 1 and second.result(5) == 3
+
+        def fails(ws):
+            store.prepare(ws.connection(), [{"miner_ip": "10.0.0.9", "timestamp": T0}])
+            raise RuntimeError("batch failed after registering a miner")
+
+        with pytest.raises(RuntimeError):
+            queue.run(fails)
+        assert "10.0.0.9" not in store._ids  # rolled back with the job
+        queue.run(write([(T0, "10.0.0.9", 1.0, 1.0, 1, 1.0, 1.0)]))
+    finally:
+        queue.close(5)
+    s = sessionmaker(bind=eng)()
+    keys = {k.ip: k.id for k in s.query(MinerKey)}
+    assert store._ids == keys and len(keys) == 4
+    assert {r.miner_id for r in s.query(CompactMetric)} == set(keys.values())
+    s.close()
@@ -0,0 +1,128 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import api.endpoints as endpoints
+from api.endpoints import api_bp
+from core.db import METRIC_COLUMNS, Base, BulkWriter, Metric
+from core.downsample import bucket_reduce, downsample_rows, lttb_indices, series_columns
+from core.fleet_state import FleetState
+from core.rollups import update_rollups
+
+T0 = dt.datetime(2026, 1, 1)
+
+
+def _raw(n, ips=("a",), spike_at=None):
+    """(timestamp, miner_ip, hashrate, power, temp, fan) rows every 30 s."""
+    return [(T0 + dt.timedelta(seconds=30 * i), ip,
+             500.0 if i == spike_at else 100.0 + np.sin(i / 40.0), 3000.0, 65.0, None)
+            for i in range(n) for ip in ips]
+
+
+def test_lttb_keeps_ends_and_spikes():
+    t = np.arange(10000, dtype=np.int64) * 30_000_000
+    y = np.sin(np.arange(10000) / 300.0)
+    y[4321] = 25.0
+    keep = lttb_indices(t, y, 200)
+    assert len(keep) == 200 and keep[0] == 0 and keep[-1] == 9999
+    assert 4321 in keep
+    assert (np.diff(keep) > 0).all()
+    assert list(lttb_indices(t[:5], y[:5], 10)) == [0, 1, 2, 3, 4]
+
+
+def test_buckets_weight_averages_and_keep_extremes():
+    rows = [(T0 + dt.timedelta(seconds=s), "a", ths, None, 60.0, None)
+            for s, ths in ((0, 100.0), (10, None), (20, 120.0), (60, 90.0), (70, 150.0))]
+    cols = series_columns(rows)
+    out = bucket_reduce(cols, 2, "minmax")
+    assert len(out["t"]) == 2 and out["w"].tolist() == [3.0, 2.0]
+    assert out["hashrate_ths"].tolist() == [110.0, 120.0]
+    assert out["hashrate_ths_min"].tolist() == [100.0, 90.0]
+    assert out["hashrate_ths_max"].tolist() == [120.0, 150.0]
+    assert np.isnan(out["power_w"]).all()
+    assert bucket_reduce(cols, 2, "max")["hashrate_ths"].tolist() == [120.0, 150.0]
+
+
+def test_rows_are_bounded_per_miner_and_ordered():
+    out = downsample_rows(series_columns(_raw(5000, ips=("b", "a"), spike_at=777)), 100, "lttb")
+    assert [sum(r["ip"] == ip for r in out) for ip in ("a", "b")] == [100, 100]
+    keys = [(r["timestamp"], r["ip"]) for r in out]
+    assert keys == sorted(keys)
+    assert max(r["hashrate_ths"] for r in out) == 500.0
+    assert out[0]["timestamp"] == "2026-01-01T00:00:00Z" and out[0]["avg_fan_rpm"] is None
+
+    out = downsample_rows(series_columns(_raw(5000)), 100, "minmax")
+    assert len(out) <= 100 and out[0]["samples"] == 50 and "power_w_max" in out[0]
+    assert downsample_rows(series_columns([]), 100, "avg") == []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    factory = sessionmaker(bind=eng, expire_on_commit=False)
+    now = dt.datetime.utcnow().replace(microsecond=0)
+    # 7 days of one miner at 60 s, plus a spike
+    rows = [(now - dt.timedelta(minutes=m), "a", 3000.0, 900.0 if m == 5000 else 100.0,
+             60, 65.0, 5000.0)
+            for m in range(7 * 1440)]
+    BulkWriter(bind=eng).write(Metric, METRIC_COLUMNS, rows)
+    update_rollups(session=factory())
+    monkeypatch.setattr(endpoints, "ReadSessionLocal", factory)
+    monkeypatch.setattr(endpoints, "FLEET_STATE", FleetState(session_factory=factory))
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    client = app.test_client()
+    client.since = (now - dt.timedelta(days=7)).isoformat()
+    client.now = now
+    return client
+
+
+def test_metrics_endpoint_downsamples_whole_window(client):
+    r = client.get(f"/api/metrics?ip=a&since={client.since}&points=300&agg=lttb&resolution=raw")
+    data = r.get_json()
+    assert len(data) == 300 and r.headers["X-Metrics-Downsample"] == "lttb;points=300;rows=10080"
+    assert max(d["hashrate_ths"] for d in data) == 900.0
+
+    # auto reads the 1m rollup (raw 30 s samples would not fit the source budget);
+    # max keeps the spike
+    r = client.get(f"/api/metrics?ip=a&since={client.since}&points=200&agg=max")
+    assert r.headers["X-Metrics-Resolution"] == "1m"
+    data = r.get_json()
+    assert len(data) <= 200 and max(d["hashrate_ths"] for d in data) == 900.0
+
+
+def test_row_cap_keeps_the_newest_data(client, monkeypatch):
+    monkeypatch.setattr(endpoints, "METRICS_DOWNSAMPLE_MAX_ROWS", 1000)
+    newest = (client.now - dt.timedelta(hours=1)).isoformat() + "Z"  # last bucket start
+
+    # 10080 raw rows in the window, the cap keeps the newest 1000
+    r = client.get(f"/api/metrics?ip=a&since={client.since}&points=50&agg=avg&resolution=raw")
+    assert r.headers["X-Metrics-Downsample"] == "avg;points=50;rows=1000"
+    assert r.get_json()[-1]["timestamp"] >= newest
+
+    # Without since the window defaults to METRICS_DOWNSAMPLE_WINDOW, not all history
+    r = client.get("/api/metrics?ip=a&points=50&agg=avg")
+    assert r.headers["X-Metrics-Resolution"] == "5m"  # 1440 raw rows would exceed the cap
+    data = r.get_json()
+    assert data[-1]["timestamp"] >= newest
+    assert data[0]["timestamp"] >= (client.now - dt.timedelta(days=1, minutes=5)).isoformat()
+
+
+def test_metrics_endpoint_rejects_unknown_agg(client):
+    assert client.get("/api/metrics?agg=median").status_code == 400
+    assert client.get("/api/metrics?agg=lttb&field=uptime").status_code == 400
+
+
+def test_buckets_line_up_across_miners():
+    late = T0 + dt.timedelta(hours=5)
+    rows = _raw(3000, ips=("a",)) + [r for r in _raw(3000, ips=("b",)) if r[0] >= late]
+    out = downsample_rows(series_columns(sorted(rows)), 50, "avg")
+    stamps = {ip: {r["timestamp"] for r in out if r["ip"] == ip} for ip in ("a", "b")}
+    assert len(stamps["a"]) <= 50 and stamps["b"] <= stamps["a"]
@@ -21,6 +21,11 @@ class BadJSONSocket:
         chunk, self._data = self._data, b''
         return chunk
 
+    def recv_into(self, buffer):
+        chunk, self._data = self._data[:len(buffer)], self._data[len(buffer):]
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
     def close(self):
         pass
 
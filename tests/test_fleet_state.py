@@ -0,0 +1,105 @@
+import datetime as dt
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.db import METRIC_COLUMNS, Base, MinerLatest
+from core.fleet_state import FleetState
+
+T0 = dt.datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def session_factory():
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    return sessionmaker(bind=eng)
+
+
+def _row(ip, ts, hashrate=100.0):
+    return (ts, ip, 3000.0, hashrate, 60, 65.0, 5000.0)
+
+
+def test_cold_start_loads_miner_latest_once(session_factory):
+    s = session_factory()
+    s.add(MinerLatest(miner_ip="10.0.0.2", timestamp=T0, hashrate_ths=90.0))
+    s.add(MinerLatest(miner_ip="10.0.0.1", timestamp=T0, hashrate_ths=80.0))
+    s.commit()
+    s.close()
+
+    fleet = FleetState(session_factory=session_factory)
+    snap = fleet.snapshot()
+    assert snap.source == "db" and snap.ips() == ["10.0.0.1", "10.0.0.2"]
+    assert snap.get("10.0.0.2").hashrate_ths == 90.0
+    assert fleet.snapshot() is snap
+    assert fleet.stats()["loads"] == 1
+
+
+def test_update_swaps_snapshot_and_ignores_older_samples(session_factory):
+    fleet = FleetState(session_factory=session_factory)
+    first = fleet.snapshot()
+    assert len(first) == 0
+
+    assert fleet.update(METRIC_COLUMNS, [_row("10.0.0.1", T0), _row("10.0.0.2", T0)]) == 2
+    second = fleet.snapshot()
+    assert second.version == first.version + 1 and len(first) == 0
+
+    late = _row("10.0.0.1", T0 - dt.timedelta(minutes=5), hashrate=1.0)
+    newer = _row("10.0.0.2", T0 + dt.timedelta(minutes=1), hashrate=110.0)
+    assert fleet.update(METRIC_COLUMNS, [late, newer]) == 1
+    third = fleet.snapshot()
+    assert third.get("10.0.0.1").hashrate_ths == 100.0
+    assert third.get("10.0.0.2").hashrate_ths == 110.0
+    assert second.get("10.0.0.2").hashrate_ths == 100.0  # published snapshots never change
+    assert fleet.update(METRIC_COLUMNS, []) == 0 and fleet.snapshot() is third
+
+
+def test_fresh_and_select_filters(session_factory):
+    fleet = FleetState(session_factory=session_factory)
+    fleet.update(METRIC_COLUMNS,
+                 [_row(f"10.0.0.{i}", T0 - dt.timedelta(minutes=i)) for i in range(1, 6)])
+    snap = fleet.snapshot()
+
+    def ips(records):
+        return [r.miner_ip for r in records]
+
+    assert ips(snap.fresh(T0 - dt.timedelta(minutes=2))) == ["10.0.0.2", "10.0.0.1"]
+    assert snap.ips(fresh_within=3, now=T0) == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    assert ips(snap.select(ips=["10.0.0.5", "10.0.0.1", "10.0.0.9"])) == ["10.0.0.1", "10.0.0.5"]
+    assert ips(snap.select(ips=["10.0.0.5", "10.0.0.1"], fresh_within=3, now=T0)) == ["10.0.0.1"]
+    assert snap.get("10.0.0.1").as_dict()["timestamp"] == T0 - dt.timedelta(minutes=1)
+
+
+def test_failed_cold_start_is_retried():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise RuntimeError("database is locked")
+
+    fleet = FleetState(session_factory=broken)
+    assert len(fleet.snapshot()) == 0 and len(fleet.snapshot()) == 0
+    assert len(calls) == 2 and fleet.stats()["load_errors"] == 2
+
+
+def test_miners_current_serves_from_fleet_state(monkeypatch, session_factory):
+    from api import endpoints
+
+    fleet = FleetState(session_factory=session_factory)
+    now = dt.datetime.utcnow()
+    fleet.update(METRIC_COLUMNS,
+                 [_row("10.0.0.1", now), _row("10.0.0.2", now - dt.timedelta(hours=2))])
+    monkeypatch.setattr(endpoints, "FLEET_STATE", fleet)
+    monkeypatch.setattr(endpoints, "ReadSessionLocal", session_factory)
+
+    app = Flask(__name__)
+    app.register_blueprint(endpoints.api_bp, url_prefix="/api")
+    client = app.test_client()
+    data = client.get("/api/miners/current?active_only=true&fresh_within=30").get_json()
+    assert [m["ip"] for m in data] == ["10.0.0.1"]
+    data = client.get("/api/miners/current?active_only=false").get_json()
+    assert [m["ip"] for m in data] == ["10.0.0.1", "10.0.0.2"]
@@ -0,0 +1,125 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import core.inventory as inventory
+from core.db import Base, Miner
+from core.inventory import DiscoverySweeper, MetadataEnricher, get_poll_targets, merge_discovered
+from core.miner import MinerMetadata
+from core.write_queue import WriteQueue
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(bind=engine)
+    s = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield s
+    s.close()
+
+
+def test_merge_adds_new_miners_and_targets_them(session):
+    summary = merge_discovered({"10.0.0.2": "tcp", "10.0.0.3": "mdns"}, session=session)
+    assert summary["added"] == 2
+    assert get_poll_targets(session) == ["10.0.0.2", "10.0.0.3"]
+
+
+def test_missing_miner_vanishes_after_threshold(session, monkeypatch):
+    monkeypatch.setattr(inventory, "INVENTORY_MISSED_SWEEPS", 2)
+    merge_discovered({"10.0.0.2": "tcp", "10.0.0.3": "tcp"}, session=session)
+    swept = ["10.0.0.2", "10.0.0.3"]
+
+    merge_discovered({"10.0.0.2": "tcp"}, swept=swept, session=session)
+    assert "10.0.0.3" in get_poll_targets(session)
+
+    summary = merge_discovered({"10.0.0.2": "tcp"}, swept=swept, session=session)
+    assert summary["vanished"] == 1
+    assert get_poll_targets(session) == ["10.0.0.2"]
+
+    # Coming back reactivates it
+    summary = merge_discovered({"10.0.0.3": "tcp"}, swept=["10.0.0.3"], session=session)
+    assert summary["reactivated"] == 1
+    assert get_poll_targets(session) == ["10.0.0.2", "10.0.0.3"]
+
+
+def test_legacy_rows_without_flag_are_targets(session):
+    session.add(Miner(miner_ip="10.0.0.9", is_active=None))
+    session.commit()
+    assert get_poll_targets(session) == ["10.0.0.9"]
+
+
+def test_sweeper_walks_cidr_in_chunks(session, monkeypatch):
+    probed = []
+
+    def fake_probe(hosts, **kwargs):
+        hosts = list(hosts)
+        probed.append(hosts)
+        return {h for h in hosts if h.endswith(".5")}
+
+    monkeypatch.setattr(inventory, "probe_hosts", fake_probe)
+    sweeper = DiscoverySweeper(cidrs=["10.0.0.0/29"], chunk_size=4, use_mdns=False)
+
+    first = sweeper.run_once(session=session)
+    second = sweeper.run_once(session=session)
+
+    assert [len(p) for p in probed] == [4, 2]  # /29 has 6 hosts
+    assert first["cursor"] == 4 and second["cursor"] == 0
+    assert get_poll_targets(session) == ["10.0.0.5"]
+
+
+def test_discover_route_merges_through_the_write_queue(monkeypatch):
+    from api import endpoints
+
+    engine = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    queue = WriteQueue(bind=engine)
+    monkeypatch.setattr(endpoints, "WRITE_QUEUE", queue)
+    monkeypatch.setattr(endpoints, "discover_miners",
+                        lambda **kwargs: {"10.0.0.7": "tcp", "10.0.0.8": "mdns"})
+    app = Flask(__name__)
+    app.register_blueprint(endpoints.api_bp, url_prefix="/api")
+
+    r = app.test_client().get("/api/discover?cidrs=10.0.0.0/29")
+    assert r.get_json()["miners"] == ["10.0.0.7", "10.0.0.8"]
+    assert queue.stats()["jobs"] == 1
+    s = sessionmaker(bind=engine)()
+    assert get_poll_targets(s) == ["10.0.0.7", "10.0.0.8"]
+    s.close()
+    queue.close()
+
+
+def _meta(model, firmware="BMMiner 1.0.0", detected_at=1.0):
+    return MinerMetadata(model=model, firmware=firmware, family="antminer_stock", j_per_th=29.5,
+                         elapsed_s=60, detected_at=detected_at)
+
+
+def test_enricher_writes_detected_metadata_once_per_detection(session, monkeypatch):
+    cache = {"10.0.0.2": _meta("Antminer S19 Pro 110T (Vnish 1.2.6)", firmware="")}
+    monkeypatch.setattr(inventory, "get_cached_metadata", lambda ip: cache.get(ip))
+    merge_discovered({"10.0.0.2": "tcp", "10.0.0.3": "tcp"}, session=session)
+    enricher = MetadataEnricher(full_interval=3600)
+
+    summary = enricher.run_once(["10.0.0.2", "10.0.0.3"], session=session)
+    assert (summary["pending"], summary["updated"]) == (1, 1)
+    miner = session.query(Miner).filter_by(miner_ip="10.0.0.2").one()
+    assert (miner.vendor, miner.model, miner.firmware_version) == (
+        "Bitmain", "Antminer S19 Pro 110T", "Vnish 1.2.6")
+    assert miner.nominal_ths and miner.nominal_efficiency_j_per_th
+
+    # Nothing new detected: no write; hand-entered nominal values survive a firmware change
+    assert enricher.run_once(["10.0.0.2"], session=session)["pending"] == 0
+    miner.nominal_ths = 104.0
+    session.commit()
+    cache["10.0.0.2"] = _meta("Antminer S19 Pro 110T", firmware="BMMiner 2.0.0", detected_at=2.0)
+    assert enricher.run_once(["10.0.0.2"], session=session)["updated"] == 1
+    assert (miner.firmware_version, miner.nominal_ths) == ("BMMiner 2.0.0", 104.0)
+
+
+def test_enricher_adds_rows_for_polled_miners_missing_from_inventory(session, monkeypatch):
+    monkeypatch.setattr(inventory, "get_cached_metadata", lambda ip: _meta("WhatsMiner M30S"))
+    summary = MetadataEnricher().run_once(["10.0.0.7"], session=session)
+    assert summary["added"] == 1 and summary["full"] == 1
+    assert session.query(Miner).filter_by(miner_ip="10.0.0.7").one().vendor == "MicroBT"
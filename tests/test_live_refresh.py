@@ -0,0 +1,102 @@
+import datetime as dt
+import threading
+
+from flask import Flask
+
+from core.db import METRIC_COLUMNS
+from core.fleet_state import FleetState
+from core.live_refresh import LiveRefresher
+
+
+def _payload(ip):
+    return {"hashrate_ths": 110.0, "elapsed_s": 60, "avg_temp_c": 70.0, "avg_fan_rpm": 5000.0,
+            "power_w": 3200.0, "when": "2026-01-01T12:00:00Z"}
+
+
+def test_concurrent_callers_share_one_fetch_per_miner():
+    calls, gate = [], threading.Event()
+
+    def fetch(ip):
+        calls.append(ip)
+        gate.wait(5)
+        return _payload(ip)
+
+    refresher = LiveRefresher(fetch=fetch, workers=4, min_interval=60)
+    results = []
+
+    def caller():
+        results.append(refresher.refresh(["a", "b"], timeout=5))
+
+    callers = [threading.Thread(target=caller) for _ in range(5)]
+    for t in callers:
+        t.start()
+    while refresher.stats()["joined"] + refresher.stats()["fetches"] < 10:
+        threading.Event().wait(0.01)
+    gate.set()
+    for t in callers:
+        t.join(5)
+
+    assert sorted(calls) == ["a", "b"]
+    assert all(sorted(r) == ["a", "b"] for r in results) and len(results) == 5
+    st = refresher.stats()
+    assert st["fetches"] == 2 and st["joined"] == 8 and st["in_flight"] == 0
+
+
+def test_results_and_failures_are_reused_within_the_interval():
+    calls = []
+
+    def fetch(ip):
+        calls.append(ip)
+        if ip == "down":
+            raise OSError("connection refused")
+        return _payload(ip)
+
+    refresher = LiveRefresher(fetch=fetch, workers=2, min_interval=60)
+    assert list(refresher.refresh(["up", "down"])) == ["up"]
+    assert list(refresher.refresh(["up", "down"])) == ["up"]
+    assert sorted(calls) == ["down", "up"]
+    assert refresher.stats()["reused"] == 2 and refresher.stats()["failures"] == 1
+
+    refresher.forget("down")
+    refresher.refresh(["up", "down"])
+    assert sorted(calls) == ["down", "down", "up"]
+
+
+def test_callers_stop_waiting_after_timeout():
+    gate = threading.Event()
+    refresher = LiveRefresher(fetch=lambda ip: gate.wait(5) and _payload(ip), workers=1,
+                              min_interval=60)
+    assert refresher.refresh(["slow"], timeout=0.05) == {}
+    assert refresher.stats()["timeouts"] == 1
+    gate.set()
+    assert refresher.refresh(["slow"], timeout=5) == {"slow": _payload("slow")}
+
+
+def test_summary_serves_poll_results_and_refreshes_on_request(monkeypatch):
+    from api import endpoints
+
+    now = dt.datetime.utcnow()
+    fleet = FleetState(session_factory=lambda: None)
+    stale = now - dt.timedelta(minutes=10)
+    fleet.update(METRIC_COLUMNS, [(now, "10.0.0.1", 3000.0, 100.0, 60, 65.0, 5000.0),
+                                  (stale, "10.0.0.2", 3000.0, 90.0, 60, 65.0, 5000.0)])
+    calls = []
+    monkeypatch.setattr(endpoints, "FLEET_STATE", fleet)
+    refresher = LiveRefresher(fetch=lambda ip: calls.append(ip) or _payload(ip), min_interval=60)
+    monkeypatch.setattr(endpoints, "LIVE_REFRESH", refresher)
+    app = Flask(__name__)
+    app.register_blueprint(endpoints.api_bp, url_prefix="/api")
+    client = app.test_client()
+
+    data = client.get("/api/summary?max_age=120").get_json()
+    assert calls == []
+    assert data["total_workers"] == 2 and data["total_hashrate"] == 190.0
+    assert data["source"] == "mixed" and data["stale_workers"] == 1
+    assert {r["ip"]: r["source"] for r in data["log"]} == {"10.0.0.1": "poll", "10.0.0.2": "stale"}
+    assert {r["discovery"] for r in data["log"]} == {"poll"}
+
+    data = client.get("/api/summary?live=true").get_json()
+    assert sorted(calls) == ["10.0.0.1", "10.0.0.2"]
+    assert data["source"] == "live" and data["total_hashrate"] == 220.0
+    client.get("/api/summary?live=true")
+    assert len(calls) == 2
@@ -73,7 +73,7 @@ def client(monkeypatch):
         FakeRow(datetime(2025, 7, 31, 12, 0, 0)),
         FakeRow(datetime(2025, 7, 31, 12, 0, 30)),
     ]
-    monkeypatch.setattr(endpoints, 'SessionLocal', lambda: FakeSession(rows))
+    monkeypatch.setattr(endpoints, 'ReadSessionLocal', lambda: FakeSession(rows))
     return app.test_client()
 
 
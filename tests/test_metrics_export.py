@@ -0,0 +1,71 @@
+import csv
+import datetime as dt
+import io
+import json
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import api.endpoints as endpoints
+from api.endpoints import api_bp
+from core.db import METRIC_COLUMNS, Base, BulkWriter, Metric
+
+T0 = dt.datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    # Two miners sharing timestamps, so ties on timestamp are broken by id
+    rows = [(T0 + dt.timedelta(seconds=30 * i), ip, 3000.0, 100.0 + i, 60, 65.0, None)
+            for i in range(25) for ip in ("10.0.0.2", "10.0.0.1")]
+    BulkWriter(bind=eng).write(Metric, METRIC_COLUMNS, rows)
+    monkeypatch.setattr(endpoints, "ReadSessionLocal", sessionmaker(bind=eng))
+    monkeypatch.setattr(endpoints, "METRICS_EXPORT_PAGE_ROWS", 7)
+    monkeypatch.setattr(endpoints, "METRICS_EXPORT_FETCH_ROWS", 3)
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    return app.test_client()
+
+
+def _ndjson(resp):
+    return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+
+def test_ndjson_streams_every_row_in_keyset_order(client):
+    r = client.get("/api/metrics/export")
+    assert r.status_code == 200 and r.mimetype == "application/x-ndjson"
+    rows = _ndjson(r)
+    assert len(rows) == 50
+    keys = [(x["timestamp"], x["id"]) for x in rows]
+    assert keys == sorted(keys)
+    assert rows[0]["timestamp"] == "2026-01-01T12:00:00Z" and rows[0]["avg_fan_rpm"] is None
+
+
+def test_cursor_resumes_after_last_row(client):
+    first = _ndjson(client.get("/api/metrics/export?limit=9"))
+    assert len(first) == 9
+    last = first[-1]
+    rest = _ndjson(client.get(f"/api/metrics/export?cursor={last['timestamp']},{last['id']}"))
+    assert len(rest) == 41
+    everything = _ndjson(client.get("/api/metrics/export"))
+    assert [x["id"] for x in first + rest] == [x["id"] for x in everything]
+
+
+def test_csv_with_filters(client):
+    r = client.get("/api/metrics/export?format=csv&ip=10.0.0.1"
+                   "&since=2026-01-01T12:05:00Z&until=2026-01-01T12:10:00Z")
+    assert r.mimetype == "text/csv" and "metrics.csv" in r.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(r.get_data(as_text=True))))
+    assert len(rows) == 10 and {x["ip"] for x in rows} == {"10.0.0.1"}
+    assert rows[0]["timestamp"] == "2026-01-01T12:05:00Z" and rows[0]["hashrate_ths"] == "110.0"
+
+
+def test_bad_params_are_rejected(client):
+    assert client.get("/api/metrics/export?format=xml").status_code == 400
+    assert client.get("/api/metrics/export?cursor=garbage").status_code == 400
@@ -1,6 +1,7 @@
 import pytest
 import socket
 import json
+import time
 from core.miner import MinerClient
 
 
@@ -23,6 +24,11 @@ class DummySocket:
         self._data = b''
         return chunk
 
+    def recv_into(self, buffer):
+        chunk, self._data = self._data[:len(buffer)], self._data[len(buffer):]
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
     def close(self):
         pass
 
@@ -37,3 +43,231 @@ def test_get_summary_parses_json():
     client = MinerClient('127.0.0.1')
     result = client.get_summary()
     assert result == {"test": 123}
+
+
+PIPED_REPLY = {
+    "summary": [{"STATUS": [{"STATUS": "S", "When": 1722427200}],
+                 "SUMMARY": [{"GHS 5s": 110000, "Elapsed": 60}]}],
+    "stats": [{"STATS": [{"Type": "Antminer S19 Pro", "temp1": 70, "fan1": 6000}]}],
+    "version": [{"VERSION": [{"Type": "Antminer S19 Pro"}]}],
+}
+
+
+class CommandSocket(DummySocket):
+    """Answers per command; records every command sent (one per connection)."""
+    sent = []
+    piped = True
+    garbled = False
+
+    def sendall(self, data):
+        cmd = json.loads(data.decode("utf-8"))["command"]
+        CommandSocket.sent.append(cmd)
+        if "+" in cmd and CommandSocket.garbled:
+            self._data = b'{"summary": [{"STATUS": [{"STA'  # cut short mid-document
+            return
+        if "+" in cmd:
+            reply = PIPED_REPLY if CommandSocket.piped else {
+                "STATUS": [{"STATUS": "E", "Code": 14, "Msg": "Invalid command"}], "id": 1}
+        else:
+            reply = {c: PIPED_REPLY[c][0] for c in PIPED_REPLY}.get(
+                cmd, {"STATUS": [{"STATUS": "S", "Msg": cmd}], "id": 1})
+        self._data = json.dumps(reply).encode("utf-8")
+
+
+@pytest.fixture
+def command_socket(monkeypatch):
+    from core import miner
+    monkeypatch.setattr(socket, 'socket', lambda *args, **kwargs: CommandSocket())
+    monkeypatch.setattr(miner, '_PIPED_SUPPORT', {})
+    monkeypatch.setattr(miner, '_PIPED_RETRY_AT', {})
+    monkeypatch.setattr(miner, '_METADATA_CACHE', {})
+    monkeypatch.setattr(miner, 'MINER_HEALTH', miner.MinerHealthRegistry())
+    CommandSocket.sent = []
+    return CommandSocket
+
+
+def test_fetch_normalized_uses_one_piped_request(command_socket):
+    result = MinerClient('127.0.0.1').fetch_normalized()
+    assert command_socket.sent == ["summary+stats+version"]
+    assert result["hashrate_ths"] == 110.0
+    assert result["model"] == "Antminer S19 Pro"
+
+
+def test_fetch_normalized_falls_back_and_caches_rejection(command_socket):
+    command_socket.piped = False
+    try:
+        first = MinerClient('127.0.0.1').fetch_normalized()
+        second = MinerClient('127.0.0.1').fetch_normalized()
+    finally:
+        command_socket.piped = True
+    assert command_socket.sent == [
+        "summary+stats+version", "summary", "stats", "version",
+        "summary", "stats",
+    ]
+    assert first["model"] == second["model"] == "Antminer S19 Pro"
+
+
+def test_garbled_first_reply_does_not_disable_piping(command_socket, monkeypatch):
+    from core import miner
+    command_socket.garbled = True
+    try:
+        first = MinerClient('127.0.0.1').fetch_normalized()
+        MinerClient('127.0.0.1').fetch_normalized()
+    finally:
+        command_socket.garbled = False
+    assert command_socket.sent == [
+        "summary+stats+version", "summary", "stats", "version",
+        "summary", "stats",
+    ]
+    assert first["model"] == "Antminer S19 Pro"
+    assert ('127.0.0.1', 4028) not in miner._PIPED_SUPPORT
+
+    # Once the retry delay has passed piping is probed again
+    monkeypatch.setitem(miner._PIPED_RETRY_AT, ('127.0.0.1', 4028), 0.0)
+    monkeypatch.setattr(miner, '_METADATA_CACHE', {})
+    command_socket.sent = []
+    MinerClient('127.0.0.1').fetch_normalized()
+    assert command_socket.sent == ["summary+stats+version"]
+    assert miner._PIPED_SUPPORT[('127.0.0.1', 4028)] is True
+
+
+def test_metadata_cached_until_reboot(command_socket, monkeypatch):
+    from core import miner
+    client = MinerClient('127.0.0.1')
+    client.fetch_normalized()
+    second = client.fetch_normalized()
+    assert command_socket.sent == ["summary+stats+version", "summary+stats"]
+    assert second["model"] == "Antminer S19 Pro"
+    assert miner.get_cached_metadata('127.0.0.1').model == "Antminer S19 Pro"
+
+    # Elapsed going backwards means a reboot (possibly a firmware change): re-detect
+    rebooted = json.loads(json.dumps(PIPED_REPLY))
+    rebooted["summary"][0]["SUMMARY"][0]["Elapsed"] = 5
+    monkeypatch.setitem(PIPED_REPLY, "summary", rebooted["summary"])
+    command_socket.sent = []
+    client.fetch_normalized()
+    assert command_socket.sent == ["summary+stats", "version"]
+    assert miner.get_cached_metadata('127.0.0.1').elapsed_s == 5
+
+
+def test_metadata_expires_after_ttl(command_socket, monkeypatch):
+    from core import miner
+    client = MinerClient('127.0.0.1')
+    client.fetch_normalized()
+    monkeypatch.setattr(miner, 'MINER_METADATA_TTL', -1)
+    client.fetch_normalized()
+    assert command_socket.sent == ["summary+stats+version", "summary+stats+version"]
+
+
+class RefusingSocket(DummySocket):
+    connects = 0
+
+    def connect(self, addr):
+        RefusingSocket.connects += 1
+        raise ConnectionRefusedError("refused")
+
+
+def test_circuit_opens_after_consecutive_failures(monkeypatch):
+    from core import miner
+    registry = miner.MinerHealthRegistry()
+    monkeypatch.setattr(miner, 'MINER_HEALTH', registry)
+    monkeypatch.setattr(miner, 'MINER_CIRCUIT_FAILURES', 2)
+    monkeypatch.setattr(socket, 'socket', lambda *args, **kwargs: RefusingSocket())
+    RefusingSocket.connects = 0
+    client = MinerClient('10.0.0.9')
+
+    for _ in range(2):
+        with pytest.raises(ConnectionRefusedError):
+            client.get_summary()
+    with pytest.raises(miner.MinerUnavailableError):
+        client.get_summary()
+    assert RefusingSocket.connects == 2
+    assert registry.snapshot()['10.0.0.9']['state'] == 'open'
+
+    # Once the backoff has passed a single probe goes through; failing it doubles the backoff
+    registry._miners[('10.0.0.9', 4028)].open_until = 1e-9
+    with pytest.raises(ConnectionRefusedError):
+        client.get_summary()
+    assert RefusingSocket.connects == 3
+    assert registry._miners[('10.0.0.9', 4028)].opened == 2
+
+
+def test_control_commands_bypass_open_circuit(command_socket, monkeypatch):
+    from core import miner
+    monkeypatch.setattr(miner, 'MINER_CIRCUIT_FAILURES', 1)
+    miner.MINER_HEALTH.record_failure(('127.0.0.1', 4028))
+    client = MinerClient('127.0.0.1')
+    with pytest.raises(miner.MinerUnavailableError):
+        client.fetch_normalized()
+    assert command_socket.sent == []
+
+    # An operator can still act on the miner, and its reply closes the circuit
+    client.switch_pool(1)
+    assert command_socket.sent == ["switchpool"]
+    assert miner.MINER_HEALTH.snapshot()['127.0.0.1']['state'] == 'closed'
+
+
+def test_timeouts_adapt_to_observed_latency(monkeypatch):
+    from core import miner
+    registry = miner.MinerHealthRegistry()
+    key = ('10.0.0.9', 4028)
+    assert registry.timeouts(key, 5.0) == (5.0, 5.0)
+    for _ in range(10):
+        registry.record_success(key, 0.01, 0.3)
+    connect_timeout, read_timeout = registry.timeouts(key, 5.0)
+    assert connect_timeout == miner.MINER_TIMEOUT_FLOOR
+    assert read_timeout == pytest.approx(0.3 * miner.MINER_TIMEOUT_P99_MULTIPLIER)
+
+
+class StreamSocket(DummySocket):
+    """Serves `chunks` one per recv_into and then blocks (never closes) unless `endless`."""
+    chunks = []
+    endless = None
+    reads = 0
+
+    def recv_into(self, buffer):
+        StreamSocket.reads += 1
+        if StreamSocket.chunks:
+            chunk = StreamSocket.chunks.pop(0)
+        elif StreamSocket.endless is not None:
+            time.sleep(0.01)
+            chunk = StreamSocket.endless[:len(buffer)]
+        else:
+            raise AssertionError("read past the end of a complete reply")
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+@pytest.fixture
+def stream_socket(monkeypatch):
+    from core import miner
+    monkeypatch.setattr(socket, 'socket', lambda *args, **kwargs: StreamSocket())
+    monkeypatch.setattr(miner, 'MINER_HEALTH', miner.MinerHealthRegistry())
+    StreamSocket.chunks, StreamSocket.endless, StreamSocket.reads = [], None, 0
+    return StreamSocket
+
+
+def test_stops_reading_at_end_of_json_document(stream_socket):
+    reply = b'{"STATUS": [{"Msg": "a \\"}{\\" b\\\\"}], "x": [1, {"y": "]"}]}\x00'
+    stream_socket.chunks = [reply[i:i + 1] for i in range(len(reply))]
+    result = MinerClient('127.0.0.1').get_summary()
+    assert result == {"STATUS": [{"Msg": 'a "}{" b\\'}], "x": [1, {"y": "]"}]}
+    assert stream_socket.reads == len(reply) - 1  # the trailing NUL is never read
+
+
+def test_trickling_miner_hits_total_deadline(stream_socket):
+    stream_socket.chunks = [b'{"SUMMARY": "']
+    stream_socket.endless = b'x'
+    started = time.monotonic()
+    with pytest.raises(socket.timeout):
+        MinerClient('127.0.0.1', timeout=0.2).get_summary()
+    assert time.monotonic() - started < 1.0
+
+
+def test_oversized_response_is_rejected(stream_socket, monkeypatch):
+    from core import miner
+    monkeypatch.setattr(miner, 'CGMINER_MAX_RESPONSE_BYTES', 1000)
+    stream_socket.chunks = [b'{"SUMMARY": "']
+    stream_socket.endless = b'x' * 100
+    with pytest.raises(miner.MinerError, match="exceeds 1000 bytes"):
+        MinerClient('127.0.0.1').get_summary()
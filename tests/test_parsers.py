@@ -0,0 +1,93 @@
+import pytest
+
+from core import parsers
+from core.miner import _detect_metadata, _normalize
+from core.parsers import detect_family, parser_for
+
+ANTMINER_SUMMARY = {"STATUS": [{"STATUS": "S", "When": 1722427200}],
+                    "SUMMARY": [{"Elapsed": 600, "GHS 5s": "104000.5", "GHS av": 103000}]}
+ANTMINER_STATS = {"STATS": [
+    {"BMMiner": "1.0.0", "Type": "Antminer S19j Pro"},
+    {"temp_num": 3, "temp_max": 75, "temp1": 60, "temp2": 62, "temp3": 61,
+     "temp2_1": 70, "temp2_2": 72, "temp2_3": 71, "fan_num": 4,
+     "fan1": 5400, "fan2": 5520, "fan3": 5460, "fan4": 5500, "temp_chip1": "58-62"},
+]}
+ANTMINER_VERSION = {"VERSION": [{"BMMiner": "1.0.0", "Type": "Antminer S19j Pro"}]}
+
+WHATSMINER_SUMMARY = {"STATUS": [{"STATUS": "S", "When": 1722427200}],
+                      "SUMMARY": [{"Elapsed": 900, "MHS av": 88_000_000.0, "MHS 5s": 90_000_000.0,
+                                   "Temperature": 76.5, "Fan Speed In": 4200, "Fan Speed Out": 4380,
+                                   "Power": 3350}]}
+
+
+@pytest.mark.parametrize("version, family", [
+    (ANTMINER_VERSION, "antminer"),
+    ({"VERSION": [{"CGMiner": "4.9.2", "Miner": "VNish 1.2.6"}]}, "vnish"),
+    ({"VERSION": [{"BOSminer": "0.2.0", "API": "3.7"}]}, "braiins"),
+    ({"VERSION": [{"BTMiner": "2.0.1", "Type": "Whatsminer M30S+"}]}, "whatsminer"),
+    ({}, "unknown"),
+])
+def test_detect_family(version, family):
+    assert detect_family(version) == family
+
+
+# What the generic normalizer returned for the Antminer reply above before the family
+# parsers existed (temp_num/fan_num included, the "58-62" string skipped)
+ANTMINER_BASELINE = {"hashrate_ths": 104.0005, "elapsed_s": 600, "avg_temp_c": 59.25,
+                     "avg_fan_rpm": 4376.8, "power_w": 3172.01525,
+                     "when": "2024-07-31T12:00:00Z", "model": "Antminer S19j Pro"}
+
+
+@pytest.mark.parametrize("family", ["antminer", "vnish", "something-new"])
+def test_antminer_reply_normalizes_as_before(family):
+    meta = _detect_metadata(ANTMINER_SUMMARY, ANTMINER_STATS, ANTMINER_VERSION)
+    meta.family = family
+    result = _normalize(ANTMINER_SUMMARY, ANTMINER_STATS, meta)
+    assert {k: result[k] for k in ANTMINER_BASELINE} == pytest.approx(ANTMINER_BASELINE)
+
+
+def test_braiins_uses_the_generic_parser():
+    assert parser_for("braiins") is parsers.GENERIC_PARSER
+
+
+def test_whatsminer_reads_summary_fields():
+    meta = _detect_metadata(WHATSMINER_SUMMARY, {}, {"VERSION": [{"BTMiner": "2.0.1"}]})
+    result = _normalize(WHATSMINER_SUMMARY, {}, meta)
+    assert meta.family == "whatsminer"
+    assert result["hashrate_ths"] == 90.0
+    assert result["avg_temp_c"] == 76.5
+    assert result["avg_fan_rpm"] == 4290
+
+
+def test_field_map_only_fits_its_own_family_layout():
+    antminer = parser_for("antminer").learn(ANTMINER_SUMMARY, ANTMINER_STATS)
+    assert antminer.fits(ANTMINER_SUMMARY, ANTMINER_STATS)
+    # Same hashrate key and STATS length, but another family's fields
+    other = {"STATS": [ANTMINER_STATS["STATS"][0], {"chain_temp": 60, "fan_in": 4200}]}
+    assert not antminer.fits(ANTMINER_SUMMARY, other)
+
+    whatsminer = parser_for("whatsminer").learn(WHATSMINER_SUMMARY, {})
+    assert whatsminer.fits(WHATSMINER_SUMMARY, {})
+    assert not whatsminer.fits({"SUMMARY": [{"MHS 5s": 90_000_000.0}]}, {})
+
+
+def test_field_map_is_learned_once_per_miner(monkeypatch):
+    calls = []
+    learn = parsers.AntminerParser.learn
+
+    def counting_learn(self, summ, stats):
+        calls.append(1)
+        return learn(self, summ, stats)
+
+    monkeypatch.setattr(parsers.AntminerParser, "learn", counting_learn)
+    meta = _detect_metadata(ANTMINER_SUMMARY, ANTMINER_STATS, ANTMINER_VERSION)
+    first = _normalize(ANTMINER_SUMMARY, ANTMINER_STATS, meta)
+    second = _normalize(ANTMINER_SUMMARY, ANTMINER_STATS, meta)
+    assert len(calls) == 1
+    assert first == second
+    assert first["hashrate_ths"] == pytest.approx(104.0005)
+    assert first["avg_fan_rpm"] == 4376.8
+
+    # A different STATS layout (e.g. firmware swapped without a reboot) is re-learned
+    _normalize(ANTMINER_SUMMARY, {"STATS": ANTMINER_STATS["STATS"][1:]}, meta)
+    assert len(calls) == 2
@@ -0,0 +1,110 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from core import db
+from core.db import METRIC_COLUMNS, Base, BulkWriter, Metric, MetricPartitions, MinerLatest
+from core.retention import GUARDS, RetentionPolicy, drop_partitions
+from core.rollups import update_rollups
+from core.write_queue import WriteQueue
+
+
+@pytest.fixture
+def parts(tmp_path, monkeypatch):
+    eng = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", future=True)
+    Base.metadata.create_all(bind=eng)
+    partitions = MetricPartitions(bind=eng, directory=tmp_path / "partitions").install()
+    monkeypatch.setattr(db, "PARTITIONS", partitions)  # what metrics_source() reads through
+    return partitions
+
+
+def _rows(ts, n=3):
+    return [(ts, f"10.0.0.{i}", 3000.0, 100.0, 60, 65.0, 5000.0) for i in range(n)]
+
+
+def test_writes_route_to_month_files_and_view_reads_all(parts):
+    writer = BulkWriter(bind=parts.bind, metrics_store=parts)
+    sep, oct_ = dt.datetime(2026, 9, 30, 23, 59), dt.datetime(2026, 10, 1, 0, 1)
+    writer.write(Metric, METRIC_COLUMNS, _rows(sep) + _rows(oct_))
+    writer.write(Metric, METRIC_COLUMNS, _rows(oct_ + dt.timedelta(minutes=1)))
+
+    assert parts.months() == ["2026_09", "2026_10"]
+    with parts.bind.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM main.metrics").scalar() == 0
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM p_2026_10.metrics").scalar() == 6
+
+    s = sessionmaker(bind=parts.bind)()
+    m = parts.source()
+    ids = [r.id for r in s.query(m).order_by(m.id)]
+    assert ids == list(range(1, 10))  # one sequence across files
+    assert s.execute(text(f"SELECT COUNT(*) FROM {parts.VIEW_NAME}")).scalar() == 9
+    latest = s.query(MinerLatest).filter_by(miner_ip="10.0.0.1").one()
+    assert latest.timestamp == oct_ + dt.timedelta(minutes=1)
+    s.close()
+
+
+def test_router_only_reads_overlapping_months(parts):
+    writer = BulkWriter(bind=parts.bind, metrics_store=parts)
+    writer.write(Metric, METRIC_COLUMNS,
+                 _rows(dt.datetime(2026, 8, 15)) + _rows(dt.datetime(2026, 10, 2)))
+
+    m = parts.source(since=dt.datetime(2026, 10, 1))
+    s = sessionmaker(bind=parts.bind)()
+    q = s.query(m).filter(m.timestamp >= dt.datetime(2026, 10, 1))
+    sql = str(q.statement.compile(parts.bind))
+    assert "p_2026_10.metrics" in sql and "p_2026_08" not in sql
+    assert len(q.all()) == 3
+    s.close()
+
+
+def test_retention_unlinks_expired_rolled_up_months(parts):
+    writer = BulkWriter(bind=parts.bind, metrics_store=parts)
+    writer.write(Metric, METRIC_COLUMNS,
+                 _rows(dt.datetime(2026, 8, 15)) + _rows(dt.datetime(2026, 10, 2)))
+    policy = RetentionPolicy("metrics", "timestamp", 14, GUARDS["metrics"])
+    now = dt.datetime(2026, 10, 10)
+
+    # Not rolled up yet: nothing is dropped
+    assert drop_partitions(policy, parts, now)["pending"] == ["2026_08"]
+
+    s = sessionmaker(bind=parts.bind)()
+    update_rollups(session=s)
+    s.close()
+    report = drop_partitions(policy, parts, now)
+    assert report["dropped"] == ["2026_08"]
+    assert not parts.path("2026_08").exists()
+    assert parts.months() == ["2026_10"]
+
+    s = sessionmaker(bind=parts.bind)()
+    assert s.query(parts.source()).count() == 3
+    s.close()
+
+
+def test_orm_writes_still_reach_main_metrics(parts):
+    writer = BulkWriter(bind=parts.bind, metrics_store=parts)
+    writer.write(Metric, METRIC_COLUMNS, _rows(dt.datetime(2026, 10, 2)))
+    s = sessionmaker(bind=parts.bind)()
+    s.add(Metric(timestamp=dt.datetime(2026, 10, 3), miner_ip="10.0.0.9", hashrate_ths=1.0))
+    s.commit()
+    assert s.query(Metric).count() == 1
+    assert s.query(parts.source()).count() == 4
+    s.query(Metric).delete()
+    s.commit()
+    s.close()
+
+
+def test_rollover_write_in_queue_transaction_uses_month_created_ahead(parts):
+    writer = BulkWriter(bind=parts.bind, metrics_store=parts)
+    assert parts.ensure_ahead(now=dt.datetime(2026, 9, 30, 23, 0)) == ["2026_09", "2026_10"]
+    queue = WriteQueue(bind=parts.bind)
+    try:
+        # The batch's month is attached when the queue checks out its connection
+        rows = _rows(dt.datetime(2026, 10, 1))
+        written = queue.run(lambda ws: writer.write(Metric, METRIC_COLUMNS, rows, session=ws))
+    finally:
+        queue.close(5)
+    assert written == 3
+    with parts.bind.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM p_2026_10.metrics").scalar() == 3
@@ -0,0 +1,62 @@
+"""Query-plan regression suite for the hot read paths (see helpers/bench_query_plans.py).
+
+Builds a synthetic metrics.db and fails if a hot query scans a metrics table or needs a
+temp B-tree. Wall times are printed (pytest -s); for the 10M-row numbers run
+  QUERY_PLAN_MINERS=1000 QUERY_PLAN_CYCLES=10000 pytest -s tests/test_query_plans.py
+or python -m helpers.bench_query_plans.
+"""
+import os
+
+import pytest
+from sqlalchemy import inspect
+
+from core.db import Base, create_sqlite_engines, ensure_indexes
+from helpers.bench_query_plans import CASES, HotQueries, build_database, explain, plan_problems
+
+MINERS = int(os.getenv("QUERY_PLAN_MINERS", 50))
+# 25h at 30s polls: every rollup window is covered
+CYCLES = int(os.getenv("QUERY_PLAN_CYCLES", 3000))
+
+
+@pytest.fixture(scope="module")
+def hot(tmp_path_factory):
+    writer, reader = build_database(tmp_path_factory.mktemp("plans") / "metrics.db", MINERS, CYCLES)
+    hot = HotQueries(reader, MINERS)
+    with hot.serving():
+        yield hot
+    writer.dispose()
+    reader.dispose()
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_hot_query_plan(hot, name):
+    fn, allow = {n: (f, a) for n, f, a in hot.cases()}[name]
+    result = hot.check(fn, allow)
+    plans = "\n".join(f"{e['sql']}\n  " + "\n  ".join(e["plan"]) for e in result["plans"])
+    print(f"{name}: {result['wall_ms']} ms at {MINERS * CYCLES} rows")
+    assert result["statements"] > 0
+    assert result["problems"] == [], plans
+
+
+def test_problems_flag_scans_and_temp_btrees():
+    plan = ["SCAN metrics", "USE TEMP B-TREE FOR ORDER BY", "SCAN miner_latest",
+            "SEARCH metrics USING INDEX idx_metrics_miner_ip_timestamp (miner_ip=?)"]
+    assert plan_problems(plan) == ["SCAN metrics", "USE TEMP B-TREE FOR ORDER BY"]
+    assert plan_problems(["SCAN metrics USING INDEX ix_metrics_timestamp"],
+                         allow=("SCAN metrics USING INDEX ix_metrics_timestamp",)) == []
+
+
+def test_ensure_indexes_restores_missing_ones(tmp_path):
+    writer, _ = create_sqlite_engines(tmp_path / "old.db", read_pool_size=1)
+    Base.metadata.create_all(bind=writer)
+    with writer.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX idx_metrics_miner_ip_timestamp")
+    sql = "SELECT * FROM metrics WHERE miner_ip = ? AND timestamp >= ? ORDER BY timestamp"
+    assert plan_problems(explain(writer, sql, ("10.0.0.1", "2026-01-01")))
+
+    assert ensure_indexes(writer) == ["idx_metrics_miner_ip_timestamp"]
+    indexes = {ix["name"] for ix in inspect(writer).get_indexes("metrics")}
+    assert "idx_metrics_miner_ip_timestamp" in indexes
+    assert plan_problems(explain(writer, sql, ("10.0.0.1", "2026-01-01"))) == []
+    assert ensure_indexes(writer) == []
+    writer.dispose()
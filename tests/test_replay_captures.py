@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from core import miner
+from core.miner import MinerClient
+from helpers.replay_captures import load_captures, normalize_capture, raw_responses, replay
+from simulator import FaultProfile, FleetSimulator
+
+
+@pytest.fixture(autouse=True)
+def fresh_miner_state(monkeypatch):
+    monkeypatch.setattr(miner, '_PIPED_SUPPORT', {})
+    monkeypatch.setattr(miner, '_PIPED_RETRY_AT', {})
+    monkeypatch.setattr(miner, '_METADATA_CACHE', {})
+    monkeypatch.setattr(miner, 'MINER_HEALTH', miner.MinerHealthRegistry())
+
+
+def test_capture_and_replay_round_trip(tmp_path):
+    fleet = FleetSimulator(2, layout="ports", host="127.0.0.1", port=0,
+                           faults=FaultProfile(latency_ms=0, jitter_ms=0), seed=5)
+    live = []
+    with fleet.running():
+        for host, port in fleet.endpoints:
+            client = MinerClient(host, port=port, capture_dir=str(tmp_path))
+            live.append(client.fetch_normalized())
+            client.fetch_normalized()  # capture mode bypasses the metadata cache
+
+    captures = load_captures(tmp_path)
+    assert len(captures) == 4
+    assert {p.parent.name for p in tmp_path.rglob("*.json")} == {"antminer"}
+    first = min(captures, key=lambda d: (d["port"], d["captured_at"]))
+    assert list(first["responses"]) == ["summary+stats+version"]
+    assert raw_responses(first)["summary+stats+version"].endswith(b"\x00")
+    assert normalize_capture(first) == min(zip(fleet.endpoints, live, strict=True))[1]
+
+    report = replay(captures, iterations=5)
+    assert report["antminer"]["captures"] == 4
+    assert report["antminer"]["cold_parses_per_s"] > 0
+    assert report["antminer"]["peak_bytes_per_parse"] > 0
+    json.dumps(report)
@@ -0,0 +1,99 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from core.archive import MetricsArchive
+from core.db import Base, Event, Metric, RollupState
+from core.retention import policies, run_retention
+from core.write_queue import WriteQueue
+
+NOW = dt.datetime(2026, 6, 1)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", future=True)
+
+    @event.listens_for(eng, "connect")
+    def _pragmas(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+    Base.metadata.create_all(bind=eng)
+    return eng
+
+
+def _seed(eng, days_old, count, rolled_up=True):
+    s = sessionmaker(bind=eng)()
+    ts = NOW - dt.timedelta(days=days_old)
+    s.add_all(Metric(timestamp=ts, miner_ip=f"10.0.{i // 250}.{i % 250}", hashrate_ths=100.0)
+              for i in range(count))
+    s.add_all(Event(timestamp=ts, message="x" * 200) for _ in range(count))
+    s.commit()
+    if rolled_up:
+        last_id = s.query(Metric.id).order_by(Metric.id.desc()).first()[0]
+        s.merge(RollupState(name="metrics", last_metric_id=last_id))
+        s.commit()
+    s.close()
+
+
+def test_policies_skip_disabled_and_unknown_tables():
+    tables = [p.table for p in policies({"metrics": 14, "events": 0, "nope": 3})]
+    assert tables == ["metrics"]
+
+
+def test_chunked_purge_respects_rollup_mark_and_reclaims_pages(engine):
+    _seed(engine, days_old=30, count=1200)
+    _seed(engine, days_old=1, count=10)
+    _seed(engine, days_old=30, count=5, rolled_up=False)  # old, but not folded into rollups yet
+
+    days = {"metrics": 14, "events": 14}
+    dry = run_retention(bind=engine, now=NOW, days=days, dry_run=True)
+    assert dry["tables"]["metrics"]["would_delete"] == 1200
+
+    report = run_retention(bind=engine, now=NOW, days=days, chunk_rows=500, pause_s=0)
+    assert report["tables"]["metrics"] == {"deleted": 1200, "chunks": 3,
+                                           "cutoff": "2026-05-18T00:00:00Z"}
+    assert report["tables"]["events"]["deleted"] == 1205
+    assert report["rows_deleted"] == 2405
+    assert report["auto_vacuum"] == "incremental"
+    assert report["pages_reclaimed"] > 0 and report["bytes_reclaimed"] > 0
+    assert report["free_pages_after"] == 0
+
+    s = sessionmaker(bind=engine)()
+    assert s.query(Metric).count() == 15
+    s.close()
+
+
+def test_purge_and_vacuum_run_as_queue_jobs(engine):
+    _seed(engine, days_old=30, count=600)
+    queue = WriteQueue(bind=engine)
+    report = run_retention(bind=engine, now=NOW, days={"metrics": 14, "events": 14},
+                           chunk_rows=250, pause_s=0, queue=queue)
+    assert report["rows_deleted"] == 1200 and report["pages_reclaimed"] > 0
+    # 3 delete chunks per table (250 + 250 + 100), then at least one vacuum step
+    assert queue.stats()["jobs"] >= 7
+    queue.close()
+
+
+def test_raw_metrics_wait_for_the_archive(engine, tmp_path):
+    _seed(engine, days_old=30, count=10)
+    _seed(engine, days_old=20, count=10)
+    archive = MetricsArchive(tmp_path / "archive")
+    days = {"metrics": 14}
+
+    # Retention before the archiver has run: rolled up and past the cutoff, but kept
+    report = run_retention(bind=engine, now=NOW, days=days, pause_s=0, archive=archive)
+    assert report["tables"]["metrics"]["deleted"] == 0 and report["archived_until"] is None
+
+    # Once the older day is archived, only that day goes
+    s = sessionmaker(bind=engine)()
+    archive.archive_day((NOW - dt.timedelta(days=30)).date(), s)
+    s.close()
+    report = run_retention(bind=engine, now=NOW, days=days, pause_s=0, archive=archive)
+    assert report["tables"]["metrics"]["deleted"] == 10
+    assert report["archived_until"] == "2026-05-03T00:00:00Z"
+    s = sessionmaker(bind=engine)()
+    assert s.query(Metric).count() == 10
+    s.close()
@@ -0,0 +1,110 @@
+import datetime as dt
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import api.endpoints as endpoints
+from api.endpoints import api_bp
+from core.db import METRIC_COLUMNS, ROLLUP_MODELS, Base, BulkWriter, Metric, RollupState
+from core.fleet_state import FleetState
+from core.rollups import bucket_start, choose_resolution, run_rollups, update_rollups
+from core.write_queue import WriteQueue
+
+T0 = dt.datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def session_factory():
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    factory = sessionmaker(bind=eng, expire_on_commit=False)
+    factory.writer = BulkWriter(bind=eng)
+    return factory
+
+
+def _write(factory, samples):
+    """samples: (seconds after T0, ip, hashrate)"""
+    rows = [(T0 + dt.timedelta(seconds=sec), ip, 3000.0, ths, 60, 65.0, 5000.0)
+            for sec, ip, ths in samples]
+    factory.writer.write(Metric, METRIC_COLUMNS, rows)
+
+
+def test_bucket_start_and_resolution_choice():
+    assert bucket_start(dt.datetime(2026, 1, 1, 12, 7, 31), 300) == dt.datetime(2026, 1, 1, 12, 5)
+    assert bucket_start(dt.datetime(2026, 1, 1, 12, 7, 31), 86400) == dt.datetime(2026, 1, 1)
+    assert choose_resolution(30 * 60, 500) is None  # 60 raw samples fit
+    assert choose_resolution(24 * 3600, 500) == "5m"  # 288 buckets
+    assert choose_resolution(7 * 86400, 500) == "1h"  # 168 buckets
+    assert choose_resolution(3650 * 86400, 10) == "1d"  # nothing fits: coarsest
+
+
+def test_incremental_update_merges_into_existing_buckets(session_factory):
+    _write(session_factory, [(0, "a", 100.0), (30, "a", 110.0), (70, "a", 90.0), (10, "b", 50.0)])
+    s = session_factory()
+    assert update_rollups(session=s, batch_rows=3)["rows"] == 4  # two chunks
+    m1 = ROLLUP_MODELS["1m"]
+    row = s.get(m1, ("a", T0))
+    assert (row.samples, row.hashrate_ths_min, row.hashrate_ths_max) == (2, 100.0, 110.0)
+    assert row.hashrate_ths_avg == pytest.approx(105.0)
+    assert row.hashrate_ths_last == 110.0
+
+    # A later poll (and a late, older sample) fold into the same 5m bucket
+    _write(session_factory, [(120, "a", 120.0), (5, "a", 80.0)])
+    summary = update_rollups(session=s)
+    assert summary["rows"] == 2 and summary["caught_up"]
+    five = s.get(ROLLUP_MODELS["5m"], ("a", T0))
+    assert five.samples == 5
+    assert five.hashrate_ths_avg == pytest.approx((100 + 110 + 90 + 120 + 80) / 5)
+    assert (five.hashrate_ths_min, five.hashrate_ths_max) == (80.0, 120.0)
+    assert five.hashrate_ths_last == 120.0 and five.last_ts == T0 + dt.timedelta(seconds=120)
+    assert s.get(RollupState, "metrics").last_metric_id == summary["high_water_mark"]
+
+    assert update_rollups(session=s)["rows"] == 0
+    s.close()
+
+
+def test_run_rollups_folds_one_chunk_per_queue_job(session_factory):
+    _write(session_factory, [(sec, "a", 100.0) for sec in range(0, 300, 30)])
+    queue = WriteQueue(bind=session_factory.kw["bind"])
+    summary = run_rollups(queue=queue, batch_rows=4)
+    assert (summary["rows"], summary["batches"], summary["caught_up"]) == (10, 3, True)
+    assert queue.stats()["jobs"] == 3
+    s = session_factory()
+    assert s.get(ROLLUP_MODELS["5m"], ("a", T0)).samples == 10
+    s.close()
+    queue.close()
+
+
+def test_endpoints_read_rollups_for_long_windows(session_factory, monkeypatch):
+    now = dt.datetime.utcnow().replace(microsecond=0)
+    rows = [(now - dt.timedelta(minutes=m), ip, 3000.0, 100.0 + (m // 10) % 2, 60, 65.0, 5000.0)
+            for m in range(0, 24 * 60, 10) for ip in ("a", "b")]
+    session_factory.writer.write(Metric, METRIC_COLUMNS, rows)
+    update_rollups(session=session_factory())
+    monkeypatch.setattr(endpoints, "ReadSessionLocal", session_factory)
+    monkeypatch.setattr(endpoints, "FLEET_STATE", FleetState(session_factory=session_factory))
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    client = app.test_client()
+
+    since = (now - dt.timedelta(hours=24)).isoformat()
+    r = client.get(f"/api/metrics?since={since}&limit=200")
+    assert r.headers["X-Metrics-Resolution"] == "1h"  # 100 points per miner
+    data = r.get_json()
+    assert {d["ip"] for d in data} == {"a", "b"} and len(data) <= 2 * 25
+
+    r = client.get(f"/api/metrics?since={since}&limit=200&resolution=raw")
+    assert r.headers["X-Metrics-Resolution"] == "raw" and len(r.get_json()) == 200
+
+    r = client.get("/api/miners/summary?window_min=1440")
+    assert r.headers["X-Metrics-Resolution"] == "1h"
+    summary = {d["ip"]: d for d in r.get_json()}
+    assert summary["a"]["hashrate_ths"] == pytest.approx(100.5, abs=0.1)
+    assert summary["a"]["last_seen"] == now.isoformat() + "Z"
+
+    r = client.get("/api/miners/summary?window_min=20")
+    assert r.headers["X-Metrics-Resolution"] == "raw"
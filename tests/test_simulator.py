@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from core import miner
+from core.inventory import probe_hosts
+from core.miner import MinerClient, _parse_response, poll_fleet
+from simulator import MODELS, FaultProfile, FleetSimulator, SimulatedMiner
+
+FAST = FaultProfile(latency_ms=0, jitter_ms=0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_miner_state(monkeypatch):
+    monkeypatch.setattr(miner, '_PIPED_SUPPORT', {})
+    monkeypatch.setattr(miner, '_PIPED_RETRY_AT', {})
+    monkeypatch.setattr(miner, '_METADATA_CACHE', {})
+    monkeypatch.setattr(miner, 'MINER_HEALTH', miner.MinerHealthRegistry())
+
+
+@pytest.fixture
+def alias_fleet():
+    fleet = FleetSimulator(6, host="127.0.3.1", port=0, faults=FAST, seed=7)
+    running = fleet.running()
+    try:
+        running.__enter__()
+    except OSError as e:  # loopback aliases are a Linux feature
+        pytest.skip(f"loopback aliases unavailable: {e}")
+    yield fleet
+    running.__exit__(None, None, None)
+
+
+def test_poll_fleet_and_discovery_against_simulator(alias_fleet):
+    cycle = asyncio.run(poll_fleet(alias_fleet.ips, port=alias_fleet.port, deadline=10))
+    assert sorted(cycle["results"]) == sorted(alias_fleet.ips)
+    for sim in alias_fleet.miners:
+        payload = cycle["results"][sim.host]
+        assert payload["model"] == sim.model
+        assert payload["hashrate_ths"] == pytest.approx(MODELS[sim.model][0], rel=0.05)
+
+    assert probe_hosts(alias_fleet.ips + ["127.0.4.1"], port=alias_fleet.port, timeout=0.5) == \
+        set(alias_fleet.ips)
+
+
+def test_port_layout_serves_miner_client():
+    fleet = FleetSimulator(2, layout="ports", host="127.0.0.1", port=0, faults=FAST,
+                           models=["Antminer S19 XP"], seed=1)
+    with fleet.running():
+        host, port = fleet.endpoints[1]
+        result = MinerClient(host, port=port).fetch_normalized()
+    assert result["model"] == "Antminer S19 XP"
+    assert fleet.stats()["requests"] == 1  # piped summary+stats+version
+
+
+def test_malformed_replies_are_nul_terminated_and_unparseable():
+    sim = SimulatedMiner("127.0.0.1", 4028, "Antminer S19", FaultProfile(malformed_rate=1.0))
+    raw = sim.handle(b'{"command": "summary"}\n')
+    assert raw.endswith(b"\x00")
+    with pytest.raises(ValueError):
+        _parse_response(raw)
+
+
+def test_reboot_resets_connections_then_elapsed():
+    sim = SimulatedMiner("127.0.0.1", 4028, "Antminer S19", FaultProfile(reboot_downtime_s=60))
+    before = _parse_response(sim.handle(b'{"command": "summary"}\n'))["SUMMARY"][0]["Elapsed"]
+    sim.handle(b'{"command": "restart"}\n')
+    assert sim.handle(b'{"command": "summary"}\n') is None
+    sim.down_until = 0.0
+    sim.booted_at -= 60 + 5
+    after = _parse_response(sim.handle(b'{"command": "summary"}\n'))["SUMMARY"][0]["Elapsed"]
+    assert after < before
@@ -0,0 +1,65 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from core.db import (
+    METRIC_COLUMNS,
+    Base,
+    BulkWriter,
+    Metric,
+    MinerLatest,
+    create_sqlite_engines,
+    sqlite_pragmas,
+)
+
+
+@pytest.fixture
+def engines(tmp_path):
+    writer, reader = create_sqlite_engines(tmp_path / "metrics.db", profile="tuned",
+                                           read_pool_size=2)
+    Base.metadata.create_all(bind=writer)
+    yield writer, reader
+    writer.dispose()
+    reader.dispose()
+
+
+def _pragma(eng, name):
+    with eng.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_profiles():
+    baseline = sqlite_pragmas("baseline")
+    assert not any("mmap_size" in p or "wal_autocheckpoint" in p for p in baseline)
+    tuned = sqlite_pragmas("tuned")
+    assert any(p.startswith("PRAGMA mmap_size=") for p in tuned)
+    assert any(p.startswith("PRAGMA page_size=") for p in tuned)
+    assert "PRAGMA journal_mode=WAL" in tuned
+    read_only = sqlite_pragmas("tuned", read_only=True)
+    assert "PRAGMA query_only=1" in read_only
+    assert not any("journal_mode" in p or "page_size" in p for p in read_only)
+
+
+def test_tuned_writer_and_reader(engines):
+    writer, reader = engines
+    assert _pragma(writer, "journal_mode") == "wal"
+    assert _pragma(writer, "page_size") == 8192
+    assert _pragma(writer, "temp_store") == 2  # MEMORY
+    assert _pragma(reader, "query_only") == 1
+    assert _pragma(reader, "mmap_size") > 0
+
+
+def test_reader_sees_writes_and_rejects_its_own(engines):
+    writer, reader = engines
+    row = (dt.datetime(2026, 1, 1), "10.0.0.1", 1.0, 2.0, 3, 4.0, 5.0)
+    BulkWriter(bind=writer).write(Metric, METRIC_COLUMNS, [row])
+
+    s = sessionmaker(bind=reader)()
+    assert s.query(MinerLatest).one().miner_ip == "10.0.0.1"
+    s.add(Metric(timestamp=dt.datetime(2026, 1, 1), miner_ip="10.0.0.2"))
+    with pytest.raises(OperationalError):
+        s.commit()
+    s.rollback()
+    s.close()
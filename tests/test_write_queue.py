@@ -0,0 +1,91 @@
+import datetime as dt
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.alert_engine import _update_alerts
+from core.db import METRIC_COLUMNS, Alert, Base, BulkWriter, Metric, Miner
+from core.write_queue import WriteQueue
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine("sqlite://", future=True, poolclass=StaticPool,
+                        connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=eng)
+    return eng
+
+
+@pytest.fixture
+def wq(engine):
+    q = WriteQueue(bind=engine, max_batch=16)
+    yield q
+    q.close(timeout=5)
+
+
+def _add_miner(session, ip):
+    session.add(Miner(miner_ip=ip))
+    session.flush()
+    return ip
+
+
+def _ips(engine):
+    s = sessionmaker(bind=engine)()
+    try:
+        return sorted(m.miner_ip for m in s.query(Miner))
+    finally:
+        s.close()
+
+
+def test_run_returns_committed_result(engine, wq):
+    assert wq.run(_add_miner, "10.0.0.1") == "10.0.0.1"
+    assert _ips(engine) == ["10.0.0.1"]
+    st = wq.stats()
+    assert st["jobs"] == 1 and st["transactions"] == 1 and st["depth"] == 0
+    assert st["last_commit_ms"] >= 0
+
+
+def test_queued_jobs_share_a_transaction_and_fail_alone(engine, wq):
+    started, gate = threading.Event(), threading.Event()
+    blocker = wq.submit(lambda s: started.set() or gate.wait(5))
+    assert started.wait(5)
+    futures = [wq.submit(_add_miner, ip) for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1", "10.0.0.3")]
+    assert wq.stats()["max_depth"] >= 4
+    gate.set()
+    blocker.result(5)
+
+    assert [f.exception(5) is None for f in futures] == [True, True, False, True]
+    assert isinstance(futures[2].exception(), IntegrityError)
+    assert _ips(engine) == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    st = wq.stats()
+    assert st["jobs"] == 5 and st["failed_jobs"] == 1
+    assert st["transactions"] == 2  # the blocker alone, then the four queued behind it
+
+
+def test_jobs_may_commit_and_nest(engine, wq):
+    def job(session):
+        _add_miner(session, "10.0.0.5")
+        session.commit()  # releases the job's savepoint only
+        return wq.run(_add_miner, "10.0.0.6")  # runs inline on the writer thread
+
+    done = []
+    assert wq.submit(job, callback=lambda f: done.append(f.result())).result(5) == "10.0.0.6"
+    assert done == ["10.0.0.6"]
+    assert _ips(engine) == ["10.0.0.5", "10.0.0.6"]
+
+
+def test_bulk_writer_and_alert_updates_through_queue(engine, wq):
+    writer = BulkWriter(bind=engine)
+    rows = [(dt.datetime(2026, 1, 1, 0, i), "10.0.0.1", 3000.0, 100.0, 60, 65.0, 5000.0)
+            for i in range(3)]
+    assert wq.run(lambda s: writer.write(Metric, METRIC_COLUMNS, rows, session=s)) == 3
+
+    cols = ("miner_ip", "alert_type", "severity", "message", "status")
+    alerts = [("a", "temp", "warning", "hot", "active")] * 2
+    ids = wq.run(lambda s: writer.write(Alert, cols, alerts, session=s, returning="id"))
+    assert wq.run(_update_alerts, ids, ["active"], status="resolved") == 2
+    assert wq.run(_update_alerts, ids, ["active"], status="acknowledged") == 0